@@ -12,9 +12,13 @@ from backend.agents.technical_analyst_new import OptimizedTradingStrategy
 from backend.agents.risk_manager import RiskManager
 from backend.agents.portfolio_manager import PortfolioManager
 from backend.agents.base_agent import AgentAnalysis, AgentRole
-from backend.agents.kline_compressor import kline_compressor
+from backend.agents import kline_compressor  # noqa: F401  注册 kline_compression 计算函数
+from backend.agents.multi_timeframe import parse_timeframes
+from backend.agents.cpu_executor import cpu_executor
 from backend.agents.stop_loss_decision_system import stop_decision_system
 from backend.config import settings
+from backend.monitoring.metrics import STAGE_LATENCY, AGENT_LATENCY
+from backend.monitoring.logging_config import log_payload
 
 
 
@@ -141,11 +145,25 @@ class AgentTeam:
             raw_klines = additional_data.get('raw_klines', [])
             kline_interval = additional_data.get('kline_interval', '1h')
             
+            # 多周期特征：基础周期K线重采样出各周期，一次计算所有周期的指标
+            base_klines = additional_data.pop('base_klines', None)
+            if settings.mtf_enabled and base_klines:
+                base_interval = additional_data.get('base_interval', kline_interval)
+                timeframes = parse_timeframes(settings.mtf_timeframes, base_interval)
+                try:
+                    with STAGE_LATENCY.time(stage="mtf_features", symbol=symbol):
+                        additional_data['mtf_features'] = await cpu_executor.run(
+                            "mtf_features", base_klines, base_interval, timeframes
+                        )
+                except Exception as e:
+                    logger.warning(f"⚠️ 多周期特征计算失败，使用单周期分析: {symbol} - {e}")
+            
             if raw_klines:
-                logger.info(f"📊 压缩K线数据: {symbol} {kline_interval}, 原始数据{len(raw_klines)}根")
-                compressed_kline_data = kline_compressor.compress_kline_data(
-                    raw_klines, kline_interval, symbol
-                )
+                logger.debug("📊 压缩K线数据: {} {}, 原始数据{}根", symbol, kline_interval, len(raw_klines))
+                with STAGE_LATENCY.time(stage="kline_compression", symbol=symbol):
+                    compressed_kline_data = await cpu_executor.run(
+                        "kline_compression", raw_klines, kline_interval, symbol, additional_data.get('mtf_features')
+                    )
                 
                 # 将压缩后的K线数据添加到额外数据中
                 additional_data['kline_compressed'] = compressed_kline_data
@@ -153,9 +171,9 @@ class AgentTeam:
                 
                 # 输出格式化的摘要
                 if 'formatted_summary' in compressed_kline_data:
-                    logger.info(f"\n{'='*60}\n{compressed_kline_data['formatted_summary']}\n{'='*60}")
+                    log_payload(f"K线摘要 {symbol}", compressed_kline_data['formatted_summary'])
                 
-                logger.info(f"✅ K线数据压缩完成，提取{len(compressed_kline_data)}维特征")
+                logger.debug("✅ K线数据压缩完成，提取{}维特征", len(compressed_kline_data))
             else:
                 logger.warning(f"⚠️ 未提供K线数据，将使用简化分析")
             
@@ -239,9 +257,10 @@ class AgentTeam:
                     'positions': positions
                 }
                 
-                final_decision = await self.agents['portfolio'].make_final_decision(
-                    symbol, market_data, valid_analyses, portfolio_with_positions, db_session
-                )
+                with AGENT_LATENCY.time(agent="portfolio_manager", symbol=symbol):
+                    final_decision = await self.agents['portfolio'].make_final_decision(
+                        symbol, market_data, valid_analyses, portfolio_with_positions, db_session
+                    )
                 
                 # 根据决策结果提供更详细的日志
                 action = final_decision.get('action', 'hold')
@@ -365,7 +384,7 @@ class AgentTeam:
                 'position_info': position_info,
                 'portfolio': position_info.get('portfolio', {})
             }
-            logger.info(f"准备分析数据: {additional_data}")
+            log_payload("准备分析数据", lambda: str(additional_data))
             # 第一阶段：并行执行各分析师的分析
             analysis_tasks = []
             
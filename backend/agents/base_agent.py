@@ -6,6 +6,8 @@ from typing import Dict, List, Optional
 from dataclasses import dataclass
 from enum import Enum
 
+from backend.monitoring.metrics import instrument_agent
+
 
 class AgentRole(Enum):
     """智能体角色"""
@@ -32,6 +34,12 @@ class AgentAnalysis:
 class BaseAgent(ABC):
     """智能体基类"""
     
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # 每个子类实现的analyze自动记录耗时指标（按智能体和交易对）
+        if "analyze" in cls.__dict__:
+            cls.analyze = instrument_agent(cls.analyze)
+    
     def __init__(self, role: AgentRole, ai_model: str, api_key: str):
         self.role = role
         self.ai_model = ai_model
@@ -0,0 +1,178 @@
+"""
+CPU密集型计算执行器
+
+技术指标（pandas + talib）和K线压缩是纯同步计算，直接在协程里执行会占住事件循环，
+期间WebSocket广播和API请求都会卡住。这里把这些函数注册到执行器，按函数配置运行方式：
+
+    process - 进程池（默认）。工作进程启动时预先导入 pandas/talib 等模块，避免首次调用的导入开销
+    thread  - 线程池。适合主要耗时在释放GIL的C扩展中的函数
+    inline  - 直接在事件循环中执行（调试或对比时使用）
+
+注册的函数必须定义在模块顶层（可被pickle），参数和返回值也必须可pickle。
+进程池异常（工作进程崩溃）时重建进程池，本次调用改为在线程池执行，不影响交易周期。
+"""
+import asyncio
+import importlib
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Optional
+
+from loguru import logger
+
+from backend.config import settings
+from backend.monitoring.metrics import CPU_TASK_LATENCY
+
+
+MODES = ("process", "thread", "inline")
+
+
+def parse_modes(spec: str) -> Dict[str, str]:
+    """解析 "kline_compression=thread,technical_analysis=process" 为 {函数名: 运行方式}"""
+    modes = {}
+    for item in (spec or "").split(","):
+        if "=" not in item:
+            continue
+        name, mode = item.split("=", 1)
+        name, mode = name.strip(), mode.strip().lower()
+        if mode not in MODES:
+            logger.warning(f"⚠️ 未知的执行方式: {item}")
+            continue
+        modes[name] = mode
+    return modes
+
+
+def _warm_worker(modules):
+    """工作进程初始化：只保留WARNING以上日志，预先导入计算模块"""
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    for module in modules:
+        try:
+            importlib.import_module(module)
+        except Exception as e:
+            logger.warning(f"⚠️ 工作进程预加载失败 {module}: {e}")
+
+
+def _ping() -> int:
+    return multiprocessing.current_process().pid
+
+
+class CpuExecutor:
+    """CPU密集型函数执行器"""
+
+    def __init__(self):
+        self._functions: Dict[str, Callable] = {}
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+        self._modes = parse_modes(settings.cpu_executor_modes)
+        self.stats: Dict[str, Dict] = {}
+
+    def register(self, name: str, func: Callable) -> Callable:
+        """注册函数（模块导入时调用）"""
+        self._functions[name] = func
+        return func
+
+    def set_mode(self, name: str, mode: str):
+        """运行时修改函数的执行方式"""
+        if mode not in MODES:
+            raise ValueError(f"未知的执行方式: {mode}")
+        self._modes[name] = mode
+
+    def mode_for(self, name: str) -> str:
+        return self._modes.get(name, settings.cpu_executor_default_mode)
+
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        if self._process_pool is None:
+            modules = [m.strip() for m in settings.cpu_warm_modules.split(",") if m.strip()]
+            # spawn：主进程已有线程（日志队列、监视线程、SDK），fork后的子进程可能死锁
+            self._process_pool = ProcessPoolExecutor(
+                max_workers=settings.cpu_process_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_warm_worker,
+                initargs=(modules,),
+            )
+        return self._process_pool
+
+    def _get_thread_pool(self) -> ThreadPoolExecutor:
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPoolExecutor(
+                max_workers=settings.cpu_thread_workers, thread_name_prefix="cpu"
+            )
+        return self._thread_pool
+
+    async def start(self):
+        """预热进程池：每个工作进程完成模块导入后再开始交易周期"""
+        if "process" not in (settings.cpu_executor_default_mode, *self._modes.values()):
+            return
+        started = time.perf_counter()
+        pool = self._get_process_pool()
+        loop = asyncio.get_running_loop()
+        try:
+            pids = await asyncio.gather(
+                *[loop.run_in_executor(pool, _ping) for _ in range(settings.cpu_process_workers)]
+            )
+            logger.info(
+                f"🧮 计算进程池已就绪: {len(set(pids))}个进程, 预热耗时{time.perf_counter() - started:.1f}s"
+            )
+        except Exception as e:
+            logger.error(f"❌ 计算进程池预热失败，将在线程池中计算: {e}")
+            self._reset_process_pool()
+
+    def _reset_process_pool(self):
+        pool, self._process_pool = self._process_pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    async def run(self, name: str, *args):
+        """按注册名执行函数，返回函数结果"""
+        func = self._functions[name]
+        mode = self.mode_for(name)
+        stats = self.stats.setdefault(name, {"calls": 0, "errors": 0, "fallbacks": 0, "total_ms": 0.0})
+        stats["calls"] += 1
+        started = time.perf_counter()
+        try:
+            with CPU_TASK_LATENCY.time(func=name, mode=mode):
+                if mode == "inline":
+                    return func(*args)
+                loop = asyncio.get_running_loop()
+                if mode == "thread":
+                    return await loop.run_in_executor(self._get_thread_pool(), func, *args)
+                try:
+                    return await loop.run_in_executor(self._get_process_pool(), func, *args)
+                except BrokenProcessPool as e:
+                    stats["fallbacks"] += 1
+                    logger.error(f"❌ 计算进程池异常，重建后本次改用线程池: {name} {e}")
+                    self._reset_process_pool()
+                    return await loop.run_in_executor(self._get_thread_pool(), func, *args)
+        except Exception:
+            stats["errors"] += 1
+            raise
+        finally:
+            stats["total_ms"] += (time.perf_counter() - started) * 1000
+
+    def get_status(self) -> Dict:
+        functions = {}
+        for name in self._functions:
+            stats = dict(self.stats.get(name) or {"calls": 0, "errors": 0, "fallbacks": 0, "total_ms": 0.0})
+            stats["mode"] = self.mode_for(name)
+            stats["avg_ms"] = round(stats["total_ms"] / stats["calls"], 2) if stats["calls"] else 0.0
+            functions[name] = stats
+        return {
+            "default_mode": settings.cpu_executor_default_mode,
+            "process_workers": settings.cpu_process_workers,
+            "thread_workers": settings.cpu_thread_workers,
+            "process_pool_alive": self._process_pool is not None,
+            "functions": functions,
+        }
+
+    def shutdown(self):
+        self._reset_process_pool()
+        if self._thread_pool is not None:
+            self._thread_pool.shutdown(wait=False, cancel_futures=True)
+            self._thread_pool = None
+
+
+# 全局执行器实例
+cpu_executor = CpuExecutor()
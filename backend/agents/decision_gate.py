@@ -0,0 +1,182 @@
+"""
+分层决策门控
+
+在调用LLM智能体之前，先用本地确定性指标（市场状态、信号强度、成交量比）
+和 AdvancedTradingStrategy 给每个交易对打分，只把得分最高的前K个候选
+以及已有持仓的交易对升级到LLM阶段，节省无效的LLM调用。
+"""
+import math
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+from backend.agents.technical_analyst_new import OptimizedTradingStrategy, make_df_handle
+from backend.agents.simple_trading_strategy import simple_strategy
+from backend.config import settings
+
+
+class DecisionGate:
+    """LLM调用前的确定性门控"""
+
+    # 打分权重
+    WEIGHTS = {
+        "signal": 0.45,    # 技术信号强度（本地指标引擎）
+        "regime": 0.2,     # 市场状态置信度
+        "volume": 0.15,    # 相对成交量
+        "rule": 0.2,       # 规则策略置信度
+    }
+
+    def __init__(self):
+        # 本地指标引擎，只使用其确定性的指标计算，不会调用LLM
+        self.indicator_engine = OptimizedTradingStrategy("Local", "")
+        self.stats = {
+            "cycles": 0,
+            "scored": 0,
+            "escalated": 0,
+            "skipped": 0,
+        }
+        self.last_cycle: Dict = {}
+
+    async def score_symbol(
+        self,
+        symbol: str,
+        market_data: Dict,
+        raw_klines: List[Dict],
+        portfolio: Dict,
+        has_position: bool = False
+    ) -> Dict:
+        """
+        计算单个交易对的门控得分
+
+        Returns:
+            {symbol, score, has_position, regime, signal, signal_confidence,
+             volume_ratio, rule_action, rule_confidence, error}
+        """
+        result = {
+            "symbol": symbol,
+            "score": 0.0,
+            "has_position": has_position,
+            "regime": "unknown",
+            "regime_confidence": 0.0,
+            "signal": "hold",
+            "signal_confidence": 0.0,
+            "volume_ratio": 0.0,
+            "rule_action": "hold",
+            "rule_confidence": 0.0,
+            "error": None,
+        }
+        try:
+            if raw_klines and len(raw_klines) >= 60:
+                df = make_df_handle(raw_klines, True)
+                engine = self.indicator_engine
+                indicators = engine.compute_indicators(df, engine.stream_indicators(symbol, raw_klines))
+                regime = engine.enhanced_identify_market_regime(df, indicators)
+                result["regime"] = regime["market_regime"]
+                result["regime_confidence"] = float(regime["confidence"] or 0)
+
+                analysis = await self.indicator_engine.analyze(
+                    symbol, market_data, {"raw_klines": raw_klines}
+                )
+                result["signal"] = analysis.recommendation
+                result["signal_confidence"] = float(analysis.confidence or 0)
+                volume_ratio = float(analysis.key_metrics.get("relative_volume") or 0)
+                result["volume_ratio"] = volume_ratio if math.isfinite(volume_ratio) else 0.0
+
+            rule = simple_strategy.analyze(symbol, market_data, portfolio)
+            result["rule_action"] = rule.get("action", "hold")
+            result["rule_confidence"] = float(rule.get("confidence", 0) or 0)
+        except Exception as e:
+            result["error"] = str(e)
+            logger.warning(f"门控打分失败: {symbol} - {e}")
+
+        signal_score = result["signal_confidence"] if result["signal"] != "hold" else 0.0
+        regime_score = result["regime_confidence"] if result["regime"] not in ("uncertain", "unknown") else 0.0
+        volume_score = min(result["volume_ratio"] / 2.0, 1.0)
+        rule_score = result["rule_confidence"] if result["rule_action"] != "hold" else 0.0
+
+        result["score"] = round(
+            self.WEIGHTS["signal"] * signal_score
+            + self.WEIGHTS["regime"] * regime_score
+            + self.WEIGHTS["volume"] * volume_score
+            + self.WEIGHTS["rule"] * rule_score,
+            4,
+        )
+        return result
+
+    def select(self, scores: List[Dict], top_k: Optional[int] = None, min_score: Optional[float] = None) -> List[str]:
+        """
+        根据得分选出需要升级到LLM阶段的交易对
+
+        规则：
+        1. 有持仓的交易对总是升级（需要LLM评估止盈止损/加减仓）
+        2. 其余交易对必须有本地方向信号（技术或规则策略非hold）且得分不低于阈值
+        3. 按得分降序取前K个
+
+        Returns:
+            升级的交易对列表（持仓优先，其余按得分降序）
+        """
+        top_k = settings.gate_top_k if top_k is None else top_k
+        min_score = settings.gate_min_score if min_score is None else min_score
+
+        held = [s for s in scores if s["has_position"]]
+        candidates = [
+            s for s in scores
+            if not s["has_position"]
+            and (s["signal"] != "hold" or s["rule_action"] != "hold")
+            and s["score"] >= min_score
+        ]
+        candidates.sort(key=lambda s: s["score"], reverse=True)
+        chosen = candidates[:top_k]
+        chosen_set = {s["symbol"] for s in chosen}
+
+        for s in scores:
+            if s["has_position"]:
+                decision, reason = "escalate", "持仓中"
+            elif s["symbol"] in chosen_set:
+                decision, reason = "escalate", f"前{top_k}候选"
+            elif s["signal"] == "hold" and s["rule_action"] == "hold":
+                decision, reason = "skip", "无方向信号"
+            elif s["score"] < min_score:
+                decision, reason = "skip", f"得分低于{min_score}"
+            else:
+                decision, reason = "skip", f"未进入前{top_k}"
+            s["decision"] = decision
+            s["reason"] = reason
+            logger.info(
+                f"🚦 门控 {s['symbol']}: {decision} ({reason}) score={s['score']:.3f} "
+                f"regime={s['regime']} signal={s['signal']}/{s['signal_confidence']:.2f} "
+                f"vol_ratio={s['volume_ratio']:.2f} rule={s['rule_action']}/{s['rule_confidence']:.2f}"
+            )
+
+        escalated = [s["symbol"] for s in held] + [s["symbol"] for s in chosen]
+        skipped = len(scores) - len(escalated)
+
+        self.stats["cycles"] += 1
+        self.stats["scored"] += len(scores)
+        self.stats["escalated"] += len(escalated)
+        self.stats["skipped"] += skipped
+        self.last_cycle = {
+            "scored": len(scores),
+            "escalated": escalated,
+            "llm_calls_saved": skipped,
+            "decisions": [
+                {k: s[k] for k in ("symbol", "decision", "reason", "score", "regime", "signal", "rule_action")}
+                for s in scores
+            ],
+        }
+        logger.info(f"🚦 门控汇总: 打分{len(scores)}个, 升级{len(escalated)}个, 本周期节省LLM调用{skipped}次")
+        return escalated
+
+    def get_status(self) -> Dict:
+        """获取门控统计"""
+        return {
+            "enabled": settings.gate_enabled,
+            "top_k": settings.gate_top_k,
+            "min_score": settings.gate_min_score,
+            **self.stats,
+            "last_cycle": self.last_cycle,
+        }
+
+
+# 全局门控实例
+decision_gate = DecisionGate()
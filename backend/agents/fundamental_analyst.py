@@ -6,10 +6,11 @@ import re
 from typing import Dict, Optional
 from loguru import logger
 import openai
-import aiohttp
 
 from backend.agents.base_agent import BaseAgent, AgentRole, AgentAnalysis
+from backend.ai.llm_scheduler import llm_scheduler
 from backend.agents.prompts import FUNDAMENTAL_ANALYST_PROMPT, get_risk_control_context
+from backend.monitoring.logging_config import log_payload
 
 
 class FundamentalAnalyst(BaseAgent):
@@ -77,37 +78,36 @@ class FundamentalAnalyst(BaseAgent):
 """
             
             prompt = analysis_context
-            logger.info(f"基本面分析提示词: {prompt}")
+            log_payload("基本面分析提示词", prompt)
             # 使用DeepSeek API
-            async with aiohttp.ClientSession() as session:
-                headers = {
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json"
-                }
-                
-                payload = {
-                    "model": self.model_name,
-                    "messages": [
-                        {"role": "system", "content": FUNDAMENTAL_ANALYST_PROMPT},
-                        {"role": "user", "content": prompt}
-                    ],
-                    "temperature": 0.2,
-                    "max_tokens": 1000
-                }
-                
-                async with session.post(self.api_url, headers=headers, json=payload) as response:
-                    data = await response.json()
-                    
-                    # 检查API响应格式
-                    if 'choices' not in data:
-                        logger.error(f"API响应格式错误: {data}")
-                        raise Exception(f"API响应缺少choices字段: {data}")
-                    
-                    if not data['choices'] or len(data['choices']) == 0:
-                        logger.error(f"API响应choices为空: {data}")
-                        raise Exception("API响应choices为空")
-                    
-                    content = data['choices'][0]['message']['content']
+            payload = {
+                "model": self.model_name,
+                "messages": [
+                    {"role": "system", "content": FUNDAMENTAL_ANALYST_PROMPT},
+                    {"role": "user", "content": prompt}
+                ],
+                "temperature": 0.2,
+                "max_tokens": 1000
+            }
+            
+            response = await llm_scheduler.chat_completion(
+                payload, self.api_key, api_url=self.api_url
+            )
+            # 调度器请求失败（限流、超时、重试耗尽）时直接报告原因
+            if not response['success']:
+                raise Exception(f"LLM请求失败: {response['error']}")
+            data = response['data']
+            
+            # 检查API响应格式
+            if 'choices' not in data:
+                logger.error(f"API响应格式错误: {data}")
+                raise Exception(f"API响应缺少choices字段: {data}")
+            
+            if not data['choices'] or len(data['choices']) == 0:
+                logger.error(f"API响应choices为空: {data}")
+                raise Exception("API响应choices为空")
+            
+            content = data['choices'][0]['message']['content']
             
             result = self._parse_response(content)
             
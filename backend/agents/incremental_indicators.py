@@ -0,0 +1,455 @@
+"""
+增量技术指标
+
+技术分析每次都在整个K线窗口上用 talib 重新计算全部指标，但两次分析之间通常只多了一根K线。
+这里的指标按K线逐根更新，每根 O(1)，状态按交易对保存：
+
+- EMA / MACD：talib 的种子规则（前N个值的简单平均；MACD快线在慢线起点用最近N个值的平均作种子）
+- RSI / ATR / ADX：Wilder 平滑，种子和 talib 相同
+- SMA / 布林带：滑动窗口的累计和 / 平方和（与 talib 的累加顺序一致）
+- OBV / VWAP：保存累计量，输出时以传入K线窗口的第一根为起点（与 talib.OBV / calculate_vwap 在同一窗口上的结果一致）
+
+从同一根K线开始喂入时，结果与 talib 在同一序列上的计算一致（benchmarks/check_indicators.py 校验）。
+每个指标的 _advance 只根据当前状态计算下一步，不修改状态：已收盘K线用 update 提交，
+未收盘的最后一根用 peek 试算，下一次分析时它收盘后再提交。
+"""
+import math
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from backend.agents.multi_timeframe import INTERVAL_MS
+
+
+NAN = float("nan")
+
+# talib 的 TA_IS_ZERO / TA_IS_ZERO_OR_NEG 阈值
+EPSILON = 0.00000001
+
+# 每个交易对保留的指标历史根数（需不少于分析窗口）
+HISTORY = 200
+
+# 输出的指标（与 EnhancedTradingStrategy.compute_indicators 的键一致）
+OUTPUTS = (
+    "adx", "ema_8", "ema_21", "ema_55", "rsi", "macd", "macd_signal", "macd_hist",
+    "bb_upper", "bb_middle", "bb_lower", "atr", "volume_sma", "obv", "relative_volume", "vwap",
+)
+
+# 历史中额外保存的列（按窗口起点重新计算 OBV / VWAP 用）：累计成交额、累计成交量、本根成交额、本根成交量
+CUMULATIVE = ("turnover_total", "volume_total", "turnover", "volume")
+COLUMNS = OUTPUTS + CUMULATIVE
+
+
+class Indicator:
+    """增量指标基类：_advance(状态, 输入) 返回 (新状态, 输出)，update 提交，peek 只试算"""
+
+    def __init__(self):
+        self.state = self._initial()
+        self.value = NAN
+
+    def _initial(self) -> Tuple:
+        raise NotImplementedError
+
+    def _advance(self, state: Tuple, *inputs) -> Tuple[Tuple, float]:
+        raise NotImplementedError
+
+    def update(self, *inputs) -> float:
+        self.state, self.value = self._advance(self.state, *inputs)
+        return self.value
+
+    def peek(self, *inputs) -> float:
+        return self._advance(self.state, *inputs)[1]
+
+
+class EMA(Indicator):
+    """talib.EMA：前 period 个值的简单平均作为种子"""
+
+    def __init__(self, period: int):
+        self.period = period
+        self.k = 2.0 / (period + 1)
+        super().__init__()
+
+    def _initial(self):
+        return 0, 0.0, NAN  # (已输入根数, 种子累计和, 上一个EMA)
+
+    def _advance(self, state, x):
+        count, total, prev = state
+        count += 1
+        if count < self.period:
+            return (count, total + x, NAN), NAN
+        if count == self.period:
+            value = (total + x) / self.period
+        else:
+            value = (x - prev) * self.k + prev
+        return (count, total, value), value
+
+
+class SMA(Indicator):
+    """talib.SMA：滑动窗口累计和（先加新值再减移出窗口的值）"""
+
+    def __init__(self, period: int):
+        self.period = period
+        self.window = deque(maxlen=period)
+        super().__init__()
+
+    def _initial(self):
+        return (0.0,)  # 当前窗口的累计和
+
+    def _advance(self, state, x):
+        (total,) = state
+        if len(self.window) == self.period:
+            total = (total - self.window[0]) + x
+            return (total,), total / self.period
+        total = total + x
+        return (total,), (total / self.period if len(self.window) == self.period - 1 else NAN)
+
+    def update(self, x):
+        value = super().update(x)
+        self.window.append(x)
+        return value
+
+
+class BollingerBands(Indicator):
+    """talib.BBANDS（SMA中轨，总体标准差，方差小于 1e-8 时视为0）"""
+
+    def __init__(self, period: int = 20, nbdev: float = 2.0):
+        self.period = period
+        self.nbdev = nbdev
+        self.window = deque(maxlen=period)
+        super().__init__()
+
+    def _initial(self):
+        return 0.0, 0.0  # (窗口累计和, 窗口平方和)
+
+    def _advance(self, state, x):
+        total, squares = state
+        if len(self.window) == self.period:
+            old = self.window[0]
+            total = (total - old) + x
+            squares = (squares - old * old) + x * x
+        else:
+            total, squares = total + x, squares + x * x
+            if len(self.window) < self.period - 1:
+                return (total, squares), (NAN, NAN, NAN)
+        middle = total / self.period
+        variance = squares / self.period - middle * middle
+        band = (math.sqrt(variance) if variance >= EPSILON else 0.0) * self.nbdev
+        return (total, squares), (middle + band, middle, middle - band)
+
+    def update(self, x):
+        value = super().update(x)
+        self.window.append(x)
+        return value
+
+
+class RSI(Indicator):
+    """talib.RSI：前 period 个涨跌幅的平均作种子，之后 Wilder 平滑"""
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        super().__init__()
+
+    def _initial(self):
+        return 0, NAN, 0.0, 0.0  # (已输入根数, 上一个收盘价, 平均涨幅, 平均跌幅)
+
+    def _advance(self, state, x):
+        count, prev, gain, loss = state
+        count += 1
+        if count == 1:
+            return (count, x, 0.0, 0.0), NAN
+        diff = x - prev
+        n = self.period
+        if count <= n + 1:
+            if diff < 0:
+                loss -= diff
+            else:
+                gain += diff
+            if count < n + 1:
+                return (count, x, gain, loss), NAN
+            gain, loss = gain / n, loss / n
+        else:
+            gain, loss = gain * (n - 1), loss * (n - 1)
+            if diff < 0:
+                loss -= diff
+            else:
+                gain += diff
+            gain, loss = gain / n, loss / n
+        total = gain + loss
+        value = 100.0 * (gain / total) if abs(total) >= EPSILON else 0.0
+        return (count, x, gain, loss), value
+
+
+def _true_range(high: float, low: float, prev_close: float) -> float:
+    return max(high - low, abs(high - prev_close), abs(low - prev_close))
+
+
+class ATR(Indicator):
+    """talib.ATR：第2根起的前 period 个真实波幅平均作种子，之后 Wilder 平滑"""
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        super().__init__()
+
+    def _initial(self):
+        return 0, NAN, 0.0  # (已输入根数, 上一个收盘价, 种子累计和或上一个ATR)
+
+    def _advance(self, state, high, low, close):
+        count, prev_close, atr = state
+        count += 1
+        if count == 1:
+            return (count, close, 0.0), NAN
+        tr = _true_range(high, low, prev_close)
+        n = self.period
+        if count <= n:
+            return (count, close, atr + tr), NAN
+        if count == n + 1:
+            atr = (atr + tr) / n
+        else:
+            atr = (atr * (n - 1) + tr) / n
+        return (count, close, atr), atr
+
+
+class ADX(Indicator):
+    """talib.ADX：+DM/-DM/TR 先累计 period-1 根再 Wilder 平滑，DX 的前 period 个平均作ADX种子"""
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        super().__init__()
+
+    def _initial(self):
+        # (已输入根数, 上一根最高/最低/收盘, +DM, -DM, TR, DX累计和或上一个ADX)
+        return 0, NAN, NAN, NAN, 0.0, 0.0, 0.0, 0.0
+
+    def _advance(self, state, high, low, close):
+        count, prev_high, prev_low, prev_close, plus_dm, minus_dm, tr_sum, adx = state
+        count += 1
+        if count == 1:
+            return (count, high, low, close, 0.0, 0.0, 0.0, 0.0), NAN
+        n = self.period
+        diff_plus, diff_minus = high - prev_high, prev_low - low
+        tr = _true_range(high, low, prev_close)
+
+        if count > n:
+            plus_dm -= plus_dm / n
+            minus_dm -= minus_dm / n
+            tr_sum = tr_sum - tr_sum / n + tr
+        else:
+            tr_sum += tr
+        if diff_minus > 0 and diff_plus < diff_minus:
+            minus_dm += diff_minus
+        elif diff_plus > 0 and diff_plus > diff_minus:
+            plus_dm += diff_plus
+
+        value = NAN
+        if count > n:
+            dx = None
+            if abs(tr_sum) >= EPSILON:
+                minus_di, plus_di = 100.0 * (minus_dm / tr_sum), 100.0 * (plus_dm / tr_sum)
+                di_sum = minus_di + plus_di
+                if abs(di_sum) >= EPSILON:
+                    dx = 100.0 * (abs(minus_di - plus_di) / di_sum)
+            if count < 2 * n:
+                adx += dx or 0.0
+            elif count == 2 * n:
+                adx = (adx + (dx or 0.0)) / n
+                value = adx
+            else:
+                if dx is not None:
+                    adx = (adx * (n - 1) + dx) / n
+                value = adx
+        return (count, high, low, close, plus_dm, minus_dm, tr_sum, adx), value
+
+
+class MACD(Indicator):
+    """
+    talib.MACD：慢线在第 slow 根用前 slow 个值的平均作种子，快线在同一根用最近 fast 个值的平均作种子；
+    信号线是MACD的EMA，三条线都从第 slow+signal-1 根开始输出
+    """
+
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9):
+        self.fast, self.slow, self.signal = fast, slow, signal
+        self.k_fast, self.k_slow, self.k_signal = 2.0 / (fast + 1), 2.0 / (slow + 1), 2.0 / (signal + 1)
+        super().__init__()
+
+    def _initial(self):
+        # (已输入根数, 快线种子和/快线, 慢线种子和/慢线, 信号线种子和/信号线)
+        return 0, 0.0, 0.0, 0.0
+
+    def _advance(self, state, x):
+        count, fast, slow, signal = state
+        count += 1
+        warm = (NAN, NAN, NAN)
+        if count < self.slow:
+            if count > self.slow - self.fast:
+                fast += x
+            return (count, fast, slow + x, 0.0), warm
+        if count == self.slow:
+            fast, slow = (fast + x) / self.fast, (slow + x) / self.slow
+        else:
+            fast = (x - fast) * self.k_fast + fast
+            slow = (x - slow) * self.k_slow + slow
+        macd = fast - slow
+        first = self.slow + self.signal - 1
+        if count < first:
+            return (count, fast, slow, signal + macd), warm
+        if count == first:
+            signal = (signal + macd) / self.signal
+        else:
+            signal = (macd - signal) * self.k_signal + signal
+        return (count, fast, slow, signal), (macd, signal, macd - signal)
+
+
+class OBV(Indicator):
+    """talib.OBV：第一根为其成交量，之后按收盘涨跌累加/累减成交量"""
+
+    def _initial(self):
+        return NAN, NAN  # (上一个收盘价, OBV)
+
+    def _advance(self, state, close, volume):
+        prev_close, obv = state
+        if math.isnan(prev_close):
+            obv = volume
+        elif close > prev_close:
+            obv += volume
+        elif close < prev_close:
+            obv -= volume
+        return (close, obv), obv
+
+
+class VWAP(Indicator):
+    """VWAP 的累计量：输出 (累计成交额, 累计成交量, 本根成交额)，典型价格 (H+L+C)/3"""
+
+    def _initial(self):
+        return 0.0, 0.0
+
+    def _advance(self, state, high, low, close, volume):
+        turnover, total_volume = state
+        bar_turnover = (high + low + close) / 3 * volume
+        turnover += bar_turnover
+        total_volume += volume
+        return (turnover, total_volume), (turnover, total_volume, bar_turnover)
+
+
+class IndicatorSet:
+    """一个交易对的全部增量指标和最近 HISTORY 根的输出"""
+
+    def __init__(self):
+        self.adx = ADX(14)
+        self.emas = (EMA(8), EMA(21), EMA(55))
+        self.rsi = RSI(14)
+        self.macd = MACD(12, 26, 9)
+        self.bbands = BollingerBands(20, 2)
+        self.atr = ATR(14)
+        self.volume_sma = SMA(5)
+        self.volume_sma20 = SMA(20)
+        self.obv = OBV()
+        self.vwap = VWAP()
+        self.history = np.full((HISTORY, len(COLUMNS)), np.nan)
+        self.count = 0
+        self.last_timestamp: Optional[int] = None
+        self.last_close = NAN
+
+    def _row(self, method: str, high: float, low: float, close: float, volume: float) -> List[float]:
+        def call(indicator, *inputs):
+            return getattr(indicator, method)(*inputs)
+
+        ema_8, ema_21, ema_55 = (call(ema, close) for ema in self.emas)
+        macd, macd_signal, macd_hist = call(self.macd, close)
+        bb_upper, bb_middle, bb_lower = call(self.bbands, close)
+        volume_sma20 = call(self.volume_sma20, volume)
+        turnover_total, volume_total, turnover = call(self.vwap, high, low, close, volume)
+        return [
+            call(self.adx, high, low, close), ema_8, ema_21, ema_55, call(self.rsi, close),
+            macd, macd_signal, macd_hist, bb_upper, bb_middle, bb_lower,
+            call(self.atr, high, low, close), call(self.volume_sma, volume), call(self.obv, close, volume),
+            volume / volume_sma20 if volume_sma20 else NAN, turnover_total / volume_total if volume_total else NAN,
+            turnover_total, volume_total, turnover, volume,
+        ]
+
+    def update(self, kline: Dict):
+        """提交一根已收盘K线"""
+        high, low, close, volume = (float(kline[k]) for k in ("high", "low", "close", "volume"))
+        self.history[self.count % HISTORY] = self._row("update", high, low, close, volume)
+        self.count += 1
+        self.last_timestamp = int(kline["timestamp"])
+        self.last_close = close
+
+    def peek(self, kline: Dict) -> List[float]:
+        """试算一根未收盘K线（不修改状态）"""
+        return self._row("peek", *(float(kline[k]) for k in ("high", "low", "close", "volume")))
+
+    def recent(self, length: int) -> np.ndarray:
+        """最近 length 根已提交K线的输出（不足时前面补NaN）"""
+        available = min(length, self.count, HISTORY)
+        rows = np.full((length, len(COLUMNS)), np.nan)
+        if available:
+            index = (self.count - available + np.arange(available)) % HISTORY
+            rows[length - available:] = self.history[index]
+        return rows
+
+
+class IndicatorStore:
+    """按 (交易对, 周期) 保存增量指标状态"""
+
+    def __init__(self):
+        self._sets: Dict[Tuple[str, str], IndicatorSet] = {}
+        self.stats = {"incremental": 0, "rebuilds": 0, "candles": 0}
+
+    def _sync(self, key: Tuple[str, str], closed: List[Dict], step: int) -> IndicatorSet:
+        """提交新收盘的K线；和已有状态接不上（缺口、历史被修改、首次）时用这批K线重建"""
+        indicators = self._sets.get(key)
+        start = None
+        if indicators is not None and indicators.last_timestamp is not None:
+            for i in range(len(closed) - 1, -1, -1):
+                ts = int(closed[i]["timestamp"])
+                if ts == indicators.last_timestamp:
+                    if float(closed[i]["close"]) == indicators.last_close:
+                        start = i + 1
+                    break
+                if ts < indicators.last_timestamp:
+                    break
+            if start is None and closed and int(closed[0]["timestamp"]) == indicators.last_timestamp + step:
+                start = 0
+        if start is None:
+            indicators = self._sets[key] = IndicatorSet()
+            start = 0
+            self.stats["rebuilds"] += 1
+        else:
+            self.stats["incremental"] += 1
+        for kline in closed[start:]:
+            indicators.update(kline)
+        self.stats["candles"] += len(closed) - start
+        return indicators
+
+    def series(self, symbol: str, interval: str, klines: List[Dict]) -> Optional[Dict[str, np.ndarray]]:
+        """
+        与 klines 逐根对齐的指标数组 {指标名: ndarray}
+
+        klines 按时间升序（交易所返回的顺序）；除最后一根外都视为已收盘：
+        只提交上次之后新增的K线，最后一根（可能未收盘）只试算
+        """
+        if not klines or len(klines) > HISTORY:
+            return None
+        if int(klines[0]["timestamp"]) > int(klines[-1]["timestamp"]):
+            klines = sorted(klines, key=lambda k: int(k["timestamp"]))
+        step = INTERVAL_MS.get(interval, 0)
+        indicators = self._sync((symbol, interval), klines[:-1], step)
+        rows = np.vstack([indicators.recent(len(klines) - 1), [indicators.peek(klines[-1])]])
+        result = {name: rows[:, i] for i, name in enumerate(COLUMNS)}
+        # OBV / VWAP 以窗口第一根为起点：减去窗口之前的累计量
+        turnover_total, volume_total = result.pop("turnover_total"), result.pop("volume_total")
+        turnover, volume = result.pop("turnover"), result.pop("volume")
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result["vwap"] = (turnover_total - (turnover_total[0] - turnover[0])) / (
+                volume_total - (volume_total[0] - volume[0])
+            )
+        result["obv"] = result["obv"] - result["obv"][0] + volume[0]
+        return result
+
+    def get_status(self) -> Dict:
+        return {"symbols": len(self._sets), **self.stats}
+
+
+# 全局增量指标状态实例（只在主进程中使用，计算执行器收到的是算好的数组）
+indicator_store = IndicatorStore()
@@ -3,9 +3,12 @@ K线数据压缩处理器
 将原始K线数据压缩为智能体可分析的关键特征
 """
 import numpy as np
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from loguru import logger
 
+from backend.agents.cpu_executor import cpu_executor
+from backend.agents.multi_timeframe import format_summary
+
 
 class KlineCompressor:
     """K线数据压缩处理器"""
@@ -21,7 +24,7 @@ class KlineCompressor:
             '1d': 1.0    # 日线数据全部保留
         }
     
-    def compress_kline_data(self, raw_klines: List, interval: str, symbol: str) -> Dict[str, Any]:
+    def compress_kline_data(self, raw_klines: List, interval: str, symbol: str, mtf: Optional[Dict] = None) -> Dict[str, Any]:
         """
         压缩K线数据，提取关键特征
         
@@ -29,6 +32,7 @@ class KlineCompressor:
             raw_klines: 原始K线数据
             interval: K线间隔
             symbol: 交易对
+            mtf: 多周期特征（multi_timeframe.compute_mtf_features 的结果），附加到特征和摘要中
             
         Returns:
             压缩后的K线特征字典
@@ -51,6 +55,9 @@ class KlineCompressor:
             
             # 生成格式化的中文摘要
             formatted_summary = self._format_chinese_summary(summary, interval)
+            mtf_features = (mtf or {}).get('features') or {}
+            if mtf_features:
+                formatted_summary += "\n多周期趋势:\n" + format_summary(mtf_features)
             
             # 关键特征提取
             compressed_data = {
@@ -66,9 +73,13 @@ class KlineCompressor:
                 'trend_analysis': self._analyze_trends(parsed_klines),
                 'compressed_candles': self._compress_candles(parsed_klines, compression_ratio)
             }
+            if mtf_features:
+                compressed_data['multi_timeframe'] = {
+                    'features': mtf_features,
+                    'confirmation': mtf.get('confirmation'),
+                }
             
-            logger.info(f"📊 K线数据压缩完成: {symbol} {interval}, 原始{len(raw_klines)}根 -> 特征{len(compressed_data)}维")
-            logger.info(f"\n{formatted_summary}")  # 输出格式化摘要到日志
+            logger.debug("📊 K线数据压缩完成: {} {}, 原始{}根 -> 特征{}维", symbol, interval, len(raw_klines), len(compressed_data))
             return compressed_data
             
         except Exception as e:
@@ -826,3 +837,10 @@ K线数据摘要 ({interval_text}):
 # 全局K线压缩器实例
 kline_compressor = KlineCompressor()
 
+
+def compress_kline_data(raw_klines: List, interval: str, symbol: str, mtf: Optional[Dict] = None) -> Dict[str, Any]:
+    """供计算执行器调用的模块级入口（进程池中使用工作进程自己的压缩器实例）"""
+    return kline_compressor.compress_kline_data(raw_klines, interval, symbol, mtf)
+
+
+cpu_executor.register("kline_compression", compress_kline_data)
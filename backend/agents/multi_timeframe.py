@@ -0,0 +1,220 @@
+"""
+多周期特征
+
+门控升级的交易对只拉取一次基础周期K线（默认1h x 720；门控打分只用1h x 100），
+4h/1d 等更高周期由基础K线重采样得到，交易所请求数不随周期数增加。
+所有周期的指标在一次计算中完成，结果是以周期为行、特征为列的特征表，
+交给技术分析师（多周期共振确认信号）和K线压缩器（写入K线摘要）。
+
+重采样按 UTC 对齐（与交易所 4h/1d K线的分界一致），开头不完整的一组丢弃，
+最后一组是未收盘的K线（与交易所返回的最后一根一致）。
+"""
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from backend.agents.cpu_executor import cpu_executor
+
+
+INTERVAL_MS = {
+    "1m": 60_000, "5m": 300_000, "15m": 900_000,
+    "1h": 3_600_000, "4h": 14_400_000, "1d": 86_400_000,
+}
+
+# 原有单周期分析（技术指标、K线压缩、门控）使用的周期和K线数量
+PRIMARY_INTERVAL = "1h"
+PRIMARY_LIMIT = 100
+
+# 少于该根数（MACD慢线周期）的周期不参与共振判断
+MIN_BARS = 26
+
+TREND_LABELS = {"up": "上升", "down": "下降", "neutral": "震荡"}
+
+
+def can_derive(base_interval: str, interval: str) -> bool:
+    """interval 能否由 base_interval 的K线整数倍聚合得到"""
+    base, step = INTERVAL_MS.get(base_interval), INTERVAL_MS.get(interval)
+    return bool(base and step and step >= base and step % base == 0)
+
+
+def parse_timeframes(spec: str, base_interval: str) -> List[str]:
+    """解析 "1h,4h,1d"，只保留能由基础周期重采样得到的周期，按周期从小到大排序"""
+    timeframes = {item.strip() for item in (spec or "").split(",")}
+    return sorted((t for t in timeframes if can_derive(base_interval, t)), key=INTERVAL_MS.get)
+
+
+FIELDS = ("open", "high", "low", "close", "volume")
+
+
+def _to_arrays(klines: List[Dict]) -> Dict[str, np.ndarray]:
+    """K线字典列表转为按时间排序的列数组"""
+    ts = np.array([int(k["timestamp"]) for k in klines], dtype=np.int64)
+    order = np.argsort(ts, kind="stable")
+    arrays = {"timestamp": ts[order]}
+    for name in FIELDS:
+        arrays[name] = np.array([float(klines[i].get(name, 0) or 0) for i in order])
+    return arrays
+
+
+def _resample_arrays(arrays: Dict[str, np.ndarray], base_interval: str, interval: str) -> Dict[str, np.ndarray]:
+    """列数组聚合为更高周期（开盘取第一根、收盘取最后一根、最高最低取极值、成交量求和）"""
+    if interval == base_interval or arrays["timestamp"].size == 0:
+        return arrays
+    step = INTERVAL_MS[interval]
+    ratio = step // INTERVAL_MS[base_interval]
+    keys = arrays["timestamp"] // step
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    counts = np.diff(np.r_[starts, len(keys)])
+    if counts[0] < ratio:
+        starts = starts[1:]
+    if starts.size == 0:
+        return {name: values[:0] for name, values in arrays.items()}
+    ends = np.r_[starts[1:], len(keys)] - 1
+    return {
+        "timestamp": keys[starts] * step,
+        "open": arrays["open"][starts],
+        "high": np.maximum.reduceat(arrays["high"], starts),
+        "low": np.minimum.reduceat(arrays["low"], starts),
+        "close": arrays["close"][ends],
+        "volume": np.add.reduceat(arrays["volume"], starts),
+    }
+
+
+def resample_klines(klines: List[Dict], base_interval: str, interval: str) -> List[Dict]:
+    """把基础周期K线聚合为更高周期的K线字典列表"""
+    if interval == base_interval or not klines:
+        return list(klines)
+    step = INTERVAL_MS[interval]
+    bars = _resample_arrays(_to_arrays(klines), base_interval, interval)
+    return [
+        {
+            "timestamp": int(ts), "open": float(o), "high": float(h), "low": float(l),
+            "close": float(c), "volume": float(v), "close_time": int(ts + step - 1),
+        }
+        for ts, o, h, l, c, v in zip(*(bars[name] for name in ("timestamp",) + FIELDS))
+    ]
+
+
+def primary_klines(base_klines: List[Dict], base_interval: str) -> List[Dict]:
+    """从基础K线取原有单周期分析使用的K线（最近 PRIMARY_LIMIT 根）"""
+    return resample_klines(base_klines, base_interval, PRIMARY_INTERVAL)[-PRIMARY_LIMIT:]
+
+
+def _aligned(series: Dict[str, np.ndarray], length: int) -> pd.DataFrame:
+    """各周期序列右对齐（前面补NaN）拼成一张表，列为周期"""
+    return pd.DataFrame({
+        interval: np.r_[np.full(length - values.size, np.nan), values]
+        for interval, values in series.items()
+    })
+
+
+def build_feature_frame(base_klines: List[Dict], base_interval: str, timeframes: List[str]) -> pd.DataFrame:
+    """
+    所有周期的特征表（行: 周期，列: 特征）
+
+    各周期K线右对齐到同一张表（列为周期），每个指标对所有周期只做一次 ewm/diff 计算；
+    前面补的NaN不影响 adjust=False 的指数平均（从第一个有效值开始）
+    """
+    arrays = _to_arrays(base_klines)
+    bars = {interval: _resample_arrays(arrays, base_interval, interval) for interval in timeframes}
+    bars = {interval: b for interval, b in bars.items() if b["close"].size >= 2}
+    if not bars:
+        return pd.DataFrame()
+    length = max(b["close"].size for b in bars.values())
+    close = _aligned({i: b["close"] for i, b in bars.items()}, length)
+    high = _aligned({i: b["high"] for i, b in bars.items()}, length)
+    low = _aligned({i: b["low"] for i, b in bars.items()}, length)
+
+    ema_fast = close.ewm(span=8, adjust=False).mean().iloc[-1]
+    ema_slow = close.ewm(span=21, adjust=False).mean().iloc[-1]
+
+    # Wilder 平滑的 RSI 和 ATR
+    delta = close.diff()
+    gain = delta.clip(lower=0).ewm(alpha=1 / 14, adjust=False).mean().iloc[-1]
+    loss = (-delta.clip(upper=0)).ewm(alpha=1 / 14, adjust=False).mean().iloc[-1]
+    rsi = (100 - 100 / (1 + gain / loss.replace(0, np.nan))).fillna(100.0)
+    prev_close = close.shift()
+    true_range = np.fmax(high - low, np.fmax((high - prev_close).abs(), (low - prev_close).abs()))
+    atr = true_range.ewm(alpha=1 / 14, adjust=False).mean().iloc[-1]
+
+    macd = close.ewm(span=12, adjust=False).mean() - close.ewm(span=26, adjust=False).mean()
+    macd_hist = (macd - macd.ewm(span=9, adjust=False).mean()).iloc[-1]
+
+    last = close.iloc[-1]
+    counts = pd.Series({i: b["close"].size for i, b in bars.items()})
+    lookback = np.minimum(5, counts - 1)
+    previous = pd.Series({i: close[i].iloc[-1 - lookback[i]] for i in bars})
+
+    frame = pd.DataFrame({
+        "bars": counts,
+        "close": last,
+        "ema_fast": ema_fast,
+        "ema_slow": ema_slow,
+        "rsi": rsi,
+        "macd_hist": macd_hist,
+        "atr_pct": atr / last * 100,
+        "change_pct": (last / previous - 1) * 100,
+    })
+    frame["trend"] = np.where(
+        (last > ema_fast) & (ema_fast > ema_slow), "up",
+        np.where((last < ema_fast) & (ema_fast < ema_slow), "down", "neutral")
+    )
+    frame["reliable"] = counts >= MIN_BARS
+    return frame
+
+
+def confirmation_score(features: Dict[str, Dict], signal: str) -> Optional[int]:
+    """
+    多周期共振评分（0-10）：可靠周期中趋势与信号方向一致的比例
+    signal 为 hold 时按多数方向计算一致程度；没有可靠周期时返回 None
+    """
+    trends = [f["trend"] for f in features.values() if f.get("reliable")]
+    if not trends:
+        return None
+    up, down = trends.count("up"), trends.count("down")
+    if signal == "buy":
+        agree = up
+    elif signal in ("sell", "short"):
+        agree = down
+    else:
+        agree = max(up, down)
+    return round(agree / len(trends) * 10)
+
+
+def format_summary(features: Dict[str, Dict]) -> str:
+    """多周期特征的中文摘要（供提示词使用）"""
+    if not features:
+        return ""
+    lines = []
+    for interval, f in features.items():
+        note = "" if f["reliable"] else f"（仅{f['bars']}根，参考性低）"
+        lines.append(
+            f"- {interval}: {TREND_LABELS[f['trend']]}趋势{note} | EMA8/21 {f['ema_fast']:.6g}/{f['ema_slow']:.6g} | "
+            f"RSI {f['rsi']:.1f} | MACD柱 {f['macd_hist']:+.4g} | ATR {f['atr_pct']:.2f}% | 近5根 {f['change_pct']:+.2f}%"
+        )
+    trends = [f["trend"] for f in features.values() if f["reliable"]]
+    if trends:
+        up, down = trends.count("up"), trends.count("down")
+        bias = "看涨共振" if up == len(trends) else "看跌共振" if down == len(trends) else "方向分歧"
+        lines.append(f"- 多周期一致性: {bias}（上升{up}/下降{down}/共{len(trends)}个周期）")
+    return "\n".join(lines)
+
+
+def compute_mtf_features(base_klines: List[Dict], base_interval: str, timeframes: List[str]) -> Dict:
+    """供计算执行器调用：特征表转为 {周期: 特征} 字典（可pickle、可JSON）和摘要"""
+    frame = build_feature_frame(base_klines, base_interval, timeframes)
+    features = {interval: row.to_dict() for interval, row in frame.iterrows()}
+    for f in features.values():
+        f["bars"] = int(f["bars"])
+        f["reliable"] = bool(f["reliable"])
+    return {
+        "base_interval": base_interval,
+        "timeframes": list(features),
+        "features": features,
+        "confirmation": confirmation_score(features, "hold"),
+        "summary": format_summary(features),
+    }
+
+
+cpu_executor.register("mtf_features", compute_mtf_features)
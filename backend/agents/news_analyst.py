@@ -9,12 +9,18 @@ from loguru import logger
 import aiohttp
 
 from backend.agents.base_agent import BaseAgent, AgentRole, AgentAnalysis
+from backend.ai.llm_scheduler import llm_scheduler
 from backend.agents.prompts import NEWS_ANALYST_PROMPT, get_risk_control_context
+from backend.agents.prompt_budget import prompt_budgeter, PromptSection, compact_json
 from backend.config import settings
+from backend.monitoring.logging_config import log_payload
 
 
 class NewsAnalyst(BaseAgent):
     """新闻分析师 - 监控全球新闻、宏观经济与名人推文（特朗普/马斯克/CZ）"""
+
+    # 超出token预算时保留的新闻/推文条数
+    BRIEF_NEWS_ITEMS = 10
     
     def __init__(self, ai_model: str, api_key: str):
         super().__init__(AgentRole.NEWS_ANALYST, ai_model, api_key)
@@ -68,46 +74,48 @@ class NewsAnalyst(BaseAgent):
 
             role_context = self._build_role_context(symbol, news_data, tweet_data)
             
-            # 构建完整的提示词（注入风控配置）
-            prompt = f"""
-当前交易对: {symbol}
-市场数据：{json.dumps(market_data, ensure_ascii=False, indent=2)}
-
-{role_context}
-{self._analyze_position_status(symbol, positions, market_data)}
-请分析并提供建议，返回标准的JSON格式分析。
-注意：建议必须符合系统风控规则！
-"""
-            logger.info(f"新闻分析师提示词: {NEWS_ANALYST_PROMPT}\n {prompt}")
-            async with aiohttp.ClientSession() as session:
-                headers = {
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json"
-                }
-                
-                payload = {
-                    "model": "deepseek-chat",
-                    "messages": [
-                        {"role": "system", "content": NEWS_ANALYST_PROMPT},
-                        {"role": "user", "content": prompt}
-                    ],
-                    "temperature": 0.7,
-                    "max_tokens": 800
-                }
-                
-                async with session.post(self.api_url, headers=headers, json=payload) as response:
-                    data = await response.json()
-                    
-                    # 检查API响应格式
-                    if 'choices' not in data:
-                        logger.error(f"API响应格式错误: {data}")
-                        raise Exception(f"API响应缺少choices字段: {data}")
-                    
-                    if not data['choices'] or len(data['choices']) == 0:
-                        logger.error(f"API响应choices为空: {data}")
-                        raise Exception("API响应choices为空")
-                    
-                    content = data['choices'][0]['message']['content']
+            # 构建完整的提示词（注入风控配置），超出token预算时先减少新闻条数
+            built = prompt_budgeter.build("news_analyst", NEWS_ANALYST_PROMPT, [
+                PromptSection("symbol", f"当前交易对: {symbol}", priority=10, required=True),
+                PromptSection("market_data", f"市场数据：{compact_json(market_data)}", priority=5),
+                PromptSection("news", role_context, priority=8, required=True,
+                              summarize=lambda _: self._build_role_context(
+                                  symbol, news_data, tweet_data, max_items=self.BRIEF_NEWS_ITEMS)),
+                PromptSection("position", self._analyze_position_status(symbol, positions, market_data),
+                              priority=9, required=True),
+                PromptSection("instruction", "请分析并提供建议，返回标准的JSON格式分析。\n注意：建议必须符合系统风控规则！",
+                              priority=10, required=True),
+            ])
+            prompt = built.user_prompt
+            log_payload("新闻分析师提示词", prompt)
+            payload = {
+                "model": "deepseek-chat",
+                "messages": [
+                    {"role": "system", "content": NEWS_ANALYST_PROMPT},
+                    {"role": "user", "content": prompt}
+                ],
+                "temperature": 0.7,
+                "max_tokens": 800
+            }
+            
+            response = await llm_scheduler.chat_completion(
+                payload, self.api_key, api_url=self.api_url
+            )
+            # 调度器请求失败（限流、超时、重试耗尽）时直接报告原因
+            if not response['success']:
+                raise Exception(f"LLM请求失败: {response['error']}")
+            data = response['data']
+            
+            # 检查API响应格式
+            if 'choices' not in data:
+                logger.error(f"API响应格式错误: {data}")
+                raise Exception(f"API响应缺少choices字段: {data}")
+            
+            if not data['choices'] or len(data['choices']) == 0:
+                logger.error(f"API响应choices为空: {data}")
+                raise Exception("API响应choices为空")
+            
+            content = data['choices'][0]['message']['content']
             
             result = self._parse_response(content)
             return AgentAnalysis(
@@ -133,8 +141,22 @@ class NewsAnalyst(BaseAgent):
                 priority=4
             )
 
-    def _build_role_context(self, symbol: str, news: List[Dict], tweets: List[Dict]) -> str:
-        """构建分析上下文，包括新闻与名人推文以及负面新闻分级"""
+    def _build_role_context(
+        self,
+        symbol: str,
+        news: List[Dict],
+        tweets: List[Dict],
+        max_items: Optional[int] = None
+    ) -> str:
+        """
+        构建分析上下文，包括新闻与名人推文以及负面新闻分级
+
+        Args:
+            max_items: 新闻和推文的最多条数（超出token预算时使用），重大新闻优先保留
+        """
+        if max_items is not None:
+            news = sorted(news, key=lambda item: not item.get("is_major", False))
+            tweets = tweets[:max_items]
         # 处理新闻数据，提取关键信息
         processed_news = []
         for item in news:
@@ -178,8 +200,10 @@ class NewsAnalyst(BaseAgent):
                 processed_item["original_content"] = item.get("original_content")
             processed_news.append(processed_item.get("summary"))
         
-        news_json = json.dumps(processed_news, ensure_ascii=False, indent=2) if processed_news else "无"
-        tweet_json = json.dumps(tweets, ensure_ascii=False, indent=2) if tweets else "无"
+        if max_items is not None:
+            processed_news = processed_news[:max_items]
+        news_json = compact_json(processed_news) if processed_news else "无"
+        tweet_json = compact_json(tweets) if tweets else "无"
 
         return f"""
 作为新闻分析师，请重点关注以下三类信息：
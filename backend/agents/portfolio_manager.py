@@ -7,12 +7,14 @@ from typing import Dict, List, Optional
 from datetime import datetime
 from loguru import logger
 import openai
-import aiohttp
 
 from backend.agents.base_agent import BaseAgent, AgentRole, AgentAnalysis
+from backend.ai.llm_scheduler import llm_scheduler, LLMPriority
 from backend.agents.prompts import PORTFOLIO_MANAGER_PROMPT, get_risk_control_context
 from backend.agents.intelligent_stop_strategy import intelligent_stop_strategy
+from backend.agents.prompt_budget import prompt_budgeter, PromptSection, compact_json, dedupe_metrics
 from backend.config import settings
+from backend.monitoring.logging_config import log_payload
 
 
 class PortfolioManager(BaseAgent):
@@ -84,11 +86,6 @@ class PortfolioManager(BaseAgent):
             logger.debug(f"🤖 投资组合经理分析止盈止损决策...")
             
             # 调用DeepSeek-R1进行推理
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self.api_key}"
-            }
-            
             payload = {
                 "model": self.model_name,
                 "messages": [
@@ -99,28 +96,29 @@ class PortfolioManager(BaseAgent):
                 "max_tokens": 2000
             }
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(self.api_url, json=payload, headers=headers, timeout=30) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        
-                        # 解析响应
-                        if 'choices' in result and len(result['choices']) > 0:
-                            content = result['choices'][0]['message']['content']
-                            
-                            # DeepSeek-R1的响应可能包含推理过程和结论
-                            # 尝试从响应中提取结构化决策
-                            decision = self._parse_stop_decision_response(content, position_info)
-                            
-                            logger.info(f"✅ AI止盈止损决策完成: {decision.get('action', 'hold')}")
-                            return decision
-                        else:
-                            logger.error(f"AI响应格式错误: {result}")
-                            return self._default_stop_decision(team_consensus, position_info)
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"AI API调用失败 ({response.status}): {error_text}")
-                        return self._default_stop_decision(team_consensus, position_info)
+            # 止盈止损评估优先级最高
+            response = await llm_scheduler.chat_completion(
+                payload, self.api_key, api_url=self.api_url, priority=LLMPriority.STOP_LOSS, timeout=30
+            )
+            if response['success']:
+                result = response['data']
+                
+                # 解析响应
+                if 'choices' in result and len(result['choices']) > 0:
+                    content = result['choices'][0]['message']['content']
+                    
+                    # DeepSeek-R1的响应可能包含推理过程和结论
+                    # 尝试从响应中提取结构化决策
+                    decision = self._parse_stop_decision_response(content, position_info)
+                    
+                    logger.info(f"✅ AI止盈止损决策完成: {decision.get('action', 'hold')}")
+                    return decision
+                else:
+                    logger.error(f"AI响应格式错误: {result}")
+                    return self._default_stop_decision(team_consensus, position_info)
+            else:
+                logger.error(f"AI API调用失败 ({response['status']}): {response['error']}")
+                return self._default_stop_decision(team_consensus, position_info)
         
         except Exception as e:
             logger.exception(f"AI止盈止损决策失败: {e}")
@@ -333,7 +331,7 @@ class PortfolioManager(BaseAgent):
         """
         try:
             # 整理团队意见
-            team_summary = self._summarize_team_analyses(team_analyses)
+            team_summary = self._summarize_team_analyses(team_analyses, shared=market_data)
             
             # 新增：多空投票统计
             long_short_balance = self._calculate_long_short_balance(team_analyses)
@@ -368,11 +366,13 @@ class PortfolioManager(BaseAgent):
             risk_context = self._get_dynamic_risk_context(performance_analysis)
             
             # 获取当前买卖盘口信息
-            order_book_info = await self._get_order_book_summary(symbol)
+            # 参考金额取单笔最大仓位，用于估算市价成交滑点
+            order_book_info = await self._get_order_book_summary(
+                symbol, portfolio.get('total_balance', 0) * settings.max_position_size
+            )
             
-            # 构建决策上下文（注入风控配置）
-            decision_context = f"""
-【系统状态与强制规则】
+            # 构建决策上下文（注入风控配置），按段落在token预算内组装
+            header = f"""【系统状态与强制规则】
 
 - 订单类型: 市价单 (永续合约)
 
@@ -382,21 +382,18 @@ class PortfolioManager(BaseAgent):
 - 保证金使用率: {(portfolio.get('total_value', 0) / portfolio.get('total_balance', 1) * 100) if portfolio.get('total_balance', 0) > 0 else 0:.1f}%
 - 持仓价值: ${(current_position.get('current_price', 0) * current_position.get('amount', 0)):,.2f}
 
-当前交易对：{symbol}
-市场数据：
-{json.dumps(market_data, ensure_ascii=False, indent=2)}
-
-{position_analysis}
-{position_pnl_details}
-{position_duration}
-
-【当前市场深度】
-{order_book_info.get('info', '盘口数据不可用')}
-
-【团队分析汇总】
-{team_summary}
+当前交易对：{symbol}"""
+            market_section = f"市场数据：\n{compact_json(market_data)}"
+            position_section = f"{position_analysis}\n{position_pnl_details}\n{position_duration}"
+            order_book_section = f"【当前市场深度】\n{order_book_info.get('info', '盘口数据不可用')}"
+            try:
+                portfolio_risk_section = self._get_portfolio_risk_summary(symbol)
+            except Exception as e:
+                logger.warning(f"获取组合风险摘要失败: {e}")
+                portfolio_risk_section = ""
+            team_section = f"【团队分析汇总】\n{team_summary}"
 
-【市价单交易特别注意事项】
+            execution_notes = f"""【市价单交易特别注意事项】
 🚨 重要提醒：我们使用市价单交易永续合约，请特别注意：
 
 1. 📊 价格执行风险
@@ -412,9 +409,9 @@ class PortfolioManager(BaseAgent):
 3. 🎯 入场时机选择
    - 避免在市场剧烈波动时入场（如大阳线/大阴线刚形成）
    - 考虑在价格回调至关键支撑/阻力位时入场
-   - 关注成交量配合：放量突破时入场更安全
+   - 关注成交量配合：放量突破时入场更安全"""
 
-【强制交易规则与优先级】
+            rules = f"""【强制交易规则与优先级】
 
 1. 同方向防重复: 已有同方向仓位，需要判断是否满足最大仓位限制；
 2. 已开仓位风控: 5h内如果未触发止盈止损，禁止执行平仓操作。如果5h后仍未卖出，强制平仓
@@ -454,52 +451,72 @@ class PortfolioManager(BaseAgent):
 }}
 **重要：检查输出内容，输出内容必须满足json格式**
 """
-            
-            prompt = decision_context
-            logger.info(f"投资组合经理提示词: {PORTFOLIO_MANAGER_PROMPT}\n {prompt}")
+
+            built = prompt_budgeter.build("portfolio_manager", PORTFOLIO_MANAGER_PROMPT, [
+                PromptSection("header", header, priority=10, required=True),
+                PromptSection("market_data", market_section, priority=7,
+                              summarize=lambda _: f"市场数据：\n{compact_json(self._key_market_fields(market_data))}"),
+                PromptSection("position", position_section, priority=9, required=True),
+                PromptSection("order_book", order_book_section, priority=4),
+                PromptSection("portfolio_risk", portfolio_risk_section, priority=5),
+                PromptSection("team_summary", team_section, priority=8, required=True,
+                              summarize=lambda _: f"【团队分析汇总】\n{self._summarize_team_analyses(team_analyses, brief=True)}"),
+                PromptSection("execution_notes", execution_notes, priority=3),
+                PromptSection("rules", rules, priority=10, required=True),
+            ])
+            prompt = built.user_prompt
+            # 系统提示词是固定内容，只输出用户提示词
+            log_payload("投资组合经理提示词", prompt)
             # 使用DeepSeek-R1推理模型
-            async with aiohttp.ClientSession() as session:
-                headers = {
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json"
-                }
-                
-                # R1推理模型的配置
-                payload = {
-                    "model": self.model_name,
-                    "messages": [
-                        {"role": "system", "content": PORTFOLIO_MANAGER_PROMPT},
-                        {"role": "user", "content": prompt}
-                    ],
-                    "temperature": 0.6,  # R1推荐温度
-                    "max_tokens": 6000,  # R1需要更多token进行推理
-                    "stream": False
-                }
-                
-                async with session.post(self.api_url, headers=headers, json=payload) as response:
-                    data = await response.json()
-                    
-                    # 检查API响应格式
-                    if 'choices' not in data:
-                        logger.error(f"API响应格式错误: {data}")
-                        raise Exception(f"API响应缺少choices字段: {data}")
-                    
-                    if not data['choices'] or len(data['choices']) == 0:
-                        logger.error(f"API响应choices为空: {data}")
-                        raise Exception("API响应choices为空")
-                    
-                    message = data['choices'][0]['message']
-                    content = message.get('content', '')
-                    logger.info(f"投资组合经理决策内容: {content}")
-                    # DeepSeek-R1会返回推理过程
-                    reasoning_content = message.get('reasoning_content', '')
-                    
-                    if reasoning_content and self.use_reasoning:
-                        logger.info(f"🧠 DeepSeek-R1推理过程（前500字符）:\n{reasoning_content[:500]}...")
-                        # 将推理过程记录到日志中供分析
-                        # logger.debug(f"完整推理过程:\n{reasoning_content}")
+            # R1推理模型的配置
+            payload = {
+                "model": self.model_name,
+                "messages": [
+                    {"role": "system", "content": PORTFOLIO_MANAGER_PROMPT},
+                    {"role": "user", "content": prompt}
+                ],
+                "temperature": 0.6,  # R1推荐温度
+                "max_tokens": 6000,  # R1需要更多token进行推理
+                "stream": False
+            }
+            
+            # 已有持仓的交易对优先于新开仓扫描
+            priority = LLMPriority.POSITION if current_position.get('amount', 0) else LLMPriority.ENTRY
+            if settings.llm_streaming:
+                # 流式读取，决策JSON闭合即返回；首token过慢时自动对冲到备用模型
+                response = await llm_scheduler.stream_json(
+                    payload, self.api_key, api_url=self.api_url, priority=priority, timeout=300
+                )
+            else:
+                response = await llm_scheduler.chat_completion(
+                    payload, self.api_key, api_url=self.api_url, priority=priority, timeout=180
+                )
+            # 调度器请求失败（限流、超时、重试耗尽）时直接报告原因
+            if not response['success']:
+                raise Exception(f"LLM请求失败: {response['error']}")
+            data = response['data']
+            
+            # 检查API响应格式
+            if 'choices' not in data:
+                logger.error(f"API响应格式错误: {data}")
+                raise Exception(f"API响应缺少choices字段: {data}")
+            
+            if not data['choices'] or len(data['choices']) == 0:
+                logger.error(f"API响应choices为空: {data}")
+                raise Exception("API响应choices为空")
+            
+            message = data['choices'][0]['message']
+            content = message.get('content', '')
+            log_payload("投资组合经理决策内容", content)
+            # DeepSeek-R1会返回推理过程
+            reasoning_content = message.get('reasoning_content', '')
             
-            result = self._parse_response(content)
+            if reasoning_content and self.use_reasoning:
+                logger.info(f"🧠 DeepSeek-R1推理过程（前500字符）:\n{reasoning_content[:500]}...")
+                # 将推理过程记录到日志中供分析
+                # logger.debug(f"完整推理过程:\n{reasoning_content}")
+            
+            result = response.get('parsed') or self._parse_response(content)
             stop_levels = {}
             # 计算智能止盈止损（如果决策是买入或做空）
             if result.get('action') in ['buy', 'short']:
@@ -596,8 +613,19 @@ class PortfolioManager(BaseAgent):
                 "team_analyses": []
             }
     
-    def _summarize_team_analyses(self, team_analyses: List[AgentAnalysis]) -> str:
-        """整理团队分析摘要"""
+    def _summarize_team_analyses(
+        self,
+        team_analyses: List[AgentAnalysis],
+        shared: Optional[Dict] = None,
+        brief: bool = False
+    ) -> str:
+        """
+        整理团队分析摘要
+
+        Args:
+            shared: 已在提示词中出现的上下文（如市场数据），关键指标中同名同值的项会被去掉
+            brief: 精简模式，超出token预算时使用，只保留建议、置信度和截断后的理由
+        """
         summary_parts = []
         role_names = {
             AgentRole.TECHNICAL_ANALYST: "技术分析师",
@@ -609,16 +637,27 @@ class PortfolioManager(BaseAgent):
         for analysis in sorted(team_analyses, key=lambda x: x.priority, reverse=True):
             
             role_name = role_names.get(analysis.agent_role, "未知")
+            if brief:
+                summary_parts.append(
+                    f"{role_name}: 建议{analysis.recommendation}, 置信度{analysis.confidence}, "
+                    f"理由: {(analysis.reasoning or '')[:200]}"
+                )
+                continue
             summary_parts.append(f"""
 {role_name} (优先级{analysis.priority}, 风险评分{analysis.risk_score if analysis.risk_score else '暂无评分'}):
 - 建议: {analysis.recommendation }
 - 置信度: {analysis.confidence if analysis.confidence else "暂无置信度数据"}
 - 理由: {analysis.reasoning}...
-- 关键指标: {json.dumps(analysis.key_metrics, ensure_ascii=False,)}
+- 关键指标: {compact_json(dedupe_metrics(analysis.key_metrics, shared))}
 """)
         
         return "\n".join(summary_parts)
     
+    def _key_market_fields(self, market_data: Dict) -> Dict:
+        """市场数据精简版，超出token预算时替代完整市场数据"""
+        keys = ('price', 'change_24h', 'high_24h', 'low_24h', 'volume_24h', 'funding_rate', 'min_qty')
+        return {k: market_data[k] for k in keys if k in market_data}
+
     def _calculate_long_short_balance(self, analyses: List[AgentAnalysis]) -> Dict:
         """计算多空平衡"""
         long_votes = 0
@@ -1082,53 +1121,81 @@ class PortfolioManager(BaseAgent):
 - 最大回撤限制: 8%
 """
     
-    async def _get_order_book_summary(self, symbol: str) -> Dict:
-        """获取当前买卖盘口摘要信息"""
+    def _get_portfolio_risk_summary(self, symbol: str) -> str:
+        """组合风险摘要（K线收益率统计：交易对波动率/beta、与现有持仓的相关性、组合VaR）"""
+        from backend.trading.risk_analytics import risk_analytics
+        
+        symbol_risk = risk_analytics.symbol_risk(symbol)
+        if not symbol_risk:
+            return ""
+        interval = risk_analytics.interval
+        beta = symbol_risk['beta']
+        lines = [
+            f"- {symbol} 波动率: {symbol_risk['volatility']:.2%}/{interval}，"
+            f"相对{settings.risk_analytics_benchmark} beta: {f'{beta:.2f}' if beta is not None else 'N/A'}"
+        ]
+        if symbol_risk['portfolio_correlation'] is not None:
+            peers = "、".join(f"{p['symbol']} {p['correlation']:+.2f}" for p in symbol_risk['correlated_positions'])
+            lines.append(f"- 与现有组合相关系数: {symbol_risk['portfolio_correlation']:+.2f}（{peers}）")
+            lines.append("- 同向开仓且相关系数高时，新仓位主要放大已有风险而不是分散风险")
+        portfolio_risk = risk_analytics.portfolio()
+        if portfolio_risk and portfolio_risk['contributions']:
+            confidence = settings.risk_analytics_confidence
+            lines.append(
+                f"- 组合{confidence:.0%} VaR: {portfolio_risk['var_historical']:.2%}，"
+                f"ES: {portfolio_risk['es_historical']:.2%}（占权益，{interval}周期），组合beta: {portfolio_risk['beta']:.2f}"
+            )
+        return "【组合风险】\n" + "\n".join(lines)
+    
+    async def _get_order_book_summary(self, symbol: str, notional: float = 0) -> Dict:
+        """获取当前买卖盘口摘要信息（读取订单簿服务的本地簿和盘口特征）"""
         try:
-            # 尝试从交易所获取订单簿
-            from backend.exchanges.aster_dex import aster_client
+            from backend.exchanges.order_book import order_book_service
             
-            order_book = await aster_client.get_order_book(symbol)
-            
-            if not order_book or 'bids' not in order_book or 'asks' not in order_book:
+            features = await order_book_service.features(symbol, notional=notional or None)
+            if not features:
                 return {
                     'info': '盘口数据不可用',
                     'spread_percentage': 'N/A'
                 }
             
-            # 确保价格数据转换为float类型，并处理可能的异常
-            try:
-                best_bid = float(order_book['bids'][0][0]) if order_book['bids'] and len(order_book['bids'][0]) > 0 else 0
-                best_ask = float(order_book['asks'][0][0]) if order_book['asks'] and len(order_book['asks'][0]) > 0 else 0
-            except (ValueError, TypeError, IndexError) as e:
-                logger.warning(f"盘口价格数据转换失败: {e}, bids={order_book.get('bids')}, asks={order_book.get('asks')}")
-                return {
-                    'info': '盘口数据格式错误',
-                    'spread_percentage': 'N/A'
-                }
-            
-            if best_bid == 0 or best_ask == 0:
+            best_bid = features['best_bid']
+            best_ask = features['best_ask']
+            if best_bid <= 0 or best_ask <= 0:
                 return {
                     'info': '买卖价数据不完整',
                     'spread_percentage': 'N/A'
                 }
             
-            spread = best_ask - best_bid
-            spread_percentage = (spread / best_bid * 100) if best_bid > 0 else 0
+            spread = features['spread']
+            spread_percentage = spread / best_bid * 100
+            imbalance = features['imbalance']
+            pressure = "买盘占优" if imbalance > 0.2 else "卖盘占优" if imbalance < -0.2 else "买卖均衡"
             
             info = f"""
 - 买一价: ${best_bid:.4f}
 - 卖一价: ${best_ask:.4f}
 - 买卖价差: ${spread:.4f} ({spread_percentage:.4f}%)
-- 建议入场参考: 多单接近买一价，空单接近卖一价
+- 微观价格: ${features['microprice']:.4f}（按买一/卖一挂单量加权）
+- 前{settings.order_book_feature_levels}档买卖量不平衡: {imbalance:+.2f}（{pressure}）
+- 中间价±{features['depth_bps']:.0f}bps内挂单: 买盘${features['bid_depth']:,.0f} / 卖盘${features['ask_depth']:,.0f}
 """
+            if notional:
+                def fmt(bps):
+                    return f"{bps:.1f}bps" if bps is not None else "深度不足"
+                info += (
+                    f"- 预估滑点(市价${notional:,.0f}): 买入 {fmt(features['buy_slippage_bps'])}，"
+                    f"卖出 {fmt(features['sell_slippage_bps'])}\n"
+                )
+            info += "- 建议入场参考: 多单接近买一价，空单接近卖一价\n"
             
             return {
                 'info': info,
                 'spread_percentage': f'{spread_percentage:.4f}%',
                 'best_bid': best_bid,
                 'best_ask': best_ask,
-                'spread': spread
+                'spread': spread,
+                'features': features
             }
             
         except Exception as e:
@@ -0,0 +1,289 @@
+"""
+提示词预算控制
+
+每次调用LLM前本地估算token数量，按智能体配置的预算组装用户提示词：
+- 各段落带优先级，超预算时先摘要、再丢弃最低优先级的段落，必需段落最后按比例截断
+- 非必需段落中与系统提示词逐行相同的整块内容（空行分隔）会被去掉，例如重复注入的风控规则；
+  段落之间和段落内部的重复行不做处理，必需段落保持原样
+- 系统提示词保持逐字节不变，以便服务端前缀缓存命中；内容变化时告警
+- 每次调用的系统/用户token数、丢弃与摘要的段落都会记录并可通过API查看
+
+安装 tiktoken 时使用 cl100k_base 分词器计数，否则使用按中英文字符估算的近似计数。
+"""
+import hashlib
+import json
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from loguru import logger
+
+from backend.config import settings
+
+_ENCODING = None
+_ENCODING_LOADED = False
+
+
+def _get_encoding():
+    """首次计数时才加载分词器（加载分词文件较慢，不放在模块导入时）"""
+    global _ENCODING, _ENCODING_LOADED
+    if not _ENCODING_LOADED:
+        _ENCODING_LOADED = True
+        try:
+            import tiktoken
+            _ENCODING = tiktoken.get_encoding("cl100k_base")
+        except Exception:  # 未安装或无法加载分词文件时退回近似计数
+            _ENCODING = None
+    return _ENCODING
+
+
+_CJK_RE = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+
+# 重复块中至少要有一行达到此长度才会被去掉（只有标题、分隔符、括号的块保留）
+_MIN_DEDUPE_LINE = 12
+
+_TRUNCATED = "\n...(已截断)"
+
+
+def count_tokens(text: str) -> int:
+    """本地估算文本token数"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    # 近似：中文约每字0.6 token，其余约每4个字符1 token
+    cjk = len(_CJK_RE.findall(text))
+    return int(cjk * 0.6 + (len(text) - cjk) / 4) + 1
+
+
+def compact_json(data: Any) -> str:
+    """紧凑JSON（无缩进与多余空格），比 indent=2 节省约三分之一token"""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def dedupe_metrics(metrics: Dict, shared: Optional[Dict]) -> Dict:
+    """去掉与共享上下文（如市场数据）中同名同值的指标，避免同一数据在提示词中出现两次"""
+    if not metrics or not shared:
+        return metrics or {}
+    return {k: v for k, v in metrics.items() if k not in shared or shared.get(k) != v}
+
+
+@dataclass
+class PromptSection:
+    """
+    提示词段落
+
+    Attributes:
+        name: 段落名称（用于统计）
+        text: 段落内容
+        priority: 优先级，数值越大越重要，超预算时从最小的开始处理
+        required: 必需段落不会被丢弃，只会在最后被截断
+        summarize: 可选的摘要函数，超预算时先用摘要替换原文
+    """
+    name: str
+    text: str
+    priority: int = 5
+    required: bool = False
+    summarize: Optional[Callable[[str], str]] = None
+    tokens: int = field(default=0, init=False)
+
+
+@dataclass
+class PromptBuildResult:
+    """组装结果"""
+    agent: str
+    user_prompt: str
+    system_tokens: int
+    user_tokens: int
+    budget: int
+    dropped: List[str]
+    summarized: List[str]
+    truncated: List[str]
+
+    @property
+    def total_tokens(self) -> int:
+        return self.system_tokens + self.user_tokens
+
+
+class PromptBudgeter:
+    """按智能体预算组装提示词并统计token"""
+
+    def __init__(self):
+        self._system_hashes: Dict[str, str] = {}
+        self.stats: Dict[str, Dict] = {}
+
+    def get_budget(self, agent: str) -> int:
+        """用户提示词预算（token），未单独配置时使用默认值"""
+        return int(getattr(settings, f"prompt_budget_{agent}", 0) or settings.prompt_budget_default)
+
+    def build(
+        self,
+        agent: str,
+        system_prompt: str,
+        sections: List[PromptSection],
+        budget: Optional[int] = None
+    ) -> PromptBuildResult:
+        """
+        在预算内组装用户提示词
+
+        Args:
+            agent: 智能体名称（对应 settings.prompt_budget_<agent>）
+            system_prompt: 系统提示词（只用于计数、去重和前缀稳定性检查，不会被修改）
+            sections: 按输出顺序排列的段落
+            budget: 用户提示词预算，默认读取配置
+
+        Returns:
+            PromptBuildResult
+        """
+        budget = budget or self.get_budget(agent)
+        self._check_system_prompt(agent, system_prompt)
+
+        # 1. 非必需段落去掉与系统提示词重复的整块内容
+        system_lines = {line.strip() for line in system_prompt.splitlines() if line.strip()}
+        active: List[PromptSection] = []
+        for section in sections:
+            if not section.text or not section.text.strip():
+                continue
+            if not section.required:
+                section.text = self._dedupe_blocks(section.text, system_lines)
+            section.tokens = count_tokens(section.text)
+            active.append(section)
+
+        dropped, summarized, truncated = [], [], []
+        total = sum(s.tokens for s in active)
+
+        # 2. 超预算时按优先级从低到高先摘要、再丢弃非必需段落
+        for section in sorted(active, key=lambda s: s.priority):
+            if total <= budget:
+                break
+            if section.summarize:
+                try:
+                    short = section.summarize(section.text)
+                except Exception as e:
+                    logger.warning(f"提示词段落摘要失败: {agent}/{section.name} - {e}")
+                    short = None
+                if short is not None:
+                    short_tokens = count_tokens(short)
+                    if short_tokens < section.tokens:
+                        total -= section.tokens - short_tokens
+                        section.text, section.tokens = short, short_tokens
+                        summarized.append(section.name)
+                        if total <= budget:
+                            break
+            if not section.required:
+                total -= section.tokens
+                section.tokens = 0
+                section.text = ""
+                dropped.append(section.name)
+
+        # 3. 仍超预算时按比例截断最大的必需段落
+        if total > budget:
+            for section in sorted(active, key=lambda s: s.tokens, reverse=True):
+                if total <= budget or not section.tokens:
+                    break
+                keep_tokens = max(section.tokens - (total - budget) - count_tokens(_TRUNCATED), section.tokens // 4)
+                keep_chars = int(len(section.text) * keep_tokens / section.tokens)
+                section.text = section.text[:keep_chars] + _TRUNCATED
+                new_tokens = count_tokens(section.text)
+                total -= section.tokens - new_tokens
+                section.tokens = new_tokens
+                truncated.append(section.name)
+
+        user_prompt = "\n\n".join(s.text for s in active if s.text)
+        result = PromptBuildResult(
+            agent=agent,
+            user_prompt=user_prompt,
+            system_tokens=count_tokens(system_prompt),
+            user_tokens=count_tokens(user_prompt),
+            budget=budget,
+            dropped=dropped,
+            summarized=summarized,
+            truncated=truncated,
+        )
+        self._record(result)
+        return result
+
+    @staticmethod
+    def _dedupe_blocks(text: str, system_lines: set) -> str:
+        """
+        去掉每一行都已出现在系统提示词中的块（空行分隔）
+
+        只按整块判断，块内有任何一行不在系统提示词中就整块保留，避免拆散列表、规则或JSON示例
+        """
+        kept = []
+        for block in re.split(r"\n\s*\n", text):
+            keys = [line.strip() for line in block.splitlines() if line.strip()]
+            if (keys and all(key in system_lines for key in keys)
+                    and any(len(key) >= _MIN_DEDUPE_LINE for key in keys)):
+                continue
+            kept.append(block)
+        return "\n\n".join(kept)
+
+    def _check_system_prompt(self, agent: str, system_prompt: str):
+        """系统提示词必须保持逐字节稳定，否则服务端前缀缓存会失效"""
+        digest = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:16]
+        previous = self._system_hashes.get(agent)
+        if previous and previous != digest:
+            logger.warning(f"⚠️ {agent} 系统提示词发生变化，前缀缓存将失效 ({previous} → {digest})")
+        self._system_hashes[agent] = digest
+
+    def _record(self, result: PromptBuildResult):
+        stats = self.stats.setdefault(result.agent, {
+            "calls": 0,
+            "system_tokens": 0,
+            "user_tokens_total": 0,
+            "user_tokens_max": 0,
+            "over_budget_calls": 0,
+            "dropped": {},
+            "summarized": {},
+            "truncated": {},
+        })
+        stats["calls"] += 1
+        stats["system_tokens"] = result.system_tokens
+        stats["user_tokens_total"] += result.user_tokens
+        stats["user_tokens_max"] = max(stats["user_tokens_max"], result.user_tokens)
+        stats["last"] = {
+            "system_tokens": result.system_tokens,
+            "user_tokens": result.user_tokens,
+            "total_tokens": result.total_tokens,
+            "budget": result.budget,
+            "at": time.time(),
+        }
+        if result.dropped or result.summarized or result.truncated:
+            stats["over_budget_calls"] += 1
+        for key in ("dropped", "summarized", "truncated"):
+            for name in getattr(result, key):
+                stats[key][name] = stats[key].get(name, 0) + 1
+
+        extra = ""
+        if result.summarized:
+            extra += f" 摘要={result.summarized}"
+        if result.dropped:
+            extra += f" 丢弃={result.dropped}"
+        if result.truncated:
+            extra += f" 截断={result.truncated}"
+        logger.info(
+            f"📏 提示词 {result.agent}: system={result.system_tokens} user={result.user_tokens} "
+            f"total={result.total_tokens} budget={result.budget}{extra}"
+        )
+
+    def get_status(self) -> Dict:
+        """获取各智能体token统计"""
+        agents = {}
+        for agent, stats in self.stats.items():
+            agents[agent] = {
+                **stats,
+                "user_tokens_avg": round(stats["user_tokens_total"] / stats["calls"], 1) if stats["calls"] else 0,
+                "budget": self.get_budget(agent),
+                "system_prompt_hash": self._system_hashes.get(agent),
+            }
+        return {
+            "tokenizer": "tiktoken/cl100k_base" if _get_encoding() is not None else "heuristic",
+            "agents": agents,
+        }
+
+
+# 全局提示词预算实例
+prompt_budgeter = PromptBudgeter()
@@ -6,11 +6,14 @@ import re
 from typing import Dict, List, Optional
 from loguru import logger
 import openai
-import aiohttp
 
 from backend.agents.base_agent import BaseAgent, AgentRole, AgentAnalysis
+from backend.ai.llm_scheduler import llm_scheduler
 from backend.agents.prompts import RISK_MANAGER_PROMPT, get_risk_control_context
 from backend.agents.intelligent_stop_strategy import intelligent_stop_strategy
+from backend.monitoring.logging_config import log_payload
+from backend.trading.risk_analytics import risk_analytics
+from backend.config import settings
 
 
 class RiskManager(BaseAgent):
@@ -50,7 +53,7 @@ class RiskManager(BaseAgent):
             kline_data = additional_data.get('kline_compressed', {}) if additional_data else {}
             
             # 计算风险指标（集成K线数据）
-            risk_metrics = self._calculate_risk_metrics(market_data, portfolio, positions, kline_data)
+            risk_metrics = self._calculate_risk_metrics(market_data, portfolio, positions, kline_data, symbol)
             
             # 评估止盈止损风险
             stop_risk_assessment = self._assess_stop_risk(
@@ -100,37 +103,36 @@ class RiskManager(BaseAgent):
 """
             
             prompt = analysis_context
-            logger.info(f"风险管理分析提示词:{RISK_MANAGER_PROMPT}\n {prompt}")
+            log_payload("风险管理分析提示词", prompt)
             # 使用DeepSeek API
-            async with aiohttp.ClientSession() as session:
-                headers = {
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json"
-                }
-                
-                payload = {
-                    "model": self.model_name,
-                    "messages": [
-                        {"role": "system", "content": RISK_MANAGER_PROMPT},
-                        {"role": "user", "content": prompt}
-                    ],
-                    "temperature": 0.1,
-                    "max_tokens": 1000
-                }
-                
-                async with session.post(self.api_url, headers=headers, json=payload) as response:
-                    data = await response.json()
-                    
-                    # 检查API响应格式
-                    if 'choices' not in data:
-                        logger.error(f"API响应格式错误: {data}")
-                        raise Exception(f"API响应缺少choices字段: {data}")
-                    
-                    if not data['choices'] or len(data['choices']) == 0:
-                        logger.error(f"API响应choices为空: {data}")
-                        raise Exception("API响应choices为空")
-                    
-                    content = data['choices'][0]['message']['content']
+            payload = {
+                "model": self.model_name,
+                "messages": [
+                    {"role": "system", "content": RISK_MANAGER_PROMPT},
+                    {"role": "user", "content": prompt}
+                ],
+                "temperature": 0.1,
+                "max_tokens": 1000
+            }
+            
+            response = await llm_scheduler.chat_completion(
+                payload, self.api_key, api_url=self.api_url
+            )
+            # 调度器请求失败（限流、超时、重试耗尽）时直接报告原因
+            if not response['success']:
+                raise Exception(f"LLM请求失败: {response['error']}")
+            data = response['data']
+            
+            # 检查API响应格式
+            if 'choices' not in data:
+                logger.error(f"API响应格式错误: {data}")
+                raise Exception(f"API响应缺少choices字段: {data}")
+            
+            if not data['choices'] or len(data['choices']) == 0:
+                logger.error(f"API响应choices为空: {data}")
+                raise Exception("API响应choices为空")
+            
+            content = data['choices'][0]['message']['content']
             
             result = self._parse_response(content)
             
@@ -161,7 +163,8 @@ class RiskManager(BaseAgent):
         market_data: Dict, 
         portfolio: Dict, 
         positions: List[Dict],
-        kline_data: Dict = None
+        kline_data: Dict = None,
+        symbol: str = ""
     ) -> Dict:
         """改进的风险指标计算 - 包含做空风险溢价，集成K线数据"""
         price = market_data.get('price', 0)
@@ -202,7 +205,7 @@ class RiskManager(BaseAgent):
         liquidation_risk = self._calculate_liquidation_risk(positions, market_data)
         
         # 新增：相关性风险
-        correlation_risk = self._assess_correlation_risk(portfolio, positions)
+        correlation_risk = self._assess_correlation_risk(portfolio, positions, symbol)
         
         metrics = {
             "volatility": round(volatility, 2),
@@ -299,11 +302,21 @@ class RiskManager(BaseAgent):
         return f"{vol_regime}-{trend_regime}"
     
     def _calculate_liquidation_risk(self, positions: List[Dict], market_data: Dict) -> str:
-        """计算清算风险"""
+        """计算清算风险（优先用组合风险分析的ES，和当日亏损上限比较）"""
         if not positions:
             return "无"
         
-        # 简化计算：基于持仓数量和市场波动
+        analytics = risk_analytics.portfolio()
+        if analytics and not analytics["uncovered"]:
+            es = analytics["es_historical"]
+            limit = settings.risk_daily_loss_limit or 0.05
+            level = "高" if es >= limit else "中" if es >= limit / 2 else "低"
+            return (
+                f"{level}（组合{settings.risk_analytics_confidence:.0%} ES {es:.2%}/{risk_analytics.interval}，"
+                f"VaR {analytics['var_historical']:.2%}，beta {analytics['beta']:.2f}）"
+            )
+        
+        # 无K线统计时简化计算：基于持仓数量和市场波动
         total_positions = len(positions)
         volatility = ((market_data.get('high_24h', 0) - market_data.get('low_24h', 0)) / 
                      market_data.get('price', 1)) * 100
@@ -315,12 +328,19 @@ class RiskManager(BaseAgent):
         else:
             return "低"
     
-    def _assess_correlation_risk(self, portfolio: Dict, positions: List[Dict]) -> str:
-        """评估相关性风险"""
+    def _assess_correlation_risk(self, portfolio: Dict, positions: List[Dict], symbol: str = "") -> str:
+        """评估相关性风险（优先用收益率相关系数：当前交易对与现有组合的相关性）"""
         if not positions:
             return "无"
         
-        # 简化评估：基于持仓集中度
+        symbol_risk = risk_analytics.symbol_risk(symbol) if symbol else None
+        if symbol_risk and symbol_risk["portfolio_correlation"] is not None:
+            corr = symbol_risk["portfolio_correlation"]
+            level = "高" if abs(corr) >= 0.7 else "中" if abs(corr) >= 0.4 else "低"
+            peers = "、".join(f"{p['symbol']} {p['correlation']:+.2f}" for p in symbol_risk["correlated_positions"])
+            return f"{level}（与组合相关系数{corr:+.2f}；持仓相关性: {peers}）"
+        
+        # 无K线统计时简化评估：基于持仓集中度：基于持仓集中度
         total_value = portfolio.get('positions_value', 0)
         if total_value == 0:
             return "无"
@@ -7,6 +7,10 @@ from datetime import datetime
 from typing import Dict, Any, Optional, Tuple, List
 
 from backend.agents.base_agent import AgentAnalysis, AgentRole, BaseAgent
+from backend.agents.cpu_executor import cpu_executor
+from backend.agents.incremental_indicators import OUTPUTS, indicator_store
+from backend.agents.multi_timeframe import PRIMARY_INTERVAL, TREND_LABELS, confirmation_score
+from backend.config import settings
 
 class EnhancedTradingStrategy (BaseAgent):
     """
@@ -80,6 +84,40 @@ class EnhancedTradingStrategy (BaseAgent):
         vwap = cumulative_tpv / cumulative_volume
         return vwap
     
+    def compute_indicators(self, df: pd.DataFrame, precomputed: Optional[Dict[str, np.ndarray]] = None) -> Dict[str, pd.Series]:
+        """
+        计算分析用到的全部指标
+        precomputed 为增量指标数组（与df逐行对齐，见 incremental_indicators）时直接使用，否则用 talib 全量计算
+        """
+        if precomputed is not None:
+            return {name: pd.Series(precomputed[name], index=df.index) for name in OUTPUTS}
+        high, low, close, volume = df['high'], df['low'], df['close'], df['volume']
+        macd, macd_signal, macd_hist = self.calculate_macd(close)
+        bb_upper, bb_middle, bb_lower = self.calculate_bollinger_bands(close)
+        return {
+            'adx': self.calculate_adx(high, low, close),
+            'ema_8': self.calculate_ema(close, 8),
+            'ema_21': self.calculate_ema(close, 21),
+            'ema_55': self.calculate_ema(close, 55),
+            'rsi': self.calculate_rsi(close),
+            'macd': macd, 'macd_signal': macd_signal, 'macd_hist': macd_hist,
+            'bb_upper': bb_upper, 'bb_middle': bb_middle, 'bb_lower': bb_lower,
+            'atr': self.calculate_atr(high, low, close),
+            'volume_sma': self.calculate_volume_sma(volume),
+            'obv': self.calculate_obv(close, volume),
+            'relative_volume': self.calculate_relative_volume(volume),
+            'vwap': self.calculate_vwap(high, low, close, volume),
+        }
+    
+    def stream_indicators(self, symbol: str, raw_klines: List) -> Optional[Dict[str, np.ndarray]]:
+        """
+        按交易对增量更新的指标数组（在主进程中调用，状态保存在 indicator_store）
+        未启用或没有交易对时返回 None，由 compute_indicators 回退到 talib
+        """
+        if not settings.incremental_indicators_enabled or not symbol or not raw_klines:
+            return None
+        return indicator_store.series(symbol, PRIMARY_INTERVAL, raw_klines)
+    
     def identify_price_range(self, high: pd.Series, low: pd.Series, close: pd.Series, lookback_period: int = 50) -> Dict[str, float]:
         """
         识别价格震荡区间
@@ -179,9 +217,10 @@ class EnhancedTradingStrategy (BaseAgent):
             'squeeze_intensity': 1 - (current_bb_width / self.bb_squeeze_threshold) if is_squeeze else 0
         }
     
-    def analyze_price_action(self, high: pd.Series, low: pd.Series, close: pd.Series, lookback_period: int = 30) -> Dict[str, Any]:
+    def analyze_price_action(self, high: pd.Series, low: pd.Series, close: pd.Series, lookback_period: int = 30,
+                             atr: Optional[pd.Series] = None) -> Dict[str, Any]:
         """
-        分析价格行为，识别震荡特征
+        分析价格行为，识别震荡特征（atr 为已算好的ATR序列时不再重复计算）
         """
         recent_highs = high.tail(lookback_period)
         recent_lows = low.tail(lookback_period)
@@ -189,7 +228,9 @@ class EnhancedTradingStrategy (BaseAgent):
         
         # 计算价格在区间内的波动特征
         price_range = recent_highs.max() - recent_lows.min()
-        avg_true_range = talib.ATR(high, low, close, timeperiod=14).iloc[-1]
+        if atr is None:
+            atr = talib.ATR(high, low, close, timeperiod=14)
+        avg_true_range = atr.iloc[-1]
         
         # 计算方向性移动
         upward_moves = 0
@@ -287,25 +328,28 @@ class EnhancedTradingStrategy (BaseAgent):
             'obv_slope': obv_slope
         }
     
-    def enhanced_identify_market_regime(self, df: pd.DataFrame) -> Dict[str, Any]:
+    def enhanced_identify_market_regime(self, df: pd.DataFrame, indicators: Optional[Dict[str, pd.Series]] = None) -> Dict[str, Any]:
         """
         增强版市场状态识别 - 多重因子判断
+        indicators 为 compute_indicators() 的结果，不传时现算
         """
         high, low, close = df['high'], df['low'], df['close']
         
         # 计算基础指标
-        adx = self.calculate_adx(high, low, close)
-        ema_fast = self.calculate_ema(close, 8)
-        ema_medium = self.calculate_ema(close, 21)
-        ema_slow = self.calculate_ema(close, 55)
-        bb_upper, bb_middle, bb_lower = self.calculate_bollinger_bands(close)
+        if indicators is None:
+            indicators = self.compute_indicators(df)
+        adx = indicators['adx']
+        ema_fast = indicators['ema_8']
+        ema_medium = indicators['ema_21']
+        ema_slow = indicators['ema_55']
+        bb_upper, bb_middle, bb_lower = indicators['bb_upper'], indicators['bb_middle'], indicators['bb_lower']
         
         current_adx = adx.iloc[-1]
         
         # 多重因子分析
         ma_analysis = self.check_ma_tangle(ema_fast, ema_medium, ema_slow)
         bb_analysis = self.check_bollinger_squeeze(bb_upper, bb_lower, bb_middle)
-        price_action_analysis = self.analyze_price_action(high, low, close)
+        price_action_analysis = self.analyze_price_action(high, low, close, atr=indicators['atr'])
         price_range_analysis = self.identify_price_range(high, low, close)
         
         # 综合判断市场状态
@@ -754,28 +798,43 @@ class EnhancedTradingStrategy (BaseAgent):
     ) -> AgentAnalysis:
         """
         综合分析市场并生成交易信号
-        df需要包含: ['open', 'high', 'low', 'close', 'volume']
+        指标在主进程中按交易对增量更新（只计算新K线），信号计算在计算执行器中进行（默认进程池），不占用事件循环
         """
         raw_klines = additional_data.get("raw_klines")
+        indicators = self.stream_indicators(symbol, raw_klines)
+        result = await cpu_executor.run(
+            "technical_analysis", type(self).__name__, raw_klines, additional_data.get("mtf_features"), indicators
+        )
+        return AgentAnalysis(agent_role=self.role, **result)
+
+    def compute_signal(self, raw_klines: List, mtf: Optional[Dict] = None,
+                       indicators: Optional[Dict[str, np.ndarray]] = None) -> Dict[str, Any]:
+        """
+        同步计算技术指标和交易信号，返回 AgentAnalysis 的字段（不含 agent_role）
+        df需要包含: ['open', 'high', 'low', 'close', 'volume']
+        mtf 为多周期特征时，按多周期共振评分调整信号置信度
+        indicators 为主进程增量更新的指标数组时不再用 talib 重算
+        """
         df = make_df_handle(raw_klines,True)
         
-        # 增强版市场状态识别
-        regime_analysis = self.enhanced_identify_market_regime(df)
-        
         # 计算所有技术指标
-        high, low, close, volume = df['high'], df['low'], df['close'], df['volume']
-        ema_fast = self.calculate_ema(close, 8)
-        ema_slow = self.calculate_ema(close, 21)
-        rsi = self.calculate_rsi(close)
-        macd, macd_signal, macd_hist = self.calculate_macd(close)
-        bb_upper, bb_middle, bb_lower = self.calculate_bollinger_bands(close)
-        atr = self.calculate_atr(high, low, close)
-        volume_sma = self.calculate_volume_sma(volume)
+        ind = self.compute_indicators(df, indicators)
+        close, volume = df['close'], df['volume']
+        ema_fast = ind['ema_8']
+        ema_slow = ind['ema_21']
+        rsi = ind['rsi']
+        macd, macd_signal = ind['macd'], ind['macd_signal']
+        bb_upper, bb_middle, bb_lower = ind['bb_upper'], ind['bb_middle'], ind['bb_lower']
+        atr = ind['atr']
+        volume_sma = ind['volume_sma']
         
         # 新增：量价分析指标
-        obv = self.calculate_obv(close, volume)
-        relative_volume = self.calculate_relative_volume(volume)
-        vwap = self.calculate_vwap(high, low, close, volume)
+        obv = ind['obv']
+        relative_volume = ind['relative_volume']
+        vwap = ind['vwap']
+        
+        # 增强版市场状态识别
+        regime_analysis = self.enhanced_identify_market_regime(df, ind)
         
         # 新增：量价关系分析
         volume_price_analysis = self.analyze_volume_price_relationship(
@@ -832,6 +891,18 @@ class EnhancedTradingStrategy (BaseAgent):
         result['risk_score'] = 0.0
         result['signal_strength'] = strategy_result.get('signal_strength', 'normal')
         
+        # 多周期共振：可靠周期中趋势与信号同向的比例（0-10），有交易信号时按权重调整置信度
+        confidence = strategy_result.get('confidence', 0)
+        mtf_features = (mtf or {}).get('features') or {}
+        confirmation = confirmation_score(mtf_features, strategy_result['signal']) if mtf_features else None
+        if confirmation is not None:
+            result['timeframe_confirmation'] = confirmation
+            result['timeframe_trends'] = {interval: f['trend'] for interval, f in mtf_features.items()}
+            result['indicators']['timeframe_confirmation'] = confirmation
+            if strategy_result['signal'] in ['buy', 'sell']:
+                weight = settings.mtf_confidence_weight
+                confidence *= (1 - weight) + weight * confirmation / 10
+        
         # 如果有交易信号，计算止损止盈
         if strategy_result['signal'] in ['buy', 'sell']:
             stop_loss, take_profit = self.calculate_stop_loss_take_profit(
@@ -849,10 +920,9 @@ class EnhancedTradingStrategy (BaseAgent):
         # 构建推理说明，包含量价分析信息
         reasoning = self._build_reasoning(result, volume_price_analysis, strategy_result)
         
-        return AgentAnalysis(
-            agent_role=self.role,
+        return dict(
             recommendation=result.get('signal', 'hold'),
-            confidence=strategy_result.get('confidence', 0),
+            confidence=confidence,
             reasoning=reasoning,
             key_metrics=result.get('indicators', {}),
             risk_score=0,
@@ -906,6 +976,11 @@ class EnhancedTradingStrategy (BaseAgent):
         elif signal_strength == 'divergence':
             base_reasoning += f"信号强度: 背离信号🔄\n"
         
+        # 多周期共振
+        if 'timeframe_confirmation' in result:
+            trends = " | ".join(f"{k} {TREND_LABELS[v]}" for k, v in result['timeframe_trends'].items())
+            base_reasoning += f"多周期共振: {result['timeframe_confirmation']}/10 ({trends})\n"
+        
         base_reasoning += f"最终信号: {signal}"
         
         # 如果有VWAP，添加执行建议
@@ -933,11 +1008,11 @@ class OptimizedTradingStrategy(EnhancedTradingStrategy):
     #         ma_tangle_threshold=0.015   # 更严格的均线缠绕判断
     #     )
     
-    def enhanced_identify_market_regime(self, df: pd.DataFrame) -> Dict[str, Any]:
+    def enhanced_identify_market_regime(self, df: pd.DataFrame, indicators: Optional[Dict[str, pd.Series]] = None) -> Dict[str, Any]:
         """
         优化版市场状态识别 - 放宽过滤条件，避免长期不交易
         """
-        result = super().enhanced_identify_market_regime(df)
+        result = super().enhanced_identify_market_regime(df, indicators)
         
         # 放宽额外的过滤条件，更容易识别为可交易状态
         if result['market_regime'] == 'ranging':
@@ -1505,7 +1580,7 @@ class TradingDecisionRenderer:
             'trigger_conditions': trigger_conditions,
             'market_fit_score': market_fit_score,
             'indicator_consistency': indicator_consistency,
-            'timeframe_confirmation': 7,  # 假设值，可根据多时间框架分析计算
+            'timeframe_confirmation': result.get('timeframe_confirmation', 'N/A'),  # 多周期共振评分（0-10）
             'entry_price': current_price,
             'stop_loss': stop_loss,
             'take_profit': take_profit,
@@ -1758,6 +1833,22 @@ class TradingDecisionRenderer:
 # 获取当前文件路径
 current_file_path = os.path.dirname(os.path.abspath(__file__))
 # 使用示例
+# 工作进程内按策略类缓存的实例（只用于指标计算，不需要API密钥）
+_worker_strategies: Dict[str, EnhancedTradingStrategy] = {}
+
+
+def run_technical_analysis(strategy_name: str, raw_klines: List, mtf: Optional[Dict] = None,
+                           indicators: Optional[Dict[str, np.ndarray]] = None) -> Dict[str, Any]:
+    """供计算执行器调用的模块级入口"""
+    strategy = _worker_strategies.get(strategy_name)
+    if strategy is None:
+        strategy = _worker_strategies[strategy_name] = globals()[strategy_name]("Local", "")
+    return strategy.compute_signal(raw_klines, mtf, indicators)
+
+
+cpu_executor.register("technical_analysis", run_technical_analysis)
+
+
 def fetch_market_data(symbol: str, timeframe: str):
     symbol = symbol.replace("/", "")
     symbol = symbol.replace("USDT", "")
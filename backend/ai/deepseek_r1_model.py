@@ -3,9 +3,9 @@ DeepSeek-R1推理模型实现
 """
 import json
 from typing import Dict, List
-import aiohttp
 from loguru import logger
 from backend.ai.base_model import BaseAIModel, AIDecisionResult
+from backend.ai.llm_scheduler import llm_scheduler
 from backend.config import settings
 
 
@@ -29,45 +29,46 @@ class DeepSeekR1Model(BaseAIModel):
         try:
             prompt = self._create_market_prompt(symbol, market_data, current_positions)
             
-            async with aiohttp.ClientSession() as session:
-                headers = {
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json"
-                }
-                
-                payload = {
-                    "model": self.model_name,
-                    "messages": [
-                        {
-                            "role": "system", 
-                            "content": "你是一个专业的加密货币交易分析师，具备深度推理能力。请进行系统性的分析和推理。"
-                        },
-                        {"role": "user", "content": prompt}
-                    ],
-                    "temperature": 0.6,  # R1模型推荐使用较低温度
-                    "max_tokens": 2000  # R1模型需要更多token进行推理
-                }
-                
-                async with session.post(self.api_url, headers=headers, json=payload) as response:
-                    data = await response.json()
-                    
-                    # DeepSeek-R1返回包含推理过程的响应
-                    if 'choices' not in data or not data['choices']:
-                        logger.error(f"DeepSeek-R1 API响应格式错误: {data}")
-                        raise ValueError("API响应格式错误")
-                    
-                    message = data['choices'][0]['message']
-                    content = message.get('content', '')
-                    
-                    # R1模型可能会返回reasoning_content字段，包含推理过程
-                    reasoning_content = message.get('reasoning_content', '')
-                    
-                    if reasoning_content:
-                        logger.info(f"DeepSeek-R1推理过程: {reasoning_content[:500]}...")
+            payload = {
+                "model": self.model_name,
+                "messages": [
+                    {
+                        "role": "system", 
+                        "content": "你是一个专业的加密货币交易分析师，具备深度推理能力。请进行系统性的分析和推理。"
+                    },
+                    {"role": "user", "content": prompt}
+                ],
+                "temperature": 0.6,  # R1模型推荐使用较低温度
+                "max_tokens": 2000  # R1模型需要更多token进行推理
+            }
+            
+            if settings.llm_streaming:
+                response = await llm_scheduler.stream_json(
+                    payload, self.api_key, provider="deepseek", api_url=self.api_url
+                )
+            else:
+                response = await llm_scheduler.chat_completion(
+                    payload, self.api_key, provider="deepseek", api_url=self.api_url
+                )
+            data = response['data']
+            
+            # DeepSeek-R1返回包含推理过程的响应
+            if not response['success'] or 'choices' not in data or not data['choices']:
+                logger.error(f"DeepSeek-R1 API响应格式错误: {data or response['error'][:200]}")
+                raise ValueError("API响应格式错误")
+            
+            message = data['choices'][0]['message']
+            content = message.get('content', '')
             
-            # 解析JSON响应
+            # R1模型可能会返回reasoning_content字段，包含推理过程
+            reasoning_content = message.get('reasoning_content', '')
+            
+            if reasoning_content:
+                logger.info(f"DeepSeek-R1推理过程: {reasoning_content[:500]}...")
+            
+            # 解析JSON响应（流式模式下已增量提取）
             try:
-                result = json.loads(content)
+                result = response.get('parsed') or json.loads(content)
             except json.JSONDecodeError:
                 import re
                 json_match = re.search(r'\{.*\}', content, re.DOTALL)
@@ -115,37 +116,33 @@ class DeepSeekR1Model(BaseAIModel):
             }
         """
         try:
-            async with aiohttp.ClientSession() as session:
-                headers = {
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json"
-                }
-                
-                messages = []
-                if system_prompt:
-                    messages.append({"role": "system", "content": system_prompt})
-                messages.append({"role": "user", "content": prompt})
-                
-                payload = {
-                    "model": self.model_name,
-                    "messages": messages,
-                    "temperature": 0.6,
-                    "max_tokens": 2000
-                }
-                
-                async with session.post(self.api_url, headers=headers, json=payload) as response:
-                    data = await response.json()
-                    
-                    if 'choices' not in data or not data['choices']:
-                        raise ValueError("API响应格式错误")
-                    
-                    message = data['choices'][0]['message']
-                    
-                    return {
-                        "content": message.get('content', ''),
-                        "reasoning_content": message.get('reasoning_content', ''),
-                        "raw_response": data
-                    }
+            messages = []
+            if system_prompt:
+                messages.append({"role": "system", "content": system_prompt})
+            messages.append({"role": "user", "content": prompt})
+            
+            payload = {
+                "model": self.model_name,
+                "messages": messages,
+                "temperature": 0.6,
+                "max_tokens": 2000
+            }
+            
+            response = await llm_scheduler.chat_completion(
+                payload, self.api_key, provider="deepseek", api_url=self.api_url
+            )
+            data = response['data']
+            
+            if not response['success'] or 'choices' not in data or not data['choices']:
+                raise ValueError("API响应格式错误")
+            
+            message = data['choices'][0]['message']
+            
+            return {
+                "content": message.get('content', ''),
+                "reasoning_content": message.get('reasoning_content', ''),
+                "raw_response": data
+            }
         
         except Exception as e:
             logger.error(f"DeepSeek-R1推理失败: {e}")
@@ -0,0 +1,184 @@
+"""
+本地假LLM服务（OpenAI兼容的 /v1/chat/completions）
+
+用于测试和压测，不消耗真实API额度：
+    python -m backend.ai.fake_llm_server --port 9100 --latency 0.5 --error-rate 0.1
+然后设置 LLM_API_BASE_OVERRIDE=http://127.0.0.1:9100，所有LLM请求都会发往这里。
+
+延迟分布（--distribution）：
+    uniform     latency ± jitter 均匀分布（默认）
+    normal      均值 latency，标准差 jitter
+    lognormal   中位数 latency，jitter 为对数标准差，模拟推理模型的长尾
+    exponential 均值 latency
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from typing import Optional
+
+from aiohttp import web
+from loguru import logger
+
+
+LATENCY_DISTRIBUTIONS = ("uniform", "normal", "lognormal", "exponential")
+
+DEFAULT_CONTENT = {
+    "final_decision": "reject",
+    "action": "hold",
+    "decision": "hold",
+    "confidence": 0.5,
+    "position_size": 0.1,
+    "stop_loss": 0,
+    "take_profit": 0,
+    "reasoning": "fake llm server response",
+    "key_considerations": ["fake"],
+}
+
+
+class FakeLLMServer:
+    """假LLM服务"""
+
+    def __init__(
+        self,
+        latency: float = 0.2,
+        jitter: float = 0.1,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        content: Optional[dict] = None,
+        chunk_delay: float = 0.02,
+        distribution: str = "uniform",
+    ):
+        if distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"未知的延迟分布: {distribution}")
+        self.latency = latency
+        self.jitter = jitter
+        self.distribution = distribution
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.content = content or DEFAULT_CONTENT
+        self.chunk_delay = chunk_delay
+        self.stats = {"requests": 0, "errors": 0, "rate_limited": 0, "max_concurrent": 0, "client_disconnects": 0}
+        self._concurrent = 0
+        self._runner: Optional[web.AppRunner] = None
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.handle_chat)
+        app.router.add_get("/stats", self.handle_stats)
+        return app
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats)
+
+    async def handle_chat(self, request: web.Request) -> web.StreamResponse:
+        self.stats["requests"] += 1
+        self._concurrent += 1
+        self.stats["max_concurrent"] = max(self.stats["max_concurrent"], self._concurrent)
+        try:
+            payload = await request.json()
+            roll = random.random()
+            if roll < self.rate_limit_rate:
+                self.stats["rate_limited"] += 1
+                return web.json_response({"error": "rate limited"}, status=429, headers={"Retry-After": "1"})
+            if roll < self.rate_limit_rate + self.error_rate:
+                self.stats["errors"] += 1
+                return web.json_response({"error": "internal error"}, status=503)
+
+            await asyncio.sleep(self.sample_latency())
+
+            text = json.dumps(self.content, ensure_ascii=False)
+            prompt_tokens = len(json.dumps(payload.get("messages", []), ensure_ascii=False)) // 3
+            completion_tokens = len(text) // 3
+            model = payload.get("model", "fake-model")
+
+            if payload.get("stream"):
+                return await self._stream(request, text, model)
+
+            return web.json_response({
+                "id": f"fake-{self.stats['requests']}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            })
+        finally:
+            self._concurrent -= 1
+
+    def sample_latency(self) -> float:
+        """按配置的分布采样一次响应延迟（秒）"""
+        if self.distribution == "normal":
+            value = random.gauss(self.latency, self.jitter)
+        elif self.distribution == "lognormal":
+            value = self.latency * math.exp(random.gauss(0, self.jitter))
+        elif self.distribution == "exponential":
+            value = random.expovariate(1 / self.latency) if self.latency > 0 else 0.0
+        else:
+            value = self.latency + random.uniform(-self.jitter, self.jitter)
+        return max(0.0, value)
+
+    async def _stream(self, request: web.Request, text: str, model: str) -> web.StreamResponse:
+        """以SSE格式分块返回"""
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        try:
+            await response.prepare(request)
+            for i in range(0, len(text), 16):
+                chunk = {
+                    "object": "chat.completion.chunk",
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": text[i:i + 16]}, "finish_reason": None}],
+                }
+                await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+                await asyncio.sleep(self.chunk_delay)
+            await response.write(b"data: [DONE]\n\n")
+            await response.write_eof()
+        except ConnectionResetError:
+            # 客户端提前停止读取（JSON已完整或对冲请求被取消）
+            self.stats["client_disconnects"] += 1
+        return response
+
+    async def start(self, host: str = "127.0.0.1", port: int = 9100) -> str:
+        """在当前事件循环中启动，返回base url"""
+        self._runner = web.AppRunner(self.build_app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        logger.info(f"🧪 假LLM服务已启动: http://{host}:{port}")
+        return f"http://{host}:{port}"
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地假LLM服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=0.2, help="平均响应延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.1, help="延迟抖动（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回503的概率")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="返回429的概率")
+    parser.add_argument("--distribution", default="uniform", choices=LATENCY_DISTRIBUTIONS, help="延迟分布")
+    args = parser.parse_args()
+
+    server = FakeLLMServer(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        distribution=args.distribution,
+    )
+    web.run_app(server.build_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,9 +3,9 @@ GPT模型实现
 """
 import json
 from typing import Dict, List
-import openai
 from loguru import logger
 from backend.ai.base_model import BaseAIModel, AIDecisionResult
+from backend.ai.llm_scheduler import llm_scheduler
 from backend.config import settings
 
 
@@ -14,7 +14,6 @@ class GPTModel(BaseAIModel):
     
     def __init__(self):
         super().__init__("GPT-4", settings.openai_api_key)
-        openai.api_key = self.api_key
     
     async def analyze_market(
         self, 
@@ -27,17 +26,20 @@ class GPTModel(BaseAIModel):
         try:
             prompt = self._create_market_prompt(symbol, market_data, current_positions)
             
-            response = await openai.ChatCompletion.acreate(
-                model="gpt-4-turbo-preview",
-                messages=[
+            payload = {
+                "model": "gpt-4-turbo-preview",
+                "messages": [
                     {"role": "system", "content": "你是一个专业的加密货币交易分析师。"},
                     {"role": "user", "content": prompt}
                 ],
-                temperature=0.7,
-                max_tokens=1000
-            )
+                "temperature": 0.7,
+                "max_tokens": 1000
+            }
             
-            content = response.choices[0].message.content
+            response = await llm_scheduler.chat_completion(payload, self.api_key, provider="openai")
+            if not response['success']:
+                raise ValueError(f"API调用失败 ({response['status']}): {response['error'][:200]}")
+            content = response['content']
             
             # 解析JSON响应
             try:
@@ -3,9 +3,9 @@ Grok模型实现
 """
 import json
 from typing import Dict, List
-import aiohttp
 from loguru import logger
 from backend.ai.base_model import BaseAIModel, AIDecisionResult
+from backend.ai.llm_scheduler import llm_scheduler
 from backend.config import settings
 
 
@@ -27,25 +27,22 @@ class GrokModel(BaseAIModel):
         try:
             prompt = self._create_market_prompt(symbol, market_data, current_positions)
             
-            async with aiohttp.ClientSession() as session:
-                headers = {
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json"
-                }
-                
-                payload = {
-                    "model": "grok-beta",
-                    "messages": [
-                        {"role": "system", "content": "你是一个专业的加密货币交易分析师。"},
-                        {"role": "user", "content": prompt}
-                    ],
-                    "temperature": 0.7,
-                    "max_tokens": 1000
-                }
-                
-                async with session.post(self.api_url, headers=headers, json=payload) as response:
-                    data = await response.json()
-                    content = data['choices'][0]['message']['content']
+            payload = {
+                "model": "grok-beta",
+                "messages": [
+                    {"role": "system", "content": "你是一个专业的加密货币交易分析师。"},
+                    {"role": "user", "content": prompt}
+                ],
+                "temperature": 0.7,
+                "max_tokens": 1000
+            }
+            
+            response = await llm_scheduler.chat_completion(
+                payload, self.api_key, provider="grok", api_url=self.api_url
+            )
+            if not response['success']:
+                raise ValueError(f"API调用失败 ({response['status']}): {response['error'][:200]}")
+            content = response['content']
             
             # 解析JSON响应
             try:
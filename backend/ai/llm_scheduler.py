@@ -0,0 +1,535 @@
+"""
+LLM请求调度器
+
+所有智能体和AI模型的LLM调用统一经过这里提交：
+- 按服务商的令牌桶限流（RPM 请求数 / TPM token数）
+- 按服务商限制并发，优先级队列保证止盈止损评估先于新开仓扫描
+- 429/5xx/网络错误时带抖动的指数退避重试（遵循 Retry-After）
+- 统计队列深度、排队等待时间、重试和错误次数
+- 流式(SSE)读取 + 增量JSON提取，决策对象闭合即停止读取；首token超时时向备用服务商发起对冲请求
+
+测试时可以把 LLM_API_BASE_OVERRIDE 指向 backend.ai.fake_llm_server 启动的本地假服务。
+"""
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import deque
+from enum import IntEnum
+from typing import Dict, Optional
+
+import aiohttp
+from loguru import logger
+
+from backend.ai.stream_json import IncrementalJSONExtractor
+from backend.config import settings
+from backend.monitoring.health import health_registry
+from backend.monitoring.tracing import tracer
+
+
+class LLMPriority(IntEnum):
+    """请求优先级（数值越小越先执行）"""
+    STOP_LOSS = 0      # 持仓止盈止损评估
+    POSITION = 1       # 持仓管理（加减仓）
+    ENTRY = 2          # 新开仓扫描
+    BACKGROUND = 3     # 其他后台分析
+
+
+# 服务商默认配置：接口地址、每分钟请求数、每分钟token数、最大并发
+PROVIDER_DEFAULTS = {
+    "deepseek": {"url": "https://api.deepseek.com/v1/chat/completions", "rpm": 60, "tpm": 200000, "concurrency": 4},
+    "grok": {"url": "https://api.x.ai/v1/chat/completions", "rpm": 60, "tpm": 100000, "concurrency": 2},
+    "openai": {"url": "https://api.openai.com/v1/chat/completions", "rpm": 60, "tpm": 90000, "concurrency": 2},
+    "qwen": {"url": "https://dashscope.aliyuncs.com/compatible-mode/v1/chat/completions", "rpm": 60, "tpm": 100000, "concurrency": 2},
+}
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def provider_from_url(api_url: str) -> str:
+    """根据接口地址推断服务商"""
+    if "x.ai" in api_url:
+        return "grok"
+    if "openai.com" in api_url:
+        return "openai"
+    if "dashscope" in api_url:
+        return "qwen"
+    return "deepseek"
+
+
+def provider_api_key(name: str) -> str:
+    """获取服务商对应的API密钥"""
+    return {
+        "deepseek": settings.deepseek_api_key,
+        "grok": settings.grok_api_key,
+        "openai": settings.openai_api_key,
+        "qwen": settings.qwen_api_key,
+    }.get(name, "")
+
+
+def estimate_tokens(payload: Dict) -> int:
+    """粗略估算一次请求消耗的token数（输入按字符/3估算 + max_tokens）"""
+    text = json.dumps(payload.get("messages", []), ensure_ascii=False)
+    return len(text) // 3 + int(payload.get("max_tokens", 1000))
+
+
+class TokenBucket:
+    """令牌桶（按分钟速率补充）"""
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1.0):
+        """获取令牌，不足时等待（单次请求超过容量时按容量计算，避免永远等待）"""
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def adjust(self, delta: float):
+        """用实际用量修正预扣的令牌（delta>0 表示多扣了，退还）"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + delta)
+
+
+class _Provider:
+    """单个服务商的限流和排队状态"""
+
+    def __init__(self, name: str, url: str, rpm: int, tpm: int, concurrency: int):
+        self.name = name
+        self.url = url
+        self.rpm_bucket = TokenBucket(rpm)
+        self.tpm_bucket = TokenBucket(tpm)
+        self.concurrency = concurrency
+        self.queue: Optional[asyncio.PriorityQueue] = None
+        self.workers = []
+        self.in_flight = 0
+        self.stats = {
+            "requests": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "retries": 0,
+            "rate_limited": 0,
+            "tokens_used": 0,
+            "streams": 0,
+            "early_stops": 0,
+            "hedged": 0,
+            "hedge_wins": 0,
+        }
+        self.wait_times = deque(maxlen=200)
+        self.ttft_times = deque(maxlen=200)
+
+
+class LLMScheduler:
+    """LLM请求调度器"""
+
+    def __init__(self):
+        self._providers: Dict[str, _Provider] = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._seq = itertools.count()
+        for name, cfg in PROVIDER_DEFAULTS.items():
+            prefix = f"llm_{name}"
+            self._providers[name] = _Provider(
+                name,
+                cfg["url"],
+                getattr(settings, f"{prefix}_rpm", cfg["rpm"]),
+                getattr(settings, f"{prefix}_tpm", cfg["tpm"]),
+                getattr(settings, f"{prefix}_concurrency", cfg["concurrency"]),
+            )
+
+    def _resolve_url(self, provider: _Provider, api_url: Optional[str]) -> str:
+        """假服务模式下所有请求都发往 LLM_API_BASE_OVERRIDE"""
+        if settings.llm_api_base_override:
+            return settings.llm_api_base_override.rstrip("/") + "/v1/chat/completions"
+        return api_url or provider.url
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession()
+        return self._session
+
+    def _ensure_workers(self, provider: _Provider):
+        """在当前事件循环中懒启动队列和工作协程"""
+        if provider.queue is None:
+            provider.queue = asyncio.PriorityQueue()
+        provider.workers = [w for w in provider.workers if not w.done()]
+        while len(provider.workers) < provider.concurrency:
+            provider.workers.append(asyncio.create_task(self._worker(provider)))
+
+    def _submit(
+        self,
+        name: str,
+        payload: Dict,
+        api_key: str,
+        api_url: Optional[str],
+        priority: LLMPriority,
+        timeout: float,
+        stream: bool = False,
+    ) -> Dict:
+        """把请求放入服务商的优先级队列，返回任务（结果通过 job["future"] 获取）"""
+        prov = self._providers.get(name) or self._providers["deepseek"]
+        self._ensure_workers(prov)
+        job = {
+            "provider": prov.name,
+            "payload": payload,
+            "api_key": api_key,
+            "url": self._resolve_url(prov, api_url),
+            "timeout": timeout,
+            "future": asyncio.get_running_loop().create_future(),
+            "submitted_at": time.monotonic(),
+            "priority": int(priority),
+            "stream": stream,
+            "first_token": asyncio.Event(),
+            "abandoned": False,
+            "inner": None,
+            # 工作协程不继承提交方的上下文，记录父span以便LLM请求挂在同一trace下
+            "parent_span": tracer.current_span(),
+            "queue_wait": 0.0,
+        }
+        prov.stats["requests"] += 1
+        prov.queue.put_nowait((int(priority), next(self._seq), job))
+        return job
+
+    def _abandon(self, job: Dict):
+        """放弃一个请求：排队中的直接跳过，执行中的取消读取"""
+        job["abandoned"] = True
+        if job["inner"] is not None and not job["inner"].done():
+            job["inner"].cancel()
+        if not job["future"].done():
+            job["future"].cancel()
+
+    async def chat_completion(
+        self,
+        payload: Dict,
+        api_key: str,
+        provider: Optional[str] = None,
+        api_url: Optional[str] = None,
+        priority: LLMPriority = LLMPriority.ENTRY,
+        timeout: float = 60,
+    ) -> Dict:
+        """
+        提交一次 chat/completions 请求并等待结果
+
+        Args:
+            payload: OpenAI兼容的请求体
+            api_key: 服务商API密钥
+            provider: 服务商名称（deepseek/grok/openai/qwen），不传则根据 api_url 推断
+            api_url: 接口地址，不传则使用服务商默认地址
+            priority: 请求优先级
+            timeout: 单次HTTP请求超时（秒）
+
+        Returns:
+            {"success": bool, "status": int, "data": dict, "content": str, "error": str}
+        """
+        name = provider or provider_from_url(api_url or "")
+        job = self._submit(name, payload, api_key, api_url, priority, timeout)
+        return await job["future"]
+
+    async def stream_json(
+        self,
+        payload: Dict,
+        api_key: str,
+        provider: Optional[str] = None,
+        api_url: Optional[str] = None,
+        priority: LLMPriority = LLMPriority.ENTRY,
+        timeout: float = 180,
+        hedge: bool = True,
+    ) -> Dict:
+        """
+        流式请求并增量提取JSON决策对象
+
+        决策对象一闭合就停止读取。如果 LLM_HEDGE_TTFT 秒内还没有收到首个token，
+        会向备用服务商/模型（LLM_HEDGE_PROVIDER / LLM_HEDGE_MODEL）发起对冲请求，
+        取先成功返回的结果，另一个请求被取消。
+
+        Returns:
+            与 chat_completion 相同的结构，另外包含:
+            parsed(提取到的JSON对象或None)、provider(实际返回结果的服务商)、hedged、ttft
+        """
+        name = provider or provider_from_url(api_url or "")
+        stream_payload = {**payload, "stream": True}
+        primary = self._submit(name, stream_payload, api_key, api_url, priority, timeout, stream=True)
+        jobs = [primary]
+
+        hedge_target = self._hedge_target(name, payload) if hedge else None
+        if hedge_target and settings.llm_hedge_ttft > 0:
+            first_token = asyncio.ensure_future(primary["first_token"].wait())
+            try:
+                await asyncio.wait(
+                    {first_token, primary["future"]},
+                    timeout=settings.llm_hedge_ttft,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+            finally:
+                first_token.cancel()
+            if not primary["first_token"].is_set() and not primary["future"].done():
+                hedge_name, hedge_payload = hedge_target
+                logger.warning(
+                    f"⏱️ 首token超过{settings.llm_hedge_ttft}s，发起对冲请求: {name} → {hedge_name}/{hedge_payload['model']}"
+                )
+                self._providers[name].stats["hedged"] += 1
+                jobs.append(self._submit(
+                    hedge_name, hedge_payload, provider_api_key(hedge_name), None, priority, timeout, stream=True
+                ))
+
+        pending = {job["future"]: job for job in jobs}
+        first_failure = None
+        while pending:
+            done, _ = await asyncio.wait(set(pending), return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                job = pending.pop(future)
+                result = future.result() if not future.cancelled() else None
+                if result and result["success"]:
+                    for other in pending.values():
+                        self._abandon(other)
+                    result["hedged"] = len(jobs) > 1
+                    if job is not primary:
+                        self._providers[name].stats["hedge_wins"] += 1
+                    return result
+                if job is primary or first_failure is None:
+                    first_failure = result
+        return first_failure or {
+            "success": False, "status": 0, "data": {}, "content": "", "parsed": None,
+            "error": "all streams failed", "provider": name, "hedged": len(jobs) > 1, "ttft": None,
+        }
+
+    def _hedge_target(self, name: str, payload: Dict):
+        """确定对冲请求的服务商和请求体（与主请求相同时不对冲）"""
+        hedge_name = settings.llm_hedge_provider
+        hedge_model = settings.llm_hedge_model
+        if not hedge_name or hedge_name not in self._providers or not provider_api_key(hedge_name):
+            return None
+        if hedge_name == name and hedge_model == payload.get("model"):
+            return None
+        return hedge_name, {**payload, "model": hedge_model, "stream": True}
+
+    async def _worker(self, provider: _Provider):
+        while True:
+            _, _, job = await provider.queue.get()
+            try:
+                if job["abandoned"] or job["future"].cancelled():
+                    continue
+                await provider.rpm_bucket.acquire(1)
+                estimated = estimate_tokens(job["payload"])
+                await provider.tpm_bucket.acquire(estimated)
+                job["queue_wait"] = time.monotonic() - job["submitted_at"]
+                provider.wait_times.append(job["queue_wait"])
+
+                provider.in_flight += 1
+                try:
+                    # 在独立任务中执行，便于对冲请求胜出后单独取消
+                    job["inner"] = asyncio.create_task(self._execute(provider, job, estimated))
+                    await asyncio.wait({job["inner"]})
+                    if job["inner"].cancelled():
+                        result = {"success": False, "status": 0, "data": {}, "content": "", "error": "cancelled"}
+                    else:
+                        result = job["inner"].result()
+                finally:
+                    provider.in_flight -= 1
+
+                if not job["future"].done():
+                    job["future"].set_result(result)
+            except Exception as e:
+                if not job["future"].done():
+                    job["future"].set_result({"success": False, "status": 0, "data": {}, "content": "", "error": str(e)})
+            finally:
+                provider.queue.task_done()
+
+    async def _execute(self, provider: _Provider, job: Dict, estimated: int) -> Dict:
+        """在提交方的trace下执行请求"""
+        with tracer.span(
+            "llm.request",
+            parent=job["parent_span"],
+            provider=provider.name,
+            model=job["payload"].get("model", ""),
+            stream=job["stream"],
+            priority=job["priority"],
+            queue_wait_ms=round(job["queue_wait"] * 1000, 1),
+            estimated_tokens=estimated,
+        ) as span:
+            started = time.perf_counter()
+            result = await self._send(provider, job, estimated, span)
+            health_registry.record(
+                f"llm.{provider.name}", bool(result.get("success")),
+                time.perf_counter() - started, result.get("error") or ""
+            )
+            if span is not None:
+                span.set_attribute("http_status", result.get("status", 0))
+                if result.get("ttft") is not None:
+                    span.set_attribute("ttft_ms", round(result["ttft"] * 1000, 1))
+                if not result.get("success"):
+                    span.status = "error"
+                    span.error = (result.get("error") or "")[:500]
+            return result
+
+    async def _send(self, provider: _Provider, job: Dict, estimated: int, span=None) -> Dict:
+        """发送请求，遇到可重试错误时退避重试"""
+        headers = {
+            "Authorization": f"Bearer {job['api_key']}",
+            "Content-Type": "application/json",
+        }
+        if span is not None:
+            headers["traceparent"] = span.traceparent
+        max_retries = settings.llm_max_retries
+        last_error = ""
+        last_status = 0
+
+        for attempt in range(max_retries + 1):
+            retry_after = None
+            try:
+                session = await self._get_session()
+                async with session.post(
+                    job["url"],
+                    headers=headers,
+                    json=job["payload"],
+                    timeout=aiohttp.ClientTimeout(total=job["timeout"]),
+                ) as response:
+                    last_status = response.status
+                    if response.status == 200 and job["stream"]:
+                        return await self._read_stream(provider, job, response, estimated)
+                    if response.status == 200:
+                        data = await response.json(content_type=None)
+                        usage = (data.get("usage") or {}).get("total_tokens")
+                        if usage:
+                            provider.tpm_bucket.adjust(estimated - usage)
+                            provider.stats["tokens_used"] += usage
+                        provider.stats["succeeded"] += 1
+                        content = ""
+                        if data.get("choices"):
+                            content = data["choices"][0].get("message", {}).get("content", "") or ""
+                        return {"success": True, "status": 200, "data": data, "content": content, "error": ""}
+
+                    last_error = await response.text()
+                    if response.status not in RETRYABLE_STATUS:
+                        break
+                    if response.status == 429:
+                        provider.stats["rate_limited"] += 1
+                    header = response.headers.get("Retry-After")
+                    if header:
+                        try:
+                            retry_after = float(header)
+                        except ValueError:
+                            retry_after = None
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                last_error = str(e) or e.__class__.__name__
+                last_status = 0
+
+            if attempt >= max_retries:
+                break
+            provider.stats["retries"] += 1
+            if span is not None:
+                span.set_attribute("retries", attempt + 1)
+            backoff = retry_after if retry_after is not None else min(
+                settings.llm_backoff_max, settings.llm_backoff_base * (2 ** attempt)
+            ) * random.uniform(0.5, 1.5)
+            logger.warning(
+                f"🔁 LLM请求重试 [{provider.name}] 第{attempt + 1}次，状态={last_status}，{backoff:.1f}s后重试"
+            )
+            await asyncio.sleep(backoff)
+
+        provider.stats["failed"] += 1
+        logger.error(f"❌ LLM请求失败 [{provider.name}] 状态={last_status}: {last_error[:200]}")
+        return {"success": False, "status": last_status, "data": {}, "content": "", "error": last_error}
+
+    async def _read_stream(self, provider: _Provider, job: Dict, response, estimated: int) -> Dict:
+        """逐行读取SSE，决策JSON闭合后立即停止"""
+        extractor = IncrementalJSONExtractor()
+        reasoning = []
+        ttft = None
+        early_stop = False
+        provider.stats["streams"] += 1
+
+        async for raw in response.content:
+            line = raw.decode("utf-8", errors="ignore").strip()
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+            try:
+                chunk = json.loads(data)
+            except json.JSONDecodeError:
+                continue
+            choices = chunk.get("choices") or []
+            if not choices:
+                continue
+            delta = choices[0].get("delta") or {}
+            text = delta.get("content") or ""
+            thinking = delta.get("reasoning_content") or ""
+            if (text or thinking) and ttft is None:
+                ttft = time.monotonic() - job["submitted_at"]
+                provider.ttft_times.append(ttft)
+                job["first_token"].set()
+            if thinking:
+                reasoning.append(thinking)
+            if text and extractor.feed(text) is not None:
+                early_stop = True
+                break
+
+        content = extractor.text
+        reasoning_content = "".join(reasoning)
+        used = (len(content) + len(reasoning_content)) // 3
+        provider.tpm_bucket.adjust(estimated - used)
+        provider.stats["tokens_used"] += used
+        provider.stats["succeeded"] += 1
+        if early_stop:
+            provider.stats["early_stops"] += 1
+
+        return {
+            "success": True,
+            "status": 200,
+            "data": {"choices": [{"message": {"content": content, "reasoning_content": reasoning_content}}]},
+            "content": content,
+            "parsed": extractor.result,
+            "error": "",
+            "provider": provider.name,
+            "ttft": ttft,
+        }
+
+    def get_status(self) -> Dict:
+        """获取各服务商的队列深度、等待时间和调用统计"""
+        providers = {}
+        for name, prov in self._providers.items():
+            waits = sorted(prov.wait_times)
+            providers[name] = {
+                "queue_depth": prov.queue.qsize() if prov.queue else 0,
+                "in_flight": prov.in_flight,
+                "concurrency": prov.concurrency,
+                "wait_avg_ms": round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+                "wait_p95_ms": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 1) if waits else 0.0,
+                "wait_max_ms": round(waits[-1] * 1000, 1) if waits else 0.0,
+                "ttft_avg_ms": round(sum(prov.ttft_times) / len(prov.ttft_times) * 1000, 1) if prov.ttft_times else 0.0,
+                **prov.stats,
+            }
+        return {
+            "api_base_override": settings.llm_api_base_override or None,
+            "providers": providers,
+        }
+
+    async def close(self):
+        """关闭HTTP会话和工作协程"""
+        for prov in self._providers.values():
+            for worker in prov.workers:
+                worker.cancel()
+            prov.workers = []
+            prov.queue = None
+        if self._session and not self._session.closed:
+            await self._session.close()
+
+
+# 全局LLM调度器实例
+llm_scheduler = LLMScheduler()
@@ -0,0 +1,80 @@
+"""
+增量JSON提取器
+
+流式读取LLM输出时逐块喂入文本，一旦第一个顶层 {...} 对象闭合就立即返回解析结果，
+调用方可以据此提前停止读取剩余输出（例如结尾的 ``` 或额外说明文字）。
+"""
+import json
+from typing import Any, Dict, Optional
+
+
+class IncrementalJSONExtractor:
+    """跟踪括号/字符串状态，检测第一个完整的顶层JSON对象"""
+
+    def __init__(self):
+        self.buffer = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._started = False
+        self._start_text = []
+        self.result: Optional[Dict[str, Any]] = None
+
+    @property
+    def done(self) -> bool:
+        return self.result is not None
+
+    @property
+    def text(self) -> str:
+        return "".join(self.buffer)
+
+    def feed(self, chunk: str) -> Optional[Dict[str, Any]]:
+        """
+        喂入一段文本
+
+        Returns:
+            对象闭合且解析成功时返回字典，否则返回None
+        """
+        if self.done or not chunk:
+            return self.result
+        self.buffer.append(chunk)
+
+        for ch in chunk:
+            if not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._depth = 1
+                    self._start_text = ["{"]
+                continue
+
+            self._start_text.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    candidate = "".join(self._start_text)
+                    try:
+                        parsed = json.loads(candidate)
+                    except json.JSONDecodeError:
+                        # 不是合法JSON（例如提示词中出现的花括号），继续寻找下一个对象
+                        self._started = False
+                        self._start_text = []
+                        continue
+                    if isinstance(parsed, dict):
+                        self.result = parsed
+                        return parsed
+                    self._started = False
+                    self._start_text = []
+        return None
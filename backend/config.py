@@ -16,6 +16,7 @@ class Settings(BaseSettings):
     aster_dex_api_key: str = os.getenv("ASTER_DEX_API_KEY", "")
     aster_dex_api_secret: str = os.getenv("ASTER_DEX_API_SECRET", "")  # 保留兼容性，专业API可能不需要
     wallet_address: str = os.getenv("WALLET_ADDRESS", "")  # API授权的钱包地址（专业API必需）
+    aster_dex_base_url: str = os.getenv("ASTER_DEX_BASE_URL", "https://fapi.asterdex.com")  # 压测时可指向本地假交易所
     
     # AI模型密钥
     openai_api_key: str = os.getenv("OPENAI_API_KEY", "")
@@ -31,7 +32,16 @@ class Settings(BaseSettings):
     app_host: str = os.getenv("APP_HOST", "0.0.0.0")
     app_port: int = int(os.getenv("APP_PORT", "8000"))
     debug_mode: bool = os.getenv("DEBUG_MODE", "False").lower() == "true"
-    sql_echo: bool = os.getenv("SQL_ECHO", "True").lower() == "true"  # 是否打印SQL语句
+    sql_echo: bool = os.getenv("SQL_ECHO", "False").lower() == "true"  # 是否打印SQL语句
+    
+    # 日志配置
+    log_level: str = os.getenv("LOG_LEVEL", "INFO")
+    # 按模块覆盖日志级别，如 "backend.exchanges=WARNING,backend.agents.kline_compressor=DEBUG"
+    log_module_levels: str = os.getenv("LOG_MODULE_LEVELS", "")
+    log_enqueue: bool = os.getenv("LOG_ENQUEUE", "true").lower() == "true"  # 后台线程写日志，不阻塞事件循环
+    log_payloads: str = os.getenv("LOG_PAYLOADS", "debug")  # 大段内容: debug | sample | all | off
+    log_payload_sample_rate: float = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0.05"))
+    log_payload_max_chars: int = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", "4000"))
     
     # 交易配置
     initial_balance: float = float(os.getenv("INITIAL_BALANCE", "100"))
@@ -46,12 +56,158 @@ class Settings(BaseSettings):
     # 交易对筛选配置
     min_volume_threshold: float = float(os.getenv("MIN_VOLUME_THRESHOLD", "20000000"))  # 最小24H交易量（美元），默认2000万
     max_trading_symbols: int = int(os.getenv("MAX_TRADING_SYMBOLS", "50"))  # 最多选择多少个交易对进行分析，默认50个
+    screener_score: str = os.getenv(
+        "SCREENER_SCORE",
+        "z_liquidity + 0.5 * z_volatility + 0.3 * abs(z_trend) - 0.5 * z_spread_bps - 0.3 * abs(z_funding_rate)"
+    )  # 多因子打分表达式（因子说明见 backend/trading/screener.py）
+    screener_filter: str = os.getenv("SCREENER_FILTER", "")  # 额外过滤表达式，如 spread_bps < 20
+    screener_feature_refresh_interval: int = int(os.getenv("SCREENER_FEATURE_REFRESH_INTERVAL", "300"))  # 资金费率/价差缓存刷新间隔（秒）
     
     # 更新频率（秒）- 超实时模式
     data_update_interval: int = int(os.getenv("DATA_UPDATE_INTERVAL", "60"))  # 市场数据每3秒更新（超实时）
     trade_check_interval: int = int(os.getenv("TRADE_CHECK_INTERVAL", "600"))  # 交易检查每5分钟
     broadcast_interval: int = int(os.getenv("BROADCAST_INTERVAL", "2"))  # WebSocket推送每2秒
     
+    # 后台任务调度
+    trading_cycle_cron: str = os.getenv("TRADING_CYCLE_CRON", "*/30 * * * *")  # 开仓交易周期，默认整点/半点
+    trading_cycle_jitter: int = int(os.getenv("TRADING_CYCLE_JITTER", "0"))
+    position_cycle_interval: int = int(os.getenv("POSITION_CYCLE_INTERVAL", "120"))  # 持仓管理周期（秒）
+    position_cycle_jitter: int = int(os.getenv("POSITION_CYCLE_JITTER", "10"))
+    scheduler_misfire_grace_time: int = int(os.getenv("SCHEDULER_MISFIRE_GRACE_TIME", "120"))  # 错过计划时间后仍补跑的宽限（秒）
+    
+    # 向量化止损引擎
+    stop_monitor_enabled: bool = os.getenv("STOP_MONITOR_ENABLED", "False").lower() == "true"  # 开启后会按止损/止盈价格自动平仓
+    stop_check_interval: float = float(os.getenv("STOP_CHECK_INTERVAL", "1"))  # 价格tick轮询间隔（秒）
+    stop_sync_interval: int = int(os.getenv("STOP_SYNC_INTERVAL", "60"))  # 持仓同步间隔（秒）
+    
+    # LLM前置门控
+    gate_enabled: bool = os.getenv("GATE_ENABLED", "True").lower() == "true"
+    gate_top_k: int = int(os.getenv("GATE_TOP_K", "5"))  # 每周期最多升级到LLM的新候选数量（不含持仓）
+    gate_min_score: float = float(os.getenv("GATE_MIN_SCORE", "0.3"))  # 升级所需的最低门控得分
+    
+    # 多周期特征（基础周期K线只拉一次，更高周期由重采样得到）
+    mtf_enabled: bool = os.getenv("MTF_ENABLED", "true").lower() == "true"
+    mtf_base_interval: str = os.getenv("MTF_BASE_INTERVAL", "1h")  # 拉取的基础周期（需不大于1h）
+    mtf_base_limit: int = int(os.getenv("MTF_BASE_LIMIT", "720"))  # 基础周期K线数量（1h x 720 约30根日线，只为门控升级的交易对拉取）
+    mtf_timeframes: str = os.getenv("MTF_TIMEFRAMES", "1h,4h,1d")
+    mtf_confidence_weight: float = float(os.getenv("MTF_CONFIDENCE_WEIGHT", "0.3"))  # 技术信号置信度按共振评分调整的权重（0不调整）
+    
+    # 增量技术指标（按交易对保存状态，每根新K线 O(1) 更新，关闭时每次用 talib 全量计算）
+    incremental_indicators_enabled: bool = os.getenv("INCREMENTAL_INDICATORS_ENABLED", "true").lower() == "true"
+    
+    # LLM请求调度（限流/优先级/重试）
+    llm_api_base_override: str = os.getenv("LLM_API_BASE_OVERRIDE", "")  # 指向本地假LLM服务，如 http://127.0.0.1:9100
+    llm_max_retries: int = int(os.getenv("LLM_MAX_RETRIES", "3"))
+    llm_backoff_base: float = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))  # 退避基数（秒）
+    llm_backoff_max: float = float(os.getenv("LLM_BACKOFF_MAX", "30"))  # 最大退避（秒）
+    llm_deepseek_rpm: int = int(os.getenv("LLM_DEEPSEEK_RPM", "60"))
+    llm_deepseek_tpm: int = int(os.getenv("LLM_DEEPSEEK_TPM", "200000"))
+    llm_deepseek_concurrency: int = int(os.getenv("LLM_DEEPSEEK_CONCURRENCY", "4"))
+    llm_grok_rpm: int = int(os.getenv("LLM_GROK_RPM", "60"))
+    llm_grok_tpm: int = int(os.getenv("LLM_GROK_TPM", "100000"))
+    llm_grok_concurrency: int = int(os.getenv("LLM_GROK_CONCURRENCY", "2"))
+    llm_openai_rpm: int = int(os.getenv("LLM_OPENAI_RPM", "60"))
+    llm_openai_tpm: int = int(os.getenv("LLM_OPENAI_TPM", "90000"))
+    llm_openai_concurrency: int = int(os.getenv("LLM_OPENAI_CONCURRENCY", "2"))
+    llm_streaming: bool = os.getenv("LLM_STREAMING", "True").lower() == "true"  # R1决策使用流式读取+增量JSON提取
+    llm_hedge_ttft: float = float(os.getenv("LLM_HEDGE_TTFT", "8"))  # 首token超过该秒数发起对冲请求，0为关闭
+    llm_hedge_provider: str = os.getenv("LLM_HEDGE_PROVIDER", "deepseek")  # 对冲请求的服务商
+    llm_hedge_model: str = os.getenv("LLM_HEDGE_MODEL", "deepseek-chat")  # 对冲请求使用的模型
+
+    # 提示词token预算（用户提示词部分，系统提示词保持不变以命中前缀缓存）
+    prompt_budget_default: int = int(os.getenv("PROMPT_BUDGET_DEFAULT", "4000"))
+    prompt_budget_portfolio_manager: int = int(os.getenv("PROMPT_BUDGET_PORTFOLIO_MANAGER", "6000"))
+    prompt_budget_news_analyst: int = int(os.getenv("PROMPT_BUDGET_NEWS_ANALYST", "3000"))
+
+    # 运行指标（/metrics，Prometheus格式）
+    metrics_enabled: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+    # 链路追踪（每个交易周期一条trace，导出到JSONL文件或本地OTLP采集器）
+    tracing_enabled: bool = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+    tracing_exporter: str = os.getenv("TRACING_EXPORTER", "jsonl")  # jsonl | otlp
+    tracing_jsonl_path: str = os.getenv("TRACING_JSONL_PATH", "logs/traces.jsonl")
+    tracing_otlp_endpoint: str = os.getenv("TRACING_OTLP_ENDPOINT", "http://127.0.0.1:4318/v1/traces")
+    tracing_service_name: str = os.getenv("TRACING_SERVICE_NAME", "noloss-trading")
+    tracing_flush_interval: float = float(os.getenv("TRACING_FLUSH_INTERVAL", "5"))
+
+    # 运行时诊断（/admin 接口需要在请求头 X-Admin-Token 中提供该令牌，未配置时禁用）
+    admin_token: str = os.getenv("ADMIN_TOKEN", "")
+    profiler_interval: float = float(os.getenv("PROFILER_INTERVAL", "0.005"))  # 采样间隔（秒）
+    profiler_max_seconds: int = int(os.getenv("PROFILER_MAX_SECONDS", "120"))
+    loop_watchdog_enabled: bool = os.getenv("LOOP_WATCHDOG_ENABLED", "true").lower() == "true"
+    loop_watchdog_interval: float = float(os.getenv("LOOP_WATCHDOG_INTERVAL", "0.1"))
+    loop_block_threshold_ms: int = int(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "250"))  # 超过该时长记录阻塞调用栈
+
+    # 组件健康度与降级模式
+    health_window_seconds: int = int(os.getenv("HEALTH_WINDOW_SECONDS", "300"))  # 滚动统计窗口
+    health_min_calls: int = int(os.getenv("HEALTH_MIN_CALLS", "5"))  # 窗口内少于该调用数不判定异常
+    health_degraded_error_rate: float = float(os.getenv("HEALTH_DEGRADED_ERROR_RATE", "0.2"))
+    health_down_error_rate: float = float(os.getenv("HEALTH_DOWN_ERROR_RATE", "0.5"))
+    health_latency_p95_ms: float = float(os.getenv("HEALTH_LATENCY_P95_MS", "10000"))
+    health_db_timeout: float = float(os.getenv("HEALTH_DB_TIMEOUT", "2"))  # /health/ready 数据库探测超时（秒）
+    degraded_mode_enabled: bool = os.getenv("DEGRADED_MODE_ENABLED", "true").lower() == "true"  # 关键组件异常时暂停新开仓
+    exchange_mock_fallback: bool = os.getenv("EXCHANGE_MOCK_FALLBACK", "false").lower() == "true"  # 真实模式下K线失败是否用模拟数据填充
+
+    # CPU密集型计算执行器（技术指标、K线压缩移出事件循环）
+    cpu_executor_default_mode: str = os.getenv("CPU_EXECUTOR_DEFAULT_MODE", "process")  # process | thread | inline
+    cpu_executor_modes: str = os.getenv("CPU_EXECUTOR_MODES", "")  # 按函数覆盖，如 kline_compression=thread
+    cpu_process_workers: int = int(os.getenv("CPU_PROCESS_WORKERS", "2"))
+    cpu_thread_workers: int = int(os.getenv("CPU_THREAD_WORKERS", "4"))
+    cpu_warm_modules: str = os.getenv(
+        "CPU_WARM_MODULES", "backend.agents.technical_analyst_new,backend.agents.kline_compressor"
+    )
+
+    # 订单管理（幂等下单与成交跟踪）
+    order_submit_retries: int = int(os.getenv("ORDER_SUBMIT_RETRIES", "2"))  # 下单失败后的重试次数（沿用同一客户端订单ID）
+    order_retry_backoff: float = float(os.getenv("ORDER_RETRY_BACKOFF", "1.0"))  # 重试间隔（秒，按次数递增）
+    order_poll_interval: float = float(os.getenv("ORDER_POLL_INTERVAL", "1.0"))  # 未完成订单的状态轮询间隔（秒）
+    order_track_timeout: float = float(os.getenv("ORDER_TRACK_TIMEOUT", "120"))  # 超过该时间仍未完成则停止跟踪
+
+    # 执行算法（限价挂单、TWAP、按深度拆单）
+    execution_algo: str = os.getenv("EXECUTION_ALGO", "market")  # market / limit_at_touch / twap / depth / auto
+    execution_limit_timeout: float = float(os.getenv("EXECUTION_LIMIT_TIMEOUT", "10"))  # 挂单未成交转市价前的等待时间（秒）
+    execution_twap_minutes: float = float(os.getenv("EXECUTION_TWAP_MINUTES", "5"))  # TWAP总时长（分钟）
+    execution_twap_slices: int = int(os.getenv("EXECUTION_TWAP_SLICES", "5"))  # TWAP子单数量
+    execution_depth_fraction: float = float(os.getenv("EXECUTION_DEPTH_FRACTION", "0.2"))  # 每笔子单不超过可见深度的比例
+    execution_depth_levels: int = int(os.getenv("EXECUTION_DEPTH_LEVELS", "5"))  # 计算可见深度的档位数
+    execution_depth_pause: float = float(os.getenv("EXECUTION_DEPTH_PAUSE", "1.0"))  # 深度拆单子单间隔（秒，等待盘口恢复）
+    execution_slice_notional: float = float(os.getenv("EXECUTION_SLICE_NOTIONAL", "2000"))  # auto: 超过该金额按深度拆单
+    execution_twap_notional: float = float(os.getenv("EXECUTION_TWAP_NOTIONAL", "20000"))  # auto: 超过该金额用TWAP
+    execution_min_child_notional: float = float(os.getenv("EXECUTION_MIN_CHILD_NOTIONAL", "10"))  # 子单最小金额（USDT）
+
+    # 用户数据流（listenKey推送订单和账户更新，代替轮询持仓/余额）
+    user_stream_enabled: bool = os.getenv("USER_STREAM_ENABLED", "true").lower() == "true"
+    aster_dex_ws_url: str = os.getenv("ASTER_DEX_WS_URL", "wss://fstream.asterdex.com/ws")
+    user_stream_keepalive: int = int(os.getenv("USER_STREAM_KEEPALIVE", "1800"))  # listenKey续期间隔（秒，60分钟过期）
+    user_stream_reconcile_interval: int = int(os.getenv("USER_STREAM_RECONCILE_INTERVAL", "300"))  # REST对账间隔（秒）
+    user_stream_stale_after: float = float(os.getenv("USER_STREAM_STALE_AFTER", "900"))  # 超过该时间未对账则回退REST
+    
+    # 订单簿服务（本地订单簿 + 盘口特征）
+    order_book_stream_enabled: bool = os.getenv("ORDER_BOOK_STREAM_ENABLED", "true").lower() == "true"
+    order_book_depth: int = int(os.getenv("ORDER_BOOK_DEPTH", "50"))  # REST快照和特征计算的档位数
+    order_book_refresh_interval: int = int(os.getenv("ORDER_BOOK_REFRESH_INTERVAL", "10"))  # 未接增量流时REST刷新间隔（秒）
+    order_book_max_age: float = float(os.getenv("ORDER_BOOK_MAX_AGE", "10"))  # 本地簿超过该时间未更新则按需REST拉取
+    order_book_feature_levels: int = int(os.getenv("ORDER_BOOK_FEATURE_LEVELS", "10"))  # 买卖量不平衡取前N档
+    order_book_depth_bps: float = float(os.getenv("ORDER_BOOK_DEPTH_BPS", "25"))  # 统计中间价±X基点内的挂单金额
+    max_entry_slippage_bps: float = float(os.getenv("MAX_ENTRY_SLIPPAGE_BPS", "30"))  # 开仓预估滑点上限，超出则缩小仓位（0关闭）
+    
+    # 下单前风控（所有订单提交到交易所前的确定性检查）
+    risk_engine_enabled: bool = os.getenv("RISK_ENGINE_ENABLED", "true").lower() == "true"
+    risk_max_gross_exposure: float = float(os.getenv("RISK_MAX_GROSS_EXPOSURE", "1.0"))  # 总敞口上限（权益的倍数）
+    risk_max_net_exposure: float = float(os.getenv("RISK_MAX_NET_EXPOSURE", "0.8"))  # 净敞口上限（权益的倍数）
+    risk_max_bucket_exposure: float = float(os.getenv("RISK_MAX_BUCKET_EXPOSURE", "0.4"))  # 同一相关性分组敞口上限
+    risk_correlation_buckets: str = os.getenv("RISK_CORRELATION_BUCKETS", "")  # 分组:交易对,交易对;分组:...
+    risk_daily_loss_limit: float = float(os.getenv("RISK_DAILY_LOSS_LIMIT", "0.05"))  # 当日亏损超过该比例开启清仓开关（0关闭）
+    risk_min_notional: float = float(os.getenv("RISK_MIN_NOTIONAL", "5"))  # 交易所未返回MIN_NOTIONAL时的最小名义金额
+    
+    # 组合风险分析（K线收益率的相关性、VaR、beta）
+    risk_analytics_interval: str = os.getenv("RISK_ANALYTICS_INTERVAL", "1h")
+    risk_analytics_window: int = int(os.getenv("RISK_ANALYTICS_WINDOW", "168"))  # 收益率样本数（K线根数）
+    risk_analytics_refresh_interval: int = int(os.getenv("RISK_ANALYTICS_REFRESH_INTERVAL", "300"))  # 补拉K线间隔（秒）
+    risk_analytics_confidence: float = float(os.getenv("RISK_ANALYTICS_CONFIDENCE", "0.95"))  # VaR/ES置信度
+    risk_analytics_benchmark: str = os.getenv("RISK_ANALYTICS_BENCHMARK", "BTCUSDT")  # beta基准
+    risk_analytics_min_coverage: float = float(os.getenv("RISK_ANALYTICS_MIN_COVERAGE", "0.8"))  # 样本覆盖率低于该比例的交易对不参与计算
+    
     # 新闻API配置
     news_api_url: str = os.getenv("NEWS_API_URL", "")
     
@@ -82,6 +82,14 @@ class Trade(Base):
     take_profit = Column(Float, nullable=True)  # 止盈价格
     stop_loss_strategy = Column(String(50), nullable=True)  # 止损策略类型
     take_profit_strategy = Column(String(50), nullable=True)  # 止盈策略类型
+    client_order_id = Column(String(64), nullable=True, index=True)  # 客户端订单ID（重试幂等）
+    order_status = Column(String(20), nullable=True)  # new, partially_filled, filled, rejected, cancelled
+    filled_amount = Column(Float, nullable=True)  # 实际成交数量
+    fee = Column(Float, nullable=True)  # 手续费
+    fee_asset = Column(String(20), nullable=True)  # 手续费币种
+    execution_algo = Column(String(20), nullable=True)  # 执行算法: market, limit_at_touch, twap, depth
+    arrival_price = Column(Float, nullable=True)  # 下单决策时的中间价
+    slippage_bps = Column(Float, nullable=True)  # 成交均价相对到达价格的滑点（基点，正数为不利）
 
 
 class PortfolioSnapshot(Base):
@@ -3,7 +3,7 @@ Aster DEX 交易所接口 - 使用官方SDK
 """
 import time
 import asyncio
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from loguru import logger
 
 # 官方SDK导入
@@ -12,6 +12,12 @@ from aster.error import ClientError, ServerError
 
 from backend.config import settings
 from backend.exchanges.mock_market_data import mock_market
+from backend.monitoring.metrics import instrument_exchange, record_exchange_error, MOCK_FALLBACKS
+from backend.monitoring.health import mark_failed
+
+
+# 批量下单接口每次最多提交的订单数
+BATCH_ORDER_LIMIT = 5
 
 
 class AsterDEXClient:
@@ -26,7 +32,7 @@ class AsterDEXClient:
         self.user = settings.wallet_address  # 主钱包地址
         self.api_key = settings.aster_dex_api_key  # API Key
         self.api_secret = settings.aster_dex_api_secret  # API Secret
-        self.base_url = "https://fapi.asterdex.com"  # Futures API
+        self.base_url = settings.aster_dex_base_url  # Futures API
         self.position_mode_initialized = False  # 持仓模式初始化标志
         self.time_offset = 0  # 服务器时间偏移量
         
@@ -46,12 +52,7 @@ class AsterDEXClient:
             logger.info(f"🔐 API Secret: {'*' * 20}")
             if self.user:
                 logger.info(f"💳 钱包地址: {self.user[:6]}...{self.user[-4:]}")
-            
-            # 同步服务器时间
-            try:
-                self._sync_server_time()
-            except Exception as e:
-                logger.warning(f"⚠️ 同步服务器时间失败: {e}，将使用本地时间")
+            # 服务器时间同步是网络请求，在应用启动后由 initialize() 异步执行
         else:
             self.use_mock_data = True
             self.client = None
@@ -75,6 +76,12 @@ class AsterDEXClient:
             # 如果没有事件循环，创建新的
             return asyncio.run(asyncio.to_thread(lambda: coro))
     
+    async def initialize(self):
+        """异步初始化：在线程中同步服务器时间，不阻塞模块导入和事件循环"""
+        if self.use_mock_data:
+            return
+        await asyncio.to_thread(self._sync_server_time)
+    
     def _sync_server_time(self):
         """同步服务器时间，计算时间偏移量"""
         try:
@@ -104,6 +111,7 @@ class AsterDEXClient:
             return f"{base}/USDT"
         return symbol
     
+    @instrument_exchange
     async def get_account_balance(self) -> Dict:
         """获取账户余额 - 使用官方SDK"""
         if self.use_mock_data:
@@ -120,6 +128,7 @@ class AsterDEXClient:
             
             # 检查API是否返回错误
             if isinstance(result, dict) and 'code' in result:
+                record_exchange_error(endpoint="get_account_balance", error="api_error")
                 error_code = result.get('code')
                 error_msg = result.get('msg', '未知错误')
                 logger.error(f"❌ AsterDEX API错误: [{error_code}] {error_msg}")
@@ -174,7 +183,7 @@ class AsterDEXClient:
                     free = float(usdt_balance.get('free', 0))
                     locked = float(usdt_balance.get('locked', 0))
                     total = free + locked
-                    logger.info(f"💵 USDT余额: 可用={free:.2f}, 锁定={locked:.2f}, 总计={total:.2f}")
+                    logger.debug("💵 USDT余额: 可用={:.2f}, 锁定={:.2f}, 总计={:.2f}", free, locked, total)
                 
                 return {
                     "success": True,
@@ -182,7 +191,7 @@ class AsterDEXClient:
                     "canTrade": result.get('canTrade', False)
                 }
             elif isinstance(result, list):
-                logger.info(f"✅ 成功获取钱包余额，共{len(result)}项")
+                logger.debug("✅ 成功获取钱包余额，共{}项", len(result))
                 return {
                     "success": True,
                     "balances": result
@@ -195,6 +204,7 @@ class AsterDEXClient:
                     "error": "响应格式不匹配"
                 }
         except ClientError as e:
+            record_exchange_error(endpoint="get_account_balance", error=type(e).__name__)
             logger.error(f"❌ 客户端错误: {e.error_message}")
             return {
                 "success": False,
@@ -202,6 +212,7 @@ class AsterDEXClient:
                 "error": f"客户端错误: {e.error_message}"
             }
         except ServerError as e:
+            record_exchange_error(endpoint="get_account_balance", error=type(e).__name__)
             logger.error(f"❌ 服务器错误: {e}")
             return {
                 "success": False,
@@ -209,6 +220,7 @@ class AsterDEXClient:
                 "error": f"服务器错误: {str(e)}"
             }
         except Exception as e:
+            record_exchange_error(endpoint="get_account_balance", error=type(e).__name__)
             logger.error(f"获取钱包余额失败: {e}")
             return {
                 "success": False,
@@ -216,6 +228,7 @@ class AsterDEXClient:
                 "error": str(e)
             }
     
+    @instrument_exchange
     async def get_ticker(self, symbol: str) -> Dict:
         """获取交易对行情 - 使用官方SDK"""
         if self.use_mock_data:
@@ -250,9 +263,11 @@ class AsterDEXClient:
                 }
             return {}
         except Exception as e:
+            record_exchange_error(endpoint="get_ticker", error=type(e).__name__)
             logger.error(f"获取行情失败 {symbol}: {e}")
             return {}
     
+    @instrument_exchange
     async def get_all_tickers(self) -> List[Dict]:
         """获取所有交易对行情 - 使用官方SDK"""
         if self.use_mock_data:
@@ -282,9 +297,48 @@ class AsterDEXClient:
                     })
             return tickers
         except Exception as e:
+            record_exchange_error(endpoint="get_all_tickers", error=type(e).__name__)
             logger.error(f"获取所有行情失败: {e}")
             return []
     
+    @instrument_exchange
+    async def get_all_funding_rates(self) -> Dict[str, float]:
+        """获取所有交易对最近一次资金费率 {symbol: 费率}（premiumIndex 一次请求）"""
+        if self.use_mock_data:
+            return {}
+        
+        try:
+            result = await asyncio.to_thread(self.client.mark_price)
+            if isinstance(result, dict):
+                result = [result]
+            return {
+                item["symbol"]: float(item.get("lastFundingRate") or 0)
+                for item in result or [] if item.get("symbol")
+            }
+        except Exception as e:
+            record_exchange_error(endpoint="get_all_funding_rates", error=type(e).__name__)
+            logger.error(f"获取资金费率失败: {e}")
+            return {}
+    
+    @instrument_exchange
+    async def get_all_book_tickers(self) -> Dict[str, Tuple[float, float]]:
+        """获取所有交易对的最优买卖价 {symbol: (买一价, 卖一价)}（bookTicker 一次请求）"""
+        if self.use_mock_data:
+            return {}
+        
+        try:
+            result = await asyncio.to_thread(self.client.book_ticker)
+            if isinstance(result, dict):
+                result = [result]
+            return {
+                item["symbol"]: (float(item.get("bidPrice") or 0), float(item.get("askPrice") or 0))
+                for item in result or [] if item.get("symbol")
+            }
+        except Exception as e:
+            record_exchange_error(endpoint="get_all_book_tickers", error=type(e).__name__)
+            logger.error(f"获取最优挂单价失败: {e}")
+            return {}
+    
     async def _ensure_hedge_mode(self):
         """确保账户设置为双向持仓模式（支持同时做多和做空）"""
         if self.use_mock_data or self.position_mode_initialized:
@@ -400,18 +454,30 @@ class AsterDEXClient:
         
         return adjusted
     
+    @instrument_exchange
     async def place_order(
         self, 
         symbol: str, 
         side: str,  # buy, sell
         order_type: str,  # market, limit
         amount: float,
-        price: Optional[float] = None
+        price: Optional[float] = None,
+        client_order_id: Optional[str] = None,
+        time_in_force: str = "GTC",
+        reduce_only: bool = False
     ) -> Dict:
-        """下单 - 使用官方SDK"""
+        """
+        下单 - 使用官方SDK
+
+        client_order_id: 客户端订单ID（newClientOrderId），重试时使用同一ID，交易所会拒绝重复订单
+        time_in_force: 限价单有效方式，GTX 为只做maker（会立即成交时被交易所拒绝）
+        reduce_only: 只减仓（平仓单），数量超过持仓时交易所只成交到平仓为止，不会开出反向仓位
+        """
         if self.use_mock_data:
             result = mock_market.place_order(symbol, side, order_type, amount, price)
             logger.info(f"模拟订单已提交: {symbol} {side} {amount}")
+            if client_order_id:
+                result["client_order_id"] = client_order_id
             return result
         
         # 调整精度（在构建参数之前）
@@ -423,15 +489,20 @@ class AsterDEXClient:
             "side": side.upper(),  # BUY 或 SELL
             "type": order_type.upper(),  # MARKET 或 LIMIT
             "quantity": amount,
+            "newOrderRespType": "RESULT",  # 响应中包含成交数量和成交均价
         }
-        
+        if client_order_id:
+            params["newClientOrderId"] = client_order_id
+        if reduce_only:
+            params["reduceOnly"] = "true"
+
         # 限价单需要价格和timeInForce
         if order_type.upper() == "LIMIT":
             if price is None:
                 logger.error("限价单必须指定价格")
                 return {"success": False, "error": "限价单必须指定价格"}
             params["price"] = price
-            params["timeInForce"] = "GTC"
+            params["timeInForce"] = time_in_force
         
         try:
             logger.info(f"📤 提交订单: {symbol} {side} {amount} ({order_type})")
@@ -450,35 +521,134 @@ class AsterDEXClient:
                 return {
                     "success": True,
                     "order_id": str(result.get('orderId')),
+                    "client_order_id": result.get('clientOrderId', client_order_id),
                     **result
                 }
             elif isinstance(result, dict) and 'code' in result:
+                record_exchange_error(endpoint="place_order", error="api_error")
                 error_msg = result.get('msg', '未知错误')
                 logger.error(f"❌ 下单失败: {error_msg}")
-                return {"success": False, "error": error_msg}
+                return {"success": False, "code": result.get('code'), "error": error_msg}
             else:
                 logger.warning(f"⚠️  下单响应格式未知: {result}")
                 return result
         except ClientError as e:
+            record_exchange_error(endpoint="place_order", error=type(e).__name__)
             logger.error(f"❌ 客户端错误: {e.error_message}")
             return {"success": False, "error": f"客户端错误: {e.error_message}"}
         except ServerError as e:
+            record_exchange_error(endpoint="place_order", error=type(e).__name__)
             logger.error(f"❌ 服务器错误: {e}")
             return {"success": False, "error": f"服务器错误: {str(e)}"}
         except Exception as e:
+            record_exchange_error(endpoint="place_order", error=type(e).__name__)
             logger.error(f"下单异常: {e}")
             return {"success": False, "error": str(e)}
     
-    async def place_short_order(self, symbol: str, amount: float, price: Optional[float] = None) -> Dict:
+    @instrument_exchange
+    async def place_batch_orders(self, orders: List[Dict]) -> List[Dict]:
         """
-        做空订单 - 使用官方SDK
+        批量市价下单 - /fapi/v1/batchOrders（每次最多5笔，多批并发提交）
+
+        Args:
+            orders: [{"symbol", "side": buy/sell, "amount", "client_order_id", "reduce_only"（可选）}, ...]
+
+        Returns:
+            与 orders 一一对应的下单结果，格式同 place_order()。
+            SDK不支持批量接口（或模拟模式）时退化为逐笔并发下单
+        """
+        if self.use_mock_data or not hasattr(self.client, 'new_batch_order'):
+            return list(await asyncio.gather(*(
+                self.place_order(
+                    o["symbol"], o["side"], "market", o["amount"],
+                    client_order_id=o.get("client_order_id"), reduce_only=o.get("reduce_only", False)
+                )
+                for o in orders
+            )))
         
+        chunks = [orders[i:i + BATCH_ORDER_LIMIT] for i in range(0, len(orders), BATCH_ORDER_LIMIT)]
+        results = await asyncio.gather(*(self._submit_batch_chunk(chunk) for chunk in chunks))
+        return [result for chunk in results for result in chunk]
+    
+    async def _submit_batch_chunk(self, orders: List[Dict]) -> List[Dict]:
+        batch = []
+        for o in orders:
+            params = {
+                "symbol": o["symbol"],
+                "side": o["side"].upper(),
+                "type": "MARKET",
+                "quantity": str(self._adjust_precision(o["symbol"], o["amount"])),
+                "newOrderRespType": "RESULT",
+            }
+            if o.get("client_order_id"):
+                params["newClientOrderId"] = o["client_order_id"]
+            if o.get("reduce_only"):
+                params["reduceOnly"] = "true"
+            batch.append(params)
+        
+        try:
+            logger.info(f"📤 批量提交{len(batch)}笔订单: {', '.join(o['symbol'] for o in orders)}")
+            
+            def submit_batch():
+                return self.client.new_batch_order(batchOrders=batch)
+            
+            result = await asyncio.to_thread(submit_batch)
+        except ClientError as e:
+            record_exchange_error(endpoint="place_batch_orders", error=type(e).__name__)
+            logger.error(f"❌ 批量下单客户端错误: {e.error_message}")
+            return [{"success": False, "error": f"客户端错误: {e.error_message}"} for _ in orders]
+        except ServerError as e:
+            record_exchange_error(endpoint="place_batch_orders", error=type(e).__name__)
+            logger.error(f"❌ 批量下单服务器错误: {e}")
+            return [{"success": False, "error": f"服务器错误: {str(e)}"} for _ in orders]
+        except Exception as e:
+            record_exchange_error(endpoint="place_batch_orders", error=type(e).__name__)
+            logger.error(f"❌ 批量下单异常: {e}")
+            return [{"success": False, "error": str(e)} for _ in orders]
+        
+        if not isinstance(result, list) or len(result) != len(orders):
+            logger.warning(f"⚠️  批量下单响应格式未知: {result}")
+            return [{"success": False, "error": "响应格式未知"} for _ in orders]
+        
+        # 每笔订单单独返回成功结果或错误
+        normalized = []
+        for o, item in zip(orders, result):
+            if isinstance(item, dict) and 'orderId' in item:
+                normalized.append({
+                    "success": True,
+                    "order_id": str(item.get('orderId')),
+                    "client_order_id": item.get('clientOrderId', o.get("client_order_id")),
+                    **item
+                })
+            else:
+                item = item if isinstance(item, dict) else {}
+                record_exchange_error(endpoint="place_batch_orders", error="api_error")
+                logger.error(f"❌ 批量下单失败: {o['symbol']} - [{item.get('code')}] {item.get('msg', '未知错误')}")
+                normalized.append({"success": False, "code": item.get('code'), "error": item.get('msg', '未知错误')})
+        return normalized
+    
+    @instrument_exchange
+    async def place_short_order(
+        self,
+        symbol: str,
+        amount: float,
+        price: Optional[float] = None,
+        client_order_id: Optional[str] = None,
+        time_in_force: str = "GTC"
+    ) -> Dict:
+        """
+        做空订单 - 使用官方SDK
+
         关键说明：
         - 单向持仓模式：做空使用 side="SELL"，不能使用 positionSide 参数
         - 双向持仓模式：做空使用 side="SELL" + positionSide="SHORT"
+        - 持仓模式不匹配时的重试沿用同一个 client_order_id，首单若已被接受，重试会被交易所拒绝而不会重复下单
         """
         if self.use_mock_data:
-            return mock_market.place_short_order(symbol, amount, price)
+            result = mock_market.place_short_order(symbol, amount, price)
+            if client_order_id:
+                result["client_order_id"] = client_order_id
+            return result
         
         # 调整精度
         amount = self._adjust_precision(symbol, amount)
@@ -490,15 +660,18 @@ class AsterDEXClient:
             "side": "SELL",                    # 卖出方向（做空）
             "type": "MARKET" if price is None else "LIMIT",
             "quantity": amount,
+            "newOrderRespType": "RESULT",
         }
-        
+        if client_order_id:
+            params["newClientOrderId"] = client_order_id
+
         # 如果交易所支持positionSide，可以取消注释
         # params["positionSide"] = "SHORT"
         
         # 限价单需要价格
         if price is not None:
             params["price"] = price
-            params["timeInForce"] = "GTC"
+            params["timeInForce"] = time_in_force
         
         try:
             logger.info(f"📉 提交做空订单: {symbol} {amount}")
@@ -520,10 +693,12 @@ class AsterDEXClient:
                 return {
                     "success": True,
                     "order_id": str(result.get('orderId')),
+                    "client_order_id": result.get('clientOrderId', client_order_id),
                     "side": "short",
                     **result
                 }
             elif isinstance(result, dict) and 'code' in result:
+                record_exchange_error(endpoint="place_short_order", error="api_error")
                 error_code = result.get('code')
                 error_msg = result.get('msg', '未知错误')
                 logger.error(f"❌ 做空失败 [{error_code}]: {error_msg}")
@@ -543,25 +718,29 @@ class AsterDEXClient:
                         return {
                             "success": True,
                             "order_id": str(retry_result.get('orderId')),
+                            "client_order_id": retry_result.get('clientOrderId', client_order_id),
                             "side": "short",
                             **retry_result
                         }
                 
-                return {"success": False, "error": error_msg}
+                return {"success": False, "code": error_code, "error": error_msg}
             else:
                 logger.warning(f"⚠️  做空响应格式未知: {result}")
                 return {"success": False, "error": "响应格式未知", "response": result}
         except ClientError as e:
+            record_exchange_error(endpoint="place_short_order", error=type(e).__name__)
             logger.error(f"❌ 做空客户端错误: {e.error_message}")
             logger.error(f"   错误代码: {e.error_code}")
             logger.error(f"   参数: {params}")
             return {"success": False, "error": f"客户端错误[{e.error_code}]: {e.error_message}"}
         except ServerError as e:
+            record_exchange_error(endpoint="place_short_order", error=type(e).__name__)
             logger.error(f"❌ 做空服务器错误: {e}")
             logger.error(f"   状态码: {e.status_code}")
             logger.error(f"   参数: {params}")
             return {"success": False, "error": f"服务器错误[{e.status_code}]: {str(e)}"}
         except Exception as e:
+            record_exchange_error(endpoint="place_short_order", error=type(e).__name__)
             logger.error(f"❌ 做空异常: {e}")
             logger.error(f"   异常类型: {type(e).__name__}")
             logger.error(f"   参数: {params}")
@@ -569,6 +748,7 @@ class AsterDEXClient:
             logger.error(f"   堆栈: {traceback.format_exc()}")
             return {"success": False, "error": f"{type(e).__name__}: {str(e)}"}
     
+    @instrument_exchange
     async def close_position(self, symbol: str) -> Dict:
         """平仓 - 使用官方SDK或手动平仓"""
         if self.use_mock_data:
@@ -595,8 +775,14 @@ class AsterDEXClient:
                 # SDK没有close_position方法，使用手动平仓方案
                 logger.info("ℹ️  SDK没有close_position方法，使用手动平仓")
                 
-                # 1. 获取当前持仓
-                positions = await self.get_open_positions(symbol=symbol)
+                # 1. 获取当前持仓（用户数据流在线时读内存账户簿）
+                from backend.exchanges.user_stream import user_stream
+                if user_stream.is_live():
+                    positions = user_stream.get_positions(symbol)
+                else:
+                    positions = await self.get_open_positions(symbol=symbol)
+                    if positions is None:
+                        return {"success": False, "error": f"持仓查询失败: {symbol}"}
                 
                 # 2. 找到对应symbol的持仓
                 target_position = None
@@ -640,37 +826,148 @@ class AsterDEXClient:
                     return {"success": False, "error": error_msg}
                 
         except Exception as e:
+            record_exchange_error(endpoint="close_position", error=type(e).__name__)
             logger.error(f"❌ 平仓异常: {e}")
             import traceback
             logger.error(f"   堆栈: {traceback.format_exc()}")
             return {"success": False, "error": str(e)}
     
-    async def get_order_status(self, order_id: str) -> Dict:
-        """查询订单状态 - 使用官方SDK"""
+    @instrument_exchange
+    async def get_order_status(
+        self,
+        order_id: Optional[str] = None,
+        symbol: Optional[str] = None,
+        client_order_id: Optional[str] = None
+    ) -> Dict:
+        """
+        查询订单状态 - 使用官方SDK
+
+        按交易所订单ID或客户端订单ID查询（二选一，合约接口还需要symbol）。
+        下单请求超时等情况下，用客户端订单ID确认交易所是否已接受该订单。
+        """
         if self.use_mock_data:
-            return {"success": True, "status": "FILLED"}
+            return {"success": True, "status": "FILLED", "orderId": order_id, "clientOrderId": client_order_id}
+        
+        params = {"symbol": symbol} if symbol else {}
+        if order_id:
+            params["orderId"] = order_id
+        else:
+            params["origClientOrderId"] = client_order_id
         
         try:
-            logger.debug(f"📊 查询订单状态: {order_id}")
+            logger.debug(f"📊 查询订单状态: {order_id or client_order_id}")
             
             # 在线程池中运行同步SDK调用
             def query_order():
-                return self.client.query_order(orderId=order_id)
+                return self.client.query_order(**params)
             
             result = await asyncio.to_thread(query_order)
             
             if isinstance(result, dict) and 'orderId' in result:
-                logger.debug(f"✅ 订单查询成功: {order_id}")
+                logger.debug(f"✅ 订单查询成功: {order_id or client_order_id}")
                 return {"success": True, **result}
+            elif isinstance(result, dict) and 'code' in result:
+                # -2013: 订单不存在（下单请求未到达交易所）
+                return {"success": False, "code": result.get('code'), "error": result.get('msg', '未知错误')}
             else:
                 logger.warning(f"⚠️  订单查询响应格式未知: {result}")
                 return result
+        except ClientError as e:
+            # 订单不存在属于正常的查询结果，不计入交易所错误
+            if e.error_code != -2013:
+                record_exchange_error(endpoint="get_order_status", error=type(e).__name__)
+            logger.debug(f"订单查询失败: [{e.error_code}] {e.error_message}")
+            return {"success": False, "code": e.error_code, "error": e.error_message}
         except Exception as e:
+            record_exchange_error(endpoint="get_order_status", error=type(e).__name__)
             logger.error(f"❌ 查询订单失败: {e}")
             return {"success": False, "error": str(e)}
     
-    async def get_open_positions(self, symbol: str = None) -> List[Dict]:
-        """获取当前持仓 - 使用官方SDK"""
+    @instrument_exchange
+    async def cancel_order(
+        self,
+        symbol: str,
+        order_id: Optional[str] = None,
+        client_order_id: Optional[str] = None
+    ) -> Dict:
+        """撤单 - 按交易所订单ID或客户端订单ID（二选一）"""
+        if self.use_mock_data:
+            # 模拟模式下单即成交，没有可撤的挂单
+            return {"success": False, "code": -2011, "error": "Unknown order sent."}
+        
+        params = {"symbol": symbol}
+        if order_id:
+            params["orderId"] = order_id
+        else:
+            params["origClientOrderId"] = client_order_id
+        
+        try:
+            def submit_cancel():
+                return self.client.cancel_order(**params)
+            
+            result = await asyncio.to_thread(submit_cancel)
+            
+            if isinstance(result, dict) and 'orderId' in result:
+                logger.debug(f"✅ 撤单成功: {symbol} {order_id or client_order_id}")
+                return {"success": True, **result}
+            elif isinstance(result, dict) and 'code' in result:
+                return {"success": False, "code": result.get('code'), "error": result.get('msg', '未知错误')}
+            else:
+                logger.warning(f"⚠️  撤单响应格式未知: {result}")
+                return {"success": False, "error": "响应格式未知"}
+        except ClientError as e:
+            # -2011: 订单已成交或已撤销，属于正常竞态
+            if e.error_code != -2011:
+                record_exchange_error(endpoint="cancel_order", error=type(e).__name__)
+            logger.debug(f"撤单失败: [{e.error_code}] {e.error_message}")
+            return {"success": False, "code": e.error_code, "error": e.error_message}
+        except Exception as e:
+            record_exchange_error(endpoint="cancel_order", error=type(e).__name__)
+            logger.error(f"❌ 撤单失败: {e}")
+            return {"success": False, "error": str(e)}
+    
+    @instrument_exchange
+    async def get_order_fills(self, symbol: str, order_id: str) -> List[Dict]:
+        """
+        查询订单的逐笔成交（成交价、数量、手续费）
+        
+        Returns:
+            [{"price": float, "qty": float, "commission": float, "commission_asset": str}, ...]
+        """
+        if self.use_mock_data:
+            return []
+        
+        try:
+            def query_fills():
+                return self.client.get_account_trades(symbol=symbol, orderId=order_id)
+            
+            result = await asyncio.to_thread(query_fills)
+            
+            if not isinstance(result, list):
+                logger.warning(f"⚠️  成交查询响应格式未知: {result}")
+                return []
+            return [
+                {
+                    "price": float(fill.get('price', 0)),
+                    "qty": float(fill.get('qty', 0)),
+                    "commission": float(fill.get('commission', 0)),
+                    "commission_asset": fill.get('commissionAsset', ''),
+                }
+                for fill in result
+            ]
+        except Exception as e:
+            record_exchange_error(endpoint="get_order_fills", error=type(e).__name__)
+            logger.error(f"❌ 查询成交明细失败: {symbol} {order_id} - {e}")
+            return []
+    
+    @instrument_exchange
+    async def get_open_positions(self, symbol: str = None) -> Optional[List[Dict]]:
+        """
+        获取当前持仓 - 使用官方SDK
+
+        Returns:
+            持仓列表（无持仓时为空列表）；查询失败返回 None，调用方不能把失败当作"没有持仓"
+        """
         if self.use_mock_data:
             return mock_market.get_open_positions()
         
@@ -685,10 +982,11 @@ class AsterDEXClient:
             
             # 检查是否返回错误
             if isinstance(result, dict) and 'code' in result:
+                record_exchange_error(endpoint="get_open_positions", error="api_error")
                 error_code = result.get('code')
                 error_msg = result.get('msg', '未知错误')
                 logger.error(f"❌ 持仓查询错误: [{error_code}] {error_msg}")
-                return []
+                return None
             
             # 解析持仓数据
             if isinstance(result, list):
@@ -707,30 +1005,77 @@ class AsterDEXClient:
                             "current_price": float(pos.get('markPrice', 0)),
                             "unrealized_pnl": float(pos.get('unRealizedProfit', 0)),
                             "position_type": "short" if pos_amt < 0 else "long",
-                            "total_value": entry_price_value * float(pos.get('positionAmt', 0))
+                            "total_value": entry_price_value * abs(pos_amt)
                         })
                 
                 if positions_data:
-                    logger.info(f"✅ 获取到{len(positions_data)}个持仓")
+                    logger.debug("✅ 获取到{}个持仓", len(positions_data))
                     for pos in positions_data:
-                        logger.info(f"   {pos['symbol']}: {pos['amount']:.4f} @ ${pos['average_price']:.2f} (未实现盈亏: ${pos['unrealized_pnl']:.2f})")
+                        logger.debug(
+                            "   {}: {:.4f} @ ${:.2f} (未实现盈亏: ${:.2f})",
+                            pos['symbol'], pos['amount'], pos['average_price'], pos['unrealized_pnl']
+                        )
                 else:
-                    logger.info("ℹ️  当前无持仓")
+                    logger.debug("ℹ️  当前无持仓")
                 
                 return positions_data
             else:
+                record_exchange_error(endpoint="get_open_positions", error="bad_response")
                 logger.warning(f"⚠️ 持仓响应格式未知: {result}")
-                return []
+                return None
         except ClientError as e:
+            record_exchange_error(endpoint="get_open_positions", error=type(e).__name__)
             logger.error(f"❌ 客户端错误: {e.error_message}")
-            return []
+            return None
         except ServerError as e:
+            record_exchange_error(endpoint="get_open_positions", error=type(e).__name__)
             logger.error(f"❌ 服务器错误: {e}")
-            return []
+            return None
         except Exception as e:
+            record_exchange_error(endpoint="get_open_positions", error=type(e).__name__)
             logger.error(f"获取持仓失败: {e}")
-            return []
+            return None
+    
+    async def create_listen_key(self) -> Optional[str]:
+        """创建用户数据流listenKey（60分钟内未续期则失效）"""
+        if self.use_mock_data:
+            return None
+        
+        try:
+            result = await asyncio.to_thread(self.client.new_listen_key)
+            if isinstance(result, dict) and result.get('listenKey'):
+                return result['listenKey']
+            logger.warning(f"⚠️  listenKey响应格式未知: {result}")
+            return None
+        except Exception as e:
+            record_exchange_error(endpoint="create_listen_key", error=type(e).__name__)
+            logger.error(f"❌ 创建listenKey失败: {e}")
+            return None
+    
+    async def keepalive_listen_key(self, listen_key: str) -> bool:
+        """续期listenKey"""
+        if self.use_mock_data:
+            return False
+        
+        try:
+            await asyncio.to_thread(self.client.renew_listen_key, listen_key)
+            return True
+        except Exception as e:
+            record_exchange_error(endpoint="keepalive_listen_key", error=type(e).__name__)
+            logger.error(f"❌ listenKey续期失败: {e}")
+            return False
+    
+    async def close_listen_key(self, listen_key: str):
+        """关闭用户数据流"""
+        if self.use_mock_data:
+            return
+        
+        try:
+            await asyncio.to_thread(self.client.close_listen_key, listen_key)
+        except Exception as e:
+            logger.debug(f"关闭listenKey失败: {e}")
     
+    @instrument_exchange
     async def get_order_book(self, symbol: str, limit: int = 20) -> Dict:
         """获取订单簿数据"""
         if self.use_mock_data:
@@ -743,16 +1088,18 @@ class AsterDEXClient:
             result = await asyncio.to_thread(get_depth)
             
             if isinstance(result, dict) and 'bids' in result and 'asks' in result:
-                logger.info(f"获取订单簿成功: {symbol}")
+                logger.debug("获取订单簿成功: {}", symbol)
                 return result
             else:
                 logger.warning(f"订单簿数据格式异常: {result}")
                 return {'bids': [], 'asks': []}
                 
         except Exception as e:
+            record_exchange_error(endpoint="get_order_book", error=type(e).__name__)
             logger.error(f"获取订单簿失败: {e}")
             return {'bids': [], 'asks': []}
 
+    @instrument_exchange
     async def get_supported_symbols(self) -> List[str]:
         """获取所有支持的交易对 - 使用官方SDK"""
         if self.use_mock_data:
@@ -770,6 +1117,7 @@ class AsterDEXClient:
                 return [s for s in result['symbols'] if s.get('status') == 'TRADING']
             return result.get('symbols', [])
         except Exception as e:
+            record_exchange_error(endpoint="get_supported_symbols", error=type(e).__name__)
             logger.error(f"获取交易对列表失败: {e}")
             # 返回一些常见的加密货币作为默认值
             return [
@@ -778,6 +1126,7 @@ class AsterDEXClient:
                 "LINK/USDT", "UNI/USDT", "ATOM/USDT", "LTC/USDT", "ETC/USDT"
             ]
     
+    @instrument_exchange
     async def get_klines(self, symbol: str, interval: str = "1h", limit: int = 100) -> List[Dict]:
         """
         获取K线数据 - 使用官方SDK
@@ -791,11 +1140,11 @@ class AsterDEXClient:
             K线数据字典数组，格式：[{timestamp, open, high, low, close, volume, ...}, ...]
         """
         if self.use_mock_data:
-            logger.debug(f"📊 模拟模式：生成K线数据 {symbol} {interval} x{limit}")
+            logger.debug("📊 模拟模式：生成K线数据 {} {} x{}", symbol, interval, limit)
             return mock_market.get_klines(symbol, interval, limit)
         
         try:
-            logger.info(f"📊 真实模式：使用官方SDK获取K线数据 {symbol} {interval} x{limit}")
+            logger.debug("📊 真实模式：使用官方SDK获取K线数据 {} {} x{}", symbol, interval, limit)
             
             # 在线程池中运行同步SDK调用
             def get_kline_data():
@@ -807,15 +1156,15 @@ class AsterDEXClient:
             
             # 检查API是否返回错误
             if isinstance(result, dict) and 'code' in result:
+                record_exchange_error(endpoint="get_klines", error="api_error")
                 error_code = result.get('code')
                 error_msg = result.get('msg', '未知错误')
                 logger.error(f"❌ AsterDEX API错误: [{error_code}] {error_msg}")
-                logger.warning(f"⚠️  使用模拟数据作为后备")
-                return mock_market.get_klines(symbol, interval, limit)
+                return self._klines_fallback(symbol, interval, limit)
             
             # 检查返回的数据格式并转换为字典格式
             if isinstance(result, list) and len(result) > 0:
-                logger.info(f"✅ 成功获取K线数据: {symbol} {interval} x{len(result)}")
+                logger.debug("✅ 成功获取K线数据: {} {} x{}", symbol, interval, len(result))
                 
                 # 将列表格式转换为字典格式
                 klines_dict = []
@@ -842,22 +1191,37 @@ class AsterDEXClient:
                 
                 return klines_dict
             else:
-                logger.warning(f"⚠️  K线数据为空或格式异常，使用模拟数据")
-                return mock_market.get_klines(symbol, interval, limit)
+                logger.warning(f"⚠️  K线数据为空或格式异常: {symbol} {interval}")
+                mark_failed("empty_klines")
+                return self._klines_fallback(symbol, interval, limit)
                 
         except ClientError as e:
+            record_exchange_error(endpoint="get_klines", error=type(e).__name__)
             logger.error(f"❌ 客户端错误: {e.error_message if hasattr(e, 'error_message') else e}")
-            logger.warning(f"⚠️  使用模拟数据作为后备")
-            return mock_market.get_klines(symbol, interval, limit)
+            return self._klines_fallback(symbol, interval, limit)
         except ServerError as e:
+            record_exchange_error(endpoint="get_klines", error=type(e).__name__)
             logger.error(f"❌ 服务器错误: {e}")
-            logger.warning(f"⚠️  使用模拟数据作为后备")
-            return mock_market.get_klines(symbol, interval, limit)
+            return self._klines_fallback(symbol, interval, limit)
         except Exception as e:
+            record_exchange_error(endpoint="get_klines", error=type(e).__name__)
             logger.error(f"❌ 获取K线数据失败: {e}")
-            logger.warning(f"⚠️  使用模拟数据作为后备")
-            return mock_market.get_klines(symbol, interval, limit)
+            return self._klines_fallback(symbol, interval, limit)
+    
+    def _klines_fallback(self, symbol: str, interval: str, limit: int) -> List[Dict]:
+        """
+        真实模式下K线获取失败的处理
+        
+        默认返回空列表（调用方跳过该交易对），不用模拟K线冒充真实行情；
+        EXCHANGE_MOCK_FALLBACK=true 时保留旧行为，用模拟数据填充
+        """
+        if not settings.exchange_mock_fallback:
+            return []
+        logger.warning(f"⚠️  使用模拟数据作为后备: {symbol} {interval}")
+        MOCK_FALLBACKS.inc(endpoint="get_klines")
+        return mock_market.get_klines(symbol, interval, limit)
     
+    @instrument_exchange
     async def get_commission_rate(self, symbol: str) -> Dict:
         """
         获取交易对手续费率 - 使用官方SDK
@@ -881,7 +1245,7 @@ class AsterDEXClient:
             }
         
         try:
-            logger.info(f"📊 获取手续费率: {symbol}")
+            logger.debug("📊 获取手续费率: {}", symbol)
             
             # 在线程池中运行同步SDK调用
             def get_commission():
@@ -891,6 +1255,7 @@ class AsterDEXClient:
             
             # 检查API是否返回错误
             if isinstance(result, dict) and 'code' in result:
+                record_exchange_error(endpoint="get_commission_rate", error="api_error")
                 error_code = result.get('code')
                 error_msg = result.get('msg', '未知错误')
                 logger.error(f"❌ 获取手续费率错误: [{error_code}] {error_msg}")
@@ -903,7 +1268,7 @@ class AsterDEXClient:
             
             # 返回手续费率信息
             if isinstance(result, dict):
-                logger.info(f"✅ 成功获取手续费率: {symbol}")
+                logger.debug("✅ 成功获取手续费率: {}", symbol)
                 logger.debug(f"   Maker: {result.get('makerCommissionRate', 'N/A')}")
                 logger.debug(f"   Taker: {result.get('takerCommissionRate', 'N/A')}")
                 return result
@@ -916,6 +1281,7 @@ class AsterDEXClient:
                 }
                 
         except ClientError as e:
+            record_exchange_error(endpoint="get_commission_rate", error=type(e).__name__)
             logger.error(f"❌ 客户端错误: {e.error_message if hasattr(e, 'error_message') else e}")
             return {
                 "symbol": symbol,
@@ -923,6 +1289,7 @@ class AsterDEXClient:
                 "takerCommissionRate": "0.0004"
             }
         except ServerError as e:
+            record_exchange_error(endpoint="get_commission_rate", error=type(e).__name__)
             logger.error(f"❌ 服务器错误: {e}")
             return {
                 "symbol": symbol,
@@ -930,6 +1297,7 @@ class AsterDEXClient:
                 "takerCommissionRate": "0.0004"
             }
         except Exception as e:
+            record_exchange_error(endpoint="get_commission_rate", error=type(e).__name__)
             logger.error(f"❌ 获取手续费率失败: {e}")
             return {
                 "symbol": symbol,
@@ -0,0 +1,429 @@
+"""
+订单簿快照服务
+
+为关注的交易对维护本地订单簿，决策和下单直接读取，不再每次REST拉取：
+- 实盘：订阅增量深度流（<symbol>@depth@100ms），用REST快照 + 更新ID衔接，
+  发现断档（pu 与上一条 u 不一致）时重新拉快照同步
+- 模拟模式或增量流不可用：定时任务按 ORDER_BOOK_REFRESH_INTERVAL 用REST刷新
+
+盘口特征用numpy按档位向量化计算：前N档买卖量不平衡、微观价格、
+指定金额市价成交的预估滑点、中间价±X基点内的挂单金额。
+"""
+import asyncio
+import heapq
+import json
+import time
+from typing import Dict, Iterable, List, Optional
+
+import aiohttp
+import numpy as np
+from loguru import logger
+
+from backend.config import settings
+from backend.exchanges.aster_dex import aster_client
+from backend.monitoring.metrics import ORDER_BOOK_UPDATES
+
+# 同一交易对两次重新同步的最小间隔（秒），避免断档时反复拉快照
+RESYNC_COOLDOWN = 1.0
+# 并发REST刷新数量上限
+REFRESH_CONCURRENCY = 5
+
+
+def estimate_slippage_bps(levels: np.ndarray, mid: float, notional: float) -> Optional[float]:
+    """
+    按档位吃掉 notional 金额，返回成交均价相对中间价的滑点（基点，不利方向为正）
+
+    Args:
+        levels: [[价格, 数量], ...]，从最优价开始
+    Returns:
+        可见深度不足以成交时返回None
+    """
+    if notional <= 0 or mid <= 0 or len(levels) == 0:
+        return 0.0
+    px, qty = levels[:, 0], levels[:, 1]
+    cum = np.cumsum(px * qty)
+    if cum[-1] < notional:
+        return None
+    i = int(np.searchsorted(cum, notional))
+    filled_qty = qty[:i].sum() + (notional - (cum[i - 1] if i else 0.0)) / px[i]
+    vwap = notional / filled_qty
+    return float(abs(vwap - mid) / mid * 1e4)
+
+
+def max_notional_within(levels: np.ndarray, mid: float, max_bps: float, side: str) -> float:
+    """预估滑点不超过 max_bps 时最多可以市价成交的金额（side=buy 时 levels 为卖盘）"""
+    if mid <= 0 or len(levels) == 0:
+        return 0.0
+    px, qty = levels[:, 0], levels[:, 1]
+    cum_notional = np.cumsum(px * qty)
+    cum_qty = np.cumsum(qty)
+    ok = np.abs(cum_notional / cum_qty - mid) / mid * 1e4 <= max_bps
+    # 吃单越深均价越差，ok 是前缀为True的序列
+    k = len(ok) if ok.all() else int(np.argmin(ok))
+    if k == len(levels):
+        return float(cum_notional[-1])
+    # 第k档只吃一部分：解 (N + x) / (Q + x / p) = 目标均价
+    notional = cum_notional[k - 1] if k else 0.0
+    filled = cum_qty[k - 1] if k else 0.0
+    target = mid * (1 + (max_bps if side == "buy" else -max_bps) / 1e4)
+    partial = (target * filled - notional) / (1 - target / px[k])
+    return float(notional + max(partial, 0.0))
+
+
+def book_features(
+    bids: np.ndarray,
+    asks: np.ndarray,
+    levels: int,
+    depth_bps: float,
+    notional: Optional[float] = None
+) -> Dict:
+    """由买卖盘档位计算盘口特征（bids/asks 为 [[价格, 数量], ...]，从最优价开始）"""
+    if len(bids) == 0 or len(asks) == 0:
+        return {}
+    best_bid, best_ask = float(bids[0, 0]), float(asks[0, 0])
+    bid_qty, ask_qty = float(bids[0, 1]), float(asks[0, 1])
+    mid = (best_bid + best_ask) / 2
+
+    top_bid = float(bids[:levels, 1].sum())
+    top_ask = float(asks[:levels, 1].sum())
+    imbalance = (top_bid - top_ask) / (top_bid + top_ask) if top_bid + top_ask > 0 else 0.0
+    # 微观价格：按对手盘数量加权，买一量大时偏向卖一价
+    microprice = (best_ask * bid_qty + best_bid * ask_qty) / (bid_qty + ask_qty) if bid_qty + ask_qty > 0 else mid
+
+    band = mid * depth_bps / 1e4
+    bid_mask = bids[:, 0] >= mid - band
+    ask_mask = asks[:, 0] <= mid + band
+    features = {
+        "best_bid": best_bid,
+        "best_ask": best_ask,
+        "mid": mid,
+        "spread": best_ask - best_bid,
+        "spread_bps": (best_ask - best_bid) / mid * 1e4,
+        "imbalance": imbalance,
+        "microprice": microprice,
+        "depth_bps": depth_bps,
+        "bid_depth": float((bids[bid_mask, 0] * bids[bid_mask, 1]).sum()),
+        "ask_depth": float((asks[ask_mask, 0] * asks[ask_mask, 1]).sum()),
+    }
+    if notional:
+        features["notional"] = notional
+        features["buy_slippage_bps"] = estimate_slippage_bps(asks, mid, notional)
+        features["sell_slippage_bps"] = estimate_slippage_bps(bids, mid, notional)
+    return features
+
+
+class LocalBook:
+    """单个交易对的本地订单簿（价格 -> 数量）"""
+
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self.bids: Dict[float, float] = {}
+        self.asks: Dict[float, float] = {}
+        self.last_update_id = 0
+        self.synced = False  # 已与增量流衔接，之后的变化都由推送更新
+        self.source = "rest"
+        self.updated_at: Optional[float] = None
+        self._arrays = None  # (深度, bids, asks) 缓存，簿有变化时清空
+
+    def load_snapshot(self, book: Dict):
+        """REST快照整体替换（衔接增量流前 synced=False）"""
+        self.bids = {float(p): float(q) for p, q, *_ in book.get("bids", []) if float(q) > 0}
+        self.asks = {float(p): float(q) for p, q, *_ in book.get("asks", []) if float(q) > 0}
+        self.last_update_id = int(book.get("lastUpdateId", 0))
+        self.synced = False
+        self.source = "rest"
+        self.updated_at = time.time()
+        self._arrays = None
+
+    def apply_diff(self, event: Dict) -> bool:
+        """
+        应用一条 depthUpdate，返回False表示与本地簿断档需要重新同步
+
+        衔接规则：丢弃 u < lastUpdateId 的事件；第一条须满足 U <= lastUpdateId <= u；
+        之后每条的 pu 必须等于上一条的 u
+        """
+        first, last = int(event["U"]), int(event["u"])
+        if last < self.last_update_id:
+            return True
+        if self.synced:
+            if int(event.get("pu", -1)) != self.last_update_id:
+                return False
+        elif first > self.last_update_id:
+            return False
+
+        for side, changes in ((self.bids, event.get("b", [])), (self.asks, event.get("a", []))):
+            for p, q in changes:
+                price, qty = float(p), float(q)
+                if qty == 0:
+                    side.pop(price, None)
+                else:
+                    side[price] = qty
+        self.last_update_id = last
+        self.synced = True
+        self.source = "stream"
+        self.updated_at = time.time()
+        self._arrays = None
+        return True
+
+    def arrays(self, depth: int):
+        """前 depth 档的 (bids, asks) 数组，形如 [[价格, 数量], ...]"""
+        if self._arrays is None or self._arrays[0] != depth:
+            bids = heapq.nlargest(depth, self.bids.items())
+            asks = heapq.nsmallest(depth, self.asks.items())
+            self._arrays = (
+                depth,
+                np.array(bids, dtype=float).reshape(-1, 2),
+                np.array(asks, dtype=float).reshape(-1, 2),
+            )
+        return self._arrays[1], self._arrays[2]
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.updated_at if self.updated_at else float("inf")
+
+
+class OrderBookService:
+    """本地订单簿和盘口特征"""
+
+    def __init__(self):
+        self.books: Dict[str, LocalBook] = {}
+        self.watched: set = set()
+        self.connected = False
+        self.events = 0
+        self.resyncs = 0
+        self.reconnects = 0
+        self._subscribed: set = set()
+        self._resyncing: Dict[str, List[Dict]] = {}  # 同步中的交易对 -> 缓冲的增量事件
+        self._last_resync: Dict[str, float] = {}
+        self._ws: Optional[aiohttp.ClientWebSocketResponse] = None
+        self._task: Optional[asyncio.Task] = None
+        self._request_id = 0
+
+    @property
+    def stream_enabled(self) -> bool:
+        return settings.order_book_stream_enabled and not aster_client.use_mock_data
+
+    def watch(self, symbols: Iterable[str]):
+        """设置关注的交易对（交易周期开始时调用），不再关注的本地簿会被丢弃"""
+        symbols = {s for s in symbols if s}
+        for symbol in self.watched - symbols:
+            self.books.pop(symbol, None)
+        self.watched = symbols
+        if self.connected:
+            asyncio.create_task(self._sync_subscriptions())
+
+    def _is_fresh(self, book: Optional[LocalBook], max_age: float) -> bool:
+        if book is None or book.updated_at is None:
+            return False
+        return (book.synced and self.connected) or book.age <= max_age
+
+    async def get_book(self, symbol: str, max_age: Optional[float] = None) -> Optional[LocalBook]:
+        """返回本地簿；不存在或超过 max_age 未更新（且未衔接增量流）时用REST刷新"""
+        max_age = settings.order_book_max_age if max_age is None else max_age
+        book = self.books.get(symbol)
+        if self._is_fresh(book, max_age):
+            return book
+        return await self._refresh(symbol)
+
+    async def snapshot(self, symbol: str, limit: int = 20, max_age: Optional[float] = None) -> Dict:
+        """与 aster_client.get_order_book 相同格式的订单簿"""
+        book = await self.get_book(symbol, max_age)
+        if book is None:
+            return {"bids": [], "asks": []}
+        bids, asks = book.arrays(limit)
+        return {"bids": bids.tolist(), "asks": asks.tolist()}
+
+    async def features(self, symbol: str, notional: Optional[float] = None, max_age: Optional[float] = None) -> Dict:
+        """
+        盘口特征（关注的交易对通常直接读本地簿，没有额外的REST请求）
+
+        Returns:
+            best_bid/best_ask/mid/spread/spread_bps/imbalance/microprice/bid_depth/ask_depth，
+            传 notional 时附带 buy_slippage_bps/sell_slippage_bps；盘口不可用时返回空字典
+        """
+        book = await self.get_book(symbol, max_age)
+        if book is None:
+            return {}
+        bids, asks = book.arrays(settings.order_book_depth)
+        features = book_features(
+            bids, asks, settings.order_book_feature_levels, settings.order_book_depth_bps, notional
+        )
+        if features:
+            features.update({"symbol": symbol, "source": book.source, "age": round(book.age, 3)})
+        return features
+
+    async def max_notional(self, symbol: str, side: str, max_bps: float) -> Optional[float]:
+        """预估滑点不超过 max_bps 时最多可以市价成交的金额，盘口不可用时返回None"""
+        book = await self.get_book(symbol)
+        if book is None:
+            return None
+        bids, asks = book.arrays(settings.order_book_depth)
+        if len(bids) == 0 or len(asks) == 0:
+            return None
+        mid = (bids[0, 0] + asks[0, 0]) / 2
+        return max_notional_within(asks if side == "buy" else bids, mid, max_bps, side)
+
+    async def _refresh(self, symbol: str) -> Optional[LocalBook]:
+        """REST拉取快照写入本地簿，失败时返回旧簿（没有则None）"""
+        data = await aster_client.get_order_book(symbol, limit=settings.order_book_depth)
+        book = self.books.get(symbol)
+        if not data.get("bids") or not data.get("asks"):
+            return book
+        if book is None:
+            book = LocalBook(symbol)
+            if symbol in self.watched:
+                self.books[symbol] = book
+        book.load_snapshot(data)
+        ORDER_BOOK_UPDATES.inc(source="rest")
+        return book
+
+    async def refresh_stale(self):
+        """定时任务：REST刷新未衔接增量流且已过期的关注交易对"""
+        stale = [
+            symbol for symbol in self.watched
+            if not self._is_fresh(self.books.get(symbol), settings.order_book_refresh_interval)
+            and symbol not in self._resyncing
+        ]
+        if not stale:
+            return
+        semaphore = asyncio.Semaphore(REFRESH_CONCURRENCY)
+
+        async def refresh(symbol):
+            async with semaphore:
+                await self._refresh(symbol)
+
+        await asyncio.gather(*(refresh(s) for s in stale), return_exceptions=True)
+
+    def start(self):
+        if not self.stream_enabled:
+            logger.info("ℹ️  订单簿增量流未启用（模拟模式或 ORDER_BOOK_STREAM_ENABLED=false），定时REST刷新")
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="order-book-stream")
+
+    async def _run(self):
+        backoff = 1.0
+        while True:
+            try:
+                async with aiohttp.ClientSession() as session:
+                    async with session.ws_connect(settings.aster_dex_ws_url, heartbeat=60) as ws:
+                        self._ws = ws
+                        self.connected = True
+                        backoff = 1.0
+                        logger.info("📚 订单簿增量流已连接")
+                        await self._sync_subscriptions()
+                        async for msg in ws:
+                            if msg.type == aiohttp.WSMsgType.TEXT:
+                                self.handle_message(msg.data)
+                            elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                                break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ 订单簿增量流异常: {e}")
+            finally:
+                self.connected = False
+                self._ws = None
+                self._subscribed.clear()
+                # 断线期间的变化无法衔接，已同步的簿退回REST刷新
+                for book in self.books.values():
+                    book.synced = False
+
+            self.reconnects += 1
+            logger.warning(f"🔌 订单簿增量流断开，{backoff:.0f}s后重连（期间定时REST刷新）")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60.0)
+
+    async def _sync_subscriptions(self):
+        """按关注列表订阅/取消订阅增量深度流"""
+        if self._ws is None:
+            return
+        add, remove = self.watched - self._subscribed, self._subscribed - self.watched
+        for method, symbols in (("SUBSCRIBE", add), ("UNSUBSCRIBE", remove)):
+            if not symbols:
+                continue
+            self._request_id += 1
+            params = [f"{s.lower()}@depth@100ms" for s in sorted(symbols)]
+            try:
+                await self._ws.send_str(json.dumps({"method": method, "params": params, "id": self._request_id}))
+            except Exception as e:
+                logger.warning(f"⚠️ 订单簿订阅更新失败: {e}")
+                return
+        self._subscribed = set(self.watched)
+
+    def handle_message(self, raw: str):
+        try:
+            event = json.loads(raw)
+        except ValueError:
+            logger.debug(f"订单簿推送消息无法解析: {raw[:200]}")
+            return
+        if event.get("e") != "depthUpdate":
+            return  # 订阅应答等
+        self.events += 1
+        symbol = event.get("s")
+        if symbol not in self.watched:
+            return
+        if symbol in self._resyncing:
+            self._resyncing[symbol].append(event)
+            return
+        book = self.books.get(symbol)
+        if book is not None and book.apply_diff(event):
+            ORDER_BOOK_UPDATES.inc(source="stream")
+            return
+        if book is not None:
+            book.synced = False  # 断档后按更新时间判断新鲜度，直到重新衔接
+        self._start_resync(symbol, event)
+
+    def _start_resync(self, symbol: str, event: Dict):
+        """缓冲增量事件并拉取REST快照重新衔接（距上次同步不足 RESYNC_COOLDOWN 时延后拉取）"""
+        now = time.time()
+        delay = max(0.0, self._last_resync.get(symbol, 0.0) + RESYNC_COOLDOWN - now)
+        self._last_resync[symbol] = now + delay
+        self._resyncing[symbol] = [event]
+        asyncio.create_task(self._resync(symbol, delay))
+
+    async def _resync(self, symbol: str, delay: float = 0.0):
+        try:
+            if delay:
+                await asyncio.sleep(delay)
+            self.resyncs += 1
+            ORDER_BOOK_UPDATES.inc(source="resync")
+            book = await self._refresh(symbol)
+        finally:
+            buffered = self._resyncing.pop(symbol, [])
+        if book is None:
+            return
+        for event in buffered:
+            if not book.apply_diff(event):
+                logger.debug(f"订单簿 {symbol} 快照与缓冲的增量事件未衔接，等待下一次同步")
+                book.synced = False
+                return
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def get_status(self) -> Dict:
+        return {
+            "stream_enabled": self.stream_enabled,
+            "connected": self.connected,
+            "events": self.events,
+            "resyncs": self.resyncs,
+            "reconnects": self.reconnects,
+            "watched": sorted(self.watched),
+            "books": {
+                symbol: {
+                    "source": book.source,
+                    "synced": book.synced,
+                    "age": round(book.age, 3),
+                    "levels": [len(book.bids), len(book.asks)],
+                }
+                for symbol, book in self.books.items()
+            },
+        }
+
+
+# 全局订单簿服务实例
+order_book_service = OrderBookService()
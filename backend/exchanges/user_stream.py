@@ -0,0 +1,294 @@
+"""
+用户数据流（listenKey）
+
+交易所通过WebSocket推送账户变化，代替每个周期多次轮询 get_position_risk / account：
+- ORDER_TRADE_UPDATE: 订单状态和逐笔成交，转发给订单管理器
+- ACCOUNT_UPDATE: 余额和持仓变化，写入内存账户簿
+- listenKeyExpired: listenKey失效，重新创建并重连
+
+listenKey 60分钟内未续期会失效，由定时任务续期。每次连上后先用REST拉一次快照，
+之后按固定间隔REST对账（修正推送丢失）。连接断开或长时间未对账时，
+is_live() 返回False，调用方回退到REST查询。
+"""
+import asyncio
+import json
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+from loguru import logger
+
+from backend.config import settings
+from backend.exchanges.aster_dex import aster_client
+from backend.monitoring.metrics import USER_STREAM_EVENTS
+
+# 持仓保证金的计价资产
+QUOTE_ASSET = "USDT"
+
+
+class AccountBook:
+    """内存账户簿：余额和持仓，格式与 aster_client 的REST返回一致"""
+
+    def __init__(self):
+        self.balances: Dict[str, Dict] = {}  # asset -> {"wallet", "locked"}
+        self.positions: Dict[Tuple[str, str], Dict] = {}  # (symbol, positionSide) -> 持仓
+        # 占用保证金 / 持仓名义金额（REST快照时计算）；推送不带可用余额，按它估算持仓变化后的 locked
+        self.margin_ratio: Optional[float] = None
+        self.updated_at: Optional[float] = None
+
+    def load_snapshot(self, balance_info: Dict, positions: List[Dict]):
+        """用REST快照整体替换，返回与推送状态不一致的交易对（对账差异）"""
+        drift = []
+        if balance_info.get("success"):
+            self.balances = {
+                b["asset"]: {
+                    "wallet": float(b.get("free", 0)) + float(b.get("locked", 0)),
+                    "locked": float(b.get("locked", 0)),
+                }
+                for b in balance_info.get("balances", [])
+                if b.get("asset")
+            }
+
+        fresh = {}
+        for pos in positions:
+            side = "SHORT" if pos.get("position_type") == "short" else "LONG"
+            fresh[(pos["symbol"], side)] = dict(pos)
+        for key in set(fresh) | set(self.positions):
+            old, new = self.positions.get(key), fresh.get(key)
+            if old is None or new is None or abs(old["amount"] - new["amount"]) > 1e-9:
+                drift.append(key[0])
+        self.positions = fresh
+        usdt = self.balances.get(QUOTE_ASSET)
+        notional = self._notional()
+        if usdt and notional > 0:
+            self.margin_ratio = usdt["locked"] / notional
+        self.updated_at = time.time()
+        return drift
+
+    def _notional(self) -> float:
+        return sum(pos["total_value"] for pos in self.positions.values())
+
+    def _update_locked(self):
+        """持仓变化后按快照时的保证金比例估算 USDT 的 locked（无持仓时为0）"""
+        usdt = self.balances.get(QUOTE_ASSET)
+        if usdt is None:
+            return
+        notional = self._notional()
+        if notional <= 0:
+            usdt["locked"] = 0.0
+        elif self.margin_ratio is not None:
+            usdt["locked"] = min(usdt["wallet"], notional * self.margin_ratio)
+
+    def apply_account_update(self, data: Dict):
+        """ACCOUNT_UPDATE: a.B 余额, a.P 持仓（只推送有变化的部分）"""
+        for b in data.get("B", []):
+            entry = self.balances.setdefault(b["a"], {"wallet": 0.0, "locked": 0.0})
+            entry["wallet"] = float(b.get("wb", 0))
+
+        for p in data.get("P", []):
+            symbol = p["s"]
+            amount = float(p.get("pa", 0))
+            position_side = p.get("ps", "BOTH")
+            # 单向持仓模式下同一交易对只有一个方向，清掉另一方向的旧记录
+            if position_side == "BOTH":
+                self.positions.pop((symbol, "LONG"), None)
+                self.positions.pop((symbol, "SHORT"), None)
+                side = "SHORT" if amount < 0 else "LONG"
+            else:
+                side = position_side
+            if amount == 0:
+                self.positions.pop((symbol, side), None)
+                continue
+
+            entry_price = float(p.get("ep", 0))
+            unrealized = float(p.get("up", 0))
+            # 推送不带标记价格，用未实现盈亏反推
+            mark_price = entry_price + unrealized / amount
+            self.positions[(symbol, side)] = {
+                "symbol": symbol,
+                "amount": abs(amount),
+                "average_price": entry_price,
+                "entry_price": entry_price,
+                "current_price": mark_price,
+                "unrealized_pnl": unrealized,
+                "position_type": "short" if amount < 0 else "long",
+                "total_value": entry_price * abs(amount),
+            }
+        self._update_locked()
+        self.updated_at = time.time()
+
+    def get_positions(self, symbol: Optional[str] = None) -> List[Dict]:
+        return [
+            dict(pos) for (sym, _), pos in self.positions.items()
+            if symbol is None or sym == symbol
+        ]
+
+    def get_balance(self) -> Dict:
+        balances = []
+        for asset, b in self.balances.items():
+            if b["wallet"] <= 0:
+                continue
+            balances.append({
+                "asset": asset,
+                "free": str(b["wallet"] - b["locked"]),
+                "locked": str(b["locked"]),
+            })
+        return {"success": True, "balances": balances}
+
+
+class UserDataStream:
+    """用户数据流消费者"""
+
+    def __init__(self):
+        self.book = AccountBook()
+        self.listen_key: Optional[str] = None
+        self.connected = False
+        self.events = 0
+        self.reconnects = 0
+        self.last_event_at: Optional[float] = None
+        self.last_reconcile_at: Optional[float] = None
+        self.last_drift: List[str] = []
+        self._ws: Optional[aiohttp.ClientWebSocketResponse] = None
+        self._task: Optional[asyncio.Task] = None
+        self._order_listeners: List[Callable[[Dict], None]] = []
+
+    def add_order_listener(self, callback: Callable[[Dict], None]):
+        """ORDER_TRADE_UPDATE 推送时回调 callback(事件中的订单字段 o)"""
+        self._order_listeners.append(callback)
+
+    @property
+    def enabled(self) -> bool:
+        return settings.user_stream_enabled and not aster_client.use_mock_data
+
+    def is_live(self) -> bool:
+        """账户簿是否可以代替REST查询：连接正常且最近对账过"""
+        return (
+            self.connected
+            and self.last_reconcile_at is not None
+            and time.time() - self.last_reconcile_at < settings.user_stream_stale_after
+        )
+
+    def get_positions(self, symbol: Optional[str] = None) -> List[Dict]:
+        return self.book.get_positions(symbol)
+
+    def get_balance(self) -> Dict:
+        return self.book.get_balance()
+
+    def start(self):
+        if not self.enabled:
+            logger.info("ℹ️  用户数据流未启用（模拟模式或 USER_STREAM_ENABLED=false），持仓和余额使用REST查询")
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="user-data-stream")
+
+    async def _run(self):
+        backoff = 1.0
+        while True:
+            try:
+                self.listen_key = await aster_client.create_listen_key()
+                if not self.listen_key:
+                    raise RuntimeError("创建listenKey失败")
+                url = f"{settings.aster_dex_ws_url.rstrip('/')}/{self.listen_key}"
+                async with aiohttp.ClientSession() as session:
+                    async with session.ws_connect(url, heartbeat=60) as ws:
+                        self._ws = ws
+                        self.connected = True
+                        backoff = 1.0
+                        logger.info("📡 用户数据流已连接")
+                        # 先订阅再拉快照，快照之后的变化都会通过推送到达
+                        await self.reconcile()
+                        async for msg in ws:
+                            if msg.type == aiohttp.WSMsgType.TEXT:
+                                if not self.handle_message(msg.data):
+                                    break
+                            elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                                break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ 用户数据流异常: {e}")
+            finally:
+                self.connected = False
+                self._ws = None
+
+            self.reconnects += 1
+            logger.warning(f"🔌 用户数据流断开，{backoff:.0f}s后重连（期间持仓和余额回退REST查询）")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60.0)
+
+    def handle_message(self, raw: str) -> bool:
+        """处理一条推送，返回False表示需要重连"""
+        try:
+            event = json.loads(raw)
+        except ValueError:
+            logger.debug(f"用户数据流消息无法解析: {raw[:200]}")
+            return True
+
+        event_type = event.get("e", "unknown")
+        self.events += 1
+        self.last_event_at = time.time()
+        USER_STREAM_EVENTS.inc(event=event_type)
+
+        if event_type == "ACCOUNT_UPDATE":
+            self.book.apply_account_update(event.get("a", {}))
+        elif event_type == "ORDER_TRADE_UPDATE":
+            order = event.get("o", {})
+            for listener in self._order_listeners:
+                try:
+                    listener(order)
+                except Exception as e:
+                    logger.error(f"❌ 订单推送回调失败: {e}")
+        elif event_type == "listenKeyExpired":
+            logger.warning("⚠️ listenKey已过期，重新创建")
+            return False
+        return True
+
+    async def reconcile(self):
+        """REST对账：用余额和持仓快照替换账户簿"""
+        if not self.enabled:
+            return
+        balance_info = await aster_client.get_account_balance()
+        positions = await aster_client.get_open_positions()
+        if not balance_info.get("success") or positions is None:
+            logger.warning("⚠️ 用户数据流对账失败，保留当前账户簿")
+            return
+
+        drift = self.book.load_snapshot(balance_info, positions)
+        if drift and self.last_reconcile_at is not None:
+            logger.warning(f"🔁 对账修正了推送未反映的持仓变化: {', '.join(sorted(set(drift)))}")
+        self.last_drift = sorted(set(drift))
+        self.last_reconcile_at = time.time()
+
+    async def keepalive(self):
+        """续期listenKey，失败则断开重连（重连时会创建新的listenKey）"""
+        if not self.listen_key or not self.connected:
+            return
+        if not await aster_client.keepalive_listen_key(self.listen_key):
+            if self._ws is not None:
+                await self._ws.close()
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.listen_key:
+            await aster_client.close_listen_key(self.listen_key)
+            self.listen_key = None
+
+    def get_status(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "connected": self.connected,
+            "live": self.is_live(),
+            "events": self.events,
+            "reconnects": self.reconnects,
+            "last_event_at": self.last_event_at,
+            "last_reconcile_at": self.last_reconcile_at,
+            "last_drift": self.last_drift,
+            "positions": len(self.book.positions),
+        }
+
+
+# 全局用户数据流实例
+user_stream = UserDataStream()
@@ -1,32 +1,71 @@
 """
 FastAPI主应用
+
+交易引擎、智能体团队、交易所客户端等重模块（pandas/talib/openai/交易所SDK）不在导入时加载，
+由 lifespan 启动的后台初始化任务在线程中导入并异步初始化，应用先对外提供服务。
 """
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, Query
+from backend.startup import LazyObject, startup_report
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, Query, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
 from typing import List, Optional
 import asyncio
+import hmac
+import importlib
 import json
+import time
 from datetime import datetime, timedelta
 from loguru import logger
-from sqlalchemy import select, desc
+from sqlalchemy import select, desc, text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from backend.config import settings
 from backend.database import init_db, get_db, Trade, PortfolioSnapshot, AIDecision, MarketData
-from backend.trading.trading_engine import trading_engine
-from backend.agents.agent_team import agent_team
-from backend.exchanges.aster_dex import aster_client
+from backend.trading.job_scheduler import job_scheduler
+from backend.ai.llm_scheduler import llm_scheduler
+from backend.agents.prompt_budget import prompt_budgeter
+from backend.agents.cpu_executor import cpu_executor
+from backend.monitoring.metrics import registry as metrics_registry
+from backend.monitoring.tracing import tracer
+from backend.monitoring.logging_config import setup_logging
+from backend.monitoring.profiler import sampling_profiler, loop_watchdog
+from backend.monitoring.health import health_registry
 from backend.locales.manager import get_message, get_supported_languages
 from backend.migrations import run_all_migrations
 
+# 重模块单例：首次使用时导入，正常情况下由后台初始化任务提前导入
+trading_engine = LazyObject("backend.trading.trading_engine", "trading_engine")
+stop_engine = LazyObject("backend.trading.stop_engine", "stop_engine")
+decision_gate = LazyObject("backend.agents.decision_gate", "decision_gate")
+agent_team = LazyObject("backend.agents.agent_team", "agent_team")
+aster_client = LazyObject("backend.exchanges.aster_dex", "aster_client")
+order_manager = LazyObject("backend.trading.order_manager", "order_manager")
+user_stream = LazyObject("backend.exchanges.user_stream", "user_stream")
+order_book_service = LazyObject("backend.exchanges.order_book", "order_book_service")
+execution_engine = LazyObject("backend.trading.execution", "execution_engine")
+pre_trade_risk = LazyObject("backend.trading.risk_engine", "pre_trade_risk")
+risk_analytics = LazyObject("backend.trading.risk_analytics", "risk_analytics")
+indicator_store = LazyObject("backend.agents.incremental_indicators", "indicator_store")
+screener = LazyObject("backend.trading.screener", "screener")
+
+# 后台初始化时按顺序导入（分开计时，便于定位慢的依赖）
+HEAVY_MODULES = [
+    "backend.exchanges.aster_dex",
+    "backend.agents.technical_analyst_new",
+    "backend.agents.agent_team",
+    "backend.trading.trading_engine",
+]
+
+startup_report.checkpoint("import backend.main")
+
 # ==================== 🚨 重构模式：停止所有交易逻辑 ====================
 REFACTORING_MODE = False  # 设置为True时，停止所有交易和后台任务
 # ========================================================================
 
-# 配置日志
-logger.add("logs/trading_{time}.log", rotation="1 day", retention="30 days")
+# 配置日志（异步队列写入 + 按模块级别过滤）
+setup_logging()
 
 
 # WebSocket连接管理
@@ -51,6 +90,9 @@ class ConnectionManager:
 
 manager = ConnectionManager()
 
+# 止损平仓队列消费任务（常驻，停机时取消）
+stop_consumer: Optional[asyncio.Task] = None
+
 
 # 应用生命周期管理
 @asynccontextmanager
@@ -63,33 +105,86 @@ async def lifespan(app: FastAPI):
         logger.info("🚀 启动AI交易平台...")
     
     # 初始化数据库
-    await init_db()
+    with startup_report.phase("init_db"):
+        await init_db()
     
     # 执行数据库迁移
-    await run_all_migrations()
+    with startup_report.phase("migrations"):
+        await run_all_migrations()
     
-    async for db in get_db():
-        await trading_engine.initialize(db)
-        break
+    tracer.start()
+    loop_watchdog.start()
     
-    # 启动后台任务（重构模式下跳过）
-    if not REFACTORING_MODE:
-        asyncio.create_task(update_market_data_task())  # 市场数据更新任务
-        asyncio.create_task(background_trading_task_only_buy())  # 交易任务
-        asyncio.create_task(background_trading_task())  # 交易任务
-        asyncio.create_task(broadcast_updates_task())   # 广播任务
-        logger.info("✅ 所有后台任务已启动")
-    else:
-        logger.warning("⚠️  后台任务已禁用（重构模式）")
+    # 重模块导入和交易引擎初始化放到后台，不阻塞应用对外提供服务
+    init_task = asyncio.create_task(deferred_startup())
+    startup_report.mark_serving()
     
     yield
     
+    if not init_task.done():
+        init_task.cancel()
+    if stop_consumer is not None:
+        stop_consumer.cancel()
+        await asyncio.gather(stop_consumer, return_exceptions=True)
+    
     # 关闭时执行
     if REFACTORING_MODE:
         logger.info("🛑 关闭静态展示模式...")
     else:
         logger.info("🛑 关闭AI交易平台...")
-    await aster_client.close()
+    if execution_engine.is_loaded():
+        await execution_engine.shutdown()
+    if order_manager.is_loaded():
+        await order_manager.shutdown()
+    if user_stream.is_loaded():
+        await user_stream.stop()
+    if order_book_service.is_loaded():
+        await order_book_service.stop()
+    if aster_client.is_loaded():
+        await aster_client.close()
+    await llm_scheduler.close()
+    await tracer.shutdown()
+    loop_watchdog.stop()
+    cpu_executor.shutdown()
+    job_scheduler.shutdown()
+
+
+async def deferred_startup():
+    """后台初始化：导入重模块、交易所时间同步、交易引擎初始化、启动定时任务"""
+    global stop_consumer
+    try:
+        for module in HEAVY_MODULES:
+            with startup_report.phase(f"import {module.rsplit('.', 1)[-1]}"):
+                await asyncio.to_thread(importlib.import_module, module)
+        
+        with startup_report.phase("aster_client.initialize"):
+            await aster_client.initialize()
+        
+        with startup_report.phase("trading_engine.initialize"):
+            async for db in get_db():
+                await trading_engine.initialize(db)
+                break
+        
+        with startup_report.phase("cpu_executor.start"):
+            await cpu_executor.start()
+        
+        # 启动后台任务（重构模式下跳过）
+        if not REFACTORING_MODE:
+            register_jobs()  # 市场数据、交易周期、广播等定时任务
+            job_scheduler.start()
+            user_stream.start()  # 用户数据流（订单/持仓推送）
+            order_book_service.start()  # 订单簿增量深度流
+            if settings.stop_monitor_enabled:
+                stop_consumer = asyncio.create_task(stop_order_consumer_task(), name="stop-order-consumer")
+            logger.info("✅ 所有后台任务已启动")
+        else:
+            logger.warning("⚠️  后台任务已禁用（重构模式）")
+        startup_report.mark_ready()
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.exception(f"❌ 后台初始化失败: {e}")
+        startup_report.mark_ready(error=str(e))
 
 
 app = FastAPI(title="AI加密货币交易平台", version="1.0.0", lifespan=lifespan)
@@ -116,6 +211,41 @@ async def root():
     }
 
 
+@app.get("/health")
+@app.get("/health/live")
+async def health_live():
+    """存活检查：进程和事件循环在响应即可（不依赖交易引擎，启动后立即可用）"""
+    return {"status": "alive", "ready": startup_report.ready}
+
+
+@app.get("/health/ready")
+async def health_ready():
+    """
+    就绪检查：后台初始化完成且数据库可用时返回200，否则503
+    
+    返回各组件（交易所接口、LLM服务商、数据库写入）的滚动错误率和p95耗时；
+    mode=degraded 表示引擎处于降级模式（暂停新开仓，止损监控继续），仍视为就绪
+    """
+    status = health_registry.get_status()
+    checks = {"startup": startup_report.ready, "database": True}
+    try:
+        async for db in get_db():
+            await asyncio.wait_for(db.execute(text("SELECT 1")), timeout=settings.health_db_timeout)
+            break
+    except Exception as e:
+        checks["database"] = False
+        status["database_error"] = f"{type(e).__name__}: {e}"[:300]
+    ready = all(checks.values())
+    body = {"status": "ready" if ready else "not_ready", "checks": checks, **status}
+    return JSONResponse(body, status_code=200 if ready else 503)
+
+
+@app.get("/api/startup")
+async def get_startup_report():
+    """启动耗时报告（各阶段耗时、开始服务和初始化完成的时间点）"""
+    return startup_report.get_status()
+
+
 @app.get("/api/status")
 async def get_status(language: str = Query("zh", description="Language code (zh/en)")):
     """获取系统状态"""
@@ -126,7 +256,9 @@ async def get_status(language: str = Query("zh", description="Language code (zh/
         trading_status = False
         system_status = "refactoring"
     else:
-        trading_status = settings.enable_auto_trading
+        trading_status = settings.enable_auto_trading and not (
+            trading_engine.is_loaded() and trading_engine.trading_paused
+        )
         system_status = "online"
     
     return {
@@ -421,6 +553,214 @@ async def get_strategies(limit: int = 10, db: AsyncSession = Depends(get_db)):
     return strategies
 
 
+@app.get("/api/llm-scheduler")
+async def get_llm_scheduler_status():
+    """获取LLM调度器队列深度、等待时间和调用统计"""
+    return llm_scheduler.get_status()
+
+
+def require_admin(x_admin_token: str = Header("")):
+    """管理接口鉴权：请求头 X-Admin-Token 必须与 ADMIN_TOKEN 一致"""
+    # 常量时间比较，避免按响应耗时逐字符猜测令牌
+    if not settings.admin_token or not hmac.compare_digest(
+        (x_admin_token or "").encode("utf-8"), settings.admin_token.encode("utf-8")
+    ):
+        raise HTTPException(status_code=403, detail="需要管理员令牌")
+
+
+@app.get("/admin/profile", dependencies=[Depends(require_admin)])
+async def admin_profile(
+    seconds: float = Query(30, gt=0, description="采样时长（秒）"),
+    format: str = Query("json", description="json: 火焰图+事件循环统计; speedscope: 仅火焰图文件")
+):
+    """对运行中的进程采样，返回speedscope火焰图和事件循环滞后统计"""
+    seconds = min(seconds, settings.profiler_max_seconds)
+    try:
+        profile = await sampling_profiler.profile(seconds)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if format == "speedscope":
+        return JSONResponse(
+            profile,
+            headers={"Content-Disposition": f'attachment; filename="profile-{int(time.time())}.speedscope.json"'}
+        )
+    return {"speedscope": profile, "loop_lag": loop_watchdog.get_status()}
+
+
+@app.post("/admin/close-all", dependencies=[Depends(require_admin)])
+async def admin_close_all(
+    disable_trading: bool = Query(True, description="同时关闭自动交易，避免下个周期重新开仓"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    清仓开关：批量平掉全部持仓，返回每笔平仓结果
+
+    先暂停自动交易，再持有 "trading" 互斥组的锁清仓：正在运行的交易周期结束后才开始扫单，
+    扫单期间不会有交易周期开仓。用 /admin/auto-trading 恢复自动交易。
+    """
+    if disable_trading:
+        trading_engine.set_trading_paused(True, "管理员清仓")
+    async with job_scheduler.group_lock("trading"):
+        results = await trading_engine.close_all_positions(db, reason="管理员清仓")
+    return {"auto_trading": trading_engine.auto_trading_enabled, "results": results}
+
+
+@app.post("/admin/auto-trading", dependencies=[Depends(require_admin)])
+async def admin_auto_trading(enabled: bool = Query(..., description="false: 暂停自动交易; true: 恢复")):
+    """暂停或恢复自动交易（清仓开关暂停后用它恢复）"""
+    trading_engine.set_trading_paused(not enabled, "管理员暂停")
+    return {
+        "auto_trading": trading_engine.auto_trading_enabled,
+        "configured": settings.enable_auto_trading,
+        "paused": trading_engine.trading_paused,
+        "pause_reason": trading_engine.pause_reason,
+    }
+
+
+@app.post("/admin/risk/kill-switch", dependencies=[Depends(require_admin)])
+async def admin_kill_switch(
+    engaged: bool = Query(True, description="开启后只允许减仓订单"),
+    reason: str = Query("管理员操作")
+):
+    """风控清仓开关：开启后下单前风控拒绝所有开仓订单"""
+    pre_trade_risk.set_kill_switch(engaged, reason)
+    return pre_trade_risk.get_status()
+
+
+@app.get("/admin/loop-lag", dependencies=[Depends(require_admin)])
+async def admin_loop_lag():
+    """事件循环滞后统计和最近的阻塞调用栈"""
+    return loop_watchdog.get_status()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus指标（METRICS_ENABLED=false 时返回404）"""
+    if not settings.metrics_enabled:
+        return PlainTextResponse("metrics disabled\n", status_code=404)
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/traces")
+async def get_traces():
+    """最近的trace列表（每个交易周期一条）"""
+    return {"status": tracer.get_status(), "traces": tracer.get_traces()}
+
+
+@app.get("/api/traces/{trace_id}")
+async def get_trace(trace_id: str):
+    """单条trace的全部span和关键路径"""
+    trace = tracer.get_trace(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="trace不存在或已过期")
+    return trace
+
+
+@app.get("/api/prompt-stats")
+async def get_prompt_stats():
+    """获取各智能体提示词token统计（预算、丢弃/摘要的段落）"""
+    return prompt_budgeter.get_status()
+
+
+@app.get("/api/jobs")
+async def get_jobs():
+    """获取后台任务状态（触发方式、下次运行时间、最近耗时、跳过/错过次数）"""
+    return job_scheduler.get_status()
+
+
+@app.get("/api/cpu-executor")
+async def get_cpu_executor_status():
+    """获取CPU密集型计算执行器状态（各函数的运行方式、调用次数、平均耗时）"""
+    return cpu_executor.get_status()
+
+
+@app.get("/api/indicators")
+async def get_indicator_status():
+    """获取增量技术指标状态（保存状态的交易对数量、增量更新/重建次数、累计处理的K线根数）"""
+    return {"enabled": settings.incremental_indicators_enabled, **indicator_store.get_status()}
+
+
+@app.get("/api/gate")
+async def get_gate_status():
+    """获取LLM前置门控统计（每周期节省的LLM调用）"""
+    return decision_gate.get_status()
+
+
+@app.get("/api/orders")
+async def get_orders(limit: int = 50):
+    """获取最近订单（客户端订单ID、状态、成交数量、成交均价、手续费）"""
+    return order_manager.get_status(limit=limit)
+
+
+@app.get("/api/execution")
+async def get_execution_status():
+    """获取执行算法统计（各算法订单数、成交额、平均滑点、挂单转市价次数）"""
+    return execution_engine.get_status()
+
+
+@app.get("/api/risk")
+async def get_risk_status():
+    """获取下单前风控状态（清仓开关、当日盈亏、各项敞口和上限、拒绝统计）"""
+    return pre_trade_risk.get_status()
+
+
+@app.get("/api/risk/analytics")
+async def get_risk_analytics(matrix: bool = False):
+    """获取组合风险分析（组合VaR/ES、beta、各持仓风险贡献、高相关交易对；matrix=true 附带相关系数矩阵）"""
+    return risk_analytics.get_status(matrix)
+
+
+@app.get("/api/risk/analytics/{symbol}")
+async def get_symbol_risk(symbol: str):
+    """获取单个交易对的波动率、beta和与当前持仓的相关性"""
+    result = risk_analytics.symbol_risk(symbol.upper())
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"{symbol} 暂无足够的K线数据")
+    return result
+
+
+@app.get("/api/screener")
+async def get_screener(limit: int = Query(50, ge=1, le=500)):
+    """获取交易对筛选结果（打分/过滤表达式、特征缓存状态、前 limit 行因子表），只读最近一次筛选"""
+    return screener.get_status(limit)
+
+
+@app.post("/admin/screener/refresh", dependencies=[Depends(require_admin)])
+async def admin_screener_refresh(limit: int = Query(50, ge=1, le=500)):
+    """立即重新筛选（全市场行情请求），返回最新结果"""
+    await screener.run(limit=settings.max_trading_symbols)
+    return screener.get_status(limit)
+
+
+@app.get("/api/user-stream")
+async def get_user_stream_status():
+    """获取用户数据流状态（连接、事件数、最近对账时间和对账差异）"""
+    return user_stream.get_status()
+
+
+@app.get("/api/order-book")
+async def get_order_book_status():
+    """获取订单簿服务状态（增量流连接、关注的交易对、各本地簿来源和更新时间）"""
+    return order_book_service.get_status()
+
+
+@app.get("/api/order-book/{symbol}")
+async def get_order_book_features(symbol: str, notional: Optional[float] = None):
+    """获取交易对的盘口特征（不平衡、微观价格、中间价附近深度，传 notional 时附带预估滑点）"""
+    features = await order_book_service.features(symbol.upper(), notional=notional)
+    if not features:
+        raise HTTPException(status_code=404, detail=f"{symbol} 盘口数据不可用")
+    return features
+
+
+@app.get("/api/stop-engine")
+async def get_stop_engine_status():
+    """获取向量化止损引擎状态"""
+    status = stop_engine.get_status()
+    status["levels"] = [stop_engine.get_levels(symbol) for symbol in stop_engine.symbols()]
+    return status
+
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """WebSocket连接 - 实时数据推送"""
@@ -436,162 +776,164 @@ async def websocket_endpoint(websocket: WebSocket):
 
 # ==================== 后台任务 ====================
 
-async def update_market_data_task():
+async def update_market_data_job():
     """市场数据更新任务（高频更新）"""
-    # 重构模式：停止市场数据更新
-    if REFACTORING_MODE:
-        logger.info("⚠️  市场数据更新任务已跳过（重构模式）")
+    async for db in get_db():
+        await trading_engine.update_market_data(db)
+        break
+
+
+async def trading_cycle_job():
+    """开仓交易周期（按 TRADING_CYCLE_CRON 对齐执行）"""
+    if not trading_engine.auto_trading_enabled:
+        logger.debug("自动交易已禁用，跳过本轮执行")
         return
-    
-    logger.info("📊 市场数据更新任务已启动（实时模式）")
-    
-    while True:
-        try:
-            async for db in get_db():
-                await trading_engine.update_market_data(db)
-                break
-            
-            # 使用配置的更新间隔（默认10秒，更实时）
-            await asyncio.sleep(settings.data_update_interval)
-            
-        except Exception as e:
-            logger.error(f"市场数据更新任务错误: {e}")
-            await asyncio.sleep(60)
+    async for db in get_db():
+        await trading_engine.execute_trading_cycle(db)
+        break
 
 
-async def background_trading_task():
-    """后台交易任务（快速响应）"""
-    # 重构模式：停止所有交易
-    if REFACTORING_MODE:
-        logger.info("⚠️  后台交易任务已跳过（重构模式）")
+async def position_cycle_job():
+    """持仓管理周期（只处理已有持仓）"""
+    if not trading_engine.auto_trading_enabled:
         return
-    
-    logger.info("🤖 后台交易任务已启动（快速模式）")
-    
-    def _next_aligned_time(reference: datetime) -> datetime:
-        aligned = reference.replace(second=0, microsecond=0)
-        remainder = aligned.minute % 30
-        if remainder == 0 and reference.second == 0 and reference.microsecond == 0:
-            return aligned
-        increment = 30 - remainder if remainder != 0 else 30
-        return aligned + timedelta(minutes=increment)
+    async for db in get_db():
+        await trading_engine.execute_trading_cycle(db=db, only_buy=True)
+        break
 
-    next_run = _next_aligned_time(datetime.now())
-    logger.info(f"⏰ 后台交易任务将于 {next_run.strftime('%Y-%m-%d %H:%M:%S')} 首次执行，并按整十分钟对齐运行")
 
-    while True:
-        try:
-            now = datetime.now()
-            wait_seconds = (next_run - now).total_seconds()
-            if wait_seconds > 0:
-                await asyncio.sleep(wait_seconds)
-            else:
-                logger.debug("已错过计划执行时间，立即执行补偿任务")
-
-            cycle_start = datetime.now()
-            
-            if settings.enable_auto_trading:
-                async for db in get_db():
-                    await trading_engine.execute_trading_cycle(db)
-                    break
-            else:
-                logger.debug("自动交易已禁用，跳过本轮执行")
-
-            finished_at = datetime.now()
-            duration = finished_at - cycle_start
-            next_run = _next_aligned_time(finished_at + timedelta(seconds=1))
-            logger.debug(
-                f"本轮任务耗时 {duration.total_seconds():.2f} 秒，下一次后台交易任务将在 {next_run.strftime('%Y-%m-%d %H:%M:%S')} 执行"
-            )
-            
-        except Exception as e:
-            logger.error(f"后台交易任务错误: {e}")
-            next_run = _next_aligned_time(datetime.now())
-            await asyncio.sleep(300)
+def register_jobs():
+    """注册定时后台任务；两个交易周期在同一账户下单，放入同一互斥组串行执行"""
+    job_scheduler.add_job(
+        "market_data", update_market_data_job,
+        seconds=settings.data_update_interval, run_immediately=True
+    )
+    job_scheduler.add_job(
+        "trading_cycle", trading_cycle_job,
+        cron=settings.trading_cycle_cron, jitter=settings.trading_cycle_jitter, group="trading"
+    )
+    job_scheduler.add_job(
+        "position_cycle", position_cycle_job,
+        seconds=settings.position_cycle_interval, jitter=settings.position_cycle_jitter,
+        group="trading", run_immediately=True
+    )
+    job_scheduler.add_job(
+        "broadcast", broadcast_updates_job,
+        seconds=settings.broadcast_interval
+    )
+    job_scheduler.add_job(
+        "order_book_refresh", order_book_service.refresh_stale,
+        seconds=settings.order_book_refresh_interval
+    )
+    job_scheduler.add_job(
+        "risk_analytics_refresh", risk_analytics.refresh,
+        seconds=settings.risk_analytics_refresh_interval
+    )
+    job_scheduler.add_job(
+        "screener_features", screener.refresh_features,
+        seconds=settings.screener_feature_refresh_interval
+    )
+    if settings.stop_monitor_enabled:
+        # 止损引擎：定期从交易所同步持仓，每个tick向量化判断所有持仓
+        job_scheduler.add_job(
+            "stop_engine_sync", stop_engine_sync_job,
+            seconds=settings.stop_sync_interval, run_immediately=True
+        )
+        job_scheduler.add_job(
+            "stop_engine_tick", stop_engine_tick_job,
+            seconds=settings.stop_check_interval
+        )
+    if user_stream.enabled:
+        job_scheduler.add_job(
+            "user_stream_keepalive", user_stream.keepalive,
+            seconds=settings.user_stream_keepalive
+        )
+        job_scheduler.add_job(
+            "user_stream_reconcile", user_stream.reconcile,
+            seconds=settings.user_stream_reconcile_interval
+        )
 
-async def background_trading_task_only_buy():
-    """后台交易任务（快速响应）"""
-    # 重构模式：停止所有交易
-    if REFACTORING_MODE:
-        logger.info("⚠️  后台交易任务已跳过（重构模式）")
-        return
-    
-    logger.info("🤖 后台交易任务已启动（快速模式）")
-    
-    while True:
-        try:
-            if settings.enable_auto_trading:
-                async for db in get_db():
-                    await trading_engine.execute_trading_cycle(db=db,only_buy=True)
-                    break
-            
-            # 使用配置的交易检查间隔（默认60秒，更频繁）
-            await asyncio.sleep(120)
-            
-        except Exception as e:
-            logger.error(f"后台交易任务错误: {e}")
-            await asyncio.sleep(300)
-async def broadcast_updates_task():
-    """广播更新任务（实时SDK钱包余额）"""
-    # 重构模式：停止WebSocket广播（前端仍可通过API查询）
-    if REFACTORING_MODE:
-        logger.info("⚠️  WebSocket广播任务已跳过（重构模式）")
+
+async def stop_engine_sync_job():
+    """止损引擎持仓同步（开仓后的新持仓也会在这里纳入监控）"""
+    async for db in get_db():
+        await trading_engine.refresh_stop_engine(db)
+        break
+
+
+async def stop_engine_tick_job():
+    """止损引擎价格tick：一次全市场行情，向量化判断所有持仓"""
+    if stop_engine.size == 0:
         return
-    
-    logger.info("📡 数据广播任务已启动（实时SDK钱包余额推送模式）")
+    tickers = await aster_client.get_all_tickers()
+    prices = {t["symbol"]: t["price"] for t in tickers if t.get("symbol")}
+    stop_engine.evaluate(prices)
+
+
+async def stop_order_consumer_task():
+    """止损平仓队列消费任务（队列阻塞等待，不适合定时触发，由 lifespan 持有句柄并在停机时取消）"""
+    logger.info("📤 止损平仓队列消费任务已启动")
     
     while True:
+        # 同一个tick触发的多条指令一起取出，批量下单
+        orders = [await stop_engine.order_queue.get()]
+        while not stop_engine.order_queue.empty():
+            orders.append(stop_engine.order_queue.get_nowait())
         try:
             async for db in get_db():
-                # 刷新数据库会话，确保获取最新数据
-                await db.commit()
-                
-                # 获取最新数据（内部会实时查询SDK钱包余额）
-                portfolio = await trading_engine.get_portfolio_summary(db)
-                
-                # 获取最近的交易
-                result = await db.execute(
-                    select(Trade).order_by(desc(Trade.timestamp)).limit(5)
-                )
-                recent_trades = result.scalars().all()
-                
-                # 构建交易列表
-                trades_list = []
-                for t in recent_trades:
-                    try:
-                        trades_list.append({
-                            "id": t.id,
-                            "symbol": t.symbol or "",
-                            "side": t.side or "",
-                            "price": float(t.price) if t.price else 0.0,
-                            "amount": float(t.amount) if t.amount else 0.0,
-                            "total_value": float(t.total_value) if t.total_value else 0.0,
-                            "profit_loss": float(t.profit_loss) if t.profit_loss is not None else None,
-                            "profit_loss_percentage": float(t.profit_loss_percentage) if hasattr(t, 'profit_loss_percentage') and t.profit_loss_percentage is not None else None,
-                            "timestamp": t.timestamp.isoformat() if t.timestamp else datetime.now().isoformat()
-                        })
-                    except Exception as e:
-                        logger.error(f"处理交易记录 {t.id} 广播时出错: {e}")
-                        continue
-                
-                # 广播数据（包含实时SDK钱包余额）
-                await manager.broadcast({
-                    "type": "portfolio_update",
-                    "data": portfolio,
-                    "recent_trades": trades_list,
-                    "timestamp": datetime.now().isoformat(),
-                    "wallet_synced": True,  # 标记数据来自SDK钱包实时查询
-                    "balance_source": "SDK"  # 明确标记余额来源
-                })
-                
-                # logger.info(f"💰 广播SDK钱包余额: 总资产=${portfolio.get('total_balance', 0):.2f}, 钱包=${portfolio.get('cash_balance', 0):.2f}, 交易记录数={len(trades_list)}")
+                await trading_engine.execute_stop_orders(db, orders)
                 break
-            
-            await asyncio.sleep(settings.broadcast_interval)
-            
         except Exception as e:
-            logger.error(f"广播任务错误: {e}")
-            await asyncio.sleep(30)
+            logger.error(f"止损平仓执行错误: {e}")
+        finally:
+            for _ in orders:
+                stop_engine.order_queue.task_done()
+
+
+async def broadcast_updates_job():
+    """广播更新任务（实时SDK钱包余额）"""
+    async for db in get_db():
+        # 刷新数据库会话，确保获取最新数据
+        await db.commit()
+        
+        # 获取最新数据（内部会实时查询SDK钱包余额）
+        portfolio = await trading_engine.get_portfolio_summary(db)
+        
+        # 获取最近的交易
+        result = await db.execute(
+            select(Trade).order_by(desc(Trade.timestamp)).limit(5)
+        )
+        recent_trades = result.scalars().all()
+        
+        # 构建交易列表
+        trades_list = []
+        for t in recent_trades:
+            try:
+                trades_list.append({
+                    "id": t.id,
+                    "symbol": t.symbol or "",
+                    "side": t.side or "",
+                    "price": float(t.price) if t.price else 0.0,
+                    "amount": float(t.amount) if t.amount else 0.0,
+                    "total_value": float(t.total_value) if t.total_value else 0.0,
+                    "profit_loss": float(t.profit_loss) if t.profit_loss is not None else None,
+                    "profit_loss_percentage": float(t.profit_loss_percentage) if hasattr(t, 'profit_loss_percentage') and t.profit_loss_percentage is not None else None,
+                    "timestamp": t.timestamp.isoformat() if t.timestamp else datetime.now().isoformat()
+                })
+            except Exception as e:
+                logger.error(f"处理交易记录 {t.id} 广播时出错: {e}")
+                continue
+        
+        # 广播数据（包含实时SDK钱包余额）
+        await manager.broadcast({
+            "type": "portfolio_update",
+            "data": portfolio,
+            "recent_trades": trades_list,
+            "timestamp": datetime.now().isoformat(),
+            "wallet_synced": True,  # 标记数据来自SDK钱包实时查询
+            "balance_source": "SDK"  # 明确标记余额来源
+        })
+        break
 
 
 if __name__ == "__main__":
@@ -216,6 +216,56 @@ async def migrate_add_positions_entry_price():
     return success
 
 
+async def migrate_add_order_tracking_fields():
+    """
+    迁移: 为trades表添加订单跟踪字段（客户端订单ID、订单状态、成交数量、手续费）
+    """
+    logger.info("🔄 开始执行数据库迁移: 添加订单跟踪字段...")
+    
+    columns = [
+        ("client_order_id", "VARCHAR(64)"),
+        ("order_status", "VARCHAR(20)"),
+        ("filled_amount", "REAL"),
+        ("fee", "REAL"),
+        ("fee_asset", "VARCHAR(20)"),
+    ]
+    results = [
+        await add_column_if_not_exists(table_name="trades", column_name=name, column_type=column_type)
+        for name, column_type in columns
+    ]
+    
+    if all(results):
+        logger.info("✅ 迁移完成: trades 订单跟踪字段已就绪")
+    else:
+        logger.warning("⚠️  部分迁移可能失败，请检查日志")
+    
+    return all(results)
+
+
+async def migrate_add_execution_quality_fields():
+    """
+    迁移: 为trades表添加执行质量字段（执行算法、到达价格、滑点）
+    """
+    logger.info("🔄 开始执行数据库迁移: 添加执行质量字段...")
+    
+    columns = [
+        ("execution_algo", "VARCHAR(20)"),
+        ("arrival_price", "REAL"),
+        ("slippage_bps", "REAL"),
+    ]
+    results = [
+        await add_column_if_not_exists(table_name="trades", column_name=name, column_type=column_type)
+        for name, column_type in columns
+    ]
+    
+    if all(results):
+        logger.info("✅ 迁移完成: trades 执行质量字段已就绪")
+    else:
+        logger.warning("⚠️  部分迁移可能失败，请检查日志")
+    
+    return all(results)
+
+
 async def run_all_migrations():
     """
     运行所有数据库迁移
@@ -240,6 +290,12 @@ async def run_all_migrations():
         # 迁移4: 为positions表添加entry_price字段
         await migrate_add_positions_entry_price()
         
+        # 迁移5: 为trades表添加订单跟踪字段
+        await migrate_add_order_tracking_fields()
+        
+        # 迁移6: 为trades表添加执行质量字段
+        await migrate_add_execution_quality_fields()
+        
         # 未来的迁移可以在这里添加
         # await migrate_xxx()
         
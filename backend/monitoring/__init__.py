@@ -0,0 +1,2 @@
+"""运行监控模块"""
+
@@ -0,0 +1,171 @@
+"""
+组件健康度与降级模式
+
+按组件（交易所各接口、各LLM服务商、数据库写入）记录最近一段时间窗口内的调用结果和耗时，
+计算滚动错误率和p95耗时，得出组件状态：
+
+    ok       - 正常
+    degraded - 错误率或p95耗时超过告警阈值
+    down     - 错误率超过故障阈值
+    unknown  - 窗口内没有调用
+
+交易所行情接口（K线/行情/持仓/余额）或数据库不正常时，引擎进入降级模式：
+跳过新开仓，止损监控和持仓管理照常运行。真实模式下交易所失败不再用模拟数据填充。
+
+交易所方法的失败大多在方法内部被捕获并返回空结果，因此通过 mark_failed() 在当前调用的
+上下文中标记失败，由外层 track() 统一记录。
+"""
+import contextvars
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+from backend.config import settings
+
+
+OK = "ok"
+DEGRADED = "degraded"
+DOWN = "down"
+UNKNOWN = "unknown"
+
+# 决定是否进入降级模式的组件（前缀匹配）
+CRITICAL_COMPONENTS = (
+    "exchange.get_klines",
+    "exchange.get_ticker",
+    "exchange.get_all_tickers",
+    "exchange.get_open_positions",
+    "exchange.get_account_balance",
+    "db",
+)
+
+# [是否失败, 错误信息]
+_call_state: contextvars.ContextVar[Optional[List]] = contextvars.ContextVar("health_call_state", default=None)
+
+
+def mark_failed(error: str = ""):
+    """在当前被 track() 包裹的调用中标记失败（异常已在内部处理时使用）"""
+    state = _call_state.get()
+    if state is not None:
+        state[0] = True
+        state[1] = error or state[1]
+
+
+class ComponentHealth:
+    """单个组件的滚动窗口统计"""
+
+    def __init__(self, name: str, max_samples: int = 500):
+        self.name = name
+        self._samples: deque = deque(maxlen=max_samples)  # (时间, 是否成功, 耗时秒)
+        self.last_error = ""
+        self.last_error_at: Optional[float] = None
+
+    def record(self, ok: bool, latency: float, error: str = ""):
+        now = time.time()
+        self._samples.append((now, ok, latency))
+        if not ok:
+            self.last_error = error[:300]
+            self.last_error_at = now
+
+    def _window(self) -> List:
+        cutoff = time.time() - settings.health_window_seconds
+        while self._samples and self._samples[0][0] < cutoff:
+            self._samples.popleft()
+        return list(self._samples)
+
+    def snapshot(self) -> Dict:
+        samples = self._window()
+        n = len(samples)
+        if n == 0:
+            return {"name": self.name, "status": UNKNOWN, "calls": 0, "error_rate": 0.0, "p95_ms": 0.0}
+        errors = sum(1 for _, ok, _ in samples if not ok)
+        error_rate = errors / n
+        latencies = sorted(latency for _, _, latency in samples)
+        p95 = latencies[min(n - 1, int(n * 0.95))] * 1000
+
+        status = OK
+        if n >= settings.health_min_calls:
+            if error_rate >= settings.health_down_error_rate:
+                status = DOWN
+            elif error_rate >= settings.health_degraded_error_rate or p95 >= settings.health_latency_p95_ms:
+                status = DEGRADED
+        return {
+            "name": self.name,
+            "status": status,
+            "calls": n,
+            "error_rate": round(error_rate, 3),
+            "p95_ms": round(p95, 1),
+            "last_error": self.last_error,
+            "last_error_at": self.last_error_at,
+        }
+
+
+class HealthRegistry:
+    """组件健康度注册表"""
+
+    def __init__(self):
+        self.components: Dict[str, ComponentHealth] = {}
+        self._mode = OK
+
+    def component(self, name: str) -> ComponentHealth:
+        health = self.components.get(name)
+        if health is None:
+            health = self.components[name] = ComponentHealth(name)
+        return health
+
+    def record(self, name: str, ok: bool, latency: float, error: str = ""):
+        self.component(name).record(ok, latency, error)
+
+    @contextmanager
+    def track(self, name: str):
+        """记录一次调用：抛出异常或调用 mark_failed() 视为失败"""
+        state = [False, ""]
+        token = _call_state.set(state)
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            state[0] = True
+            state[1] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _call_state.reset(token)
+            self.record(name, not state[0], time.perf_counter() - started, state[1])
+
+    def snapshot(self) -> Dict[str, Dict]:
+        return {name: health.snapshot() for name, health in sorted(self.components.items())}
+
+    @property
+    def degraded(self) -> bool:
+        """是否处于降级模式（跳过新开仓）"""
+        if not settings.degraded_mode_enabled:
+            return False
+        unhealthy = [
+            name for name, snap in self.snapshot().items()
+            if name.startswith(CRITICAL_COMPONENTS) and snap["status"] in (DEGRADED, DOWN)
+        ]
+        mode = DEGRADED if unhealthy else OK
+        if mode != self._mode:
+            self._mode = mode
+            if unhealthy:
+                logger.warning(f"🩺 进入降级模式（暂停新开仓，止损监控继续）: {', '.join(unhealthy)}")
+            else:
+                logger.info("🩺 关键组件恢复正常，退出降级模式")
+        return mode == DEGRADED
+
+    def get_status(self) -> Dict:
+        components = self.snapshot()
+        statuses = [snap["status"] for snap in components.values()]
+        llm = [snap for name, snap in components.items() if name.startswith("llm.")]
+        return {
+            "mode": DEGRADED if self.degraded else OK,
+            "status": DOWN if DOWN in statuses else DEGRADED if DEGRADED in statuses else OK,
+            "llm_available": not llm or any(snap["status"] != DOWN for snap in llm),
+            "components": components,
+        }
+
+
+# 全局健康度注册表
+health_registry = HealthRegistry()
@@ -0,0 +1,108 @@
+"""
+日志配置
+
+- 所有sink使用 enqueue=True：日志记录只入队，格式化和文件写入在后台线程完成，不阻塞事件循环
+- 按模块设置日志级别（LOG_MODULE_LEVELS），例如把交易所和K线压缩的逐条日志降到WARNING
+- 大段内容（提示词、K线摘要、LLM原始输出）通过 log_payload 输出：
+  默认只在DEBUG级别且延迟格式化，可切换为按比例采样到INFO或全部输出
+
+热点路径请使用 loguru 的 "{}" 占位符而不是f-string，这样级别被过滤时不会产生格式化开销：
+    logger.debug("获取K线 {} {} x{}", symbol, interval, limit)
+"""
+import random
+import sys
+from typing import Callable, Dict, Optional, Union
+
+from loguru import logger
+
+from backend.config import settings
+
+
+def parse_module_levels(spec: str) -> Dict[str, int]:
+    """解析 "backend.exchanges=WARNING,backend.agents.kline_compressor=ERROR" 为 {模块前缀: 级别号}"""
+    levels = {}
+    for item in (spec or "").split(","):
+        if "=" not in item:
+            continue
+        module, level = item.split("=", 1)
+        module, level = module.strip(), level.strip().upper()
+        if not module or not level:
+            continue
+        try:
+            levels[module] = logger.level(level).no
+        except ValueError:
+            logger.warning(f"⚠️ 未知日志级别: {item}")
+    return levels
+
+
+class ModuleLevelFilter:
+    """按模块前缀（最长匹配）过滤日志级别，结果按模块名缓存"""
+
+    def __init__(self, default_level: str, module_levels: Dict[str, int]):
+        self.default_no = logger.level(default_level.upper()).no
+        self.module_levels = module_levels
+        self._cache: Dict[str, int] = {}
+
+    @property
+    def min_level(self) -> int:
+        """sink的最低级别：低于它的调用在loguru入口处直接返回，不构造记录也不格式化"""
+        return min([self.default_no, *self.module_levels.values()])
+
+    def _level_for(self, name: str) -> int:
+        level = self._cache.get(name)
+        if level is None:
+            level = self.default_no
+            best = -1
+            for prefix, no in self.module_levels.items():
+                if (name == prefix or name.startswith(prefix + ".")) and len(prefix) > best:
+                    level, best = no, len(prefix)
+            self._cache[name] = level
+        return level
+
+    def __call__(self, record) -> bool:
+        return record["level"].no >= self._level_for(record["name"] or "")
+
+
+def setup_logging():
+    """替换loguru默认sink：控制台 + 按天滚动的文件，均为异步队列写入"""
+    level_filter = ModuleLevelFilter(settings.log_level, parse_module_levels(settings.log_module_levels))
+    logger.remove()
+    logger.add(sys.stderr, level=level_filter.min_level, filter=level_filter, enqueue=settings.log_enqueue)
+    logger.add(
+        "logs/trading_{time}.log",
+        level=level_filter.min_level,
+        filter=level_filter,
+        rotation="1 day",
+        retention="30 days",
+        enqueue=settings.log_enqueue,
+        encoding="utf-8",
+    )
+
+
+def log_payload(title: str, payload: Union[str, Callable[[], str]], max_chars: Optional[int] = None):
+    """
+    输出大段内容（提示词、K线摘要等）
+
+    LOG_PAYLOADS:
+        debug  - 仅DEBUG级别输出（默认），payload为函数时只有真正输出才会计算
+        sample - 按 LOG_PAYLOAD_SAMPLE_RATE 的比例以INFO输出，其余降为DEBUG
+        all    - 全部以INFO输出
+        off    - 不输出
+    """
+    mode = settings.log_payloads
+    if mode == "off":
+        return
+    level = "DEBUG"
+    if mode == "all" or (mode == "sample" and random.random() < settings.log_payload_sample_rate):
+        level = "INFO"
+    limit = max_chars or settings.log_payload_max_chars
+
+    def render() -> str:
+        text = payload() if callable(payload) else payload
+        text = str(text)
+        if limit and len(text) > limit:
+            text = text[:limit] + f"...(共{len(text)}字符，已截断)"
+        return text
+
+    # depth=1 让日志记录归属到调用方模块，按模块级别过滤
+    logger.opt(lazy=True, depth=1).log(level, "{}:\n{}", lambda: title, render)
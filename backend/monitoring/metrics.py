@@ -0,0 +1,311 @@
+"""
+运行指标（Prometheus文本格式）
+
+交易周期、各阶段、智能体分析和交易所接口的耗时直方图，以及交易所错误和模拟数据后备计数。
+指标只在内存中累加，渲染在 /metrics 被抓取时才进行；METRICS_ENABLED=false 时
+记录函数直接返回，不调用计时器，几乎没有开销。
+
+不依赖 prometheus_client，输出格式与其兼容，可直接被Prometheus抓取。
+声明了 span_name 的直方图在计时的同时会开启一个追踪span（见 tracing.py）。
+交易所接口同时记录到组件健康度（见 health.py）。
+"""
+import functools
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from backend.config import settings
+from backend.monitoring.health import health_registry, mark_failed
+from backend.monitoring.tracing import tracer
+
+
+# 默认耗时分桶（秒），覆盖从毫秒级交易所请求到数分钟的R1推理
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+_INF_LABEL = 'le="+Inf"'
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        if not settings.metrics_enabled:
+            return
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class _Timer:
+    """计时上下文，同时支持 with 和 async with"""
+    __slots__ = ("histogram", "labels", "started", "span", "token")
+
+    def __init__(self, histogram: "Histogram", labels: Dict):
+        self.histogram = histogram
+        self.labels = labels
+        self.started = 0.0
+        self.span = None
+        self.token = None
+
+    def __enter__(self):
+        if self.histogram.span_name and tracer.enabled:
+            self.span, self.token = tracer.start_span(
+                self.histogram.span_name_for(self.labels), self.labels, root=self.histogram.span_root
+            )
+        if settings.metrics_enabled:
+            self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.started:
+            self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        if self.span is not None:
+            tracer.end_span(self.span, self.token, exc)
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+
+class Histogram(_Metric):
+    """累积分桶直方图"""
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        span_name: str = "",
+        span_label: str = "",
+        span_root: bool = False
+    ):
+        """
+        Args:
+            span_name: 计时时同时开启的span名称，为空则不追踪
+            span_label: 把该标签的值拼到span名称后（如 stage.fetch_ticker）
+            span_root: 没有活动trace时是否新建trace
+        """
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.span_name = span_name
+        self.span_label = span_label
+        self.span_root = span_root
+        # 每组标签: [各桶计数..., +Inf计数], 总和
+        self._counts: Dict[Tuple[str, ...], List[int]] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels):
+        if not settings.metrics_enabled:
+            return
+        key = self._key(labels)
+        counts = self._counts.get(key)
+        if counts is None:
+            counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+            self._sums[key] = 0.0
+        counts[bisect_left(self.buckets, value)] += 1
+        self._sums[key] += value
+
+    def span_name_for(self, labels: Dict) -> str:
+        if self.span_label and labels.get(self.span_label):
+            return f"{self.span_name}.{labels[self.span_label]}"
+        return self.span_name
+
+    def time(self, **labels) -> _Timer:
+        """计时上下文: with HISTOGRAM.time(stage="x"): ..."""
+        return _Timer(self, labels)
+
+    def snapshot(self, **labels) -> Optional[Dict]:
+        """单组标签的统计（调试/测试用）"""
+        key = self._key(labels)
+        counts = self._counts.get(key)
+        if counts is None:
+            return None
+        total = sum(counts)
+        return {"count": total, "sum": self._sums[key], "avg": self._sums[key] / total if total else 0.0}
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, counts in self._counts.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            cumulative += counts[-1]
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, _INF_LABEL)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {self._sums[key]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        **span_options
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets, **span_options))
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"指标重复注册: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """渲染为Prometheus文本格式"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def timed(histogram: Histogram, **labels) -> Callable:
+    """异步函数计时装饰器（固定标签）"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with histogram.time(**labels):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument_exchange(func):
+    """交易所接口计时装饰器，以方法名作为 endpoint 标签"""
+    endpoint = func.__name__
+
+    component = f"exchange.{endpoint}"
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        with EXCHANGE_LATENCY.time(endpoint=endpoint), health_registry.track(component):
+            return await func(*args, **kwargs)
+    return wrapper
+
+
+def record_exchange_error(endpoint: str, error: str):
+    """交易所接口错误：计数并把当前调用标记为失败（计入组件健康度）"""
+    EXCHANGE_ERRORS.inc(endpoint=endpoint, error=error)
+    mark_failed(error)
+
+
+def instrument_agent(func):
+    """智能体 analyze 计时装饰器，按智能体角色和交易对打标签"""
+    @functools.wraps(func)
+    async def wrapper(self, symbol, *args, **kwargs):
+        with AGENT_LATENCY.time(agent=self.role.value, symbol=symbol):
+            return await func(self, symbol, *args, **kwargs)
+    return wrapper
+
+
+# 全局指标注册表
+registry = MetricsRegistry()
+
+CYCLE_LATENCY = registry.histogram(
+    "trading_cycle_duration_seconds", "完整交易周期耗时", ["mode"],
+    span_name="trading_cycle", span_root=True
+)
+STAGE_LATENCY = registry.histogram(
+    "trading_stage_duration_seconds", "交易周期各阶段耗时", ["stage", "symbol"],
+    span_name="stage", span_label="stage"
+)
+AGENT_LATENCY = registry.histogram(
+    "agent_analyze_duration_seconds", "智能体分析耗时", ["agent", "symbol"],
+    span_name="agent", span_label="agent"
+)
+EXCHANGE_LATENCY = registry.histogram(
+    "exchange_request_duration_seconds", "交易所接口耗时", ["endpoint"],
+    span_name="exchange", span_label="endpoint"
+)
+EXCHANGE_ERRORS = registry.counter(
+    "exchange_errors_total", "交易所接口错误次数", ["endpoint", "error"]
+)
+MOCK_FALLBACKS = registry.counter(
+    "exchange_mock_fallbacks_total", "交易所接口失败后使用模拟数据的次数", ["endpoint"]
+)
+JOB_DURATION = registry.histogram(
+    "job_duration_seconds", "后台任务单次运行耗时", ["job"]
+)
+JOB_RUNS = registry.counter(
+    "job_runs_total", "后台任务运行次数（ok/error/skipped/missed）", ["job", "status"]
+)
+CPU_TASK_LATENCY = registry.histogram(
+    "cpu_task_duration_seconds", "CPU密集型计算耗时（含进程池排队和序列化）", ["func", "mode"],
+    span_name="cpu", span_label="func"
+)
+ORDERS = registry.counter(
+    "orders_total", "订单最终状态计数（filled/partially_filled/rejected/cancelled）", ["state"]
+)
+ORDER_FILL_LATENCY = registry.histogram(
+    "order_fill_duration_seconds", "订单从提交到最终状态的耗时", ["state"]
+)
+USER_STREAM_EVENTS = registry.counter(
+    "user_stream_events_total", "用户数据流事件计数（按事件类型）", ["event"]
+)
+EXECUTION_SLIPPAGE = registry.histogram(
+    "execution_slippage_bps", "成交均价相对到达价格的滑点（基点，正数为不利）", ["algo"],
+    buckets=(-20, -10, -5, -2, 0, 2, 5, 10, 20, 50, 100)
+)
+ORDER_BOOK_UPDATES = registry.counter(
+    "order_book_updates_total", "本地订单簿更新次数（rest/stream/resync）", ["source"]
+)
+RISK_REJECTIONS = registry.counter(
+    "risk_rejections_total", "下单前风控拒绝次数（按检查项）", ["check"]
+)
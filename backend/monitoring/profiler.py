@@ -0,0 +1,206 @@
+"""
+运行时性能诊断
+
+SamplingProfiler: 独立线程按固定间隔读取所有线程的调用栈（sys._current_frames），
+    汇总成 speedscope 格式的火焰图JSON，可直接拖入 https://www.speedscope.app 查看。
+    不需要在容器里安装额外工具，采样间隔5ms时开销通常在1%左右。
+
+LoopWatchdog: 事件循环内的心跳协程 + 外部监视线程。
+    心跳协程测量 asyncio.sleep 的实际延迟（事件循环滞后）；
+    监视线程发现心跳超过阈值未更新时，抓取事件循环线程当前的调用栈并记录日志，
+    从而定位阻塞事件循环的同步代码（例如同步SDK调用、pandas/talib计算）。
+"""
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from backend.config import settings
+
+
+class SamplingProfiler:
+    """采样分析器（同一时间只允许一次采样）"""
+
+    def __init__(self):
+        self._lock = asyncio.Lock()
+        self.running = False
+
+    def _sample_loop(self, seconds: float, interval: float, stop: threading.Event, loop_thread_id: int) -> Dict:
+        frames: List[Dict] = []
+        frame_index: Dict[Tuple[str, str, int], int] = {}
+        # 每个线程一份采样: {thread_id: {"samples": [...], "weights": [...]}}
+        threads: Dict[int, Dict] = {}
+        own_id = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        started = time.perf_counter()
+        last = started
+        deadline = started + seconds
+
+        while not stop.is_set() and time.perf_counter() < deadline:
+            now = time.perf_counter()
+            weight = now - last
+            last = now
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    key = (code.co_name, code.co_filename, code.co_firstlineno)
+                    index = frame_index.get(key)
+                    if index is None:
+                        index = frame_index[key] = len(frames)
+                        frames.append({"name": code.co_name, "file": code.co_filename, "line": code.co_firstlineno})
+                    stack.append(index)
+                    frame = frame.f_back
+                stack.reverse()
+                profile = threads.setdefault(thread_id, {"samples": [], "weights": []})
+                profile["samples"].append(stack)
+                profile["weights"].append(weight)
+            time.sleep(interval)
+
+        elapsed = time.perf_counter() - started
+        profiles = []
+        for thread_id, data in threads.items():
+            if not data["samples"]:
+                continue
+            name = names.get(thread_id, str(thread_id))
+            if thread_id == loop_thread_id:
+                name = f"{name} (事件循环)"
+            profiles.append({
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(data["weights"]),
+                "samples": data["samples"],
+                "weights": data["weights"],
+            })
+        # 事件循环线程排在最前面
+        profiles.sort(key=lambda p: (not p["name"].endswith("(事件循环)"), -p["endValue"]))
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": profiles,
+            "name": f"noloss-trading {seconds:.0f}s",
+            "activeProfileIndex": 0,
+            "exporter": "backend.monitoring.profiler",
+            "metadata": {"elapsed": elapsed, "interval": interval, "samples": sum(len(t["samples"]) for t in threads.values())},
+        }
+
+    async def profile(self, seconds: float = 30, interval: Optional[float] = None) -> Dict:
+        """
+        对当前进程采样指定秒数
+
+        Returns:
+            speedscope 格式的字典
+        """
+        if self._lock.locked():
+            raise RuntimeError("已有采样正在进行")
+        interval = interval or settings.profiler_interval
+        async with self._lock:
+            self.running = True
+            stop = threading.Event()
+            try:
+                logger.info(f"🔬 开始采样分析: {seconds}s, 间隔{interval * 1000:.0f}ms")
+                # 采样线程在事件循环之外运行，事件循环被阻塞时仍能采到阻塞点
+                return await asyncio.to_thread(self._sample_loop, seconds, interval, stop, threading.get_ident())
+            finally:
+                stop.set()
+                self.running = False
+
+
+class LoopWatchdog:
+    """事件循环阻塞监视器"""
+
+    def __init__(self, history: int = 2000, max_blocks: int = 20):
+        self._lags: deque = deque(maxlen=history)
+        self.blocks: deque = deque(maxlen=max_blocks)
+        self._heartbeat = 0.0
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.stats = {"blocks": 0, "max_lag_ms": 0.0}
+
+    def start(self):
+        """在事件循环中启动"""
+        if not settings.loop_watchdog_enabled or self._task:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._task = asyncio.create_task(self._beat())
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        logger.info(f"🐶 事件循环监视已启动: 阻塞阈值{settings.loop_block_threshold_ms}ms")
+
+    def stop(self):
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _beat(self):
+        interval = settings.loop_watchdog_interval
+        while True:
+            expected = time.monotonic() + interval
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self._lags.append(lag)
+            self.stats["max_lag_ms"] = max(self.stats["max_lag_ms"], lag * 1000)
+            # 阻塞结束后把监视线程记录的阻塞时长更新为实际总时长
+            if self.blocks and self.blocks[-1]["_since"] == self._heartbeat:
+                self.blocks[-1]["blocked_ms"] = round(lag * 1000, 1)
+            self._heartbeat = now
+
+    def _watch(self):
+        threshold = settings.loop_block_threshold_ms / 1000
+        interval = settings.loop_watchdog_interval
+        reported_beat = 0.0
+        while not self._stop.wait(min(threshold / 2, 0.05)):
+            beat = self._heartbeat
+            blocked = time.monotonic() - beat - interval
+            # 同一次阻塞只记录一次
+            if blocked < threshold or beat == reported_beat:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = traceback.format_stack(frame)
+            reported_beat = beat
+            self.stats["blocks"] += 1
+            self.blocks.append({
+                "_since": beat,
+                "at": time.time(),
+                "blocked_ms": round(blocked * 1000, 1),
+                "stack": [line.strip() for line in stack[-12:]],
+            })
+            logger.warning(
+                f"🐢 事件循环已阻塞 {blocked * 1000:.0f}ms，当前调用栈:\n{''.join(stack[-12:])}"
+            )
+
+    def get_status(self) -> Dict:
+        lags = sorted(self._lags)
+        n = len(lags)
+        return {
+            "enabled": settings.loop_watchdog_enabled,
+            "threshold_ms": settings.loop_block_threshold_ms,
+            "samples": n,
+            "lag_avg_ms": round(sum(lags) / n * 1000, 2) if n else 0.0,
+            "lag_p99_ms": round(lags[min(n - 1, int(n * 0.99))] * 1000, 2) if n else 0.0,
+            "lag_max_ms": round(self.stats["max_lag_ms"], 2),
+            "blocks": self.stats["blocks"],
+            "recent_blocks": [{k: v for k, v in b.items() if k != "_since"} for b in self.blocks],
+        }
+
+
+# 全局实例
+sampling_profiler = SamplingProfiler()
+loop_watchdog = LoopWatchdog()
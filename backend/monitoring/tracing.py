@@ -0,0 +1,339 @@
+"""
+结构化链路追踪
+
+每个交易周期是一条trace，周期内的阶段、智能体分析、交易所请求、LLM请求和数据库提交
+都是其中的span。当前span保存在 contextvars 中：
+- asyncio.gather / create_task 创建的子任务会复制上下文，子span自动挂到父span下
+- asyncio.to_thread 同样复制上下文，线程中的SDK调用保持在同一trace内
+- LLM调度器在提交时记录父span，由工作协程执行请求时显式挂回，并通过 traceparent 头向外传递
+
+没有活动trace时（例如止损监控的价格轮询），非根span直接跳过，不产生开销。
+完成的span定期批量导出到JSONL文件或本地OTLP/HTTP采集器（如 otel-collector 的 4318 端口），
+同时在内存中保留最近的trace，用于计算关键路径（哪一个慢调用决定了整个周期的耗时）。
+"""
+import asyncio
+import contextvars
+import json
+import os
+import secrets
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import aiohttp
+from loguru import logger
+
+from backend.config import settings
+
+
+class Span:
+    """单个span"""
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start_ns", "end_ns", "attributes", "status", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes
+        self.status = "ok"
+        self.error = ""
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns or time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    @property
+    def traceparent(self) -> str:
+        """W3C traceparent 头"""
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def to_dict(self) -> Dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "status": self.status,
+            "error": self.error,
+        }
+
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+class JsonlSpanExporter:
+    """逐行写入JSONL文件"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _write(self, lines: List[str]):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+    async def export(self, spans: List[Span]):
+        lines = [json.dumps(span.to_dict(), ensure_ascii=False, default=str) for span in spans]
+        await asyncio.to_thread(self._write, lines)
+
+
+class OtlpHttpSpanExporter:
+    """以OTLP/HTTP JSON格式发送到本地采集器"""
+
+    def __init__(self, endpoint: str, service_name: str):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @staticmethod
+    def _attr(key: str, value) -> Dict:
+        if isinstance(value, bool):
+            return {"key": key, "value": {"boolValue": value}}
+        if isinstance(value, int):
+            return {"key": key, "value": {"intValue": str(value)}}
+        if isinstance(value, float):
+            return {"key": key, "value": {"doubleValue": value}}
+        return {"key": key, "value": {"stringValue": str(value)}}
+
+    def _encode(self, spans: List[Span]) -> Dict:
+        otlp_spans = []
+        for span in spans:
+            item = {
+                "traceId": span.trace_id,
+                "spanId": span.span_id,
+                "name": span.name,
+                "kind": 1,
+                "startTimeUnixNano": str(span.start_ns),
+                "endTimeUnixNano": str(span.end_ns),
+                "attributes": [self._attr(k, v) for k, v in span.attributes.items()],
+                "status": {"code": 2, "message": span.error} if span.status == "error" else {"code": 1},
+            }
+            if span.parent_id:
+                item["parentSpanId"] = span.parent_id
+            otlp_spans.append(item)
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [self._attr("service.name", self.service_name)]},
+                "scopeSpans": [{"scope": {"name": "backend.monitoring.tracing"}, "spans": otlp_spans}],
+            }]
+        }
+
+    async def export(self, spans: List[Span]):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession()
+        async with self._session.post(
+            self.endpoint, json=self._encode(spans), timeout=aiohttp.ClientTimeout(total=10)
+        ) as response:
+            if response.status >= 300:
+                logger.warning(f"⚠️ OTLP导出失败: {response.status} {(await response.text())[:200]}")
+
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+
+
+class Tracer:
+    """追踪器"""
+
+    def __init__(self, max_traces: int = 50, max_buffer: int = 20000):
+        self._buffer: deque = deque(maxlen=max_buffer)
+        self._traces: "OrderedDict[str, List[Span]]" = OrderedDict()
+        self.max_traces = max_traces
+        self._exporter = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self.stats = {"spans": 0, "traces": 0, "exported": 0, "export_errors": 0, "dropped": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return settings.tracing_enabled
+
+    def current_span(self) -> Optional[Span]:
+        return _current_span.get()
+
+    def start_span(
+        self,
+        name: str,
+        attributes: Optional[Dict] = None,
+        parent: Optional[Span] = None,
+        root: bool = False
+    ):
+        """
+        开始一个span并设为当前span
+
+        Args:
+            parent: 显式指定父span（跨队列/工作协程时使用），默认取当前上下文
+            root: 没有活动trace时新建trace；为False时没有父span则不记录
+
+        Returns:
+            (span, token)，未记录时为 (None, None)
+        """
+        if not self.enabled:
+            return None, None
+        parent = parent or _current_span.get()
+        if parent is None:
+            if not root:
+                return None, None
+            trace_id = secrets.token_hex(16)
+            parent_id = None
+            self.stats["traces"] += 1
+        else:
+            trace_id = parent.trace_id
+            parent_id = parent.span_id
+        span = Span(name, trace_id, parent_id, dict(attributes or {}))
+        return span, _current_span.set(span)
+
+    def end_span(self, span: Optional[Span], token, error: Optional[BaseException] = None):
+        if span is None:
+            return
+        span.end_ns = time.time_ns()
+        if error is not None:
+            span.status = "error"
+            span.error = f"{type(error).__name__}: {error}"[:500]
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # 在不同上下文中结束（极少见），直接恢复为父span
+            pass
+        self._record(span)
+
+    @contextmanager
+    def span(self, name: str, parent: Optional[Span] = None, root: bool = False, **attributes):
+        """with tracer.span("name", symbol=...) as span: ..."""
+        span, token = self.start_span(name, attributes, parent=parent, root=root)
+        try:
+            yield span
+        except BaseException as e:
+            self.end_span(span, token, e)
+            raise
+        else:
+            self.end_span(span, token)
+
+    def _record(self, span: Span):
+        self.stats["spans"] += 1
+        if len(self._buffer) == self._buffer.maxlen:
+            self.stats["dropped"] += 1
+        self._buffer.append(span)
+        spans = self._traces.get(span.trace_id)
+        if spans is None:
+            spans = self._traces[span.trace_id] = []
+            while len(self._traces) > self.max_traces:
+                self._traces.popitem(last=False)
+        spans.append(span)
+
+    # ---------- 导出 ----------
+
+    def start(self):
+        """启动后台导出任务（在事件循环中调用）"""
+        if not self.enabled or self._flush_task:
+            return
+        if settings.tracing_exporter == "otlp":
+            self._exporter = OtlpHttpSpanExporter(settings.tracing_otlp_endpoint, settings.tracing_service_name)
+            target = settings.tracing_otlp_endpoint
+        else:
+            self._exporter = JsonlSpanExporter(settings.tracing_jsonl_path)
+            target = settings.tracing_jsonl_path
+        self._flush_task = asyncio.create_task(self._flush_loop())
+        logger.info(f"🧵 链路追踪已启用: {settings.tracing_exporter} → {target}")
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(settings.tracing_flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        if not self._exporter or not self._buffer:
+            return
+        spans = list(self._buffer)
+        self._buffer.clear()
+        try:
+            await self._exporter.export(spans)
+            self.stats["exported"] += len(spans)
+        except Exception as e:
+            self.stats["export_errors"] += 1
+            logger.warning(f"⚠️ span导出失败（丢弃{len(spans)}个）: {e}")
+
+    async def shutdown(self):
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+        if isinstance(self._exporter, OtlpHttpSpanExporter):
+            await self._exporter.close()
+
+    # ---------- 分析 ----------
+
+    def critical_path(self, trace_id: str) -> List[Dict]:
+        """
+        计算关键路径：从根span开始，每层取结束最晚的子span，
+        即决定父span耗时的那条调用链
+        """
+        spans = self._traces.get(trace_id) or []
+        children: Dict[Optional[str], List[Span]] = {}
+        for span in spans:
+            children.setdefault(span.parent_id, []).append(span)
+        roots = children.get(None) or []
+        if not roots:
+            return []
+        path = []
+        node = max(roots, key=lambda s: s.duration_ms)
+        while node is not None:
+            path.append({
+                "name": node.name,
+                "duration_ms": round(node.duration_ms, 1),
+                "attributes": node.attributes,
+                "status": node.status,
+            })
+            kids = children.get(node.span_id)
+            node = max(kids, key=lambda s: s.end_ns or time.time_ns()) if kids else None
+        return path
+
+    def get_traces(self) -> List[Dict]:
+        """最近trace的摘要（最新的在前）"""
+        result = []
+        for trace_id, spans in reversed(self._traces.items()):
+            root = next((s for s in spans if s.parent_id is None), None)
+            result.append({
+                "trace_id": trace_id,
+                "name": root.name if root else spans[0].name,
+                "duration_ms": round(root.duration_ms, 1) if root else None,
+                "spans": len(spans),
+                "errors": sum(1 for s in spans if s.status == "error"),
+                "started_at": (root or spans[0]).start_ns / 1e9,
+            })
+        return result
+
+    def get_trace(self, trace_id: str) -> Optional[Dict]:
+        spans = self._traces.get(trace_id)
+        if spans is None:
+            return None
+        return {
+            "trace_id": trace_id,
+            "critical_path": self.critical_path(trace_id),
+            "spans": [s.to_dict() for s in sorted(spans, key=lambda s: s.start_ns)],
+        }
+
+    def get_status(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "exporter": settings.tracing_exporter,
+            "buffered": len(self._buffer),
+            **self.stats,
+        }
+
+
+# 全局追踪器实例
+tracer = Tracer()
@@ -0,0 +1,105 @@
+"""
+启动流程辅助
+
+LazyObject: 模块级单例的延迟代理。main.py 中的交易引擎、智能体团队、交易所客户端等
+    依赖 pandas/talib/openai/交易所SDK，导入需要数秒。改为代理后 import backend.main 只加载
+    FastAPI和数据库层，应用可以先对外提供服务；重模块在 lifespan 启动的后台任务中
+    （线程内）导入，首次访问属性时若尚未导入则当场导入。
+
+StartupReport: 记录各启动阶段耗时，全部完成后输出启动耗时报告（也可通过 /api/startup 查询）。
+"""
+import importlib
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+
+class LazyObject:
+    """延迟导入的模块属性代理"""
+    __slots__ = ("_module", "_attr", "_target")
+
+    def __init__(self, module: str, attr: str):
+        self._module = module
+        self._attr = attr
+        self._target = None
+
+    def _resolve(self):
+        if self._target is None:
+            self._target = getattr(importlib.import_module(self._module), self._attr)
+        return self._target
+
+    def is_loaded(self) -> bool:
+        return self._target is not None or self._module in sys.modules
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+    def __repr__(self):
+        state = "loaded" if self.is_loaded() else "lazy"
+        return f"<LazyObject {self._module}.{self._attr} ({state})>"
+
+
+class StartupReport:
+    """启动耗时报告"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last = self.started
+        self.phases: List[Dict] = []
+        self.serving_ms: Optional[float] = None
+        self.ready_ms: Optional[float] = None
+        self.error = ""
+
+    def _elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def checkpoint(self, name: str):
+        """记录从上一个检查点到现在的耗时（用于模块导入等同步阶段）"""
+        now = time.perf_counter()
+        self.phases.append({"name": name, "ms": round((now - self._last) * 1000, 1)})
+        self._last = now
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            self.phases.append({"name": name, "ms": round((now - started) * 1000, 1)})
+            self._last = now
+
+    def mark_serving(self):
+        """lifespan 启动完成，开始接受请求"""
+        self.serving_ms = round(self._elapsed_ms(), 1)
+        logger.info(f"🌐 应用已开始提供服务: 启动后 {self.serving_ms:.0f}ms")
+
+    def mark_ready(self, error: str = ""):
+        """后台初始化全部完成（或失败），输出报告"""
+        self.ready_ms = round(self._elapsed_ms(), 1)
+        self.error = error
+        lines = [f"   {p['name']:<36}{p['ms']:>10.1f}ms" for p in self.phases]
+        lines.append(f"   {'(serving)':<36}{self.serving_ms or 0:>10.1f}ms")
+        lines.append(f"   {'(ready)':<36}{self.ready_ms:>10.1f}ms")
+        status = f"❌ 启动初始化失败: {error}" if error else "🚀 启动耗时报告"
+        logger.info(status + "\n" + "\n".join(lines))
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_ms is not None and not self.error
+
+    def get_status(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "serving_ms": self.serving_ms,
+            "ready_ms": self.ready_ms,
+            "error": self.error,
+            "phases": self.phases,
+        }
+
+
+# 全局启动报告（在 main.py 最先导入，计时从这里开始）
+startup_report = StartupReport()
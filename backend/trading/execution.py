@@ -0,0 +1,318 @@
+"""
+执行算法
+
+引擎决定交易方向和数量后，由执行算法决定怎么下单，子单统一通过订单管理器提交：
+- market: 单笔市价单
+- limit_at_touch: 在己方最优价挂只做maker的限价单（GTX），超时未成交的部分撤单后转市价
+- twap: 在N分钟内均匀拆成若干笔市价单
+- depth: 按订单簿可见深度拆单，每笔子单不超过对手盘前几档数量的一定比例
+
+执行质量：下单前取订单簿中间价作为到达价格，成交后计算成交均价相对到达价格的滑点
+（基点，正数为不利），按算法记录到指标和交易记录。订单簿读取订单簿服务的本地簿，
+已衔接增量流时没有额外的REST请求。
+
+TWAP和深度拆单会持续数分钟，调用方传入 on_complete 时母单转为后台任务执行，
+execute() 立即返回，完成后回调记录成交；同一交易对同一时间只有一个后台母单。
+"""
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from loguru import logger
+
+from backend.config import settings
+from backend.exchanges.order_book import order_book_service
+from backend.monitoring.metrics import EXECUTION_SLIPPAGE
+from backend.trading.order_manager import order_manager, TERMINAL_STATES
+
+
+MARKET = "market"
+LIMIT_AT_TOUCH = "limit_at_touch"
+TWAP = "twap"
+DEPTH = "depth"
+
+ALGOS = (MARKET, LIMIT_AT_TOUCH, TWAP, DEPTH)
+
+# 可以转为后台执行的算法（耗时较长，不阻塞交易周期）
+BACKGROUND_ALGOS = (TWAP, DEPTH)
+
+# 深度拆单的子单数量上限（盘口异常稀薄时避免无限拆单）
+MAX_DEPTH_CHILDREN = 50
+
+
+def parse_book(book: Dict) -> Tuple[List[Tuple[float, float]], List[Tuple[float, float]]]:
+    """订单簿转为 [(价格, 数量), ...]，买盘从高到低、卖盘从低到高"""
+    bids = sorted(((float(p), float(q)) for p, q, *_ in book.get("bids", [])), reverse=True)
+    asks = sorted((float(p), float(q)) for p, q, *_ in book.get("asks", []))
+    return bids, asks
+
+
+class ExecutionEngine:
+    """执行算法层（位于交易引擎和交易所客户端之间）"""
+
+    def __init__(self):
+        # 算法 -> {"orders", "filled_notional", "slippage_sum", "slippage_count", "fallbacks"}
+        self.stats: Dict[str, Dict] = {}
+        # 后台执行中的母单：交易对 -> 母单
+        self.working: Dict[str, Dict] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def select_algo(self, notional: float, urgent: bool = False) -> str:
+        """止损等紧急平仓始终市价；auto 模式下按订单金额选择"""
+        if urgent:
+            return MARKET
+        if settings.execution_algo in ALGOS:
+            return settings.execution_algo
+        if notional >= settings.execution_twap_notional:
+            return TWAP
+        if notional >= settings.execution_slice_notional:
+            return DEPTH
+        return LIMIT_AT_TOUCH
+
+    async def execute(
+        self,
+        symbol: str,
+        side: str,
+        amount: float,
+        intent: str,
+        short: bool = False,
+        algo: Optional[str] = None,
+        urgent: bool = False,
+        closing: bool = False,
+        on_complete: Optional[Callable[[Dict], Awaitable[None]]] = None
+    ) -> Dict:
+        """
+        执行一笔订单
+
+        Args:
+            side: buy / sell（short=True 时为做空开仓）
+            intent: 意图键，同一意图重复执行不会重复下单
+            algo: 指定执行算法，不传则按 select_algo() 选择
+            closing: 平仓订单（下单前风控按减仓放行）
+            on_complete: 传入时 TWAP/深度拆单转为后台执行，完成（或被取消）后以母单调用
+
+        Returns:
+            母单字典（children 为子单），用 order_manager.is_accepted() 判断是否有成交或挂单被接受；
+            转为后台执行时立即返回，母单 background 为 True；
+            同一意图的母单已执行过时返回其副本，duplicate 为 True（调用方不要重复记录）
+        """
+        book = await order_book_service.snapshot(symbol, limit=max(settings.execution_depth_levels, 5))
+        bids, asks = parse_book(book)
+        arrival = (bids[0][0] + asks[0][0]) / 2 if bids and asks else 0.0
+        if algo not in ALGOS:
+            algo = self.select_algo(amount * arrival, urgent) if arrival > 0 else MARKET
+
+        parent = order_manager.new_parent(
+            symbol, "short" if short else side, amount, intent, algo=algo, arrival_price=arrival
+        )
+        if parent["children"]:
+            logger.warning(f"⚠️ 母单 {parent['client_order_id']} 已执行过，不重复下单: {symbol} {side} {amount}")
+            return {**parent, "duplicate": True}
+        parent["closing"] = closing
+
+        if on_complete is not None and algo in BACKGROUND_ALGOS:
+            parent["background"] = True
+            self.working[symbol] = parent
+            task = asyncio.create_task(
+                self._run_background(parent, intent, short, bids, asks, on_complete),
+                name=f"execution-{parent['client_order_id']}"
+            )
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            logger.info(f"🧵 母单[{algo}]转后台执行: {symbol} {parent['side']} {amount}")
+            return parent
+
+        await self._run(parent, intent, short, bids, asks)
+        return parent
+
+    async def _run(self, parent: Dict, intent: str, short: bool, bids: List, asks: List):
+        """按母单的算法下子单，完成后汇总成交并记录执行质量"""
+        algo, arrival = parent["algo"], parent["arrival_price"]
+        started = time.perf_counter()
+        if algo == LIMIT_AT_TOUCH:
+            await self._limit_at_touch(parent, intent, short, bids, asks)
+        elif algo == TWAP:
+            await self._twap(parent, intent, short, arrival)
+        elif algo == DEPTH:
+            await self._depth(parent, intent, short, bids, asks)
+        else:
+            await self._child(parent, intent, parent["amount"], short)
+
+        order_manager.aggregate(parent)
+        self._record(parent)
+        slippage = parent["slippage_bps"]
+        logger.info(
+            f"🧮 执行完成[{algo}]: {parent['symbol']} {parent['side']} 成交{parent['filled_amount']}/{parent['amount']} "
+            f"均价{parent['avg_price']:.6f} 子单{len(parent['children'])}笔 耗时{time.perf_counter() - started:.1f}s"
+            + (f" 滑点{slippage:+.1f}bps" if slippage is not None else "")
+        )
+
+    async def _run_background(
+        self,
+        parent: Dict,
+        intent: str,
+        short: bool,
+        bids: List,
+        asks: List,
+        on_complete: Callable[[Dict], Awaitable[None]]
+    ):
+        """后台执行母单；被取消（停机）时停止拆单，已成交部分照常回调记录"""
+        try:
+            try:
+                await self._run(parent, intent, short, bids, asks)
+            except asyncio.CancelledError:
+                order_manager.aggregate(parent)
+                logger.warning(
+                    f"⏹️ 后台母单被取消，按已成交部分记录: {parent['symbol']} "
+                    f"成交{parent['filled_amount']}/{parent['amount']}"
+                )
+                await on_complete(parent)
+                raise
+            await on_complete(parent)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception(f"❌ 后台母单执行失败: {parent['symbol']} {parent['client_order_id']} - {e}")
+        finally:
+            self.working.pop(parent["symbol"], None)
+
+    def is_working(self, symbol: str) -> bool:
+        """交易对是否有后台执行中的母单"""
+        return symbol in self.working
+
+    async def shutdown(self):
+        """取消后台执行中的母单（已成交部分会先记录）"""
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _child(
+        self,
+        parent: Dict,
+        intent: str,
+        amount: float,
+        short: bool,
+        price: Optional[float] = None,
+        post_only: bool = False
+    ) -> Dict:
+        """提交一笔子单并挂到母单下（子单意图键带序号，重试时ID不变）"""
+        side = "buy" if parent["side"] == "buy" else "sell"
+        child = await order_manager.submit(
+            parent["symbol"], side, amount, intent=f"{intent}#{len(parent['children'])}",
+            short=short, price=price, post_only=post_only,
+            ref_price=parent["arrival_price"] or None, closing=parent.get("closing", False)
+        )
+        parent["children"].append(child)
+        return child
+
+    def _remaining(self, parent: Dict) -> float:
+        return parent["amount"] - sum(c["filled_amount"] for c in parent["children"])
+
+    def _worth_sending(self, amount: float, price: float) -> bool:
+        return amount > 0 and (price <= 0 or amount * price >= settings.execution_min_child_notional)
+
+    async def _limit_at_touch(self, parent: Dict, intent: str, short: bool, bids: List, asks: List):
+        """己方最优价只做maker挂单，超时撤单，剩余部分转市价"""
+        own_side = bids if parent["side"] == "buy" else asks
+        touch = own_side[0][0] if own_side else 0.0
+        if touch <= 0:
+            await self._child(parent, intent, parent["amount"], short)
+            return
+
+        child = await self._child(parent, intent, parent["amount"], short, price=touch, post_only=True)
+        if order_manager.is_accepted(child):
+            await order_manager.wait(child, settings.execution_limit_timeout)
+            if child["state"] not in TERMINAL_STATES:
+                await order_manager.cancel(child)
+
+        remaining = self._remaining(parent)
+        if self._worth_sending(remaining, touch):
+            self._stats(parent["algo"])["fallbacks"] += 1
+            logger.info(f"⏱️ 挂单未完全成交，剩余{remaining}转市价: {parent['symbol']}")
+            await self._child(parent, intent, remaining, short)
+
+    async def _twap(self, parent: Dict, intent: str, short: bool, arrival: float):
+        """在 execution_twap_minutes 内均匀拆成市价子单"""
+        slices = max(1, settings.execution_twap_slices)
+        # 子单金额不足下限时减少拆分数量
+        if arrival > 0:
+            slices = max(1, min(slices, int(parent["amount"] * arrival / settings.execution_min_child_notional)))
+        interval = settings.execution_twap_minutes * 60 / slices
+        for i in range(slices):
+            remaining = self._remaining(parent)
+            if remaining <= 0:
+                break
+            amount = remaining if i == slices - 1 else min(remaining, parent["amount"] / slices)
+            child = await self._child(parent, intent, amount, short)
+            if not order_manager.is_accepted(child):
+                logger.warning(f"⚠️ TWAP子单被拒绝，停止拆单: {parent['symbol']} - {child['error']}")
+                break
+            if i < slices - 1:
+                await asyncio.sleep(interval)
+
+    async def _depth(self, parent: Dict, intent: str, short: bool, bids: List, asks: List):
+        """每笔子单不超过对手盘前N档可见数量的一定比例，子单之间等待盘口恢复"""
+        levels = settings.execution_depth_levels
+        for n in range(MAX_DEPTH_CHILDREN):
+            remaining = self._remaining(parent)
+            if remaining <= 0:
+                break
+            if n > 0:
+                await asyncio.sleep(settings.execution_depth_pause)
+                # 需要成交后的盘口：未衔接增量流时强制REST刷新
+                book = await order_book_service.snapshot(parent["symbol"], limit=max(levels, 5), max_age=0)
+                bids, asks = parse_book(book)
+            opposite = asks if parent["side"] == "buy" else bids
+            visible = sum(q for _, q in opposite[:levels])
+            price = opposite[0][0] if opposite else 0.0
+            amount = min(remaining, visible * settings.execution_depth_fraction) if visible > 0 else remaining
+            # 剩余部分不足一笔子单时并入本笔
+            if not self._worth_sending(remaining - amount, price) or not self._worth_sending(amount, price):
+                amount = remaining
+            child = await self._child(parent, intent, amount, short)
+            if not order_manager.is_accepted(child):
+                logger.warning(f"⚠️ 深度拆单子单被拒绝，停止拆单: {parent['symbol']} - {child['error']}")
+                break
+            if child["state"] not in TERMINAL_STATES:
+                await order_manager.wait(child, settings.execution_limit_timeout)
+            if child["filled_amount"] <= 0:
+                break
+
+    def _stats(self, algo: str) -> Dict:
+        return self.stats.setdefault(algo, {
+            "orders": 0, "filled_notional": 0.0, "slippage_sum": 0.0, "slippage_count": 0, "fallbacks": 0,
+        })
+
+    def _record(self, parent: Dict):
+        stats = self._stats(parent["algo"])
+        stats["orders"] += 1
+        stats["filled_notional"] += parent["filled_amount"] * parent["avg_price"]
+        if parent["slippage_bps"] is not None:
+            stats["slippage_sum"] += parent["slippage_bps"]
+            stats["slippage_count"] += 1
+            EXECUTION_SLIPPAGE.observe(parent["slippage_bps"], algo=parent["algo"])
+
+    def get_status(self) -> Dict:
+        algos = {}
+        for algo, stats in self.stats.items():
+            count = stats["slippage_count"]
+            algos[algo] = {
+                "orders": stats["orders"],
+                "filled_notional": round(stats["filled_notional"], 2),
+                "avg_slippage_bps": round(stats["slippage_sum"] / count, 2) if count else None,
+                "fallbacks": stats["fallbacks"],
+            }
+        return {
+            "mode": settings.execution_algo,
+            "algos": algos,
+            "working": [
+                {"symbol": symbol, "algo": parent["algo"], "side": parent["side"],
+                 "amount": parent["amount"], "children": len(parent["children"])}
+                for symbol, parent in self.working.items()
+            ],
+        }
+
+
+# 全局执行引擎实例
+execution_engine = ExecutionEngine()
@@ -0,0 +1,172 @@
+"""
+后台任务调度器
+
+基于 APScheduler 的 AsyncIOScheduler，替代各自 while True + sleep 的后台循环：
+- 命名任务，支持 cron（如整点/半点对齐的交易周期）和固定间隔两种触发方式
+- 同一任务不重叠：上一次还没结束时本次直接跳过并计数（max_instances=1）
+- 互斥组：同组任务串行执行。两个交易周期都会在同一个交易所账户上下单，放在 "trading" 组，
+  后到的一个等待前一个结束，而不是同时运行
+- 随机抖动（jitter），避免多个任务在同一秒触发
+- 错过执行（进程阻塞/休眠）：在 misfire_grace_time 内补跑一次，多次错过合并为一次（coalesce）
+- 每次运行的耗时写入 job_duration_seconds 直方图，状态通过 /api/jobs 查询
+"""
+import asyncio
+import time
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional
+
+from apscheduler.events import EVENT_JOB_MAX_INSTANCES, EVENT_JOB_MISSED
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+from loguru import logger
+
+from backend.config import settings
+from backend.monitoring.metrics import JOB_DURATION, JOB_RUNS
+
+
+class JobScheduler:
+    """后台任务调度器"""
+
+    def __init__(self):
+        self._scheduler: Optional[AsyncIOScheduler] = None
+        self._funcs: Dict[str, Callable[[], Awaitable]] = {}
+        self._groups: Dict[str, asyncio.Lock] = {}
+        self.jobs: Dict[str, Dict] = {}
+
+    def _get_scheduler(self) -> AsyncIOScheduler:
+        if self._scheduler is None:
+            self._scheduler = AsyncIOScheduler(job_defaults={
+                "coalesce": True,
+                "max_instances": 1,
+                "misfire_grace_time": settings.scheduler_misfire_grace_time,
+            })
+            self._scheduler.add_listener(self._on_missed, EVENT_JOB_MISSED)
+            self._scheduler.add_listener(self._on_max_instances, EVENT_JOB_MAX_INSTANCES)
+        return self._scheduler
+
+    def add_job(
+        self,
+        name: str,
+        func: Callable[[], Awaitable],
+        cron: Optional[str] = None,
+        seconds: Optional[float] = None,
+        jitter: Optional[int] = None,
+        group: Optional[str] = None,
+        run_immediately: bool = False
+    ):
+        """
+        注册任务
+
+        Args:
+            cron: crontab表达式（分 时 日 月 周），与 seconds 二选一
+            seconds: 固定间隔（秒）
+            jitter: 每次触发随机延后的最大秒数
+            group: 互斥组名，同组任务串行执行
+            run_immediately: 启动后立即执行一次（仅间隔任务）
+        """
+        if cron:
+            minute, hour, day, month, day_of_week = cron.split()
+            trigger = CronTrigger(
+                minute=minute, hour=hour, day=day, month=month, day_of_week=day_of_week, jitter=jitter
+            )
+            trigger_desc = f"cron({cron})"
+        elif seconds:
+            trigger = IntervalTrigger(seconds=seconds, jitter=jitter)
+            trigger_desc = f"every {seconds}s"
+        else:
+            raise ValueError(f"任务 {name} 未指定触发方式")
+        if group:
+            self._groups.setdefault(group, asyncio.Lock())
+
+        self._funcs[name] = func
+        self.jobs[name] = {
+            "name": name,
+            "trigger": trigger_desc,
+            "jitter": jitter or 0,
+            "group": group,
+            "running": False,
+            "runs": 0,
+            "errors": 0,
+            "skipped": 0,
+            "missed": 0,
+            "last_start": None,
+            "last_duration_ms": None,
+            "last_status": None,
+            "last_error": "",
+        }
+        scheduler = self._get_scheduler()
+        kwargs = {}
+        if run_immediately and not cron:
+            kwargs["next_run_time"] = datetime.now(scheduler.timezone)
+        scheduler.add_job(self._run, trigger, args=[name], id=name, name=name, replace_existing=True, **kwargs)
+        logger.info(f"⏱️ 已注册后台任务: {name} [{trigger_desc}]" + (f" 互斥组={group}" if group else ""))
+
+    async def _run(self, name: str):
+        info = self.jobs[name]
+        group = info["group"]
+        lock = self._groups[group] if group else nullcontext()
+        if group and lock.locked():
+            logger.info(f"⏳ 任务 {name} 等待互斥组 {group} 中的任务结束")
+        async with lock:
+            info["running"] = True
+            info["last_start"] = time.time()
+            started = time.perf_counter()
+            try:
+                with JOB_DURATION.time(job=name):
+                    await self._funcs[name]()
+                info["last_status"] = "ok"
+                JOB_RUNS.inc(job=name, status="ok")
+            except Exception as e:
+                info["errors"] += 1
+                info["last_status"] = "error"
+                info["last_error"] = f"{type(e).__name__}: {e}"[:500]
+                JOB_RUNS.inc(job=name, status="error")
+                logger.error(f"❌ 后台任务 {name} 执行失败: {e}")
+            finally:
+                info["runs"] += 1
+                info["running"] = False
+                info["last_duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+    def group_lock(self, group: str) -> asyncio.Lock:
+        """互斥组的锁，组外的操作（如管理员清仓）持有它时与组内任务串行"""
+        return self._groups.setdefault(group, asyncio.Lock())
+
+    def _on_missed(self, event):
+        info = self.jobs.get(event.job_id)
+        if info is None:
+            return
+        info["missed"] += 1
+        JOB_RUNS.inc(job=event.job_id, status="missed")
+        logger.warning(f"⚠️ 后台任务 {event.job_id} 错过计划时间 {event.scheduled_run_time}，超过补跑宽限期已放弃")
+
+    def _on_max_instances(self, event):
+        info = self.jobs.get(event.job_id)
+        if info is None:
+            return
+        info["skipped"] += 1
+        JOB_RUNS.inc(job=event.job_id, status="skipped")
+        logger.info(f"⏭️ 后台任务 {event.job_id} 上一次尚未结束，跳过本次执行")
+
+    def start(self):
+        scheduler = self._get_scheduler()
+        if not scheduler.running:
+            scheduler.start()
+            logger.info(f"⏱️ 任务调度器已启动: {len(self.jobs)}个任务")
+
+    def shutdown(self):
+        if self._scheduler is not None and self._scheduler.running:
+            self._scheduler.shutdown(wait=False)
+
+    def get_status(self):
+        result = []
+        for name, info in self.jobs.items():
+            job = self._scheduler.get_job(name) if self._scheduler else None
+            next_run = job.next_run_time if job else None
+            result.append({**info, "next_run": next_run.isoformat() if next_run else None})
+        return result
+
+
+# 全局调度器实例
+job_scheduler = JobScheduler()
@@ -0,0 +1,594 @@
+"""
+订单管理
+
+下单到成交确认的完整流程：
+- 确定性的客户端订单ID（newClientOrderId）：由交易对、方向、数量和意图键（交易周期/止损触发）
+  哈希得到。下单请求超时或服务器错误时，先按该ID查询交易所是否已收到订单，未收到才用
+  同一ID重试；交易所拒绝重复的客户端订单ID，因此重试不会重复下单
+- 订单状态: new → partially_filled → filled / rejected / cancelled
+- 成交跟踪：下单后在后台跟踪未完成的订单，完成后汇总逐笔成交，计算成交均价和手续费，
+  写回对应的 Trade 记录。平仓记录按实际成交价重新计算盈亏（扣除USDT计价的手续费），
+  开仓记录同时按实际成交修正数据库持仓的数量和均价。
+  用户数据流在线时由 ORDER_TRADE_UPDATE 推送更新订单，REST轮询和成交查询只作兜底
+- 母单：执行算法（backend/trading/execution.py）拆出的多笔子单汇总为一个母单，
+  跟踪时等所有子单完成后按成交量加权汇总，再写回同一条交易记录
+- 风控：每笔订单提交到交易所前先通过下单前风控（backend/trading/risk_engine.py），
+  未通过的订单直接标记为 rejected，被接受的订单立即计入风控持仓
+"""
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from loguru import logger
+from sqlalchemy import select
+
+from backend.config import settings
+from backend.database import AsyncSessionLocal, Position, Trade
+from backend.exchanges.aster_dex import aster_client
+from backend.exchanges.user_stream import user_stream
+from backend.monitoring.health import health_registry
+from backend.monitoring.metrics import ORDERS, ORDER_FILL_LATENCY
+from backend.trading.risk_engine import pre_trade_risk
+
+
+NEW = "new"
+PARTIALLY_FILLED = "partially_filled"
+FILLED = "filled"
+REJECTED = "rejected"
+CANCELLED = "cancelled"
+
+TERMINAL_STATES = (FILLED, REJECTED, CANCELLED)
+
+# 交易所订单状态 -> 本地状态
+EXCHANGE_STATES = {
+    "NEW": NEW,
+    "PARTIALLY_FILLED": PARTIALLY_FILLED,
+    "FILLED": FILLED,
+    "CANCELED": CANCELLED,
+    "EXPIRED": CANCELLED,
+    "REJECTED": REJECTED,
+}
+
+
+def make_client_order_id(symbol: str, side: str, amount: float, intent: str) -> str:
+    """同一意图的同一笔订单总是得到相同的ID（交易所限制36个字符）"""
+    key = f"{symbol}|{side}|{amount:.8f}|{intent}"
+    return "nl-" + hashlib.sha1(key.encode("utf-8")).hexdigest()[:32]
+
+
+class OrderManager:
+    """订单管理器"""
+
+    def __init__(self, max_orders: int = 500):
+        self.orders: "OrderedDict[str, Dict]" = OrderedDict()
+        self.max_orders = max_orders
+        self._tasks: Set[asyncio.Task] = set()
+        self._updates: Dict[str, asyncio.Event] = {}
+        self._fill_listeners: List[Callable[[Dict, Optional[float], Optional[float]], None]] = []
+
+    def add_fill_listener(self, callback: Callable[[Dict, Optional[float], Optional[float]], None]):
+        """订单成交结果写回交易记录后回调 callback(order, 原盈亏, 新盈亏)"""
+        self._fill_listeners.append(callback)
+
+    def _remember(self, order: Dict):
+        self.orders[order["client_order_id"]] = order
+        self.orders.move_to_end(order["client_order_id"])
+        while len(self.orders) > self.max_orders:
+            self.orders.popitem(last=False)
+
+    @staticmethod
+    def is_accepted(order: Dict) -> bool:
+        """交易所已接受该订单（不论是否已完全成交）"""
+        return order["state"] in (NEW, PARTIALLY_FILLED, FILLED)
+
+    @staticmethod
+    def _is_retryable(result: Dict) -> bool:
+        """交易所明确拒绝（参数、余额等客户端错误）不重试，超时和服务器错误才重试"""
+        return "code" not in result and not str(result.get("error", "")).startswith("客户端错误")
+
+    def _apply_exchange_result(self, order: Dict, result: Dict):
+        """用下单响应或订单查询结果更新订单"""
+        order["order_id"] = str(result.get("orderId") or result.get("order_id") or order["order_id"])
+        # 模拟模式的下单结果没有状态字段，视为立即成交
+        status = str(result.get("status") or "FILLED").upper()
+        order["state"] = EXCHANGE_STATES.get(status, order["state"])
+        executed = float(result.get("executedQty") or result.get("amount") or 0)
+        if order["state"] == FILLED and executed <= 0:
+            executed = order["amount"]
+        if executed > 0:
+            order["filled_amount"] = executed
+        avg_price = float(result.get("avgPrice") or result.get("price") or 0)
+        if avg_price > 0:
+            order["avg_price"] = avg_price
+        order["updated_at"] = time.time()
+
+    def on_order_update(self, data: Dict):
+        """用户数据流 ORDER_TRADE_UPDATE 推送（字段 o）"""
+        order = self.orders.get(data.get("c", ""))
+        if order is None:
+            return
+        order["order_id"] = str(data.get("i") or order["order_id"])
+        order["state"] = EXCHANGE_STATES.get(data.get("X", ""), order["state"])
+        filled = float(data.get("z") or 0)
+        if filled > 0:
+            order["filled_amount"] = filled
+        avg_price = float(data.get("ap") or 0)
+        if avg_price > 0:
+            order["avg_price"] = avg_price
+        if data.get("x") == "TRADE":
+            order["stream_filled"] += float(data.get("l") or 0)
+            order["fee"] += float(data.get("n") or 0)
+            order["fee_asset"] = data.get("N") or order["fee_asset"]
+        order["updated_at"] = time.time()
+        updated = self._updates.get(order["client_order_id"])
+        if updated is not None:
+            updated.set()
+
+    def new_parent(
+        self,
+        symbol: str,
+        side: str,
+        amount: float,
+        intent: str,
+        algo: str,
+        arrival_price: float = 0.0
+    ) -> Dict:
+        """创建母单（side: buy / sell / short），子单由执行算法通过 submit() 提交后加入 children"""
+        parent = {
+            "client_order_id": make_client_order_id(symbol, side, amount, f"{intent}|{algo}"),
+            "order_id": "",
+            "symbol": symbol,
+            "side": side,
+            "amount": amount,
+            "price": None,
+            "state": NEW,
+            "filled_amount": 0.0,
+            "avg_price": 0.0,
+            "fee": 0.0,
+            "fee_asset": "",
+            "error": "",
+            "trade_id": None,
+            "algo": algo,
+            "arrival_price": arrival_price,
+            "slippage_bps": None,
+            "children": [],
+            "created_at": time.time(),
+            "updated_at": time.time(),
+        }
+        existing = self.orders.get(parent["client_order_id"])
+        if existing and self.is_accepted(existing):
+            return existing
+        self._remember(parent)
+        return parent
+
+    async def submit(
+        self,
+        symbol: str,
+        side: str,
+        amount: float,
+        intent: str,
+        short: bool = False,
+        price: Optional[float] = None,
+        post_only: bool = False,
+        ref_price: Optional[float] = None,
+        closing: bool = False
+    ) -> Dict:
+        """
+        提交订单（默认市价单）
+
+        Args:
+            side: buy / sell
+            intent: 意图键（如交易周期ID、止损触发时间），同一意图重复提交得到同一个客户端订单ID
+            short: 做空开仓（走 place_short_order，处理持仓模式）
+            price: 限价单价格，不传为市价单
+            post_only: 限价单只做maker（GTX），会立即成交时被交易所拒绝
+            ref_price: 市价单的参考价格（风控计算名义金额）
+            closing: 平仓单，风控按减仓放行，并以只减仓（reduceOnly）提交
+
+        Returns:
+            订单字典，用 is_accepted() 判断是否被交易所接受
+        """
+        order, existing = self._new_order(symbol, side, amount, intent, short, price)
+        if existing:
+            return order
+        if not self._risk_check(order, price or ref_price, closing):
+            return order
+
+        time_in_force = "GTX" if post_only else "GTC"
+
+        async def place() -> Dict:
+            if short:
+                return await aster_client.place_short_order(
+                    symbol, amount, price=price, client_order_id=order["client_order_id"], time_in_force=time_in_force
+                )
+            return await aster_client.place_order(
+                symbol, side, "limit" if price else "market", amount, price=price,
+                client_order_id=order["client_order_id"], time_in_force=time_in_force, reduce_only=closing
+            )
+
+        return await self._place(order, place)
+
+    async def submit_batch(self, requests: List[Dict]) -> List[Dict]:
+        """
+        批量提交市价平仓单（平仓扫单、一键清仓）
+
+        一次批量下单请求提交全部订单（均为只减仓），单笔失败的订单再按 submit() 的方式确认和重试。
+
+        Args:
+            requests: [{"symbol", "side": buy/sell, "amount", "intent", "price"（可选，参考价格）}, ...]
+
+        Returns:
+            与 requests 一一对应的订单字典；已提交过的订单 duplicate 为 True（调用方不要重复记录）
+        """
+        orders = []
+        pending = []
+        for req in requests:
+            order, existing = self._new_order(req["symbol"], req["side"], req["amount"], req["intent"])
+            orders.append({**order, "duplicate": True} if existing else order)
+            if not existing and self._risk_check(order, req.get("price"), closing=True):
+                order["attempts"] = 1
+                pending.append(order)
+        if not pending:
+            return orders
+
+        results = await aster_client.place_batch_orders([
+            {
+                "symbol": o["symbol"], "side": o["side"], "amount": o["amount"],
+                "client_order_id": o["client_order_id"], "reduce_only": True,
+            }
+            for o in pending
+        ])
+
+        def placer(o: Dict):
+            async def place() -> Dict:
+                return await aster_client.place_order(
+                    o["symbol"], o["side"], "market", o["amount"], client_order_id=o["client_order_id"],
+                    reduce_only=True
+                )
+            return place
+
+        await asyncio.gather(*(
+            self._place(o, placer(o), result=result) for o, result in zip(pending, results)
+        ))
+        return orders
+
+    def _new_order(
+        self,
+        symbol: str,
+        side: str,
+        amount: float,
+        intent: str,
+        short: bool = False,
+        price: Optional[float] = None
+    ) -> Tuple[Dict, bool]:
+        """创建订单字典；同一意图的订单已被交易所接受时返回 (原订单, True)"""
+        client_order_id = make_client_order_id(symbol, side, amount, intent)
+        existing = self.orders.get(client_order_id)
+        if existing and self.is_accepted(existing):
+            logger.warning(f"⚠️ 订单 {client_order_id} 已提交过，不重复下单: {symbol} {side} {amount}")
+            return existing, True
+
+        order = {
+            "client_order_id": client_order_id,
+            "order_id": "",
+            "symbol": symbol,
+            "side": "short" if short else side,
+            "amount": amount,
+            "price": price,
+            "state": NEW,
+            "filled_amount": 0.0,
+            "avg_price": 0.0,
+            "fee": 0.0,
+            "fee_asset": "",
+            "stream_filled": 0.0,
+            "error": "",
+            "attempts": 0,
+            "trade_id": None,
+            "created_at": time.time(),
+            "updated_at": time.time(),
+        }
+        self._remember(order)
+        return order, False
+
+    def _risk_check(self, order: Dict, price: Optional[float], closing: bool) -> bool:
+        """下单前风控，未通过时把订单标记为拒绝"""
+        check = pre_trade_risk.check(order["symbol"], order["side"], order["amount"], price, closing=closing)
+        if check.approved:
+            order["ref_price"] = price
+            return True
+        order["error"] = f"风控拒绝[{check.check}]: {check.reason}"
+        self._reject(order)
+        return False
+
+    def _reject(self, order: Dict):
+        order["state"] = REJECTED
+        order["updated_at"] = time.time()
+        ORDERS.inc(state=REJECTED)
+        logger.error(f"❌ 订单被拒绝: {order['symbol']} {order['side']} {order['amount']} - {order['error']}")
+
+    async def _place(
+        self,
+        order: Dict,
+        place: Callable[[], Awaitable[Dict]],
+        result: Optional[Dict] = None
+    ) -> Dict:
+        """
+        下单直到被接受或确认失败
+
+        失败时先按客户端订单ID确认交易所是否已收到，未收到且可重试时用同一ID重试。
+        result 为已经拿到的首次下单结果（批量下单），为空时先调用 place() 下单。
+        """
+        symbol, side, client_order_id = order["symbol"], order["side"], order["client_order_id"]
+        for attempt in range(settings.order_submit_retries + 1):
+            if result is None:
+                order["attempts"] += 1
+                result = await place()
+            if result and result.get("success"):
+                self._apply_exchange_result(order, result)
+                pre_trade_risk.record_order(symbol, side, order["amount"], order["avg_price"] or order.get("ref_price"))
+                return order
+
+            result = result or {}
+            order["error"] = str(result.get("error", "未知错误"))
+            # 请求可能已到达交易所（如响应超时），先确认再决定是否重试
+            status = await aster_client.get_order_status(symbol=symbol, client_order_id=client_order_id)
+            if status.get("success") and status.get("orderId"):
+                logger.info(f"ℹ️ 订单 {client_order_id} 已被交易所接受（下单响应丢失）")
+                self._apply_exchange_result(order, status)
+                pre_trade_risk.record_order(symbol, side, order["amount"], order["avg_price"] or order.get("ref_price"))
+                return order
+
+            if not self._is_retryable(result) or attempt >= settings.order_submit_retries:
+                break
+            delay = settings.order_retry_backoff * (attempt + 1)
+            logger.warning(f"🔁 下单失败，{delay:.1f}s后使用同一订单ID重试: {symbol} {side} - {order['error']}")
+            await asyncio.sleep(delay)
+            result = None
+
+        self._reject(order)
+        return order
+
+    def track(self, order: Dict, trade_id: int):
+        """后台跟踪订单（或母单的全部子单）直到完成，并把成交结果写回交易记录"""
+        order["trade_id"] = trade_id
+        task = asyncio.create_task(self._track(order), name=f"order-{order['client_order_id']}")
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def wait(self, order: Dict, timeout: float) -> Dict:
+        """等待订单进入最终状态，最多等待 timeout 秒"""
+        await self._wait_terminal(order, time.time() + timeout)
+        self._release_unfilled(order)
+        return order
+
+    async def cancel(self, order: Dict) -> Dict:
+        """撤销未完成的订单，并以撤单后的交易所状态为准（撤单前可能已部分或全部成交）"""
+        if order["state"] in TERMINAL_STATES:
+            return order
+        result = await aster_client.cancel_order(order["symbol"], client_order_id=order["client_order_id"])
+        if result.get("success"):
+            self._apply_exchange_result(order, result)
+        status = await aster_client.get_order_status(symbol=order["symbol"], client_order_id=order["client_order_id"])
+        if status.get("success"):
+            self._apply_exchange_result(order, status)
+        self._release_unfilled(order)
+        return order
+
+    @staticmethod
+    def _release_unfilled(order: Dict):
+        """订单被撤销或过期后，未成交部分不再占用风控额度"""
+        if order["state"] == CANCELLED and not order.get("risk_released"):
+            order["risk_released"] = True
+            pre_trade_risk.release(order["symbol"], order["side"], order["amount"] - order["filled_amount"])
+
+    async def _wait_terminal(self, order: Dict, deadline: float):
+        updated = self._updates[order["client_order_id"]] = asyncio.Event()
+        try:
+            while order["state"] not in TERMINAL_STATES and time.time() < deadline:
+                # 用户数据流在线时等待推送，超时才用REST查询兜底
+                timeout = settings.order_poll_interval * (10 if user_stream.is_live() else 1)
+                updated.clear()
+                try:
+                    await asyncio.wait_for(updated.wait(), timeout=min(timeout, max(0.0, deadline - time.time())))
+                    continue
+                except asyncio.TimeoutError:
+                    pass
+                status = await aster_client.get_order_status(
+                    order_id=order["order_id"], symbol=order["symbol"]
+                )
+                if status.get("success"):
+                    self._apply_exchange_result(order, status)
+
+            # 下单响应可能先于成交推送到达，稍等推送补齐成交明细
+            wait_until = time.time() + settings.order_poll_interval
+            while (
+                order["state"] in TERMINAL_STATES
+                and user_stream.is_live()
+                and order["stream_filled"] < order["filled_amount"] - 1e-12
+                and time.time() < wait_until
+            ):
+                updated.clear()
+                try:
+                    await asyncio.wait_for(updated.wait(), timeout=max(0.0, wait_until - time.time()))
+                except asyncio.TimeoutError:
+                    break
+        finally:
+            self._updates.pop(order["client_order_id"], None)
+
+    async def _settle(self, order: Dict):
+        """等待单笔订单完成并汇总逐笔成交（成交均价、手续费）"""
+        if order.get("settled"):
+            return
+        await self._wait_terminal(order, order["created_at"] + settings.order_track_timeout)
+        if order["state"] not in TERMINAL_STATES:
+            logger.warning(
+                f"⚠️ 订单跟踪超时: {order['symbol']} {order['client_order_id']} "
+                f"状态={order['state']} 已成交={order['filled_amount']}"
+            )
+        ORDERS.inc(state=order["state"])
+        ORDER_FILL_LATENCY.observe(time.time() - order["created_at"], state=order["state"])
+        self._release_unfilled(order)
+
+        # 推送已覆盖全部成交时不再查询逐笔成交
+        stream_complete = abs(order["stream_filled"] - order["filled_amount"]) < 1e-12
+        if order["filled_amount"] > 0 and order["order_id"] and not stream_complete:
+            fills = await aster_client.get_order_fills(order["symbol"], order["order_id"])
+            qty = sum(f["qty"] for f in fills)
+            if qty > 0:
+                order["filled_amount"] = qty
+                order["avg_price"] = sum(f["price"] * f["qty"] for f in fills) / qty
+                order["fee"] = sum(f["commission"] for f in fills)
+                order["fee_asset"] = fills[0]["commission_asset"]
+        order["settled"] = True
+
+    @staticmethod
+    def aggregate(parent: Dict):
+        """按成交量加权汇总子单到母单"""
+        children = parent["children"]
+        filled = sum(c["filled_amount"] for c in children)
+        parent["filled_amount"] = filled
+        parent["avg_price"] = (
+            sum(c["avg_price"] * c["filled_amount"] for c in children) / filled if filled > 0 else 0.0
+        )
+        parent["fee"] = sum(c["fee"] for c in children)
+        parent["fee_asset"] = next((c["fee_asset"] for c in children if c["fee_asset"]), "")
+        parent["order_id"] = next((c["order_id"] for c in children if c["filled_amount"] > 0 and c["order_id"]), "")
+        if filled >= parent["amount"] * (1 - 1e-9):
+            parent["state"] = FILLED
+        elif filled > 0:
+            parent["state"] = PARTIALLY_FILLED
+        else:
+            parent["state"] = REJECTED
+            parent["error"] = next((c["error"] for c in reversed(children) if c["error"]), parent["error"])
+        arrival = parent.get("arrival_price") or 0
+        if arrival > 0 and filled > 0:
+            direction = 1 if parent["side"] == "buy" else -1
+            parent["slippage_bps"] = direction * (parent["avg_price"] - arrival) / arrival * 1e4
+        parent["updated_at"] = time.time()
+
+    async def _track(self, order: Dict):
+        try:
+            if order.get("children"):
+                await asyncio.gather(*(self._settle(child) for child in order["children"]))
+                self.aggregate(order)
+            else:
+                await self._settle(order)
+            await self._write_trade(order)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception(f"订单跟踪失败: {order['symbol']} {order['client_order_id']} - {e}")
+
+    async def _write_trade(self, order: Dict):
+        """把实际成交数量、均价和手续费写回交易记录"""
+        if not order["trade_id"]:
+            return
+        async with AsyncSessionLocal() as db:
+            trade = await db.get(Trade, order["trade_id"])
+            if trade is None:
+                return
+            previous_pnl = trade.profit_loss
+            filled = order["filled_amount"]
+            price = order["avg_price"] or trade.price
+            recorded_amount, recorded_price = trade.amount or 0.0, trade.price or 0.0
+
+            trade.order_status = order["state"]
+            trade.filled_amount = filled
+            trade.fee = order["fee"]
+            trade.fee_asset = order["fee_asset"]
+            trade.success = filled > 0
+            if order.get("slippage_bps") is not None:
+                trade.slippage_bps = order["slippage_bps"]
+            if filled > 0:
+                trade.price = price
+                trade.amount = filled
+                trade.total_value = filled * price
+
+            # 平仓记录：按实际成交价重新计算盈亏
+            if filled > 0 and trade.entry_price and trade.side in ("sell", "cover"):
+                entry = trade.entry_price
+                direction = 1 if trade.side == "sell" else -1
+                fee = order["fee"] if order["fee_asset"] in ("", "USDT") else 0.0
+                trade.profit_loss = direction * (price - entry) * filled - fee
+                trade.profit_loss_percentage = trade.profit_loss / (entry * filled) * 100
+                trade.is_profitable = trade.profit_loss > 0
+
+            # 开仓记录：持仓是按下单时的成交结果写入的，按最终成交修正
+            if trade.side in ("buy", "short"):
+                await self._correct_position(db, trade, recorded_amount, recorded_price, filled, price)
+
+            with health_registry.track("db"):
+                await db.commit()
+            new_pnl = trade.profit_loss
+
+        logger.info(
+            f"🧾 订单完成: {order['symbol']} {order['side']} {order['state']} "
+            f"成交{order['filled_amount']} @ {order['avg_price']:.6f} 手续费{order['fee']:.6f}{order['fee_asset']}"
+        )
+        for listener in self._fill_listeners:
+            try:
+                listener(order, previous_pnl, new_pnl)
+            except Exception as e:
+                logger.error(f"❌ 成交回调失败: {e}")
+
+    @staticmethod
+    async def _correct_position(
+        db,
+        trade: Trade,
+        recorded_amount: float,
+        recorded_price: float,
+        filled: float,
+        price: float
+    ):
+        """把开仓时计入持仓的 recorded_amount @ recorded_price 替换为最终成交 filled @ price"""
+        result = await db.execute(select(Position).where(Position.symbol == trade.symbol))
+        position = result.scalar_one_or_none()
+        position_type = "short" if trade.side == "short" else "long"
+        same_side = position is not None and (
+            position.position_type == position_type
+            or (position_type == "long" and position.position_type == "buy")
+        )
+        if not same_side:
+            return
+        if abs(filled - recorded_amount) <= recorded_amount * 1e-9 and abs(price - recorded_price) <= recorded_price * 1e-9:
+            return
+        held = position.amount or 0.0
+        amount = held - recorded_amount + filled
+        if amount <= held * 1e-6:
+            await db.delete(position)
+            logger.info(f"🗑️ 开仓最终未成交，删除持仓记录: {trade.symbol}")
+            return
+        cost = (position.average_price or 0.0) * held - recorded_price * recorded_amount + price * filled
+        position.average_price = cost / amount
+        # 本笔开出的新持仓（没有加仓合并）时入场价即成交均价
+        if abs(held - recorded_amount) <= recorded_amount * 1e-9:
+            position.entry_price = price
+        position.amount = amount
+        position.last_updated = datetime.now()
+        logger.info(f"📊 按最终成交修正持仓: {trade.symbol} {held} -> {amount} 均价{position.average_price:.6f}")
+
+    async def shutdown(self):
+        """取消仍在跟踪的订单任务（重启后以交易所持仓为准）"""
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def get_status(self, limit: int = 50) -> Dict:
+        counts: Dict[str, int] = {}
+        for order in self.orders.values():
+            counts[order["state"]] = counts.get(order["state"], 0) + 1
+        recent = list(self.orders.values())[-limit:]
+        return {
+            "tracking": len(self._tasks),
+            "states": counts,
+            "orders": list(reversed(recent)),
+        }
+
+
+# 全局订单管理器实例
+order_manager = OrderManager()
+user_stream.add_order_listener(order_manager.on_order_update)
@@ -0,0 +1,315 @@
+"""
+组合风险分析
+
+从K线收盘价构建收益率矩阵，一次性向量化计算所有交易对的：
+- 协方差 / 相关系数矩阵、波动率、相对基准（BTC）的beta
+- 组合的历史模拟和参数法（正态）VaR / ES
+- 各持仓的边际风险贡献和成分风险贡献
+
+收盘价保存在按K线序号对齐的滚动矩阵中（行: 最近 window+1 根已收盘K线，列: 交易对），
+交易引擎分析时拉取的K线顺带写入，定时任务只补拉缺失的K线。矩阵有新数据时版本号递增，
+统计量按版本缓存，新K线到来后下一次读取时重新计算（200个交易对在毫秒级）。
+组合权重取下单前风控中的实时持仓敞口 / 账户权益。
+"""
+import asyncio
+import time
+from statistics import NormalDist
+from typing import Dict, Iterable, List, Optional, Set
+
+import numpy as np
+from loguru import logger
+
+from backend.agents.multi_timeframe import INTERVAL_MS
+from backend.config import settings
+from backend.exchanges.aster_dex import aster_client
+from backend.trading.risk_engine import pre_trade_risk
+
+
+# 补拉K线的并发数
+REFRESH_CONCURRENCY = 5
+
+
+class RiskAnalytics:
+    """滚动收盘价矩阵 + 按版本缓存的组合风险统计"""
+
+    def __init__(self):
+        self.interval = settings.risk_analytics_interval
+        self.step = INTERVAL_MS.get(self.interval, INTERVAL_MS["1h"])
+        self.window = max(2, settings.risk_analytics_window)
+        self.benchmark = settings.risk_analytics_benchmark
+        # 收盘价矩阵，最后一行是序号为 self.end 的K线
+        self.closes = np.full((self.window + 1, 0), np.nan)
+        self.symbols: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.end = 0
+        self.version = 0
+        self.tracked: Set[str] = set()
+        self.last_refresh_at: Optional[float] = None
+        self.last_compute_ms = 0.0
+        self._stats: Optional[Dict] = None
+        self._stats_version = -1
+        self._portfolio_cache = None
+
+    # ---------- 收盘价矩阵 ----------
+
+    def track(self, symbols: Iterable[str]):
+        """登记需要分析的候选交易对（持仓和基准始终包含）"""
+        self.tracked = set(symbols)
+
+    def _column(self, symbol: str) -> int:
+        col = self.index.get(symbol)
+        if col is None:
+            col = self.index[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+            self.closes = np.hstack([self.closes, np.full((self.window + 1, 1), np.nan)])
+        return col
+
+    def _roll(self, latest: int):
+        """矩阵前移到以 latest 为最后一行"""
+        shift = latest - self.end
+        if self.end == 0 or shift > self.window:
+            self.closes[:] = np.nan
+        else:
+            self.closes = np.vstack([self.closes[shift:], np.full((shift, len(self.symbols)), np.nan)])
+        self.end = latest
+
+    def ingest(self, symbol: str, klines: List[Dict], interval: Optional[str] = None):
+        """写入一个交易对的K线（只取已收盘的，其它周期的K线忽略）"""
+        if interval is not None and interval != self.interval or not klines:
+            return
+        now = time.time() * 1000
+        rows = [
+            (int(k["timestamp"]) // self.step, float(k["close"]))
+            for k in klines
+            if k.get("close") and int(k["timestamp"]) + self.step <= now
+        ]
+        if not rows:
+            return
+        idx = np.array([r[0] for r in rows], dtype=np.int64)
+        prices = np.array([r[1] for r in rows])
+        latest = int(idx.max())
+        if latest > self.end:
+            self._roll(latest)
+            self.version += 1
+        col = self._column(symbol)
+        pos = len(self.closes) - 1 - (self.end - idx)
+        mask = pos >= 0
+        pos, prices = pos[mask], prices[mask]
+        if not np.array_equal(self.closes[pos, col], prices):
+            self.closes[pos, col] = prices
+            self.version += 1
+
+    def missing(self, symbol: str) -> int:
+        """该交易对距离最新一根已收盘K线还缺几根"""
+        last_closed = int(time.time() * 1000) // self.step - 1
+        col = self.index.get(symbol)
+        if col is None or self.end == 0:
+            return self.window + 1
+        filled = np.flatnonzero(~np.isnan(self.closes[:, col]))
+        if filled.size == 0:
+            return self.window + 1
+        last = self.end - (len(self.closes) - 1 - filled[-1])
+        return int(min(self.window + 1, max(0, last_closed - last)))
+
+    def universe(self) -> Set[str]:
+        return self.tracked | set(pre_trade_risk.positions) | {self.benchmark}
+
+    async def refresh(self):
+        """补拉持仓、候选和基准缺失的K线"""
+        semaphore = asyncio.Semaphore(REFRESH_CONCURRENCY)
+
+        async def fetch(symbol: str, count: int):
+            async with semaphore:
+                # 交易所返回的最后一根是未收盘K线，多取一根
+                klines = await aster_client.get_klines(symbol, self.interval, count + 1)
+            self.ingest(symbol, klines, self.interval)
+
+        pending = {s: n for s in self.universe() if (n := self.missing(s)) > 0}
+        if pending:
+            results = await asyncio.gather(*(fetch(s, n) for s, n in pending.items()), return_exceptions=True)
+            for symbol, result in zip(pending, results):
+                if isinstance(result, Exception):
+                    logger.warning(f"⚠️ 风险分析K线拉取失败 {symbol}: {result}")
+        self.last_refresh_at = time.time()
+        self.stats()
+
+    # ---------- 统计量 ----------
+
+    def stats(self) -> Optional[Dict]:
+        """收益率矩阵统计量（同一版本只计算一次）"""
+        if self._stats_version != self.version:
+            started = time.perf_counter()
+            self._stats = self._compute()
+            self._stats_version = self.version
+            self.last_compute_ms = (time.perf_counter() - started) * 1000
+        return self._stats
+
+    def _compute(self) -> Optional[Dict]:
+        if not self.symbols:
+            return None
+        with np.errstate(invalid="ignore", divide="ignore"):
+            returns = np.diff(np.log(self.closes), axis=0)
+        valid = np.isfinite(returns)
+        keep = valid.mean(axis=0) >= settings.risk_analytics_min_coverage
+        if keep.sum() == 0:
+            return None
+        returns, valid = returns[:, keep], valid[:, keep]
+        symbols = [s for s, k in zip(self.symbols, keep) if k]
+        periods = returns.shape[0]
+
+        # 缺失的收益率按该列均值填充（去均值后为0），保持各列样本对齐
+        mu = np.where(valid, returns, 0.0).sum(axis=0) / valid.sum(axis=0)
+        centered = np.where(valid, returns - mu, 0.0)
+        cov = centered.T @ centered / (periods - 1)
+        sigma = np.sqrt(np.diag(cov))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            corr = cov / np.outer(sigma, sigma)
+        corr = np.nan_to_num(corr)
+        np.fill_diagonal(corr, 1.0)
+
+        index = {s: i for i, s in enumerate(symbols)}
+        b = index.get(self.benchmark)
+        if b is not None and cov[b, b] > 0:
+            beta = cov[:, b] / cov[b, b]
+        else:
+            beta = np.full(len(symbols), np.nan)
+        return {
+            "symbols": symbols, "index": index, "centered": centered,
+            "mu": mu, "cov": cov, "sigma": sigma, "corr": corr, "beta": beta, "periods": periods,
+        }
+
+    def _weights(self, stats: Dict, exposures: Dict[str, float], equity: float):
+        weights = np.zeros(len(stats["symbols"]))
+        uncovered = []
+        for symbol, exposure in exposures.items():
+            i = stats["index"].get(symbol)
+            if i is None:
+                if exposure:
+                    uncovered.append(symbol)
+            else:
+                weights[i] = exposure / equity
+        return weights, uncovered
+
+    def portfolio(self) -> Optional[Dict]:
+        """当前持仓的组合风险（按统计版本和持仓敞口缓存）"""
+        stats = self.stats()
+        equity = pre_trade_risk.equity
+        if stats is None or equity <= 0:
+            return None
+        exposures = {s: e for s, e in pre_trade_risk.exposures().items() if e}
+        key = (self._stats_version, equity, tuple(sorted(exposures.items())))
+        if self._portfolio_cache and self._portfolio_cache[0] == key:
+            return self._portfolio_cache[1]
+
+        weights, uncovered = self._weights(stats, exposures, equity)
+        cov, mu = stats["cov"], stats["mu"]
+        series = stats["centered"] @ weights + mu @ weights
+        mean = float(mu @ weights)
+        variance = float(weights @ cov @ weights)
+        sigma_p = variance ** 0.5
+
+        alpha = settings.risk_analytics_confidence
+        quantile = float(np.quantile(series, 1 - alpha))
+        tail = series[series <= quantile]
+        z = NormalDist().inv_cdf(alpha)
+
+        contributions = {}
+        if sigma_p > 0:
+            marginal = cov @ weights / sigma_p
+            component = weights * marginal
+            for i in np.flatnonzero(weights):
+                symbol = stats["symbols"][i]
+                contributions[symbol] = {
+                    "weight": round(float(weights[i]), 4),
+                    "marginal": round(float(marginal[i]), 6),
+                    "component": round(float(component[i]), 6),
+                    "share": round(float(component[i] / sigma_p), 4),
+                }
+
+        result = {
+            "equity": equity,
+            "gross_weight": round(float(np.abs(weights).sum()), 4),
+            "net_weight": round(float(weights.sum()), 4),
+            "volatility": sigma_p,
+            "beta": float(np.nansum(weights * stats["beta"])),
+            # 以下为单根K线周期、占权益的比例（正数为亏损）
+            "var_historical": max(0.0, -quantile),
+            "es_historical": max(0.0, -float(tail.mean())) if tail.size else 0.0,
+            "var_parametric": max(0.0, z * sigma_p - mean),
+            "es_parametric": max(0.0, sigma_p * NormalDist().pdf(z) / (1 - alpha) - mean),
+            "contributions": contributions,
+            "uncovered": uncovered,
+        }
+        self._portfolio_cache = (key, result)
+        return result
+
+    def symbol_risk(self, symbol: str) -> Optional[Dict]:
+        """单个交易对的波动率、beta、与当前组合/各持仓的相关性"""
+        stats = self.stats()
+        if stats is None or symbol not in stats["index"]:
+            return None
+        i = stats["index"][symbol]
+        corr = stats["corr"][i]
+        held = [s for s, e in pre_trade_risk.exposures().items() if e and s != symbol and s in stats["index"]]
+        peers = sorted(((s, float(corr[stats["index"][s]])) for s in held), key=lambda x: -abs(x[1]))
+
+        portfolio_corr = None
+        equity = pre_trade_risk.equity
+        if held and equity > 0:
+            weights, _ = self._weights(stats, pre_trade_risk.exposures(), equity)
+            weights[i] = 0.0
+            sigma_p = float(weights @ stats["cov"] @ weights) ** 0.5
+            if sigma_p > 0 and stats["sigma"][i] > 0:
+                portfolio_corr = float(stats["cov"][i] @ weights / (stats["sigma"][i] * sigma_p))
+
+        beta = float(stats["beta"][i])
+        return {
+            "symbol": symbol,
+            "volatility": float(stats["sigma"][i]),
+            "beta": None if np.isnan(beta) else beta,
+            "portfolio_correlation": portfolio_corr,
+            "correlated_positions": [{"symbol": s, "correlation": round(c, 3)} for s, c in peers[:3]],
+        }
+
+    def top_correlations(self, limit: int = 10, threshold: float = 0.0) -> List[Dict]:
+        """相关系数最高的交易对组合（上三角）"""
+        stats = self.stats()
+        if stats is None:
+            return []
+        corr = stats["corr"]
+        rows, cols = np.triu_indices(len(corr), k=1)
+        values = corr[rows, cols]
+        order = np.argsort(-values)[:limit]
+        return [
+            {"pair": [stats["symbols"][rows[k]], stats["symbols"][cols[k]]], "correlation": round(float(values[k]), 3)}
+            for k in order if values[k] >= threshold
+        ]
+
+    def get_status(self, matrix: bool = False) -> Dict:
+        stats = self.stats()
+        portfolio = self.portfolio()
+        status = {
+            "interval": self.interval,
+            "window": self.window,
+            "confidence": settings.risk_analytics_confidence,
+            "benchmark": self.benchmark,
+            "symbols_stored": len(self.symbols),
+            "symbols_used": len(stats["symbols"]) if stats else 0,
+            "last_candle": self.end * self.step if self.end else None,
+            "last_refresh_at": self.last_refresh_at,
+            "compute_ms": round(self.last_compute_ms, 3),
+            "portfolio": portfolio,
+            "top_correlations": self.top_correlations(),
+        }
+        if matrix and stats:
+            status["matrix"] = {
+                "symbols": stats["symbols"],
+                "correlation": np.round(stats["corr"], 3).tolist(),
+                "volatility": np.round(stats["sigma"], 6).tolist(),
+                "beta": [None if np.isnan(b) else round(float(b), 3) for b in stats["beta"]],
+            }
+        return status
+
+
+# 全局组合风险分析实例
+risk_analytics = RiskAnalytics()
@@ -0,0 +1,322 @@
+"""
+下单前风控
+
+所有订单在订单管理器提交到交易所之前同步通过以下检查（纯内存计算，不做网络请求）：
+- 清仓开关（kill switch）：手动开启或当日亏损超过上限时自动开启，开启后只允许减仓
+- 交易所过滤器：最小/最大下单数量、最小名义金额
+- 最大持仓数量（MAX_CONCURRENT_TRADES）
+- 单交易对敞口（MAX_POSITION_SIZE）、总敞口和净敞口（相对账户权益的倍数）
+- 相关性分组敞口：同一组交易对（如主流币、meme币）的合计敞口上限
+
+减仓单（平仓单，或方向与持仓相反且不超过持仓数量）只校验数量为正，止损和清仓不会被风控拦截。
+持仓由交易引擎每次查询持仓时同步，订单被接受后立即计入（下次同步时以交易所持仓为准）。
+"""
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from backend.config import settings
+from backend.monitoring.metrics import RISK_REJECTIONS
+
+
+@dataclass
+class RiskCheck:
+    """风控检查结果"""
+    approved: bool
+    check: str = ""  # 未通过的检查项
+    reason: str = ""
+    reducing: bool = False  # 减仓单
+
+
+APPROVED = RiskCheck(True)
+
+EXPOSURE_LABELS = {
+    "symbol_exposure": "单交易对敞口",
+    "gross_exposure": "总敞口",
+    "net_exposure": "净敞口",
+    "bucket_exposure": "相关性分组敞口",
+}
+
+
+def parse_buckets(spec: str) -> Dict[str, str]:
+    """"majors:BTCUSDT,ETHUSDT;memes:DOGEUSDT" -> {交易对: 分组}"""
+    buckets = {}
+    for group in spec.split(";"):
+        name, _, symbols = group.partition(":")
+        for symbol in symbols.split(","):
+            if name.strip() and symbol.strip():
+                buckets[symbol.strip().upper()] = name.strip()
+    return buckets
+
+
+class PreTradeRisk:
+    """下单前确定性风控"""
+
+    def __init__(self):
+        self.positions: Dict[str, float] = {}  # symbol -> 带符号数量（空头为负）
+        self.prices: Dict[str, float] = {}  # symbol -> 最近参考价格
+        self.filters: Dict[str, Dict[str, float]] = {}  # symbol -> {"min_qty", "max_qty", "min_notional"}
+        self.buckets = parse_buckets(settings.risk_correlation_buckets)
+        self.equity = 0.0
+        self.day: Optional[date] = None
+        self.day_start_equity = 0.0
+        self.kill_switch = False
+        self.kill_reason = ""
+        self.checks = 0
+        self.rejections: Dict[str, int] = {}
+        self.recent_rejections: deque = deque(maxlen=20)
+
+    # ---------- 状态同步 ----------
+
+    def sync_positions(self, positions: List[Dict]):
+        """用交易所持仓快照替换本地持仓"""
+        fresh = {}
+        for pos in positions:
+            amount = float(pos.get("amount", 0))
+            if amount == 0:
+                continue
+            sign = -1.0 if pos.get("position_type") == "short" else 1.0
+            fresh[pos["symbol"]] = fresh.get(pos["symbol"], 0.0) + sign * abs(amount)
+            price = float(pos.get("current_price") or pos.get("entry_price") or 0)
+            if price > 0:
+                self.prices[pos["symbol"]] = price
+        self.positions = fresh
+
+    def update_price(self, symbol: str, price: float):
+        if price and price > 0:
+            self.prices[symbol] = float(price)
+
+    def load_symbol_filters(self, symbols_info: List):
+        """从 exchangeInfo 的交易对信息读取 LOT_SIZE / MARKET_LOT_SIZE / MIN_NOTIONAL 过滤器"""
+        for info in symbols_info:
+            if not isinstance(info, dict) or not info.get("symbol"):
+                continue
+            limits = {}
+            for f in info.get("filters", []):
+                kind = f.get("filterType")
+                if kind in ("LOT_SIZE", "MARKET_LOT_SIZE"):
+                    limits["min_qty"] = max(limits.get("min_qty", 0.0), float(f.get("minQty", 0) or 0))
+                    max_qty = float(f.get("maxQty", 0) or 0)
+                    if max_qty > 0:
+                        limits["max_qty"] = min(limits.get("max_qty", max_qty), max_qty)
+                elif kind == "MIN_NOTIONAL":
+                    limits["min_notional"] = float(f.get("notional") or f.get("minNotional") or 0)
+            if limits:
+                self.filters[info["symbol"]] = limits
+
+    def update_equity(self, equity: float):
+        """更新账户权益，按自然日记录日初权益并检查当日亏损上限"""
+        if equity <= 0:
+            return
+        self.equity = equity
+        today = date.today()
+        if self.day != today:
+            self.day = today
+            self.day_start_equity = equity
+            if self.kill_switch and self.kill_reason.startswith("当日亏损"):
+                self.set_kill_switch(False, "新交易日")
+
+        limit = settings.risk_daily_loss_limit
+        if limit > 0 and not self.kill_switch and self.daily_pnl_pct <= -limit:
+            self.set_kill_switch(
+                True, f"当日亏损{-self.daily_pnl_pct * 100:.2f}%超过上限{limit * 100:.1f}%"
+            )
+
+    @property
+    def daily_pnl_pct(self) -> float:
+        if self.day_start_equity <= 0:
+            return 0.0
+        return (self.equity - self.day_start_equity) / self.day_start_equity
+
+    def set_kill_switch(self, engaged: bool, reason: str = ""):
+        self.kill_switch = engaged
+        self.kill_reason = reason if engaged else ""
+        if engaged:
+            logger.warning(f"🛑 风控清仓开关已开启，禁止开仓: {reason}")
+        else:
+            logger.info(f"✅ 风控清仓开关已关闭{'（' + reason + '）' if reason else ''}")
+
+    def record_order(self, symbol: str, side: str, amount: float, price: Optional[float] = None):
+        """订单被交易所接受后立即计入持仓（side: buy / sell / short）"""
+        if amount <= 0:
+            return
+        delta = amount if side == "buy" else -amount
+        qty = self.positions.get(symbol, 0.0) + delta
+        if abs(qty) < 1e-12:
+            self.positions.pop(symbol, None)
+        else:
+            self.positions[symbol] = qty
+        self.update_price(symbol, price)
+
+    def release(self, symbol: str, side: str, amount: float):
+        """撤单后释放 record_order() 计入的未成交数量"""
+        if amount > 0:
+            self.record_order(symbol, "sell" if side == "buy" else "buy", amount)
+
+    def exposures(self) -> Dict[str, float]:
+        """各交易对带符号的名义敞口（空头为负）"""
+        return {symbol: self._exposure(symbol) for symbol in self.positions}
+
+    # ---------- 检查 ----------
+
+    def bucket_of(self, symbol: str) -> str:
+        """未配置分组的交易对单独成组（只受单交易对上限约束）"""
+        return self.buckets.get(symbol, symbol)
+
+    def _exposure(self, symbol: str) -> float:
+        return self.positions.get(symbol, 0.0) * self.prices.get(symbol, 0.0)
+
+    def _reject(self, check: str, reason: str, symbol: str) -> RiskCheck:
+        self.rejections[check] = self.rejections.get(check, 0) + 1
+        self.recent_rejections.append({"symbol": symbol, "check": check, "reason": reason, "time": time.time()})
+        RISK_REJECTIONS.inc(check=check)
+        return RiskCheck(False, check, reason)
+
+    def check(
+        self,
+        symbol: str,
+        side: str,
+        amount: float,
+        price: Optional[float] = None,
+        closing: bool = False
+    ) -> RiskCheck:
+        """
+        下单前检查
+
+        Args:
+            side: buy / sell / short（short 与 sell 一样减少多头或增加空头）
+            price: 参考价格（限价单价格或到达价格），不传用最近一次同步的价格
+            closing: 平仓单（止损、清仓），本地持仓未同步时也按减仓放行
+        """
+        if not settings.risk_engine_enabled:
+            return APPROVED
+        self.checks += 1
+        if amount <= 0:
+            return self._reject("amount", f"下单数量无效: {amount}", symbol)
+
+        qty = self.positions.get(symbol, 0.0)
+        delta = amount if side == "buy" else -amount
+        if closing or (qty * delta < 0 and amount <= abs(qty) * (1 + 1e-9)):
+            return RiskCheck(True, reducing=True)
+
+        if self.kill_switch:
+            return self._reject("kill_switch", f"清仓开关已开启: {self.kill_reason}", symbol)
+
+        price = price or self.prices.get(symbol, 0.0)
+        if price <= 0:
+            return self._reject("price", "没有参考价格，无法计算名义金额", symbol)
+        self.prices[symbol] = price
+        notional = amount * price
+
+        limits = self.filters.get(symbol, {})
+        if amount < limits.get("min_qty", 0.0):
+            return self._reject("min_qty", f"数量{amount}低于最小下单数量{limits['min_qty']}", symbol)
+        if "max_qty" in limits and amount > limits["max_qty"]:
+            return self._reject("max_qty", f"数量{amount}超过最大下单数量{limits['max_qty']}", symbol)
+        min_notional = limits.get("min_notional") or settings.risk_min_notional
+        if notional < min_notional:
+            return self._reject("min_notional", f"名义金额${notional:.2f}低于最小${min_notional:.2f}", symbol)
+
+        if qty == 0 and len(self.positions) >= settings.max_concurrent_trades:
+            return self._reject(
+                "max_positions", f"持仓数量已达上限{settings.max_concurrent_trades}个", symbol
+            )
+
+        if self.equity <= 0:
+            return self._reject("equity", "账户权益未知", symbol)
+        for check, before, after, cap in self._exposures(symbol, delta * price):
+            # 只拦截使敞口变大且超过上限的订单
+            if abs(after) > abs(before) and abs(after) > cap * self.equity:
+                return self._reject(
+                    check,
+                    f"下单后{EXPOSURE_LABELS[check]}为${abs(after):,.2f}，超过上限${cap * self.equity:,.2f}（权益×{cap}）",
+                    symbol
+                )
+        return APPROVED
+
+    def _exposures(self, symbol: str, delta_notional: float) -> List[Tuple[str, float, float, float]]:
+        """[(检查项, 下单前敞口, 下单后敞口, 上限倍数), ...]"""
+        before = self._exposure(symbol)
+        after = before + delta_notional
+        bucket = self.bucket_of(symbol)
+        gross = net = bucket_gross = 0.0
+        for s, qty in self.positions.items():
+            exposure = qty * self.prices.get(s, 0.0)
+            gross += abs(exposure)
+            net += exposure
+            if self.buckets.get(s, s) == bucket:
+                bucket_gross += abs(exposure)
+        change = abs(after) - abs(before)
+        return [
+            ("symbol_exposure", before, after, settings.max_position_size),
+            ("gross_exposure", gross, gross + change, settings.risk_max_gross_exposure),
+            ("net_exposure", net, net + delta_notional, settings.risk_max_net_exposure),
+            ("bucket_exposure", bucket_gross, bucket_gross + change,
+             settings.risk_max_bucket_exposure if bucket != symbol else settings.max_position_size),
+        ]
+
+    def headroom(self, symbol: str, side: str, price: Optional[float] = None) -> float:
+        """各项敞口上限内该方向还能下单的名义金额（用于开仓前缩小仓位）"""
+        if not settings.risk_engine_enabled:
+            return float("inf")
+        price = price or self.prices.get(symbol, 0.0)
+        if self.kill_switch or self.equity <= 0 or price <= 0:
+            return 0.0
+        sign = 1.0 if side == "buy" else -1.0
+        before = self._exposure(symbol)
+        # 反方向下单先抵消现有敞口，这部分不占用总敞口和分组敞口额度
+        offset = 2 * abs(before) if before * sign < 0 else 0.0
+        room = float("inf")
+        for check, current, _, cap in self._exposures(symbol, 0.0):
+            if check in ("symbol_exposure", "net_exposure"):
+                room = min(room, cap * self.equity - sign * current)
+            else:
+                room = min(room, cap * self.equity - current + offset)
+        return max(room, 0.0)
+
+    def get_status(self) -> Dict:
+        gross = sum(abs(self._exposure(s)) for s in self.positions)
+        net = sum(self._exposure(s) for s in self.positions)
+        buckets: Dict[str, float] = {}
+        for symbol in self.positions:
+            bucket = self.bucket_of(symbol)
+            buckets[bucket] = buckets.get(bucket, 0.0) + abs(self._exposure(symbol))
+        equity = self.equity or 1.0
+        return {
+            "enabled": settings.risk_engine_enabled,
+            "kill_switch": self.kill_switch,
+            "kill_reason": self.kill_reason,
+            "equity": round(self.equity, 2),
+            "day_start_equity": round(self.day_start_equity, 2),
+            "daily_pnl_pct": round(self.daily_pnl_pct * 100, 3),
+            "daily_loss_limit_pct": settings.risk_daily_loss_limit * 100,
+            "open_positions": len(self.positions),
+            "max_positions": settings.max_concurrent_trades,
+            "exposure": {
+                "gross": round(gross, 2),
+                "gross_ratio": round(gross / equity, 4),
+                "net": round(net, 2),
+                "net_ratio": round(net / equity, 4),
+                "symbols": {s: round(self._exposure(s), 2) for s in self.positions},
+                "buckets": {b: round(v, 2) for b, v in buckets.items()},
+            },
+            "limits": {
+                "symbol": settings.max_position_size,
+                "gross": settings.risk_max_gross_exposure,
+                "net": settings.risk_max_net_exposure,
+                "bucket": settings.risk_max_bucket_exposure,
+                "min_notional": settings.risk_min_notional,
+            },
+            "filters_loaded": len(self.filters),
+            "checks": self.checks,
+            "rejections": dict(self.rejections),
+            "recent_rejections": list(self.recent_rejections),
+        }
+
+
+# 全局下单前风控实例
+pre_trade_risk = PreTradeRisk()
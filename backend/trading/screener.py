@@ -0,0 +1,201 @@
+"""
+交易对筛选器
+
+每轮交易周期开始时从全市场选出本轮分析的交易对：一次 get_all_tickers 全市场行情，
+加上定时刷新的缓存特征，拼成以交易对为行的列式表，在一次向量化计算中完成过滤、打分和取Top N。
+
+因子（列名）：
+- volume_24h / liquidity: 24小时成交额（美元）/ 其log10
+- volatility: 24小时振幅（(最高-最低)/最新价，%）
+- change_24h: 24小时涨跌幅（%）
+- realized_vol / trend: 组合风险分析已缓存的K线收益率标准差（%/根）和趋势得分（累计收益率/(波动率*√n)）
+- funding_rate: 最近一次资金费率（premiumIndex 一次请求，定时刷新）
+- spread_bps: 买卖价差（基点，bookTicker 一次请求，定时刷新）
+
+每个因子在过滤后的候选中做横截面标准化：z_<因子> 为z分数、r_<因子> 为百分位排名（0-1），
+缺少缓存特征的交易对取中性值（z=0、r=0.5）。打分和过滤都是 pandas 表达式（SCREENER_SCORE /
+SCREENER_FILTER），例如 "z_liquidity + 0.5 * z_volatility - 0.5 * z_spread_bps"；
+SCREENER_SCORE=volume_24h 等价于原来的按成交额排序。
+"""
+import asyncio
+import math
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from backend.config import settings
+from backend.exchanges.aster_dex import aster_client
+from backend.trading.risk_analytics import risk_analytics
+
+
+FACTORS = ("volume_24h", "liquidity", "volatility", "change_24h", "realized_vol", "trend", "funding_rate", "spread_bps")
+
+# 计算 realized_vol / trend 所需的最少收益率样本数
+MIN_RETURNS = 24
+
+# 逐个获取行情时最多查询的交易对数量（批量接口失败时的降级路径）
+FALLBACK_LIMIT = 100
+
+
+class UniverseScreener:
+    """全市场交易对筛选（列式表 + 向量化多因子打分）"""
+
+    def __init__(self):
+        self.funding: Dict[str, float] = {}
+        self.spreads: Dict[str, float] = {}
+        self.features_updated_at: Optional[float] = None
+        self.frame: Optional[pd.DataFrame] = None
+        self.universe: List[str] = []
+        self.last_screen_at: Optional[float] = None
+        self.last_screen_ms = 0.0
+        self.expression_errors = 0
+
+    async def refresh_features(self):
+        """刷新资金费率和买卖价差缓存（各一次全市场请求，失败时保留旧值）"""
+        funding, books = await asyncio.gather(
+            aster_client.get_all_funding_rates(), aster_client.get_all_book_tickers()
+        )
+        if funding:
+            self.funding = funding
+        if books:
+            self.spreads = {
+                symbol: (ask - bid) / ((ask + bid) / 2) * 10000
+                for symbol, (bid, ask) in books.items() if bid > 0 and ask >= bid
+            }
+        self.features_updated_at = time.time()
+        logger.debug(f"🔭 筛选特征已刷新: 资金费率{len(self.funding)}个 价差{len(self.spreads)}个")
+
+    async def fetch_tickers(self, symbols: Optional[List] = None) -> List[Dict]:
+        """全市场行情：优先批量接口，失败时逐个获取前 FALLBACK_LIMIT 个交易对"""
+        try:
+            tickers = await aster_client.get_all_tickers()
+            if tickers:
+                return tickers
+            raise Exception("批量API返回空数据")
+        except Exception as e:
+            logger.warning(f"批量获取失败，使用单独获取: {e}")
+        names = [s.get("symbol") if isinstance(s, dict) else s for s in (symbols or [])[:FALLBACK_LIMIT]]
+        results = await asyncio.gather(*(aster_client.get_ticker(s) for s in names), return_exceptions=True)
+        return [t for t in results if isinstance(t, dict) and t]
+
+    def _kline_features(self, symbols: pd.Index) -> pd.DataFrame:
+        """组合风险分析已缓存的收盘价矩阵按列计算 realized_vol 和 trend（没有缓存的为NaN）"""
+        features = pd.DataFrame(np.nan, index=symbols, columns=["realized_vol", "trend"])
+        cols = pd.Series(risk_analytics.index, dtype=float).reindex(symbols)
+        present = cols.notna().to_numpy()
+        if not present.any():
+            return features
+        returns = np.diff(np.log(risk_analytics.closes[:, cols[present].astype(int).to_numpy()]), axis=0)
+        valid = ~np.isnan(returns)
+        count = valid.sum(axis=0)
+        filled = np.where(valid, returns, 0.0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = filled.sum(axis=0) / count
+            std = np.sqrt(np.where(valid, (returns - mean) ** 2, 0.0).sum(axis=0) / (count - 1))
+            trend = filled.sum(axis=0) / (std * np.sqrt(count))
+        enough = (count >= MIN_RETURNS) & (std > 0)
+        features.loc[present, "realized_vol"] = np.where(enough, std * 100, np.nan)
+        features.loc[present, "trend"] = np.where(enough, trend, np.nan)
+        return features
+
+    def build_frame(self, tickers: List[Dict]) -> pd.DataFrame:
+        """行情和缓存特征拼成以交易对为行的因子表"""
+        frame = pd.DataFrame.from_records(
+            tickers, columns=["symbol", "price", "change_24h", "high_24h", "low_24h", "volume_24h"]
+        )
+        frame = frame[frame["symbol"].astype(bool)].drop_duplicates("symbol", keep="last").set_index("symbol")
+        frame = frame.apply(pd.to_numeric, errors="coerce")
+        price = frame["price"].where(frame["price"] > 0)
+        frame["liquidity"] = np.log10(frame["volume_24h"].clip(lower=1))
+        frame["volatility"] = (frame["high_24h"] - frame["low_24h"]) / price * 100
+        frame = frame.join(self._kline_features(frame.index))
+        frame["funding_rate"] = pd.Series(self.funding, dtype=float).reindex(frame.index)
+        frame["spread_bps"] = pd.Series(self.spreads, dtype=float).reindex(frame.index)
+        return frame
+
+    @staticmethod
+    def normalize(frame: pd.DataFrame) -> pd.DataFrame:
+        """每个因子横截面标准化：z_ 为z分数、r_ 为百分位排名，缺失值取中性"""
+        values = frame[list(FACTORS)]
+        std = values.std(ddof=0).replace(0, np.nan)
+        z = ((values - values.mean()) / std).fillna(0.0).add_prefix("z_")
+        r = values.rank(pct=True).fillna(0.5).add_prefix("r_")
+        return pd.concat([frame, z, r], axis=1)
+
+    def _evaluate(self, frame: pd.DataFrame, expression: str, default):
+        """计算 pandas 表达式，表达式有误时记录并返回默认值"""
+        try:
+            return frame.eval(expression)
+        except Exception as e:
+            self.expression_errors += 1
+            logger.error(f"❌ 筛选表达式无效，使用默认规则: {expression} - {e}")
+            return default
+
+    def screen(self, tickers: List[Dict], limit: Optional[int] = None) -> List[str]:
+        """
+        过滤、打分并返回得分最高的 limit 个交易对（默认 MAX_TRADING_SYMBOLS）
+
+        过滤：24H成交额不低于 MIN_VOLUME_THRESHOLD，且满足 SCREENER_FILTER（NaN参与比较时为False）；
+        打分：SCREENER_SCORE，得分相同按成交额排序
+        """
+        started = time.perf_counter()
+        limit = settings.max_trading_symbols if limit is None else limit
+        frame = self.build_frame(tickers)
+        frame = frame[frame["volume_24h"] >= settings.min_volume_threshold]
+        if settings.screener_filter and not frame.empty:
+            mask = self._evaluate(frame, settings.screener_filter, True)
+            frame = frame[mask] if isinstance(mask, pd.Series) else frame
+        frame = self.normalize(frame)
+        score = self._evaluate(frame, settings.screener_score, frame["volume_24h"]) if not frame.empty else 0.0
+        frame["score"] = pd.to_numeric(score, errors="coerce") if isinstance(score, pd.Series) else score
+        frame = frame.sort_values(["score", "volume_24h"], ascending=False, na_position="last")
+        frame["rank"] = np.arange(1, len(frame) + 1)
+
+        self.frame = frame
+        self.universe = list(frame.index[:limit])
+        self.last_screen_at = time.time()
+        self.last_screen_ms = (time.perf_counter() - started) * 1000
+        logger.info(
+            f"🔭 筛选完成: 全市场{len(tickers)}个 → 符合条件{len(frame)}个 → 选出{len(self.universe)}个 "
+            f"({self.last_screen_ms:.1f}ms)"
+        )
+        return self.universe
+
+    async def run(self, symbols: Optional[List] = None, limit: Optional[int] = None) -> List[str]:
+        """获取全市场行情并筛选（特征缓存为空时先刷新一次）"""
+        if self.features_updated_at is None:
+            await self.refresh_features()
+        return self.screen(await self.fetch_tickers(symbols), limit)
+
+    def get_status(self, limit: int = 50) -> Dict:
+        """筛选配置、特征缓存状态和最近一次筛选结果（前 limit 行因子和得分）"""
+        rows = []
+        if self.frame is not None:
+            columns = ["rank", "score", *FACTORS, "price"]
+            for symbol, row in self.frame[columns].head(limit).iterrows():
+                rows.append({"symbol": symbol, **{
+                    k: (None if isinstance(v, float) and not math.isfinite(v) else round(float(v), 6))
+                    for k, v in row.items()
+                }})
+        return {
+            "score_expression": settings.screener_score,
+            "filter_expression": settings.screener_filter,
+            "min_volume": settings.min_volume_threshold,
+            "max_symbols": settings.max_trading_symbols,
+            "funding_rates": len(self.funding),
+            "spreads": len(self.spreads),
+            "features_updated_at": self.features_updated_at,
+            "last_screen_at": self.last_screen_at,
+            "screen_ms": round(self.last_screen_ms, 3),
+            "eligible": 0 if self.frame is None else len(self.frame),
+            "expression_errors": self.expression_errors,
+            "universe": self.universe,
+            "table": rows,
+        }
+
+
+# 全局交易对筛选器实例
+screener = UniverseScreener()
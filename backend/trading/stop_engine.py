@@ -0,0 +1,258 @@
+"""
+向量化止盈止损引擎
+
+把所有持仓的入场价、止损、止盈、移动止损高/低水位和方向保存在NumPy数组中，
+每个价格tick（REST轮询或推送）做一次向量化判断，触发的持仓放入平仓队列，
+由交易引擎异步消费执行，不必等待30分钟的交易周期。
+
+只管理 stop_loss_strategy 为 intelligent_stop 的持仓（本系统开仓并设置了止盈止损的），
+手动开仓或同步时补了默认止损的持仓（default）不会被自动平仓。基础止损不会比持仓自己设置的止损更紧。
+"""
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from loguru import logger
+
+from backend.agents.intelligent_stop_strategy import intelligent_stop_strategy
+
+
+class VectorizedStopEngine:
+    """向量化止盈止损引擎"""
+
+    # 由引擎管理的止损策略
+    MANAGED_STRATEGY = "intelligent_stop"
+
+    # 触发原因编码
+    REASON_NONE = 0
+    REASON_STOP_LOSS = 1
+    REASON_TAKE_PROFIT = 2
+    REASON_TRAILING_STOP = 3
+
+    REASON_NAMES = {
+        REASON_STOP_LOSS: "止损触发",
+        REASON_TAKE_PROFIT: "止盈触发",
+        REASON_TRAILING_STOP: "移动止损触发",
+    }
+
+    def __init__(self, retry_cooldown: float = 30.0):
+        # 移动止损参数与 IntelligentStopStrategy 保持一致
+        self.base_stop_loss_pct = intelligent_stop_strategy.base_stop_loss_pct
+        self.trailing_activation_pct = intelligent_stop_strategy.trailing_activation_pct
+        self.trailing_stop_pct = intelligent_stop_strategy.trailing_stop_pct
+
+        # 已触发但尚未平仓的持仓在冷却期内不会重复入队
+        self.retry_cooldown = retry_cooldown
+
+        self.order_queue: asyncio.Queue = asyncio.Queue()
+
+        self._symbols: List[str] = []
+        self._index: Dict[str, int] = {}
+        self._side = np.zeros(0, dtype=np.int8)          # 1=多仓, -1=空仓
+        self._entry = np.zeros(0, dtype=np.float64)
+        self._quantity = np.zeros(0, dtype=np.float64)
+        self._stop_loss = np.zeros(0, dtype=np.float64)  # NaN 表示未设置
+        self._take_profit = np.zeros(0, dtype=np.float64)
+        self._high = np.zeros(0, dtype=np.float64)
+        self._low = np.zeros(0, dtype=np.float64)
+        self._pending_since = np.zeros(0, dtype=np.float64)  # 0 表示未入队
+
+        self.stats = {
+            "ticks": 0,
+            "triggers": 0,
+            "last_eval_ms": 0.0,
+            "last_tick_at": None,
+        }
+
+    @property
+    def size(self) -> int:
+        return len(self._symbols)
+
+    def symbols(self) -> List[str]:
+        """当前管理的持仓交易对"""
+        return list(self._symbols)
+
+    def sync_positions(self, positions: List[Dict]):
+        """
+        用最新持仓列表重建数组（只保留 intelligent_stop 管理的持仓）
+
+        已存在的持仓保留移动止损的高/低水位和入队状态，新持仓以入场价初始化水位。
+
+        Args:
+            positions: 持仓列表（TradingEngine._get_current_positions 返回格式）
+        """
+        rows = []
+        for pos in positions or []:
+            symbol = pos.get("symbol")
+            amount = float(pos.get("amount") or 0)
+            if not symbol or amount <= 0 or pos.get("stop_loss_strategy") != self.MANAGED_STRATEGY:
+                continue
+            entry = float(pos.get("entry_price") or pos.get("average_price") or 0)
+            if entry <= 0:
+                continue
+            side = -1 if pos.get("position_type") == "short" else 1
+            stop_loss = float(pos.get("stop_loss") or 0)
+            take_profit = float(pos.get("take_profit") or 0)
+            rows.append((symbol, side, entry, amount, stop_loss, take_profit))
+
+        n = len(rows)
+        symbols = [r[0] for r in rows]
+        side = np.array([r[1] for r in rows], dtype=np.int8)
+        entry = np.array([r[2] for r in rows], dtype=np.float64)
+        quantity = np.array([r[3] for r in rows], dtype=np.float64)
+        stop_loss = np.array([r[4] for r in rows], dtype=np.float64)
+        take_profit = np.array([r[5] for r in rows], dtype=np.float64)
+        stop_loss[stop_loss <= 0] = np.nan
+        take_profit[take_profit <= 0] = np.nan
+
+        high = entry.copy()
+        low = entry.copy()
+        pending_since = np.zeros(n, dtype=np.float64)
+
+        # 继承旧状态（同方向、同入场价视为同一持仓）
+        for i, symbol in enumerate(symbols):
+            j = self._index.get(symbol)
+            if j is None:
+                continue
+            if self._side[j] == side[i] and np.isclose(self._entry[j], entry[i]):
+                high[i] = max(self._high[j], entry[i])
+                low[i] = min(self._low[j], entry[i])
+                pending_since[i] = self._pending_since[j]
+
+        self._symbols = symbols
+        self._index = {symbol: i for i, symbol in enumerate(symbols)}
+        self._side = side
+        self._entry = entry
+        self._quantity = quantity
+        self._stop_loss = stop_loss
+        self._take_profit = take_profit
+        self._high = high
+        self._low = low
+        self._pending_since = pending_since
+
+        logger.debug(f"🎯 止损引擎已同步 {n} 个持仓")
+
+    def remove_symbol(self, symbol: str):
+        """平仓完成后移除持仓"""
+        i = self._index.get(symbol)
+        if i is None:
+            return
+        keep = np.arange(self.size) != i
+        self._symbols = [s for k, s in enumerate(self._symbols) if k != i]
+        self._index = {s: k for k, s in enumerate(self._symbols)}
+        self._side = self._side[keep]
+        self._entry = self._entry[keep]
+        self._quantity = self._quantity[keep]
+        self._stop_loss = self._stop_loss[keep]
+        self._take_profit = self._take_profit[keep]
+        self._high = self._high[keep]
+        self._low = self._low[keep]
+        self._pending_since = self._pending_since[keep]
+
+    def evaluate(self, prices: Dict[str, float]) -> List[Dict]:
+        """
+        一次向量化判断所有持仓的止盈止损
+
+        Args:
+            prices: {symbol: 最新价格}，可以只包含部分交易对
+
+        Returns:
+            本次触发的平仓指令列表（同时已放入 order_queue）
+        """
+        if self.size == 0:
+            return []
+
+        started = time.perf_counter()
+        now = time.time()
+
+        price = np.array([prices.get(s, np.nan) for s in self._symbols], dtype=np.float64)
+        has_price = np.isfinite(price) & (price > 0)
+        is_long = self._side == 1
+        is_short = ~is_long
+
+        # 更新移动止损水位
+        self._high = np.where(has_price & is_long, np.fmax(self._high, price), self._high)
+        self._low = np.where(has_price & is_short, np.fmin(self._low, price), self._low)
+
+        # 移动止损位（IntelligentStopStrategy.calculate_trailing_stop 的向量化版本）
+        # 基础止损取固定比例和持仓止损中较宽的一个（fmin/fmax 忽略未设置的NaN）；
+        # 激活按高/低水位判断，一次轮询内价格越过激活位又跌破移动止损位时仍能触发
+        base_long = np.fmin(self._entry * (1 - self.base_stop_loss_pct), self._stop_loss)
+        base_short = np.fmax(self._entry * (1 + self.base_stop_loss_pct), self._stop_loss)
+        long_active = self._high >= self._entry * (1 + self.trailing_activation_pct)
+        short_active = self._low <= self._entry * (1 - self.trailing_activation_pct)
+        trailing_long = np.where(
+            long_active, np.maximum(self._high * (1 - self.trailing_stop_pct), base_long), base_long
+        )
+        trailing_short = np.where(
+            short_active, np.minimum(self._low * (1 + self.trailing_stop_pct), base_short), base_short
+        )
+
+        # NaN 比较结果为 False，未设置的止损/止盈自然不会触发
+        with np.errstate(invalid="ignore"):
+            hit_sl = np.where(is_long, price <= self._stop_loss, price >= self._stop_loss)
+            hit_tp = np.where(is_long, price >= self._take_profit, price <= self._take_profit)
+            hit_trail = np.where(is_long, price <= trailing_long, price >= trailing_short)
+
+        # 优先级：固定止损 > 固定止盈 > 移动止损
+        reason = np.select(
+            [hit_sl, hit_tp, hit_trail],
+            [self.REASON_STOP_LOSS, self.REASON_TAKE_PROFIT, self.REASON_TRAILING_STOP],
+            default=self.REASON_NONE,
+        )
+        cooling = (self._pending_since > 0) & (now - self._pending_since < self.retry_cooldown)
+        triggered = np.flatnonzero(has_price & (reason != self.REASON_NONE) & ~cooling)
+
+        orders = []
+        for i in triggered:
+            self._pending_since[i] = now
+            order = {
+                "symbol": self._symbols[i],
+                "action": "sell" if self._side[i] == 1 else "cover",
+                "reason": self.REASON_NAMES[int(reason[i])],
+                "price": float(price[i]),
+                "entry_price": float(self._entry[i]),
+                "quantity": float(self._quantity[i]),
+                "triggered_at": now,
+            }
+            self.order_queue.put_nowait(order)
+            orders.append(order)
+            logger.warning(
+                f"⚠️ {order['reason']}: {order['symbol']} 价格${order['price']:.4f} "
+                f"(入场${order['entry_price']:.4f}) → {order['action']}"
+            )
+
+        self.stats["ticks"] += 1
+        self.stats["triggers"] += len(orders)
+        self.stats["last_eval_ms"] = (time.perf_counter() - started) * 1000
+        self.stats["last_tick_at"] = now
+        return orders
+
+    def get_status(self) -> Dict:
+        """获取引擎状态"""
+        return {
+            "positions": self.size,
+            "queue_size": self.order_queue.qsize(),
+            "pending": int(np.count_nonzero(self._pending_since > 0)),
+            **self.stats,
+        }
+
+    def get_levels(self, symbol: str) -> Optional[Dict]:
+        """获取单个持仓当前的止盈止损水位"""
+        i = self._index.get(symbol)
+        if i is None:
+            return None
+        return {
+            "symbol": symbol,
+            "side": "long" if self._side[i] == 1 else "short",
+            "entry_price": float(self._entry[i]),
+            "stop_loss": None if np.isnan(self._stop_loss[i]) else float(self._stop_loss[i]),
+            "take_profit": None if np.isnan(self._take_profit[i]) else float(self._take_profit[i]),
+            "highest_price": float(self._high[i]),
+            "lowest_price": float(self._low[i]),
+        }
+
+
+# 全局止损引擎实例
+stop_engine = VectorizedStopEngine()
@@ -1,7 +1,9 @@
 """
 交易引擎 - 核心交易逻辑
 """
+import asyncio
 import json
+from contextlib import AsyncExitStack
 from re import S
 from typing import Dict, List, Optional
 from datetime import datetime
@@ -11,11 +13,24 @@ from sqlalchemy import select, desc
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from backend.exchanges.aster_dex import aster_client
+from backend.exchanges.user_stream import user_stream
+from backend.exchanges.order_book import order_book_service
 from backend.agents.agent_team import AgentTeam
 from backend.agents.simple_trading_strategy import simple_strategy
 from backend.agents.stop_loss_decision_system import stop_decision_system
 from backend.agents.intelligent_stop_strategy import intelligent_stop_strategy
-from backend.database import Trade, Position, PortfolioSnapshot, AIDecision, MarketData
+from backend.trading.stop_engine import stop_engine
+from backend.trading.order_manager import order_manager
+from backend.trading.execution import execution_engine
+from backend.trading.risk_engine import pre_trade_risk
+from backend.trading.risk_analytics import risk_analytics
+from backend.trading.screener import screener
+from backend.agents.decision_gate import decision_gate
+from backend.agents.multi_timeframe import PRIMARY_INTERVAL, PRIMARY_LIMIT, can_derive, primary_klines
+from backend.monitoring.metrics import CYCLE_LATENCY, STAGE_LATENCY, timed
+from backend.monitoring.tracing import tracer
+from backend.monitoring.health import health_registry
+from backend.database import AsyncSessionLocal, Trade, Position, PortfolioSnapshot, AIDecision, MarketData
 from backend.config import settings
 from backend.agents.agent_team import agent_team_position,agent_team
 
@@ -29,6 +44,11 @@ class TradingEngine:
         self.total_pnl = 0.0
         self.trade_count = 0
         self.winning_trades = 0
+        self.cycle_id = ""  # 当前交易周期ID，作为客户端订单ID的意图键
+        self.trading_paused = False  # 管理员暂停自动交易（不改全局配置，可通过接口恢复）
+        self.pause_reason = ""
+        self._close_locks: Dict[str, asyncio.Lock] = {}  # 交易对 -> 平仓锁（止损扫单和交易周期不同时平同一持仓）
+        order_manager.add_fill_listener(self._on_order_filled)
         
         # 缓存机制
         self._balance_cache = None  # 余额缓存
@@ -52,6 +72,21 @@ class TradingEngine:
             logger.info(f"从数据库加载状态 - 余额: ${self.current_balance:.2f}, 总盈亏: ${self.total_pnl:.2f}")
         else:
             logger.info(f"初始化新账户 - 初始余额: ${self.current_balance:.2f}")
+        pre_trade_risk.update_equity(self.current_balance)
+    
+    @property
+    def auto_trading_enabled(self) -> bool:
+        """自动交易是否开启：配置开启且未被管理员暂停"""
+        return settings.enable_auto_trading and not self.trading_paused
+    
+    def set_trading_paused(self, paused: bool, reason: str = ""):
+        """暂停或恢复自动交易（两个交易周期任务都会跳过）"""
+        self.trading_paused = paused
+        self.pause_reason = reason if paused else ""
+        if paused:
+            logger.warning(f"🛑 自动交易已暂停: {reason}")
+        else:
+            logger.info("▶️ 自动交易已恢复")
     
     def _is_cache_valid(self, cache_time) -> bool:
         """检查缓存是否有效"""
@@ -60,6 +95,23 @@ class TradingEngine:
         elapsed = (datetime.now() - cache_time).total_seconds()
         return elapsed < self._cache_ttl
     
+    async def _fetch_positions(self) -> Optional[List[Dict]]:
+        """交易所持仓：用户数据流在线时读内存账户簿，否则REST查询（同时同步给下单前风控），查询失败返回None"""
+        if user_stream.is_live():
+            positions = user_stream.get_positions()
+        else:
+            positions = await aster_client.get_open_positions()
+            if positions is None:
+                return None
+        pre_trade_risk.sync_positions(positions)
+        return positions
+    
+    async def _fetch_balance(self) -> Dict:
+        """钱包余额：用户数据流在线时读内存账户簿，否则REST查询"""
+        if user_stream.is_live():
+            return user_stream.get_balance()
+        return await aster_client.get_account_balance()
+    
     def _invalidate_balance_cache(self):
         """使余额缓存失效"""
         self._balance_cache = None
@@ -137,19 +189,32 @@ class TradingEngine:
     
     async def execute_trading_cycle(self, db: AsyncSession,only_buy:bool = False):
         """执行一轮完整的交易周期"""
+        with CYCLE_LATENCY.time(mode="position" if only_buy else "entry"):
+            await self._run_trading_cycle(db, only_buy)
+
+    async def _run_trading_cycle(self, db: AsyncSession, only_buy: bool = False):
+        """交易周期主体（only_buy=True 时只分析持仓交易对）"""
         try:
+            # 降级模式：行情/账户/数据库异常时不开新仓，持仓管理照常
+            if not only_buy and health_registry.degraded:
+                logger.warning("🩺 降级模式：跳过本轮开仓交易周期")
+                return
+            
             logger.info("开始交易周期...")
+            self.cycle_id = datetime.now().strftime("%Y%m%d%H%M%S") + ("p" if only_buy else "e")
             
             # 在周期开始时清空缓存，确保获取最新数据
             self._invalidate_all_cache()
             
             # 1. 获取支持的交易对
-            all_symbols = await aster_client.get_supported_symbols()
+            with STAGE_LATENCY.time(stage="fetch_symbols", symbol="all"):
+                all_symbols = await aster_client.get_supported_symbols()
             logger.info(f"支持的交易对总数量: {len(all_symbols)}")
+            pre_trade_risk.load_symbol_filters(all_symbols)
             
-            # 2. 筛选并排序交易对：按24小时交易量筛选和排序
-            symbols = await self._filter_and_sort_symbols_by_volume(all_symbols)
-            logger.info(f"✅ 筛选后的交易对数量: {len(symbols)} (按交易量降序，取前50个)")
+            # 2. 筛选交易对：全市场行情 + 缓存特征多因子打分，取前 MAX_TRADING_SYMBOLS 个
+            symbols = await self._screen_symbols(all_symbols)
+            logger.info(f"✅ 筛选后的交易对数量: {len(symbols)} (按筛选得分降序，取前{settings.max_trading_symbols}个)")
             
             # 3. 获取当前持仓（首次查询，会更新缓存）
             logger.info("🔄 获取当前持仓（首次查询）...")
@@ -167,7 +232,6 @@ class TradingEngine:
             #     logger.info(f"📊 开始评估{len(positions)}个持仓的止盈止损...")
             #     await self._evaluate_positions_stop_loss(db, positions)
             temp = []
-            symbols = symbols[:20]
             if positions:
                 for position in positions:
                     temp.append(position.get("symbol"))
@@ -180,105 +244,144 @@ class TradingEngine:
             if len(temp) <= 0 :
                 logger.info("没有可分析的交易对,退出本次交易周期....")
                 return 
+            # 6. 确定性门控：只把高分候选和持仓交易对交给LLM团队
+            prefetched = {}
+            if settings.gate_enabled:
+                with STAGE_LATENCY.time(stage="gate", symbol="all"):
+                    temp, prefetched = await self._gate_symbols(temp, positions, balance_info)
+            # 本轮要分析的交易对和持仓交易对维护本地订单簿（决策、仓位计算和下单直接读取）
+            order_book_service.watch(list(temp) + [p.get("symbol") for p in positions])
+            risk_analytics.track(temp)
             for symbol in temp:  # 限制每次分析前10个，避免API调用过多
                 try:
-                    if only_buy:
-                        await self._analyze_and_trade(db, symbol, positions,balance_info,all_symbols,agent_team_position)
-                    else:
-                        await self._analyze_and_trade(db, symbol, positions,balance_info,all_symbols,agent_team)
+                    with tracer.span("analyze_and_trade", symbol=symbol):
+                        if only_buy:
+                            await self._analyze_and_trade(db, symbol, positions,balance_info,all_symbols,agent_team_position,prefetched.get(symbol))
+                        else:
+                            await self._analyze_and_trade(db, symbol, positions,balance_info,all_symbols,agent_team,prefetched.get(symbol))
                 except Exception as e:
                     logger.exception(f"分析 {symbol} 失败: {e}")
             
             # 7. 更新投资组合快照
-            await self._save_portfolio_snapshot(db)
+            with STAGE_LATENCY.time(stage="portfolio_snapshot", symbol="all"):
+                await self._save_portfolio_snapshot(db)
             
             logger.info("交易周期完成")
             
         except Exception as e:
             logger.exception(f"交易周期执行失败: {e}")
     
-    async def _filter_and_sort_symbols_by_volume(self, symbols: List[str]) -> List[str]:
+    @timed(STAGE_LATENCY, stage="filter_symbols", symbol="all")
+    async def _screen_symbols(self, symbols: List) -> List[str]:
         """
-        筛选并排序交易对：
-        1. 24小时交易量低于配置阈值的直接排除（默认2000万）
-        2. 按交易量从大到小排序
-        3. 取前N个交易量最大的币种（默认50个）
+        筛选本轮分析的交易对：全市场行情 + 缓存特征的多因子打分（见 backend/trading/screener.py），
+        取得分最高的 MAX_TRADING_SYMBOLS 个
         """
-        import asyncio
+        logger.info(
+            f"🔍 开始筛选交易对：要求24H交易量≥${settings.min_volume_threshold:,.0f} USDT，"
+            f"按 [{settings.screener_score}] 取Top {settings.max_trading_symbols}..."
+        )
+        result = await screener.run(symbols)
         
-        MIN_VOLUME_THRESHOLD = settings.min_volume_threshold  # 从配置读取
-        MAX_SYMBOLS = settings.max_trading_symbols  # 从配置读取
+        # 打印筛选结果（前10个）
+        if result:
+            logger.info(f"🏆 Top 10 交易对（按筛选得分）:")
+            for symbol, row in screener.frame.head(10).iterrows():
+                logger.info(f"   {int(row['rank'])}. {symbol}: 得分 {row['score']:.3f} 交易量 ${row['volume_24h']:,.0f}")
+        else:
+            logger.warning(f"⚠️ 没有找到符合条件的交易对（交易量≥${settings.min_volume_threshold:,.0f}）")
         
-        logger.info(f"🔍 开始筛选交易对：要求24H交易量≥${MIN_VOLUME_THRESHOLD:,.0f} USDT，取Top {MAX_SYMBOLS}...")
+        return result
+    
+    def _build_portfolio_info(self, balance_info: Dict) -> Dict:
+        """根据余额信息构造投资组合摘要"""
+        return {
+            "total_balance":self.current_balance,
+            "cash_balance": float(balance_info.get("free",0))+float(balance_info.get("locked",0)),
+            "positions_value":  float(balance_info.get("locked",0)),
+            "total_pnl": self.total_pnl,
+            "available_balance": float (balance_info.get("free",0)),
+        }
+    
+    @staticmethod
+    def _mtf_active() -> bool:
+        return settings.mtf_enabled and can_derive(settings.mtf_base_interval, PRIMARY_INTERVAL)
+    
+    async def _fetch_klines(self, symbol: str, with_base: bool = True) -> Dict:
+        """
+        获取分析用K线：开启多周期特征时只拉一次基础周期K线，1h K线由其重采样得到
         
-        # 获取所有交易对的行情数据（包含交易量信息）
-        symbol_volumes = []
+        Args:
+            with_base: False 时只拉 1h x PRIMARY_LIMIT（门控阶段对全部候选打分用，不需要多周期长窗口）
         
-        # 批量获取ticker数据（优化性能）
-        try:
-            # 尝试使用批量API
-            all_tickers = await aster_client.get_all_tickers()
-            if all_tickers and len(all_tickers) > 0:
-                # 从批量数据中提取交易量信息
-                for ticker in all_tickers:
-                    symbol = ticker.get("symbol", "")
-                    volume_24h = ticker.get("volume_24h", 0)
-                    
-                    # 应用筛选条件：交易量≥配置阈值
-                    if volume_24h >= MIN_VOLUME_THRESHOLD:
-                        symbol_volumes.append({
-                            "symbol": symbol,
-                            "volume_24h": volume_24h
-                        })
-                
-                logger.info(f"📊 批量获取完成，符合条件的交易对: {len(symbol_volumes)}个")
-            else:
-                raise Exception("批量API返回空数据")
-                
-        except Exception as e:
-            logger.warning(f"批量获取失败，使用单独获取: {e}")
-            
-            # 如果批量API失败，逐个获取（限制数量以避免过多API调用）
-            limited_symbols = symbols[:100]  # 只查询前100个
-            tasks = [aster_client.get_ticker(symbol) for symbol in limited_symbols]
-            tickers = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            for symbol, ticker in zip(limited_symbols, tickers):
-                if isinstance(ticker, dict) and ticker:
-                    volume_24h = ticker.get("volume_24h", 0)
-                    
-                    # 应用筛选条件：交易量≥配置阈值
-                    if volume_24h >= MIN_VOLUME_THRESHOLD:
-                        symbol_volumes.append({
-                            "symbol": symbol,
-                            "volume_24h": volume_24h
-                        })
+        Returns:
+            {"klines": 1h K线, "base_klines": 基础周期K线（未开启多周期或 with_base=False 时为空）}
+        """
+        base_interval = settings.mtf_base_interval
+        if with_base and self._mtf_active():
+            base_klines = await aster_client.get_klines(symbol, base_interval, settings.mtf_base_limit)
+            risk_analytics.ingest(symbol, base_klines, base_interval)
+            return {"klines": primary_klines(base_klines, base_interval), "base_klines": base_klines}
+        klines = await aster_client.get_klines(symbol, PRIMARY_INTERVAL, PRIMARY_LIMIT)
+        risk_analytics.ingest(symbol, klines, PRIMARY_INTERVAL)
+        return {"klines": klines, "base_klines": []}
+    
+    async def _gate_symbols(self, symbols, positions: List[Dict], balance_info: Dict):
+        """
+        门控阶段：并发获取行情和K线，本地打分后选出需要LLM分析的交易对
         
-        # 按交易量从大到小排序
-        symbol_volumes.sort(key=lambda x: x["volume_24h"], reverse=True)
+        这里只拉 1h x PRIMARY_LIMIT，多周期基础K线（MTF_BASE_LIMIT根）只为升级的交易对拉取
         
-        # 取前N个
-        top_symbols = symbol_volumes[:MAX_SYMBOLS]
+        Returns:
+            (升级的交易对列表, {symbol: {"ticker", "klines", "base_klines"}} 预取数据，供后续分析复用)
+        """
+        import asyncio
+        held_symbols = {p.get("symbol") for p in positions or []}
+        portfolio = self._build_portfolio_info(balance_info)
+        symbols = list(symbols)
         
-        # 打印筛选结果（前10个）
-        if top_symbols:
-            logger.info(f"🏆 Top 10 交易对（按24H交易量）:")
-            for i, item in enumerate(top_symbols[:10], 1):
-                logger.info(f"   {i}. {item['symbol']}: 交易量 ${item['volume_24h']:,.0f}")
-        else:
-            logger.warning(f"⚠️ 没有找到符合条件的交易对（交易量≥${MIN_VOLUME_THRESHOLD:,.0f}）")
+        async def fetch(symbol):
+            ticker, klines = await asyncio.gather(
+                aster_client.get_ticker(symbol),
+                self._fetch_klines(symbol, with_base=False)
+            )
+            return ticker, klines
         
-        # 返回筛选后的交易对列表
-        result = [item["symbol"] for item in top_symbols]
-        logger.info(f"✅ 最终选择 {len(result)} 个交易对进行分析")
+        fetched = await asyncio.gather(*[fetch(s) for s in symbols], return_exceptions=True)
         
-        return result
+        prefetched = {}
+        scores = []
+        for symbol, item in zip(symbols, fetched):
+            if isinstance(item, Exception) or not item[0] or not item[1]["klines"]:
+                logger.warning(f"门控获取数据失败，跳过: {symbol}")
+                continue
+            ticker, fetched_klines = item
+            klines = fetched_klines["klines"]
+            prefetched[symbol] = {"ticker": ticker, **fetched_klines}
+            scores.append(await decision_gate.score_symbol(
+                symbol,
+                {
+                    "price": ticker.get("price", 0),
+                    "change_24h": ticker.get("change_24h", 0),
+                    "high_24h": ticker.get("high_24h", 0),
+                    "low_24h": ticker.get("low_24h", 0),
+                    "volume_24h": ticker.get("volume_24h", 0),
+                },
+                klines,
+                portfolio,
+                has_position=symbol in held_symbols
+            ))
+        
+        escalated = decision_gate.select(scores)
+        return escalated, prefetched
     
-    async def _analyze_and_trade(self, db: AsyncSession, symbol: str, positions: List[Dict],balance_info: Dict,all_symbols: List[str],agent_team: AgentTeam):
-        """分析单个交易对并执行交易"""
+    async def _analyze_and_trade(self, db: AsyncSession, symbol: str, positions: List[Dict],balance_info: Dict,all_symbols: List[str],agent_team: AgentTeam,prefetched: Optional[Dict] = None):
+        """分析单个交易对并执行交易（prefetched 为门控阶段已获取的行情和K线）"""
         try:
+            prefetched = prefetched or {}
             # 获取市场数据
-            ticker = await aster_client.get_ticker(symbol)
+            with STAGE_LATENCY.time(stage="fetch_ticker", symbol=symbol):
+                ticker = prefetched.get("ticker") or await aster_client.get_ticker(symbol)
             if not ticker:
                 return
             # 从commission_rate接口获取手续费和从symbol_info获取最小交易数量
@@ -286,7 +389,8 @@ class TradingEngine:
             min_qty = 0
             
             # 获取手续费率（从专用API）
-            commission_info = await aster_client.get_commission_rate(symbol)
+            with STAGE_LATENCY.time(stage="fetch_commission", symbol=symbol):
+                commission_info = await aster_client.get_commission_rate(symbol)
             if commission_info:
                 # 使用taker手续费率（市价单通常使用taker费率）
                 taker_rate = commission_info.get('takerCommissionRate', 0)
@@ -332,37 +436,44 @@ class TradingEngine:
                     low_24h=market_data["low_24h"]
                 )
                 db.add(market_data_record)
-                await db.commit()
+                with STAGE_LATENCY.time(stage="db_commit", symbol=symbol), health_registry.track("db"):
+                    await db.commit()
                 logger.debug(f"市场数据已保存: {symbol} @ ${market_data['price']:.2f}")
             except Exception as db_error:
                 await db.rollback()
                 logger.warning(f"保存市场数据失败（继续执行）: {symbol} - {db_error}")
             
             # 获取投资组合信息
-            portfolio = {
-                "total_balance":self.current_balance,
-                "cash_balance": float(balance_info.get("free",0))+float(balance_info.get("locked",0)),
-                "positions_value":  float(balance_info.get("locked",0)),
-                "total_pnl": self.total_pnl,
-                "available_balance": float (balance_info.get("free",0)),
-            }
+            portfolio = self._build_portfolio_info(balance_info)
             # 获取symbol 的K线数据
-            klines = await aster_client.get_klines(symbol, "1h", 100)
+            with STAGE_LATENCY.time(stage="fetch_klines", symbol=symbol):
+                if prefetched.get("klines") and (prefetched.get("base_klines") or not self._mtf_active()):
+                    fetched_klines = prefetched
+                else:
+                    # 门控只预取了1h K线，升级的交易对在这里拉多周期基础K线
+                    fetched_klines = await self._fetch_klines(symbol)
+            klines = fetched_klines["klines"]
+            if not klines:
+                logger.warning(f"⚠️ {symbol} 未获取到K线数据，跳过本次分析")
+                return
             
             # # 多智能体团队协同分析
-            team_decision = await agent_team.conduct_team_analysis(
-                symbol=symbol,
-                market_data=market_data,
-                portfolio=portfolio,
-                positions=positions,
-                additional_data={
-                    "sentiment": {},  # 可以接入真实的情绪数据API
-                    "news": [],  # 可以接入真实的新闻API
-                    "raw_klines": klines,
-                    "kline_interval": "1h"
-                },
-                db_session=db  # 传入数据库会话
-            )
+            with STAGE_LATENCY.time(stage="team_analysis", symbol=symbol):
+                team_decision = await agent_team.conduct_team_analysis(
+                    symbol=symbol,
+                    market_data=market_data,
+                    portfolio=portfolio,
+                    positions=positions,
+                    additional_data={
+                        "sentiment": {},  # 可以接入真实的情绪数据API
+                        "news": [],  # 可以接入真实的新闻API
+                        "raw_klines": klines,
+                        "kline_interval": PRIMARY_INTERVAL,
+                        "base_klines": fetched_klines.get("base_klines", []),
+                        "base_interval": settings.mtf_base_interval
+                    },
+                    db_session=db  # 传入数据库会话
+                )
             
             # 如果AI团队决策失败（置信度为0），使用简单策略作为后备
             if team_decision['confidence'] == 0.0 or team_decision['action'] == 'hold' and team_decision['final_decision'] == 'reject':
@@ -397,7 +508,8 @@ class TradingEngine:
                 market_analysis=str(team_decision.get('team_analyses', []))
             )
             db.add(ai_decision)
-            await db.commit()
+            with STAGE_LATENCY.time(stage="db_commit", symbol=symbol), health_registry.track("db"):
+                await db.commit()
             
             # 处理 hold 动作：如果是持仓的币且有止盈止损，更新到数据库
             if team_decision['action'] == 'hold':
@@ -422,7 +534,8 @@ class TradingEngine:
             if (team_decision['final_decision'] == 'approve' and 
                 team_decision['confidence'] >= settings.confidence_threshold and
                 team_decision['action'] != 'hold'):
-                await self._execute_trade(db, symbol, team_decision, market_data)
+                with STAGE_LATENCY.time(stage="order", symbol=symbol):
+                    await self._execute_trade(db, symbol, team_decision, market_data)
             else:
                 logger.info(f"⏸️  {symbol} 交易未批准 - {team_decision['reasoning'][:100]}")
             
@@ -480,6 +593,28 @@ class TradingEngine:
                 reserved_margin = cash_balance * (1 - margin_ratio)
                 logger.info(f"🛡️ 合约交易保证金保护：使用{margin_ratio*100:.0f}%余额，预留${reserved_margin:.2f}保证金防止爆仓")
             
+            # 风控规则4: 按订单簿深度缩小仓位，使预估滑点不超过配置上限
+            if settings.max_entry_slippage_bps > 0:
+                liquidity_cap = await order_book_service.max_notional(
+                    symbol, "buy" if action == "buy" else "sell", settings.max_entry_slippage_bps
+                )
+                if liquidity_cap is not None and liquidity_cap < max_trade_value:
+                    logger.info(
+                        f"🌊 盘口深度限制：预估滑点≤{settings.max_entry_slippage_bps:.0f}bps 最多成交"
+                        f"${liquidity_cap:.2f}，仓位由${max_trade_value:.2f}缩小"
+                    )
+                    max_trade_value = liquidity_cap
+                if max_trade_value < settings.execution_min_child_notional:
+                    logger.warning(f"⚠️ {symbol} 盘口深度不足，跳过开仓")
+                    return
+            
+            # 风控规则5: 不超过下单前风控的敞口余量（单交易对/总/净/相关性分组）
+            side = "buy" if action == "buy" else "sell"
+            risk_room = pre_trade_risk.headroom(symbol, side, current_price)
+            if risk_room < max_trade_value:
+                logger.info(f"🛡️ 敞口上限：最多还能开仓${risk_room:.2f}，仓位由${max_trade_value:.2f}缩小")
+                max_trade_value = risk_room
+            
             # 最终检查：确保有足够余额
             if max_trade_value > cash_balance:
                 logger.warning(f"⚠️ 余额不足：需要${max_trade_value:.2f}，可用${cash_balance:.2f}")
@@ -503,97 +638,149 @@ class TradingEngine:
             logger.info(f"   交易数量: {amount_before:.8f} {symbol} -> {amount} {symbol} (精度调整)")
             logger.info(f"   实际交易金额: ${amount * current_price:.2f}")
             
-            order_result = None
-            
             if action == "buy":
-                # 买入做多
                 logger.info(f"📈 执行买入做多: {symbol}")
-                order_result = await aster_client.place_order(
-                    symbol, "buy", "market", amount
-                )
-            
             elif action == "short":
-                # 做空
                 logger.info(f"📉 执行做空买入: {symbol}")
-                order_result = await aster_client.place_short_order(symbol, amount)
-            
-            # 记录交易
-            if order_result and order_result.get('success', False):
-                # 开仓操作不计算盈亏
-                profit_loss = 0.0
-                profit_loss_percentage = 0.0
-                
-                # 记录交易到数据库
-                trade = Trade(
-                    symbol=symbol,
-                    side=action,
-                    price=current_price,
-                    amount=amount,
-                    total_value=amount * current_price,
-                    ai_model="Multi-Agent Team",
-                    ai_reasoning=team_decision['reasoning'],
-                    success=True,
-                    order_id=order_result.get('order_id', ''),
-                    profit_loss=None,  # 开仓不计算盈亏
-                    profit_loss_percentage=None,
-                    executed_at=datetime.now(),  # 记录交易执行时间
-                    stop_loss=team_decision.get('stop_loss', 0),  # 止损价格
-                    take_profit=team_decision.get('take_profit', 0),  # 止盈价格
-                    stop_loss_strategy='intelligent_stop',  # 止损策略类型
-                    take_profit_strategy='intelligent_stop'  # 止盈策略类型
-                )
-                db.add(trade)
-                await db.commit()
-                await db.refresh(trade)
-                
-                self.trade_count += 1
-                action_name = "买入做多" if (action == "buy" or action == "long") else "做空"
-                logger.info(f"✅ {action_name}成功: ID={trade.id}, {symbol} {amount:.6f} @ ${current_price:.2f}")
-                
-                # 立即更新持仓数据（包含止损止盈信息）
-                await self._update_positions_after_trade(db, symbol, team_decision=team_decision, trade=trade)
-                logger.info(f"📊 持仓数据已更新（含止损止盈）")
-                
-                # 开仓后使缓存失效（确保下次查询获取最新数据）
-                self._invalidate_all_cache()
-                
-                # 【新增】如果有止盈止损配置，加入监控
-                if team_decision.get('stop_loss', 0) > 0 or team_decision.get('take_profit', 0) > 0:
-                    position_id = f"{symbol}_{trade.id}"
-                    stop_decision_system.add_position(
-                        position_id,
-                        symbol,
-                        action,
-                        current_price,
-                        amount,
-                        team_decision.get('stop_loss', 0),
-                        team_decision.get('take_profit', 0)
-                    )
-                    logger.info(f"🎯 已加入止盈止损监控: {position_id}")
             else:
-                logger.error(f"❌ 交易失败: {symbol} {action}")
-                # 记录失败的交易
-                trade = Trade(
-                    symbol=symbol,
-                    side=action,
-                    price=current_price,
-                    amount=amount,
-                    total_value=amount * current_price,
-                    ai_model="Multi-Agent Team",
-                    ai_reasoning=team_decision['reasoning'],
-                    success=False,
-                    order_id='',
-                    profit_loss=None,
-                    profit_loss_percentage=None,
-                    executed_at=datetime.now()  # 记录交易执行时间
+                return
+            if execution_engine.is_working(symbol):
+                logger.warning(f"⚠️ {symbol} 已有后台执行中的母单，跳过本次开仓")
+                return
+            # 下单前风控由订单管理器对每笔子单统一执行，这里只按敞口余量控制仓位
+            order = await execution_engine.execute(
+                symbol, "buy" if action == "buy" else "sell", amount,
+                intent=self._order_intent(team_decision, action), short=action == "short",
+                on_complete=lambda parent: self._record_open_background(
+                    symbol, action, amount, current_price, team_decision, parent
                 )
-                db.add(trade)
-                await db.commit()
+            )
+            
+            if order.get('background'):
+                logger.info(f"🧵 {symbol} 母单[{order['algo']}]后台执行中，完成后记录交易和持仓")
+                return
+            if order.get('duplicate'):
+                logger.info(f"ℹ️ {symbol} {action} 本周期已执行过，不重复记录交易和持仓")
+                return
+            await self._record_open(db, symbol, action, amount, current_price, team_decision, order)
         
         except Exception as e:
             await db.rollback()  # 确保事务回滚
             logger.exception(f"交易执行失败: {e}")
     
+    async def _record_open(
+        self,
+        db: AsyncSession,
+        symbol: str,
+        action: str,
+        amount: float,
+        current_price: float,
+        team_decision: Dict,
+        order: Dict
+    ):
+        """开仓母单完成后记录交易、更新持仓并加入止盈止损监控"""
+        # 记录交易
+        if order_manager.is_accepted(order):
+            # 以交易所返回的成交结果为准，后台跟踪完成后再写回最终成交均价和手续费
+            fill_price = order['avg_price'] or current_price
+            amount = order['filled_amount'] or amount
+            
+            # 记录交易到数据库
+            trade = Trade(
+                symbol=symbol,
+                side=action,
+                price=fill_price,
+                amount=amount,
+                total_value=amount * fill_price,
+                ai_model="Multi-Agent Team",
+                ai_reasoning=team_decision['reasoning'],
+                success=True,
+                order_id=order['order_id'],
+                client_order_id=order['client_order_id'],
+                order_status=order['state'],
+                execution_algo=order['algo'],
+                arrival_price=order['arrival_price'] or None,
+                slippage_bps=order['slippage_bps'],
+                profit_loss=None,  # 开仓不计算盈亏
+                profit_loss_percentage=None,
+                executed_at=datetime.now(),  # 记录交易执行时间
+                stop_loss=team_decision.get('stop_loss', 0),  # 止损价格
+                take_profit=team_decision.get('take_profit', 0),  # 止盈价格
+                stop_loss_strategy='intelligent_stop',  # 止损策略类型
+                take_profit_strategy='intelligent_stop'  # 止盈策略类型
+            )
+            db.add(trade)
+            await db.commit()
+            await db.refresh(trade)
+            order_manager.track(order, trade.id)
+            
+            self.trade_count += 1
+            action_name = "买入做多" if (action == "buy" or action == "long") else "做空"
+            logger.info(f"✅ {action_name}成功: ID={trade.id}, {symbol} {amount:.6f} @ ${fill_price:.2f}")
+            
+            # 用成交结果直接更新持仓记录（包含止损止盈信息）
+            await self._apply_fill_to_position(db, symbol, action, amount, fill_price, team_decision)
+            logger.info(f"📊 持仓数据已更新（含止损止盈）")
+            
+            # 开仓后使缓存失效（确保下次查询获取最新数据）
+            self._invalidate_all_cache()
+            
+            # 【新增】如果有止盈止损配置，加入监控
+            if team_decision.get('stop_loss', 0) > 0 or team_decision.get('take_profit', 0) > 0:
+                position_id = f"{symbol}_{trade.id}"
+                stop_decision_system.add_position(
+                    position_id,
+                    symbol,
+                    action,
+                    fill_price,
+                    amount,
+                    team_decision.get('stop_loss', 0),
+                    team_decision.get('take_profit', 0)
+                )
+                logger.info(f"🎯 已加入止盈止损监控: {position_id}")
+        else:
+            logger.error(f"❌ 交易失败: {symbol} {action}")
+            # 记录失败的交易
+            trade = Trade(
+                symbol=symbol,
+                side=action,
+                price=current_price,
+                amount=amount,
+                total_value=amount * current_price,
+                ai_model="Multi-Agent Team",
+                ai_reasoning=team_decision['reasoning'],
+                success=False,
+                order_id='',
+                client_order_id=order['client_order_id'],
+                order_status=order['state'],
+                profit_loss=None,
+                profit_loss_percentage=None,
+                executed_at=datetime.now()  # 记录交易执行时间
+            )
+            db.add(trade)
+            await db.commit()
+    
+    async def _record_open_background(
+        self,
+        symbol: str,
+        action: str,
+        amount: float,
+        current_price: float,
+        team_decision: Dict,
+        order: Dict
+    ):
+        """后台母单完成后的回调（交易周期的数据库会话已关闭，使用新会话）"""
+        async with AsyncSessionLocal() as db:
+            try:
+                await self._record_open(db, symbol, action, amount, current_price, team_decision, order)
+            except Exception as e:
+                await db.rollback()
+                logger.exception(f"后台母单交易记录失败: {symbol} {action} - {e}")
+    
+    def _close_lock(self, symbol: str) -> asyncio.Lock:
+        """交易对的平仓锁：持锁期间读取持仓、下平仓单并记录结果，后到的平仓看到的是平仓后的持仓"""
+        return self._close_locks.setdefault(symbol, asyncio.Lock())
+    
     async def _execute_close_position(
         self, 
         db: AsyncSession, 
@@ -613,155 +800,278 @@ class TradingEngine:
             team_decision: 团队决策信息
         """
         try:
-            # 获取持仓信息
-            position = await self._get_position(db, symbol)
-            
-            if not position:
-                logger.warning(f"⚠️ 无法执行{action}：{symbol}无持仓")
-                return
+            async with self._close_lock(symbol):
+                # 获取持仓信息
+                position = await self._get_position(db, symbol)
+                close_amount = self._resolve_close_amount(symbol, action, position, current_price)
+                if close_amount is None:
+                    return
+                
+                # 执行平仓：平多仓卖出，平空仓买入
+                if action == "sell":
+                    logger.info(f"📤 执行卖出平多仓: {symbol}")
+                else:
+                    logger.info(f"📥 执行买入平空仓: {symbol}")
+                # 止损指令带 order_intent，始终市价立即平仓
+                order = await execution_engine.execute(
+                    symbol, "sell" if action == "sell" else "buy", close_amount,
+                    intent=self._order_intent(team_decision, action),
+                    urgent=bool(team_decision.get('order_intent')), closing=True
+                )
+                if order.get('duplicate'):
+                    logger.info(f"ℹ️ {symbol} {action} 已执行过，不重复记录平仓")
+                    return
+                await self._record_close(db, symbol, action, position, close_amount, current_price, order, team_decision)
+        
+        except Exception as e:
+            await db.rollback()  # 确保事务回滚
+            logger.exception(f"平仓执行失败: {symbol} {action} - {e}")
+    
+    def _resolve_close_amount(
+        self,
+        symbol: str,
+        action: str,
+        position: Optional[Position],
+        current_price: float
+    ) -> Optional[float]:
+        """校验持仓方向并返回平仓数量（已调整精度），不能平仓时返回None"""
+        if not position:
+            logger.warning(f"⚠️ 无法执行{action}：{symbol}无持仓")
+            return None
+        
+        # 验证持仓类型匹配
+        if action == "sell" and (position.position_type != "buy" and position.position_type != "long"):
+            logger.warning(f"⚠️ 无法执行sell：{symbol}持仓类型为{position.position_type}，不是多仓")
+            return None
+        
+        if action == "cover" and position.position_type != "short":
+            logger.warning(f"⚠️ 无法执行cover：{symbol}持仓类型为{position.position_type}，不是空仓")
+            return None
+        
+        # 获取持仓数量
+        close_amount = position.amount
+        # 优先使用entry_price，如果不存在则使用average_price
+        entry_price = position.entry_price if position.entry_price else position.average_price
+        
+        if close_amount <= 0:
+            logger.warning(f"⚠️ 无法执行{action}：{symbol}持仓数量为0")
+            return None
+        
+        logger.info(f"🔄 准备平仓:")
+        logger.info(f"   交易对: {symbol}")
+        logger.info(f"   操作: {action} ({'平多仓' if action == 'sell' else '平空仓'})")
+        logger.info(f"   持仓数量: {close_amount:.6f}")
+        logger.info(f"   入场价格: ${entry_price:.4f}")
+        logger.info(f"   当前价格: ${current_price:.4f}")
+        
+        # 调整精度
+        return self._adjust_trade_precision(symbol, close_amount)
+    
+    async def _record_close(
+        self,
+        db: AsyncSession,
+        symbol: str,
+        action: str,
+        position: Position,
+        close_amount: float,
+        current_price: float,
+        order: Dict,
+        team_decision: Dict
+    ):
+        """记录平仓结果（交易记录、盈亏统计、持仓和止损监控）"""
+        entry_price = position.entry_price if position.entry_price else position.average_price
+        
+        # 记录交易结果
+        if order_manager.is_accepted(order):
+            # 按交易所返回的成交价计算盈亏，后台跟踪完成后按最终成交均价和手续费修正
+            current_price = order['avg_price'] or current_price
+            close_amount = order['filled_amount'] or close_amount
             
-            # 验证持仓类型匹配
-            if action == "sell" and (position.position_type != "buy" and position.position_type != "long"):
-                logger.warning(f"⚠️ 无法执行sell：{symbol}持仓类型为{position.position_type}，不是多仓")
-                return
+            # 计算盈亏
+            if action == "sell":
+                # 多仓盈亏 = (当前价格 - 入场价格) * 数量
+                profit_loss = (current_price - entry_price) * close_amount
+                profit_loss_percentage = ((current_price - entry_price) / entry_price * 100) if entry_price > 0 else 0
+            elif action == "cover":
+                # 空仓盈亏 = (入场价格 - 当前价格) * 数量
+                profit_loss = (entry_price - current_price) * close_amount
+                profit_loss_percentage = ((entry_price - current_price) / entry_price * 100) if entry_price > 0 else 0
+            else:
+                profit_loss = 0
+                profit_loss_percentage = 0
             
-            if action == "cover" and position.position_type != "short":
-                logger.warning(f"⚠️ 无法执行cover：{symbol}持仓类型为{position.position_type}，不是空仓")
-                return
+            # 判断是否盈利
+            is_profitable = profit_loss > 0
             
-            # 获取持仓数量
-            close_amount = position.amount
-            # 优先使用entry_price，如果不存在则使用average_price
-            entry_price = position.entry_price if position.entry_price else position.average_price
+            # 更新总盈亏和胜率统计
+            self.total_pnl += profit_loss
+            if is_profitable:
+                self.winning_trades += 1
             
-            if close_amount <= 0:
-                logger.warning(f"⚠️ 无法执行{action}：{symbol}持仓数量为0")
-                return
+            # 记录交易到数据库
+            trade = Trade(
+                symbol=symbol,
+                side=action,
+                price=current_price,
+                amount=close_amount,
+                total_value=close_amount * current_price,
+                ai_model="Multi-Agent Team",
+                ai_reasoning=team_decision['reasoning'],
+                success=True,
+                order_id=order['order_id'],
+                client_order_id=order['client_order_id'],
+                order_status=order['state'],
+                execution_algo=order.get('algo', 'batch'),
+                arrival_price=order.get('arrival_price') or None,
+                slippage_bps=order.get('slippage_bps'),
+                profit_loss=profit_loss,
+                profit_loss_percentage=profit_loss_percentage,
+                executed_at=datetime.now(),  # 记录交易执行时间
+                is_profitable=is_profitable,  # 是否盈利
+                entry_price=entry_price  # 入场价格
+            )
+            db.add(trade)
+            await db.commit()
+            await db.refresh(trade)
+            order_manager.track(order, trade.id)
             
-            logger.info(f"🔄 准备平仓:")
-            logger.info(f"   交易对: {symbol}")
-            logger.info(f"   操作: {action} ({'平多仓' if action == 'sell' else '平空仓'})")
-            logger.info(f"   持仓数量: {close_amount:.6f}")
-            logger.info(f"   入场价格: ${entry_price:.4f}")
-            logger.info(f"   当前价格: ${current_price:.4f}")
+            self.trade_count += 1
             
-            # 调整精度
-            close_amount = self._adjust_trade_precision(symbol, close_amount)
+            # 友好的日志输出
+            action_name = "平多仓" if action == "sell" else "平空仓"
+            pnl_emoji = "💰" if profit_loss > 0 else "💸"
+            logger.info(
+                f"✅ {action_name}成功: ID={trade.id}, {symbol} {close_amount:.6f} @ ${current_price:.2f} | "
+                f"{pnl_emoji} 盈亏: ${profit_loss:.2f} ({profit_loss_percentage:+.2f}%)"
+            )
             
-            # 执行平仓
-            order_result = None
+            # 从止盈止损监控中移除
+            position_id = f"{symbol}_{position.id}"
+            stop_decision_system.remove_position(position_id)
+            logger.info(f"🗑️  已移除持仓监控: {position_id}")
             
-            if action == "sell":
-                # 平多仓（卖出）
-                logger.info(f"📤 执行卖出平多仓: {symbol}")
-                order_result = await aster_client.place_order(
-                    symbol, "sell", "market", close_amount
-                )
+            # 更新持仓数据
+            await self._apply_fill_to_position(db, symbol, action, close_amount, current_price)
+            logger.info(f"📊 持仓数据已更新")
             
-            elif action == "cover":
-                # 平空仓（买入平仓）
-                logger.info(f"📥 执行买入平空仓: {symbol}")
-                # 根据交易所API，平空仓可能需要特殊处理
+        else:
+            logger.error(f"❌ 平仓失败: {symbol} {action}")
+            # 记录失败的交易
+            trade = Trade(
+                symbol=symbol,
+                side=action,
+                price=current_price,
+                amount=close_amount,
+                total_value=close_amount * current_price,
+                ai_model="Multi-Agent Team",
+                ai_reasoning=team_decision['reasoning'],
+                success=False,
+                order_id='',
+                client_order_id=order['client_order_id'],
+                order_status=order['state'],
+                profit_loss=None,
+                profit_loss_percentage=None,
+                executed_at=datetime.now()  # 记录交易执行时间
+            )
+            db.add(trade)
+            await db.commit()
+    
+    async def close_positions(self, db: AsyncSession, requests: List[Dict]) -> List[Dict]:
+        """
+        批量平仓（止损扫单、一键清仓）
+        
+        从同一份持仓快照确定各交易对的平仓方向和数量，一次批量下单请求提交全部平仓单，
+        再逐笔记录结果。持有涉及交易对的平仓锁，与交易周期的平仓互斥。
+        
+        Args:
+            requests: [{"symbol", "action": sell/cover（可选，默认按持仓方向）, "price"（可选）,
+                        "reasoning", "order_intent"（可选）}, ...]
+        
+        Returns:
+            每笔平仓的结果: [{"symbol", "action", "success", "state", "filled_amount", "avg_price",
+                             "client_order_id", "error"}, ...]
+        """
+        async with AsyncExitStack() as stack:
+            # 按交易对排序加锁，避免与其他批量平仓交叉等待
+            for symbol in sorted({req['symbol'] for req in requests}):
+                await stack.enter_async_context(self._close_lock(symbol))
+            return await self._close_positions_locked(db, requests)
+    
+    async def _close_positions_locked(self, db: AsyncSession, requests: List[Dict]) -> List[Dict]:
+        """close_positions() 持锁后的实际平仓"""
+        # 一次同步交易所持仓到数据库，后续都读这份快照
+        await self._get_current_positions(db, use_cache=False)
+        db_result = await db.execute(select(Position))
+        positions = {p.symbol: p for p in db_result.scalars().all()}
+        
+        results = []
+        batch = []
+        for req in requests:
+            symbol = req['symbol']
+            if any(item[0] == symbol for item in batch):
+                continue  # 同一交易对只平一次
+            position = positions.get(symbol)
+            action = req.get('action') or ("cover" if position and position.position_type == "short" else "sell")
+            price = req.get('price') or (position.current_price if position else 0) or 0
+            close_amount = self._resolve_close_amount(symbol, action, position, price)
+            if close_amount is None:
+                results.append({"symbol": symbol, "action": action, "success": False, "error": "无可平持仓"})
+                continue
+            team_decision = {'reasoning': req.get('reasoning', '批量平仓'), 'order_intent': req.get('order_intent')}
+            batch.append((symbol, action, position, close_amount, price, team_decision))
+        
+        if not batch:
+            return results
+        
+        logger.info(f"🧹 批量平仓 {len(batch)} 个持仓: {', '.join(item[0] for item in batch)}")
+        orders = await order_manager.submit_batch([
+            {
+                "symbol": symbol,
+                "side": "sell" if action == "sell" else "buy",
+                "amount": close_amount,
+                "intent": self._order_intent(team_decision, action),
+                "price": price,
+            }
+            for symbol, action, position, close_amount, price, team_decision in batch
+        ])
+        
+        for (symbol, action, position, close_amount, price, team_decision), order in zip(batch, orders):
+            if order.get('duplicate'):
+                logger.info(f"ℹ️ {symbol} {action} 平仓单已提交过，不重复记录")
+            else:
                 try:
-                    # 方案2: 如果close_position不支持，使用买入
-                    order_result = await aster_client.place_order(
-                        symbol, "buy", "market", close_amount
-                    )
+                    await self._record_close(db, symbol, action, position, close_amount, price, order, team_decision)
                 except Exception as e:
-                    logger.exception(f"平仓失败: {symbol} {action} - {e}")
-            
-            # 记录交易结果
-            if order_result and order_result.get('success', False):
-                # 计算盈亏
-                if action == "sell":
-                    # 多仓盈亏 = (当前价格 - 入场价格) * 数量
-                    profit_loss = (current_price - entry_price) * close_amount
-                    profit_loss_percentage = ((current_price - entry_price) / entry_price * 100) if entry_price > 0 else 0
-                elif action == "cover":
-                    # 空仓盈亏 = (入场价格 - 当前价格) * 数量
-                    profit_loss = (entry_price - current_price) * close_amount
-                    profit_loss_percentage = ((entry_price - current_price) / entry_price * 100) if entry_price > 0 else 0
-                else:
-                    profit_loss = 0
-                    profit_loss_percentage = 0
-                
-                # 判断是否盈利
-                is_profitable = profit_loss > 0
-                
-                # 更新总盈亏和胜率统计
-                self.total_pnl += profit_loss
-                if is_profitable:
-                    self.winning_trades += 1
-                
-                # 记录交易到数据库
-                trade = Trade(
-                    symbol=symbol,
-                    side=action,
-                    price=current_price,
-                    amount=close_amount,
-                    total_value=close_amount * current_price,
-                    ai_model="Multi-Agent Team",
-                    ai_reasoning=team_decision['reasoning'],
-                    success=True,
-                    order_id=order_result.get('order_id', ''),
-                    profit_loss=profit_loss,
-                    profit_loss_percentage=profit_loss_percentage,
-                    executed_at=datetime.now(),  # 记录交易执行时间
-                    is_profitable=is_profitable,  # 是否盈利
-                    entry_price=entry_price  # 入场价格
-                )
-                db.add(trade)
-                await db.commit()
-                await db.refresh(trade)
-                
-                self.trade_count += 1
-                
-                # 友好的日志输出
-                action_name = "平多仓" if action == "sell" else "平空仓"
-                pnl_emoji = "💰" if profit_loss > 0 else "💸"
-                logger.info(
-                    f"✅ {action_name}成功: ID={trade.id}, {symbol} {close_amount:.6f} @ ${current_price:.2f} | "
-                    f"{pnl_emoji} 盈亏: ${profit_loss:.2f} ({profit_loss_percentage:+.2f}%)"
-                )
-                
-                # 从止盈止损监控中移除
-                position_id = f"{symbol}_{position.id}"
-                stop_decision_system.remove_position(position_id)
-                logger.info(f"🗑️  已移除持仓监控: {position_id}")
-                
-                # 更新持仓数据
-                await self._update_positions_after_trade(db, symbol)
-                logger.info(f"📊 持仓数据已更新")
-                
-            else:
-                logger.error(f"❌ 平仓失败: {symbol} {action}")
-                # 记录失败的交易
-                trade = Trade(
-                    symbol=symbol,
-                    side=action,
-                    price=current_price,
-                    amount=close_amount,
-                    total_value=close_amount * current_price,
-                    ai_model="Multi-Agent Team",
-                    ai_reasoning=team_decision['reasoning'],
-                    success=False,
-                    order_id='',
-                    profit_loss=None,
-                    profit_loss_percentage=None,
-                    executed_at=datetime.now()  # 记录交易执行时间
-                )
-                db.add(trade)
-                await db.commit()
+                    await db.rollback()
+                    logger.exception(f"平仓结果记录失败: {symbol} {action} - {e}")
+            results.append({
+                "symbol": symbol,
+                "action": action,
+                "success": order_manager.is_accepted(order),
+                "state": order['state'],
+                "filled_amount": order['filled_amount'],
+                "avg_price": order['avg_price'],
+                "client_order_id": order['client_order_id'],
+                "error": order['error'],
+            })
         
-        except Exception as e:
-            await db.rollback()  # 确保事务回滚
-            logger.exception(f"平仓执行失败: {symbol} {action} - {e}")
+        self._invalidate_all_cache()
+        return results
+    
+    async def close_all_positions(self, db: AsyncSession, reason: str = "一键清仓") -> List[Dict]:
+        """平掉全部持仓（清仓开关）"""
+        positions = await self._get_current_positions(db, use_cache=False)
+        intent = f"flatten-{int(datetime.now().timestamp())}"
+        return await self.close_positions(db, [
+            {"symbol": p['symbol'], "reasoning": reason, "order_intent": intent}
+            for p in positions
+        ])
     
     async def _update_balance(self, db: AsyncSession):
         """更新账户余额 - 从SDK实时查询钱包余额"""
         try:
             # 从交易所SDK获取最新钱包余额
-            balance_info = await aster_client.get_account_balance()
+            balance_info = await self._fetch_balance()
             
             # 处理余额信息（真实模式和模拟模式都支持）
             if balance_info.get('success'):
@@ -772,11 +1082,12 @@ class TradingEngine:
                     wallet_balance = float(usdt_balance.get('free', 0)) + float(usdt_balance.get('locked', 0))
                     
                     # 获取当前持仓价值
-                    positions = await aster_client.get_open_positions()
+                    positions = await self._fetch_positions()
                     positions_value = sum(p['amount'] * p['current_price'] for p in positions)
                     
                     # 总资产 = 钱包余额 + 持仓价值
                     self.current_balance = wallet_balance + positions_value
+                    pre_trade_risk.update_equity(self.current_balance)
                     
                     # logger.info(f"💰 钱包余额SDK更新: 钱包=${wallet_balance:.2f}, 持仓=${positions_value:.2f}, 总计=${self.current_balance:.2f}")
                 else:
@@ -787,117 +1098,93 @@ class TradingEngine:
         except Exception as e:
             logger.exception(f"SDK更新余额失败: {e}")
     
-    async def _update_positions_after_trade(
+    async def _apply_fill_to_position(
         self,
         db: AsyncSession,
-        traded_symbol: str = None,
+        symbol: str,
+        action: str,
+        amount: float,
+        price: float,
         team_decision: Dict = None,
-        trade: Trade = None,
     ):
         """
-        交易后立即更新持仓数据
+        用订单成交结果直接更新数据库持仓记录
+        
+        不再在每笔订单后向交易所查询全部持仓；与交易所的对账由下一次 _get_current_positions 完成
         
         Args:
-            db: 数据库会话
-            traded_symbol: 刚交易的交易对符号（可选）
-            team_decision: 团队决策信息，包含止损止盈（可选）
-            trade: 交易记录（可选，用于获取止损止盈）
+            action: buy/short 开仓，sell/cover 平仓
+            amount: 成交数量
+            price: 成交均价
+            team_decision: 团队决策信息，包含止损止盈（开仓时）
         """
         try:
-            # 从交易所获取最新持仓
-            positions = await aster_client.get_open_positions()
+            position = await self._get_position(db, symbol)
             
-            # 获取数据库中的持仓记录
-            db_result = await db.execute(select(Position))
-            db_positions = {p.symbol: p for p in db_result.scalars().all()}
-            
-            # 更新数据库中的持仓
-            for pos in positions:
-                symbol = pos['symbol']
-                if symbol in db_positions:
-                    # 更新现有持仓
-                    db_pos = db_positions[symbol]
-                    db_pos.amount = pos['amount']
-                    db_pos.current_price = pos['current_price']
-                    db_pos.unrealized_pnl = pos['unrealized_pnl']
-                    db_pos.average_price = pos.get('average_price', db_pos.average_price)
-                    db_pos.position_type = pos.get('position_type', db_pos.position_type)
-                    db_pos.last_updated = datetime.now()
-                    
-                    # 如果是刚交易的symbol，更新止损止盈
-                    if symbol == traded_symbol:
-                        if team_decision:
-                            stop_loss_value = team_decision.get('stop_loss', 0)
-                            take_profit_value = team_decision.get('take_profit', 0)
-                        elif trade:
-                            stop_loss_value = trade.stop_loss or 0
-                            take_profit_value = trade.take_profit or 0
-                        else:
-                            stop_loss_value = db_pos.stop_loss or 0
-                            take_profit_value = db_pos.take_profit or 0
-
-                        db_pos.stop_loss = stop_loss_value
-                        db_pos.take_profit = take_profit_value
-                        db_pos.stop_loss_strategy = 'intelligent_stop'
-                        db_pos.take_profit_strategy = 'intelligent_stop'
-                        logger.info(f"✅ 更新持仓止损止盈: {symbol} SL=${db_pos.stop_loss:.2f} TP=${db_pos.take_profit:.2f}")
-                else:
-                    # 添加新持仓
-                    # 如果是刚交易的symbol，使用team_decision中的止损止盈
-                    if symbol == traded_symbol:
-                        if team_decision:
-                            stop_loss = team_decision.get('stop_loss', 0)
-                            take_profit = team_decision.get('take_profit', 0)
-                        elif trade:
-                            stop_loss = trade.stop_loss or 0
-                            take_profit = trade.take_profit or 0
-                        else:
-                            stop_loss = 0
-                            take_profit = 0
+            if action in ["sell", "cover"]:
+                if position:
+                    remaining = (position.amount or 0) - amount
+                    if remaining <= (position.amount or 0) * 1e-6:
+                        await db.delete(position)
+                        logger.info(f"🗑️  删除已平仓持仓记录: {symbol}")
                     else:
-                        # 否则使用默认值或计算值
-                        entry_price = pos.get('average_price', 0)
-                        position_type = pos.get('position_type', 'long')
-                        if position_type in ['long', 'buy']:
-                            stop_loss = entry_price * 0.98  # -2%
-                            take_profit = entry_price * 1.04  # +4%
-                        else:
-                            stop_loss = entry_price * 1.02  # +2%
-                            take_profit = entry_price * 0.96  # -4%
-                    
-                    new_pos = Position(
+                        position.amount = remaining
+                        position.last_updated = datetime.now()
+            else:
+                position_type = "long" if action == "buy" else "short"
+                stop_loss = (team_decision or {}).get('stop_loss', 0)
+                take_profit = (team_decision or {}).get('take_profit', 0)
+                same_side = position and (
+                    position.position_type == position_type
+                    or (position_type == "long" and position.position_type == "buy")
+                )
+                if same_side:
+                    # 加仓：按数量加权计算均价
+                    total = position.amount + amount
+                    position.average_price = (position.average_price * position.amount + price * amount) / total
+                    position.amount = total
+                    position.current_price = price
+                    position.last_updated = datetime.now()
+                    if stop_loss or take_profit:
+                        position.stop_loss = stop_loss
+                        position.take_profit = take_profit
+                else:
+                    if position:
+                        await db.delete(position)
+                        await db.flush()
+                    db.add(Position(
                         symbol=symbol,
-                        amount=pos['amount'],
-                        average_price=pos['average_price'],
-                        current_price=pos['current_price'],
-                        unrealized_pnl=pos['unrealized_pnl'],
-                        position_type=pos.get('position_type', 'long'),
-                        entry_price=pos.get('average_price'),  # 记录入场价格
+                        amount=amount,
+                        average_price=price,
+                        current_price=price,
+                        unrealized_pnl=0.0,
+                        position_type=position_type,
+                        entry_price=price,  # 记录入场价格
                         stop_loss=stop_loss,  # 止损价格
                         take_profit=take_profit,  # 止盈价格
                         stop_loss_strategy='intelligent_stop',
                         take_profit_strategy='intelligent_stop',
                         executed_at=datetime.now()  # 持仓创建时间
-                    )
-                    db.add(new_pos)
+                    ))
                     logger.info(f"✅ 新增持仓记录: {symbol} SL=${stop_loss:.2f} TP=${take_profit:.2f}")
             
-            # 删除已平仓的持仓
-            current_symbols = {p['symbol'] for p in positions}
-            symbols_to_remove = [symbol for symbol in db_positions.keys() if symbol not in current_symbols]
-            for symbol in symbols_to_remove:
-                db_pos = db_positions[symbol]
-                await db.delete(db_pos)
-                logger.info(f"🗑️  删除已平仓持仓记录: {symbol}")
-            
             await db.commit()
-            logger.debug(f"持仓数据已同步: {len(positions)} 个持仓")
-            
         except Exception as e:
             await db.rollback()  # 确保事务回滚
             logger.exception(f"更新持仓数据失败: {e}")
-        
-        return positions
+    
+    def _order_intent(self, team_decision: Dict, action: str) -> str:
+        """客户端订单ID的意图键：止损指令自带触发标识，其余使用当前交易周期ID"""
+        intent = team_decision.get('order_intent') or self.cycle_id or datetime.now().strftime("%Y%m%d%H%M%S")
+        return f"{intent}:{action}"
+    
+    def _on_order_filled(self, order: Dict, previous_pnl: Optional[float], new_pnl: Optional[float]):
+        """订单最终成交结果写回后，按实际成交价修正累计盈亏和胜率统计"""
+        if previous_pnl is None or new_pnl is None:
+            return
+        self.total_pnl += new_pnl - previous_pnl
+        if (previous_pnl > 0) != (new_pnl > 0):
+            self.winning_trades += 1 if new_pnl > 0 else -1
     
     async def _get_current_positions(self, db: AsyncSession, use_cache: bool = True) -> List[Dict]:
         """
@@ -917,7 +1204,12 @@ class TradingEngine:
         
         # logger.debug("🔄 从API获取最新持仓数据...")
         # 从交易所获取实时持仓（模拟模式下从mock_market获取）
-        positions = await aster_client.get_open_positions()
+        positions = await self._fetch_positions()
+        if positions is None:
+            # 查询失败不能当作没有持仓（否则会删除数据库持仓和止损监控），沿用数据库中上一次同步的结果
+            logger.warning("⚠️ 交易所持仓查询失败，沿用上一次同步的持仓")
+            db_result = await db.execute(select(Position))
+            return self._position_dicts(db_result.scalars().all())
         
         # 更新缓存
         self._positions_cache = positions
@@ -975,9 +1267,17 @@ class TradingEngine:
             db_pos = db_positions[symbol]
             await db.delete(db_pos)
             
-        positions = []
         await db.commit()
-        for pos in result_positions:
+        positions = self._position_dicts(result_positions)
+        # 同步到向量化止损引擎
+        stop_engine.sync_positions(positions)
+        return positions
+    
+    @staticmethod
+    def _position_dicts(db_positions: List[Position]) -> List[Dict]:
+        """数据库持仓记录转为持仓字典"""
+        positions = []
+        for pos in db_positions:
             positions.append({
                 "symbol": pos.symbol,
                 "amount": pos.amount,
@@ -996,6 +1296,43 @@ class TradingEngine:
             })
         return positions
     
+    async def refresh_stop_engine(self, db: AsyncSession):
+        """从交易所重新拉取持仓并同步到止损引擎"""
+        await self._get_current_positions(db, use_cache=False)
+    
+    async def execute_stop_order(self, db: AsyncSession, order: Dict):
+        """
+        执行止损引擎触发的平仓指令
+        
+        Args:
+            db: 数据库会话
+            order: stop_engine 放入队列的平仓指令
+        """
+        await self.execute_stop_orders(db, [order])
+    
+    async def execute_stop_orders(self, db: AsyncSession, orders: List[Dict]):
+        """执行同一批触发的多条止损平仓指令（一次批量下单）"""
+        symbols = ",".join(order['symbol'] for order in orders)
+        try:
+            for order in orders:
+                logger.info(f"🎯 止损引擎平仓: {order['symbol']} {order['action']} - {order['reason']} @ ${order['price']:.4f}")
+            with tracer.span("stop_order", root=True, symbol=symbols, orders=len(orders)):
+                await self.close_positions(db, [
+                    {
+                        'symbol': order['symbol'],
+                        'action': order['action'],
+                        'price': order['price'],
+                        'reasoning': f"止损引擎{order['reason']}: 价格${order['price']:.4f}, 入场${order['entry_price']:.4f}",
+                        'order_intent': f"stop-{order['reason']}-{int(order['triggered_at'])}",
+                    }
+                    for order in orders
+                ])
+        except Exception as e:
+            logger.exception(f"止损引擎平仓失败: {symbols} - {e}")
+        finally:
+            # 平仓成功则持仓消失；失败则保留并在冷却期后重试
+            await self.refresh_stop_engine(db)
+    
     async def _get_position(self, db: AsyncSession, symbol: str) -> Optional[Position]:
         """获取指定交易对的持仓"""
         result = await db.execute(
@@ -1020,7 +1357,7 @@ class TradingEngine:
         
         logger.debug("🔄 从API获取最新余额数据...")
         # 从交易所SDK获取最新钱包余额
-        balance_info = await aster_client.get_account_balance()
+        balance_info = await self._fetch_balance()
         
         # 更新缓存
         self._balance_cache = balance_info
@@ -1298,7 +1635,7 @@ class TradingEngine:
         positions_value = sum(p['amount'] * p['current_price'] for p in positions)
         
         # 从SDK获取真实钱包余额
-        balance_info = await aster_client.get_account_balance()
+        balance_info = await self._fetch_balance()
         wallet_balance = 0.0
         
         if balance_info.get('success'):
@@ -1367,7 +1704,7 @@ class TradingEngine:
         positions_value = sum(p['amount'] * p['current_price'] for p in positions)
         
         # 从SDK获取真实钱包余额
-        balance_info = await aster_client.get_account_balance()
+        balance_info = await self._fetch_balance()
         wallet_balance = 0.0
         
         if balance_info.get('success'):
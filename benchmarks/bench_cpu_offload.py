@@ -0,0 +1,94 @@
+"""
+CPU密集型计算移出事件循环的基准测试
+
+事件循环中运行一个10ms心跳协程模拟WebSocket广播/API请求，同时并发执行一轮
+多交易对的K线压缩（以及安装了talib时的技术指标计算），对比各执行方式下：
+
+    cycle   - 一轮计算的总耗时
+    lag p99 / max - 心跳的事件循环滞后（越小说明API和广播越不受计算影响）
+
+运行：
+    python -m benchmarks.bench_cpu_offload --symbols 20 --cycles 3
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from loguru import logger
+
+from backend.agents.cpu_executor import cpu_executor
+from backend.agents import kline_compressor  # noqa: F401  注册 kline_compression
+from backend.exchanges.mock_market_data import mock_market
+
+try:
+    from backend.agents import technical_analyst_new  # noqa: F401  注册 technical_analysis
+    HAS_TALIB = True
+except ImportError:
+    HAS_TALIB = False
+
+
+SYMBOLS = ["BTC", "ETH", "BNB", "SOL", "XRP", "DOGE", "ADA", "AVAX", "LINK", "DOT",
+           "TRX", "TON", "SHIB", "LTC", "BCH", "NEAR", "APT", "ARB", "OP", "SUI"]
+HEARTBEAT = 0.01
+
+
+async def _heartbeat(lags, stop: asyncio.Event):
+    while not stop.is_set():
+        expected = time.perf_counter() + HEARTBEAT
+        await asyncio.sleep(HEARTBEAT)
+        lags.append(max(0.0, time.perf_counter() - expected))
+
+
+async def _analyze(symbol: str, klines):
+    await cpu_executor.run("kline_compression", klines, "1h", symbol)
+    if HAS_TALIB:
+        await cpu_executor.run("technical_analysis", "OptimizedTradingStrategy", klines)
+
+
+async def run(mode: str, symbols: int, cycles: int):
+    for name in ("kline_compression", "technical_analysis"):
+        cpu_executor.set_mode(name, mode)
+    data = {f"{s}USDT": mock_market.get_klines(f"{s}USDT", "1h", 500) for s in SYMBOLS[:symbols]}
+    if mode == "process":
+        await cpu_executor.start()
+
+    lags, stop = [], asyncio.Event()
+    beat = asyncio.create_task(_heartbeat(lags, stop))
+    cycle_times = []
+    for _ in range(cycles):
+        started = time.perf_counter()
+        await asyncio.gather(*[_analyze(symbol, klines) for symbol, klines in data.items()])
+        cycle_times.append(time.perf_counter() - started)
+    stop.set()
+    await beat
+    cpu_executor.shutdown()
+
+    lags.sort()
+    return {
+        "mode": mode,
+        "cycle_ms": statistics.mean(cycle_times) * 1000,
+        "lag_p99_ms": lags[min(len(lags) - 1, int(len(lags) * 0.99))] * 1000 if lags else 0.0,
+        "lag_max_ms": lags[-1] * 1000 if lags else 0.0,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="CPU计算执行方式基准测试")
+    parser.add_argument("--symbols", type=int, default=20)
+    parser.add_argument("--cycles", type=int, default=3)
+    parser.add_argument("--modes", default="inline,thread,process")
+    args = parser.parse_args()
+
+    logger.remove()
+    if not HAS_TALIB:
+        print("未安装talib，仅测试K线压缩")
+    results = [await run(mode, args.symbols, args.cycles) for mode in args.modes.split(",")]
+
+    print(f"{'方式':<10}{'周期耗时(ms)':>14}{'滞后p99(ms)':>14}{'滞后max(ms)':>14}")
+    for r in results:
+        print(f"{r['mode']:<10}{r['cycle_ms']:>14.1f}{r['lag_p99_ms']:>14.1f}{r['lag_max_ms']:>14.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,319 @@
+"""
+端到端基准测试
+
+在本地启动假交易所（benchmarks.fake_aster_server）和假LLM服务（backend.ai.fake_llm_server），
+用临时SQLite数据库驱动真实的 TradingEngine 和 FastAPI 应用，测量：
+
+    cycle     - 交易对数量为 10/50/200 时一轮开仓交易周期的耗时
+    api       - N个仪表盘客户端（WebSocket + 轮询）下各API的 p50/p99
+    db        - 每轮周期新增的行数和文件大小，按调度频率折算为每小时增长
+    memory    - 整个运行过程中进程RSS随时间的变化
+
+结果写入 benchmarks/results/e2e-<commit>-<时间>.json，可用 --compare 与之前的结果对比：
+
+    python -m benchmarks.bench_e2e --symbols 10,50,200 --clients 50
+    python -m benchmarks.bench_e2e --compare benchmarks/results/e2e-abc1234-20260101-120000.json
+
+必须在导入 backend 之前设置好环境变量，因此 backend 模块都在 main() 内导入。
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List
+
+from loguru import logger
+
+from benchmarks.fake_aster_server import FakeAsterServer
+
+
+RESULTS_DIR = Path(__file__).parent / "results"
+DB_TABLES = ("trades", "positions", "portfolio_snapshots", "ai_decisions", "market_data")
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def read_rss_mb() -> float:
+    """当前进程RSS（MB），仅Linux"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+class MemorySampler:
+    """后台线程按固定间隔采样RSS"""
+
+    def __init__(self, interval: float = 1.0):
+        self.interval = interval
+        self.samples: List[Dict] = []
+        self._started = time.perf_counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="rss-sampler", daemon=True)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.samples.append({
+                "t": round(time.perf_counter() - self._started, 1),
+                "rss_mb": round(read_rss_mb(), 1),
+            })
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> Dict:
+        self._stop.set()
+        self._thread.join()
+        values = [s["rss_mb"] for s in self.samples] or [0.0]
+        return {
+            "start_mb": values[0],
+            "end_mb": values[-1],
+            "peak_mb": max(values),
+            "samples": self.samples,
+        }
+
+
+def cycles_per_hour(cron: str, interval: float) -> Dict[str, float]:
+    """按调度配置计算每小时的开仓周期和持仓周期次数"""
+    from apscheduler.triggers.cron import CronTrigger
+
+    trigger = CronTrigger.from_crontab(cron)
+    start = datetime(2026, 1, 1, 0, 0, 0, tzinfo=trigger.timezone)
+    end = start + timedelta(hours=1)
+    count, previous, fire = 0, None, trigger.get_next_fire_time(None, start)
+    while fire and fire < end:
+        count += 1
+        previous = fire
+        fire = trigger.get_next_fire_time(previous, previous + timedelta(seconds=1))
+    return {"entry": float(count), "position": 3600 / interval if interval else 0.0}
+
+
+async def db_usage(db_path: Path) -> Dict:
+    from sqlalchemy import text
+    from backend.database import AsyncSessionLocal
+
+    rows = {}
+    async with AsyncSessionLocal() as session:
+        for table in DB_TABLES:
+            try:
+                rows[table] = (await session.execute(text(f"SELECT COUNT(*) FROM {table}"))).scalar() or 0
+            except Exception:
+                rows[table] = 0
+    size = sum(p.stat().st_size for p in db_path.parent.glob(db_path.name + "*"))
+    return {"bytes": size, "rows": rows}
+
+
+async def bench_cycles(exchange: FakeAsterServer, symbol_counts: List[int], cycles: int, db_path: Path) -> Dict:
+    """不同交易对数量下的开仓周期耗时，以及每轮的数据库增长"""
+    from backend.database import AsyncSessionLocal
+    from backend.trading.trading_engine import trading_engine
+
+    results = {}
+    growth = []
+    for count in symbol_counts:
+        exchange.set_symbol_count(count)
+        durations = []
+        for _ in range(cycles):
+            before = await db_usage(db_path)
+            async with AsyncSessionLocal() as db:
+                started = time.perf_counter()
+                await trading_engine.execute_trading_cycle(db)
+                durations.append(time.perf_counter() - started)
+            after = await db_usage(db_path)
+            growth.append({
+                "bytes": after["bytes"] - before["bytes"],
+                "rows": {t: after["rows"][t] - before["rows"][t] for t in DB_TABLES},
+            })
+        durations.sort()
+        results[str(count)] = {
+            "cycles": cycles,
+            "mean_s": round(sum(durations) / len(durations), 3),
+            "min_s": round(durations[0], 3),
+            "max_s": round(durations[-1], 3),
+        }
+        logger.info(f"📏 {count}个交易对: 平均周期耗时 {results[str(count)]['mean_s']}s")
+    return {"results": results, "growth": growth}
+
+
+async def bench_api(clients: int, duration: float, port: int) -> Dict:
+    """在当前进程中启动应用，用客户端群压测"""
+    import uvicorn
+    from backend.main import app
+    from benchmarks.ws_swarm import ClientSwarm
+
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="on")
+    server = uvicorn.Server(config)
+    serve_task = asyncio.create_task(server.serve())
+    try:
+        while not server.started:
+            await asyncio.sleep(0.05)
+        swarm = ClientSwarm(f"http://127.0.0.1:{port}", clients)
+        result = await swarm.run(duration)
+        logger.info(f"📏 {clients}个客户端: p50 {result['p50_ms']}ms, p99 {result['p99_ms']}ms")
+        return result
+    finally:
+        server.should_exit = True
+        await serve_task
+
+
+def summarize_growth(growth: List[Dict], per_hour: Dict[str, float]) -> Dict:
+    """每轮开仓周期的平均增长折算为每小时（持仓周期按同样的写入量估算上限）"""
+    if not growth:
+        return {}
+    n = len(growth)
+    per_cycle_bytes = sum(g["bytes"] for g in growth) / n
+    per_cycle_rows = {t: sum(g["rows"][t] for g in growth) / n for t in DB_TABLES}
+    cycles = per_hour["entry"] + per_hour["position"]
+    return {
+        "cycles_per_hour": per_hour,
+        "per_cycle_bytes": round(per_cycle_bytes),
+        "per_cycle_rows": {t: round(v, 2) for t, v in per_cycle_rows.items()},
+        "per_hour_bytes": round(per_cycle_bytes * cycles),
+        "per_hour_rows": {t: round(v * cycles, 1) for t, v in per_cycle_rows.items()},
+    }
+
+
+def _flatten(data, prefix="") -> Dict[str, float]:
+    flat = {}
+    if isinstance(data, dict):
+        for key, value in data.items():
+            if key == "samples":
+                continue
+            flat.update(_flatten(value, f"{prefix}.{key}" if prefix else str(key)))
+    elif isinstance(data, (int, float)) and not isinstance(data, bool):
+        flat[prefix] = float(data)
+    return flat
+
+
+def compare(old: Dict, new: Dict):
+    """打印两次结果中所有数值指标的变化"""
+    old_flat, new_flat = _flatten(old.get("metrics", {})), _flatten(new.get("metrics", {}))
+    print(f"{'metric':<60}{old.get('commit', '?'):>12}{new.get('commit', '?'):>12}{'change':>10}")
+    for key in sorted(set(old_flat) | set(new_flat)):
+        a, b = old_flat.get(key), new_flat.get(key)
+        if a is None or b is None:
+            print(f"{key:<60}{'-' if a is None else a:>12}{'-' if b is None else b:>12}")
+            continue
+        change = f"{(b - a) / a * 100:+.1f}%" if a else ""
+        print(f"{key:<60}{a:>12g}{b:>12g}{change:>10}")
+
+
+async def run(args, db_path: Path, exchange: FakeAsterServer, llm) -> Dict:
+    from backend.config import settings
+    from backend.database import init_db
+
+    sampler = MemorySampler(args.memory_interval)
+    sampler.start()
+    metrics = {}
+    try:
+        await init_db()
+        from backend.exchanges.aster_dex import aster_client
+        await aster_client.initialize()
+
+        counts = [int(c) for c in args.symbols.split(",") if c.strip()]
+        cycle_result = await bench_cycles(exchange, counts, args.cycles, db_path)
+        metrics["cycle_duration"] = cycle_result["results"]
+        metrics["db_growth"] = summarize_growth(
+            cycle_result["growth"],
+            cycles_per_hour(settings.trading_cycle_cron, settings.position_cycle_interval),
+        )
+        if args.clients > 0:
+            metrics["api"] = await bench_api(args.clients, args.duration, args.app_port)
+        metrics["db_final"] = await db_usage(db_path)
+    finally:
+        metrics["memory"] = sampler.stop()
+    metrics["llm_requests"] = llm.stats.get("requests", 0)
+    metrics["exchange_requests"] = exchange.stats["requests"]
+    return metrics
+
+
+async def main_async(args) -> Dict:
+    from backend.ai.fake_llm_server import FakeLLMServer
+
+    exchange = FakeAsterServer(
+        symbols=max(int(c) for c in args.symbols.split(",")), latency=args.exchange_latency, jitter=args.exchange_latency / 2
+    )
+    llm = FakeLLMServer(latency=args.llm_latency, jitter=args.llm_jitter, distribution=args.llm_distribution)
+    exchange_url = await exchange.start(port=args.exchange_port)
+    llm_url = await llm.start(port=args.llm_port)
+
+    tmpdir = tempfile.mkdtemp(prefix="bench-e2e-")
+    db_path = Path(tmpdir) / "bench.db"
+    os.environ.update({
+        "ASTER_DEX_API_KEY": "fake",
+        "ASTER_DEX_API_SECRET": "fake",
+        "ASTER_DEX_BASE_URL": exchange_url,
+        "ASTER_DEX_WS_URL": exchange_url.replace("http", "ws", 1) + "/ws",
+        "LLM_API_BASE_OVERRIDE": llm_url,
+        "DEEPSEEK_API_KEY": os.environ.get("DEEPSEEK_API_KEY") or "fake",
+        "DATABASE_URL": f"sqlite+aiosqlite:///{db_path}",
+        # 周期由本脚本驱动，应用内的调度任务不参与
+        "ENABLE_AUTO_TRADING": "False",
+    })
+    try:
+        return await run(args, db_path, exchange, llm)
+    finally:
+        await llm.stop()
+        await exchange.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端基准测试")
+    parser.add_argument("--symbols", default="10,50,200", help="逗号分隔的交易对数量")
+    parser.add_argument("--cycles", type=int, default=2, help="每个交易对数量运行的周期数")
+    parser.add_argument("--clients", type=int, default=20, help="仪表盘客户端数量（0表示跳过API压测）")
+    parser.add_argument("--duration", type=float, default=30, help="API压测时长（秒）")
+    parser.add_argument("--exchange-latency", type=float, default=0.02)
+    parser.add_argument("--llm-latency", type=float, default=1.0)
+    parser.add_argument("--llm-jitter", type=float, default=0.5)
+    parser.add_argument("--llm-distribution", default="lognormal")
+    parser.add_argument("--exchange-port", type=int, default=9200)
+    parser.add_argument("--llm-port", type=int, default=9100)
+    parser.add_argument("--app-port", type=int, default=8765)
+    parser.add_argument("--memory-interval", type=float, default=1.0, help="RSS采样间隔（秒）")
+    parser.add_argument("--output", default="", help="结果文件路径（默认写入 benchmarks/results/）")
+    parser.add_argument("--compare", default="", help="与之前的结果文件对比")
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="INFO")
+
+    metrics = asyncio.run(main_async(args))
+    result = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "params": vars(args),
+        "metrics": metrics,
+    }
+    output = Path(args.output) if args.output else (
+        RESULTS_DIR / f"e2e-{result['commit']}-{datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2, ensure_ascii=False))
+    logger.info(f"💾 结果已写入 {output}")
+
+    if args.compare:
+        compare(json.loads(Path(args.compare).read_text()), result)
+
+
+if __name__ == "__main__":
+    main()
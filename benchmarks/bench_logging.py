@@ -0,0 +1,140 @@
+"""
+日志开销基准测试
+
+模拟一个交易周期中与日志相关的热点工作（每个交易对：K线获取日志、持仓明细、
+K线压缩 + 格式化摘要、各智能体提示词），对比：
+
+    legacy  - 旧配置：同步文件sink，INFO级别输出全部内容，f-string提前格式化，摘要输出两次
+    current - 新配置：enqueue异步sink，热点日志降为DEBUG并延迟格式化，大段内容走 log_payload
+
+K线压缩使用真实的 KlineCompressor 和模拟K线，两种模式下的计算量相同，差异只来自日志。
+
+运行：
+    python -m benchmarks.bench_logging --symbols 20 --cycles 5
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from loguru import logger
+
+from backend.agents.kline_compressor import kline_compressor
+from backend.exchanges.mock_market_data import mock_market
+from backend.monitoring.logging_config import ModuleLevelFilter, log_payload
+
+
+SYMBOLS = ["BTC", "ETH", "BNB", "SOL", "XRP", "DOGE", "ADA", "AVAX", "LINK", "DOT",
+           "TRX", "TON", "SHIB", "LTC", "BCH", "NEAR", "APT", "ARB", "OP", "SUI"]
+
+
+def _positions(n: int = 5):
+    return [
+        {"symbol": f"{s}USDT", "amount": 1.2345, "average_price": 100.0 + i, "unrealized_pnl": 1.5 * i}
+        for i, s in enumerate(SYMBOLS[:n])
+    ]
+
+
+def _prompt(symbol: str, summary: str, klines) -> str:
+    # 与真实提示词量级相当：市场数据JSON + K线摘要 + 规则
+    return f"当前交易对: {symbol}\n市场数据：{json.dumps(klines[-20:], ensure_ascii=False, indent=2)}\n{summary}\n" + "规则说明\n" * 50
+
+
+def legacy_symbol(symbol: str, klines, positions):
+    """旧代码中的日志语句"""
+    logger.info(f"📊 真实模式：使用官方SDK获取K线数据 {symbol} 1h x100")
+    logger.info(f"✅ 成功获取K线数据: {symbol} 1h x{len(klines)}")
+    logger.info(f"✅ 获取到{len(positions)}个持仓")
+    for pos in positions:
+        logger.info(f"   {pos['symbol']}: {pos['amount']:.4f} @ ${pos['average_price']:.2f} (未实现盈亏: ${pos['unrealized_pnl']:.2f})")
+    logger.info(f"准备分析数据: {{'raw_klines': {klines}}}")
+    data = kline_compressor.compress_kline_data(klines, "1h", symbol)
+    summary = data.get("formatted_summary", "")
+    logger.info(f"📊 K线数据压缩完成: {symbol} 1h, 原始{len(klines)}根 -> 特征{len(data)}维")
+    logger.info(f"\n{summary}")
+    logger.info(f"\n{'='*60}\n{summary}\n{'='*60}")
+    for agent in ("技术分析师", "新闻分析师", "投资组合经理"):
+        logger.info(f"{agent}提示词: {_prompt(symbol, summary, klines)}")
+
+
+def current_symbol(symbol: str, klines, positions):
+    """当前代码中的日志语句"""
+    logger.debug("📊 真实模式：使用官方SDK获取K线数据 {} {} x{}", symbol, "1h", 100)
+    logger.debug("✅ 成功获取K线数据: {} {} x{}", symbol, "1h", len(klines))
+    logger.debug("✅ 获取到{}个持仓", len(positions))
+    for pos in positions:
+        logger.debug(
+            "   {}: {:.4f} @ ${:.2f} (未实现盈亏: ${:.2f})",
+            pos['symbol'], pos['amount'], pos['average_price'], pos['unrealized_pnl']
+        )
+    log_payload("准备分析数据", lambda: str({"raw_klines": klines}))
+    data = kline_compressor.compress_kline_data(klines, "1h", symbol)
+    summary = data.get("formatted_summary", "")
+    log_payload(f"K线摘要 {symbol}", summary)
+    for agent in ("技术分析师", "新闻分析师", "投资组合经理"):
+        log_payload(f"{agent}提示词", _prompt(symbol, summary, klines))
+
+
+def configure(mode: str, log_dir: str):
+    logger.remove()
+    path = os.path.join(log_dir, f"{mode}.log")
+    console = open(os.devnull, "w", encoding="utf-8")
+    if mode == "legacy":
+        logger.add(console, level="DEBUG")
+        logger.add(path, level="DEBUG")
+    else:
+        level_filter = ModuleLevelFilter("INFO", {})
+        logger.add(console, level=level_filter.min_level, filter=level_filter, enqueue=True)
+        logger.add(path, level=level_filter.min_level, filter=level_filter, enqueue=True)
+    return path
+
+
+def run(mode: str, symbols: int, cycles: int, log_dir: str):
+    path = configure(mode, log_dir)
+    worker = legacy_symbol if mode == "legacy" else current_symbol
+    data = {s: mock_market.get_klines(f"{s}USDT", "1h", 100) for s in SYMBOLS[:symbols]}
+    positions = _positions()
+
+    cycle_times = []
+    for _ in range(cycles):
+        started = time.perf_counter()
+        for symbol, klines in data.items():
+            worker(f"{symbol}USDT", klines, positions)
+        cycle_times.append(time.perf_counter() - started)
+
+    drain_started = time.perf_counter()
+    logger.complete()
+    logger.remove()
+    drain = time.perf_counter() - drain_started
+    return {
+        "mode": mode,
+        "cycle_avg_ms": statistics.mean(cycle_times) * 1000,
+        "cycle_min_ms": min(cycle_times) * 1000,
+        "drain_ms": drain * 1000,
+        "log_bytes": os.path.getsize(path) if os.path.exists(path) else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="日志开销基准测试")
+    parser.add_argument("--symbols", type=int, default=20)
+    parser.add_argument("--cycles", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        results = [run(mode, args.symbols, args.cycles, log_dir) for mode in ("legacy", "current")]
+
+    logger.add(sys.stderr, level="INFO")
+    print(f"{'模式':<10}{'周期均值(ms)':>14}{'周期最小(ms)':>14}{'队列排空(ms)':>14}{'日志字节':>12}")
+    for r in results:
+        print(f"{r['mode']:<10}{r['cycle_avg_ms']:>14.1f}{r['cycle_min_ms']:>14.1f}{r['drain_ms']:>14.1f}{r['log_bytes']:>12}")
+    legacy, current = results
+    if current["cycle_avg_ms"] > 0:
+        print(f"周期耗时降低 {legacy['cycle_avg_ms'] / current['cycle_avg_ms']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,496 @@
+"""
+热点纯Python函数的微基准测试（带基线和回归阈值）
+
+与端到端压测（bench_e2e）不同，这里单独测量交易周期中调用最频繁的同步函数：
+K线压缩与解析、市场状态识别、趋势/震荡策略信号、决策提示词渲染、智能止盈止损、
+最大回撤计算和各智能体的LLM响应解析。输入取自 backend/agents/check_data 中的历史K线。
+
+每个用例先校准循环次数，使一轮耗时不少于 --min-time，再运行 --rounds 轮，
+记录每次调用的 min/median/mean/stddev（微秒），与 pytest-benchmark 的统计口径一致。
+
+基线按机器保存（默认主机名 + Python版本，--machine 可指定），只和同一台机器上的基线比较：
+
+    python -m benchmarks.bench_micro --save-baseline        # 记录当前基线
+    python -m benchmarks.bench_micro --threshold 15         # 中位数慢于基线15%以上时退出码为1
+    python -m benchmarks.bench_micro -k kline               # 只运行名称包含 kline 的用例
+
+没有当前机器的基线时退出码为2，不会当作通过。基线依赖机器，仓库不提交 baselines/micro.json；
+CI中用固定的 --machine 名称（CI runner 的主机名每次不同），并缓存基线文件：
+
+    python -m benchmarks.bench_micro --machine ci-py3.11 --save-baseline   # 首次或主分支上更新基线
+    python -m benchmarks.bench_micro --machine ci-py3.11                   # PR上检查回归
+
+依赖缺失（如未安装talib）的用例会跳过并在结果中标明。
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional
+
+from loguru import logger
+
+
+CHECK_DATA_DIR = Path(__file__).resolve().parent.parent / "backend" / "agents" / "check_data"
+BASELINE_FILE = Path(__file__).parent / "baselines" / "micro.json"
+KLINE_LIMIT = 200
+
+# 用例名 -> {"setup": 准备函数, "threshold": 回归阈值覆盖%}，准备函数返回被测的无参调用
+BENCHMARKS: Dict[str, Dict] = {}
+
+
+def bench(name: str, threshold: Optional[float] = None):
+    """注册用例：被装饰的函数完成输入准备，返回一个无参可调用对象"""
+    def decorator(setup: Callable[[], Callable[[], object]]):
+        BENCHMARKS[name] = {"setup": setup, "threshold": threshold}
+        return setup
+    return decorator
+
+
+def machine_key() -> str:
+    return f"{platform.node()}-py{platform.python_version()}"
+
+
+# ==================== 输入数据 ====================
+
+_history_cache: Dict[str, List[Dict]] = {}
+
+
+def load_history(symbol: str = "BTC", limit: int = KLINE_LIMIT) -> List[Dict]:
+    """check_data 中的历史K线（按时间升序，取最后 limit 根）"""
+    if symbol not in _history_cache:
+        with open(CHECK_DATA_DIR / f"{symbol}.json", encoding="utf-8") as f:
+            data = json.load(f)
+        data.sort(key=lambda x: x["T"])
+        _history_cache[symbol] = data
+    return _history_cache[symbol][-limit:]
+
+
+def raw_klines(symbol: str = "BTC", limit: int = KLINE_LIMIT) -> List[List]:
+    """交易所数组格式的K线"""
+    return [
+        [k["T"], str(k["o"]), str(k["h"]), str(k["l"]), str(k["c"]), str(k["v"]), k["T"] + 3_599_999]
+        for k in load_history(symbol, limit)
+    ]
+
+
+def dict_klines(symbol: str = "BTC", limit: int = KLINE_LIMIT) -> List[Dict]:
+    """make_df_handle 使用的字典格式K线"""
+    return [
+        {"timestamp": k["T"], "open": k["o"], "high": k["h"], "low": k["l"], "close": k["c"], "volume": k["v"]}
+        for k in load_history(symbol, limit)
+    ]
+
+
+def _strategy_inputs():
+    """按 compute_signal 的顺序准备指标，供策略信号和渲染用例共用"""
+    from backend.agents.technical_analyst_new import OptimizedTradingStrategy, make_df_handle
+
+    strategy = OptimizedTradingStrategy("Local", "")
+    df = make_df_handle(dict_klines(), True)
+    close, volume = df["close"], df["volume"]
+    obv = strategy.calculate_obv(close, volume)
+    relative_volume = strategy.calculate_relative_volume(volume)
+    bb_upper, _, bb_lower = strategy.calculate_bollinger_bands(close)
+    macd, macd_signal, _ = strategy.calculate_macd(close)
+    return SimpleNamespace(
+        strategy=strategy,
+        df=df,
+        close=close,
+        volume=volume,
+        rsi=strategy.calculate_rsi(close),
+        macd=macd,
+        macd_signal=macd_signal,
+        ema_fast=strategy.calculate_ema(close, 8),
+        ema_slow=strategy.calculate_ema(close, 21),
+        volume_sma=strategy.calculate_volume_sma(volume),
+        obv=obv,
+        relative_volume=relative_volume,
+        bb_upper=bb_upper,
+        bb_lower=bb_lower,
+        regime=strategy.enhanced_identify_market_regime(df),
+        volume_price=strategy.analyze_volume_price_relationship(close, volume, obv, relative_volume),
+    )
+
+
+# ==================== 用例 ====================
+
+@bench("kline.compress_kline_data")
+def _bench_compress():
+    from backend.agents.kline_compressor import KlineCompressor
+
+    compressor, klines = KlineCompressor(), raw_klines()
+    return lambda: compressor.compress_kline_data(klines, "1h", "BTCUSDT")
+
+
+@bench("kline.parse_raw_klines")
+def _bench_parse_klines():
+    from backend.agents.kline_compressor import KlineCompressor
+
+    compressor, klines = KlineCompressor(), raw_klines()
+    return lambda: compressor._parse_raw_klines(klines)
+
+
+@bench("strategy.enhanced_identify_market_regime")
+def _bench_regime():
+    inputs = _strategy_inputs()
+    return lambda: inputs.strategy.enhanced_identify_market_regime(inputs.df)
+
+
+@bench("strategy.trend_strategy_signal")
+def _bench_trend_signal():
+    s = _strategy_inputs()
+    return lambda: s.strategy.trend_strategy_signal(
+        s.close, s.volume, s.rsi, s.macd, s.macd_signal, s.ema_fast, s.ema_slow,
+        s.volume_sma, s.obv, s.relative_volume, s.volume_price,
+    )
+
+
+@bench("strategy.range_strategy_signal")
+def _bench_range_signal():
+    s = _strategy_inputs()
+    price_range = s.regime["detailed_analysis"]["price_range_analysis"]
+    return lambda: s.strategy.range_strategy_signal(
+        s.close, s.rsi, s.bb_upper, s.bb_lower, price_range, s.relative_volume, s.volume_price,
+    )
+
+
+@bench("renderer.render_decision_prompt")
+def _bench_render():
+    from backend.agents.technical_analyst_new import TradingDecisionRenderer
+
+    s = _strategy_inputs()
+    signal = s.strategy.trend_strategy_signal(
+        s.close, s.volume, s.rsi, s.macd, s.macd_signal, s.ema_fast, s.ema_slow,
+        s.volume_sma, s.obv, s.relative_volume, s.volume_price,
+    )
+    result = {
+        **signal,
+        "market_regime": s.regime["market_regime"],
+        "adx_value": s.regime["adx_value"],
+        "detailed_analysis": s.regime["detailed_analysis"],
+        "indicators": {"macd": s.macd.iloc[-1], "macd_signal": s.macd_signal.iloc[-1]},
+    }
+    renderer = TradingDecisionRenderer()
+    return lambda: renderer.render_decision_prompt(result, s.df, symbol="BTCUSDT", timeframe="1h")
+
+
+@bench("stop.calculate_stop_levels")
+def _bench_stop_levels():
+    from backend.agents.intelligent_stop_strategy import IntelligentStopStrategy
+
+    stop_strategy = IntelligentStopStrategy()
+    last_day = load_history(limit=24)
+    price = last_day[-1]["c"]
+    market_data = {
+        "price": price,
+        "high_24h": max(k["h"] for k in last_day),
+        "low_24h": min(k["l"] for k in last_day),
+    }
+    return lambda: stop_strategy.calculate_stop_levels("buy", price, market_data, 0.1, 0.7, 0.03)
+
+
+@bench("portfolio.calculate_max_drawdown")
+def _bench_max_drawdown():
+    from backend.agents.portfolio_manager import PortfolioManager
+
+    # 用相邻收盘价之差模拟500笔交易的盈亏
+    history = load_history(limit=501)
+    trades = [
+        SimpleNamespace(timestamp=cur["T"], profit_loss=cur["c"] - prev["c"])
+        for prev, cur in zip(history, history[1:])
+    ]
+    manager = PortfolioManager.__new__(PortfolioManager)
+    return lambda: manager._calculate_max_drawdown(trades)
+
+
+@bench("order_book.book_features")
+def _bench_book_features():
+    from backend.exchanges.order_book import LocalBook, book_features
+
+    # 50档盘口，附带1万USDT的滑点估算
+    rng = random.Random(7)
+    book = LocalBook("BTCUSDT")
+    book.load_snapshot({
+        "bids": [[100 - 0.01 * (i + 1), rng.uniform(1, 50)] for i in range(50)],
+        "asks": [[100 + 0.01 * (i + 1), rng.uniform(1, 50)] for i in range(50)],
+    })
+    bids, asks = book.arrays(50)
+    return lambda: book_features(bids, asks, 10, 25, 10000)
+
+
+@bench("mtf.feature_frame")
+def _bench_mtf_feature_frame():
+    from backend.agents.multi_timeframe import compute_mtf_features
+
+    # 720根1h K线重采样出 1h/4h/1d 三个周期并计算特征
+    rng = random.Random(5)
+    klines, price = [], 100.0
+    for i in range(720):
+        close = price * (1 + rng.gauss(0, 0.01))
+        klines.append({
+            "timestamp": i * 3_600_000, "open": price, "high": max(price, close) * 1.002,
+            "low": min(price, close) * 0.998, "close": close, "volume": rng.uniform(1, 10),
+        })
+        price = close
+    return lambda: compute_mtf_features(klines, "1h", ["1h", "4h", "1d"])
+
+
+@bench("indicators.incremental_update")
+def _bench_incremental_indicators():
+    from collections import deque
+    from backend.agents.incremental_indicators import IndicatorStore
+
+    # 100根窗口每轮滑入一根新K线：只提交上一根、试算最新一根（对比 indicators.talib_full 的全量计算）
+    store, history = IndicatorStore(), load_history()
+    window = deque(dict_klines(limit=100), maxlen=100)
+    state = {"n": 0, "ts": window[-1]["timestamp"]}
+
+    def run():
+        k = history[state["n"] % len(history)]
+        state["n"] += 1
+        state["ts"] += 3_600_000
+        window.append({"timestamp": state["ts"], "open": k["o"], "high": k["h"], "low": k["l"], "close": k["c"], "volume": k["v"]})
+        return store.series("BTCUSDT", "1h", list(window))
+    return run
+
+
+@bench("indicators.talib_full")
+def _bench_talib_indicators():
+    from backend.agents.technical_analyst_new import OptimizedTradingStrategy, make_df_handle
+
+    strategy = OptimizedTradingStrategy("Local", "")
+    df = make_df_handle(dict_klines(limit=100), True)
+    return lambda: strategy.compute_indicators(df)
+
+
+@bench("screener.screen")
+def _bench_screener():
+    from backend.trading.screener import UniverseScreener
+
+    # 500个交易对的全市场行情，一半有资金费率、三分之一有价差缓存
+    rng = random.Random(13)
+    tickers = []
+    for i in range(500):
+        price = rng.uniform(0.01, 1000)
+        tickers.append({
+            "symbol": f"SYM{i}USDT", "price": price, "change_24h": rng.uniform(-10, 10),
+            "high_24h": price * 1.05, "low_24h": price * rng.uniform(0.9, 0.99), "volume_24h": 10 ** rng.uniform(6, 10),
+        })
+    screener = UniverseScreener()
+    screener.funding = {f"SYM{i}USDT": rng.gauss(0, 0.001) for i in range(0, 500, 2)}
+    screener.spreads = {f"SYM{i}USDT": rng.uniform(1, 30) for i in range(0, 500, 3)}
+    return lambda: screener.screen(tickers, 50)
+
+
+@bench("risk.pre_trade_check")
+def _bench_pre_trade_check():
+    from backend.trading.risk_engine import PreTradeRisk
+
+    # 10个持仓，检查一笔通过全部检查项的开仓单
+    risk = PreTradeRisk()
+    risk.update_equity(100000)
+    risk.sync_positions([
+        {"symbol": f"SYM{i}USDT", "amount": 10, "current_price": 100, "position_type": "short" if i % 2 else "long"}
+        for i in range(10)
+    ])
+    return lambda: risk.check("SYM0USDT", "buy", 5, 100)
+
+
+@bench("risk.portfolio_analytics")
+def _bench_portfolio_analytics():
+    import time
+    from backend.trading.risk_analytics import RiskAnalytics
+    from backend.trading.risk_engine import pre_trade_risk
+
+    # 200个交易对 x 168根1h K线，20个持仓；每轮模拟新K线到来后重算协方差矩阵和组合VaR
+    rng = random.Random(11)
+    analytics = RiskAnalytics()
+    now = int(time.time() * 1000) // analytics.step * analytics.step
+    for i in range(200):
+        price = 100.0
+        klines = []
+        for k in range(analytics.window + 1):
+            price *= 1 + rng.gauss(0, 0.01)
+            klines.append({"timestamp": now - (analytics.window + 1 - k) * analytics.step, "close": price})
+        analytics.ingest(f"SYM{i}USDT", klines, analytics.interval)
+    pre_trade_risk.update_equity(100000)
+    pre_trade_risk.sync_positions([
+        {"symbol": f"SYM{i}USDT", "amount": 10, "current_price": 100, "position_type": "short" if i % 3 else "long"}
+        for i in range(20)
+    ])
+
+    def run():
+        analytics.version += 1
+        return analytics.portfolio()
+    return run
+
+
+_DECISION = {
+    "final_decision": "approve",
+    "action": "buy",
+    "confidence": 0.72,
+    "position_size": 0.1,
+    "stop_loss": 0.02,
+    "take_profit": 0.05,
+    "reasoning": "多周期趋势一致，量价配合良好，风险收益比合理。" * 8,
+}
+FENCED_RESPONSE = "分析如下：\n```json\n" + json.dumps(_DECISION, ensure_ascii=False, indent=2) + "\n```\n以上。"
+BARE_RESPONSE = "思考过程略。" * 20 + json.dumps(_DECISION, ensure_ascii=False)
+
+
+def _parser_bench(module: str, cls_name: str, method: str, content: str, *extra):
+    def setup():
+        import importlib
+
+        cls = getattr(importlib.import_module(module), cls_name)
+        agent = cls.__new__(cls)  # 解析函数不依赖构造参数
+        parse = getattr(agent, method)
+        return lambda: parse(content, *extra)
+    return setup
+
+
+bench("parser.portfolio_manager")(_parser_bench(
+    "backend.agents.portfolio_manager", "PortfolioManager", "_parse_response", FENCED_RESPONSE))
+bench("parser.portfolio_manager_stop")(_parser_bench(
+    "backend.agents.portfolio_manager", "PortfolioManager", "_parse_stop_decision_response",
+    FENCED_RESPONSE, {"symbol": "BTCUSDT", "side": "long"}))
+bench("parser.technical_analyst")(_parser_bench(
+    "backend.agents.technical_analyst", "TechnicalAnalyst", "_parse_response", BARE_RESPONSE))
+bench("parser.risk_manager")(_parser_bench(
+    "backend.agents.risk_manager", "RiskManager", "_parse_response", BARE_RESPONSE))
+bench("parser.sentiment_analyst")(_parser_bench(
+    "backend.agents.sentiment_analyst", "SentimentAnalyst", "_parse_response", BARE_RESPONSE))
+bench("parser.news_analyst")(_parser_bench(
+    "backend.agents.news_analyst", "NewsAnalyst", "_parse_response", BARE_RESPONSE))
+bench("parser.fundamental_analyst")(_parser_bench(
+    "backend.agents.fundamental_analyst", "FundamentalAnalyst", "_parse_response", BARE_RESPONSE))
+
+
+# ==================== 运行与比较 ====================
+
+def measure(func: Callable[[], object], rounds: int, min_time: float) -> Dict:
+    """校准循环次数后运行多轮，返回每次调用的耗时统计（微秒）"""
+    func()  # 预热（首次导入、缓存）
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time or loops >= 1_000_000:
+            break
+        loops *= 10 if elapsed < min_time / 10 else 2
+
+    per_call = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        per_call.append((time.perf_counter() - started) / loops * 1e6)
+    return {
+        "loops": loops,
+        "rounds": rounds,
+        "min_us": round(min(per_call), 3),
+        "median_us": round(statistics.median(per_call), 3),
+        "mean_us": round(statistics.mean(per_call), 3),
+        "stddev_us": round(statistics.stdev(per_call), 3) if rounds > 1 else 0.0,
+    }
+
+
+def run_benchmarks(selected: List[str], rounds: int, min_time: float) -> Dict[str, Dict]:
+    results = {}
+    for name in selected:
+        try:
+            func = BENCHMARKS[name]["setup"]()
+        except ImportError as e:
+            results[name] = {"skipped": f"缺少依赖: {e}"}
+            logger.warning(f"⏭️ {name}: 跳过（缺少依赖: {e}）")
+            continue
+        results[name] = measure(func, rounds, min_time)
+        logger.info(f"⏱️ {name:<42}{results[name]['median_us']:>12.1f}µs  (loops={results[name]['loops']})")
+    return results
+
+
+def load_baselines(path: Path) -> Dict:
+    if path.exists():
+        return json.loads(path.read_text(encoding="utf-8"))
+    return {}
+
+
+def check_regressions(results: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """中位数相对基线变慢超过阈值的用例"""
+    regressions = []
+    print(f"\n{'benchmark':<42}{'baseline':>12}{'current':>12}{'change':>10}")
+    for name, result in results.items():
+        if "skipped" in result:
+            print(f"{name:<42}{'':>12}{'skipped':>12}")
+            continue
+        base = baseline.get(name)
+        if not base:
+            print(f"{name:<42}{'-':>12}{result['median_us']:>12.1f}{'new':>10}")
+            continue
+        change = (result["median_us"] - base["median_us"]) / base["median_us"] * 100
+        limit = BENCHMARKS[name]["threshold"] or threshold
+        flag = "  ❌" if change > limit else ""
+        print(f"{name:<42}{base['median_us']:>12.1f}{result['median_us']:>12.1f}{change:>+9.1f}%{flag}")
+        if change > limit:
+            regressions.append(f"{name}: {base['median_us']:.1f}µs -> {result['median_us']:.1f}µs ({change:+.1f}% > {limit}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="热点函数微基准测试")
+    parser.add_argument("-k", dest="keyword", default="", help="只运行名称包含该关键字的用例")
+    parser.add_argument("--rounds", type=int, default=7)
+    parser.add_argument("--min-time", type=float, default=0.05, help="每轮最少耗时（秒）")
+    parser.add_argument("--threshold", type=float, default=15.0, help="回归阈值（中位数变慢的百分比）")
+    parser.add_argument("--baseline", default=str(BASELINE_FILE), help="基线文件")
+    parser.add_argument("--machine", default="", help="基线中的机器名称，默认为主机名 + Python版本")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果保存为当前机器的基线")
+    parser.add_argument("--json", default="", help="把本次结果另存为JSON")
+    parser.add_argument("--list", action="store_true", help="列出所有用例")
+    args = parser.parse_args()
+
+    if args.list:
+        print("\n".join(BENCHMARKS))
+        return
+
+    logger.remove()
+    logger.add(sys.stderr, level="INFO")
+
+    selected = [name for name in BENCHMARKS if args.keyword in name]
+    results = run_benchmarks(selected, args.rounds, args.min_time)
+
+    machine = args.machine or machine_key()
+    if args.json:
+        Path(args.json).write_text(json.dumps({"machine": machine, "results": results}, indent=2, ensure_ascii=False))
+
+    baseline_path = Path(args.baseline)
+    baselines = load_baselines(baseline_path)
+    if args.save_baseline:
+        current = baselines.setdefault(machine, {})
+        current.update({name: r for name, r in results.items() if "skipped" not in r})
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps(baselines, indent=2, ensure_ascii=False, sort_keys=True))
+        logger.info(f"💾 基线已保存: {baseline_path} [{machine}]")
+        return
+
+    baseline = baselines.get(machine)
+    if not baseline:
+        logger.error(f"❌ 没有机器 [{machine}] 的基线（{baseline_path}），无法检查回归，先运行 --save-baseline")
+        sys.exit(2)
+    regressions = check_regressions(results, baseline, args.threshold)
+    if regressions:
+        logger.error("❌ 性能回归:\n" + "\n".join(f"   {r}" for r in regressions))
+        sys.exit(1)
+    logger.info("✅ 没有超过阈值的性能回归")
+
+
+if __name__ == "__main__":
+    main()
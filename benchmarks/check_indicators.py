@@ -0,0 +1,110 @@
+"""
+增量指标与 talib 的一致性校验
+
+1. 全量：把 check_data 中各交易对的历史K线逐根喂给增量指标（已收盘的用 update、最后一根用 peek），
+   与 EnhancedTradingStrategy.compute_indicators() 用 talib 在同一序列上的全量结果逐点比较：
+   预热期的NaN位置必须相同，数值的相对误差不超过 --rtol。
+2. 滑动窗口（生产路径）：同一个 IndicatorStore 上每次传入向后滑动一根的 --window 根K线，
+   由窗口决定的指标（布林带、成交量均线、量比、OBV、VWAP）每次都与 talib 在该窗口上有值的位置比较；
+   EMA/RSI/MACD/ATR/ADX 从更早的K线延续下来，与只看窗口的 talib 种子不同，只报告最后一根的差异。
+
+    python -m benchmarks.check_indicators
+    python -m benchmarks.check_indicators --limit 100 --rtol 1e-9 --window 100 --steps 300
+
+未安装talib时无法校验，退出码为2。
+"""
+import argparse
+import sys
+
+import numpy as np
+
+from benchmarks.bench_micro import CHECK_DATA_DIR, dict_klines
+
+
+# 只由窗口内K线决定的指标（滑动窗口校验时必须与 talib 一致）
+WINDOWED = ("bb_upper", "bb_middle", "bb_lower", "volume_sma", "relative_volume", "obv", "vwap")
+
+
+def _compare(actual, expected, names, rtol: float, warmup: bool = True) -> list:
+    """
+    返回 [(指标, 最大相对误差, 是否通过), ...]
+    warmup=True 时预热期的NaN位置也必须相同；滑动窗口时增量指标在 talib 预热期已有值，只要求 talib 有值处一致
+    """
+    rows = []
+    for name in names:
+        a, b = actual[name], expected[name].to_numpy(dtype=float)
+        valid = ~np.isnan(b)
+        same_nan = bool((np.isnan(a) == ~valid).all() if warmup else not np.isnan(a[valid]).any())
+        error = float(np.max(np.abs(a[valid] - b[valid]) / np.maximum(np.abs(b[valid]), 1e-12))) if valid.any() else 0.0
+        rows.append((name, error, same_nan and error <= rtol))
+    return rows
+
+
+def check_symbol(strategy, symbol: str, limit: int, rtol: float) -> list:
+    """全量校验：新建的状态喂入整段K线"""
+    from backend.agents.incremental_indicators import IndicatorStore, OUTPUTS
+    from backend.agents.technical_analyst_new import make_df_handle
+
+    klines = dict_klines(symbol, limit)
+    expected = strategy.compute_indicators(make_df_handle(klines, True))
+    return _compare(IndicatorStore().series(symbol, "1h", klines), expected, OUTPUTS, rtol)
+
+
+def check_sliding(strategy, symbol: str, window: int, steps: int, rtol: float) -> list:
+    """滑动窗口校验：窗口决定的指标取所有步中的最大误差，其余指标报告最后一步最后一根的差异"""
+    from backend.agents.incremental_indicators import IndicatorStore, OUTPUTS
+    from backend.agents.technical_analyst_new import make_df_handle
+
+    klines = dict_klines(symbol, window + steps)
+    store = IndicatorStore()
+    worst = {name: (0.0, True) for name in WINDOWED}
+    for start in range(len(klines) - window + 1):
+        batch = klines[start:start + window]
+        actual = store.series(symbol, "1h", batch)
+        expected = strategy.compute_indicators(make_df_handle(batch, True))
+        for name, error, ok in _compare(actual, expected, WINDOWED, rtol, warmup=False):
+            worst[name] = (max(worst[name][0], error), worst[name][1] and ok)
+    rows = [(name, error, ok) for name, (error, ok) in worst.items()]
+    for name in OUTPUTS:
+        if name not in WINDOWED:
+            a, b = actual[name][-1], float(expected[name].iloc[-1])
+            rows.append((name, abs(a - b) / max(abs(b), 1e-12), True))
+    return rows
+
+
+def _report(label: str, symbol: str, rows: list) -> bool:
+    bad = [f"{name}({error:.2e})" for name, error, ok in rows if not ok]
+    worst = max(error for name, error, _ in rows if name in WINDOWED or label == "全量")
+    line = f"{'❌' if bad else '✅'} {label} {symbol:6s} 最大相对误差 {worst:.2e}"
+    if label != "全量":
+        drift = ", ".join(f"{name} {error:.1e}" for name, error, _ in rows if name not in WINDOWED)
+        line += f" | 延续指标最后一根差异: {drift}"
+    print(line + (f" 不一致: {', '.join(bad)}" if bad else ""))
+    return not bad
+
+
+def main():
+    parser = argparse.ArgumentParser(description="增量指标与 talib 一致性校验")
+    parser.add_argument("--limit", type=int, default=200, help="全量校验每个交易对使用的K线根数（不超过增量指标的历史长度）")
+    parser.add_argument("--window", type=int, default=100, help="滑动窗口校验的窗口长度（与技术分析的K线数量一致）")
+    parser.add_argument("--steps", type=int, default=300, help="滑动窗口校验向后滑动的根数")
+    parser.add_argument("--rtol", type=float, default=1e-9, help="允许的最大相对误差")
+    args = parser.parse_args()
+
+    try:
+        import talib  # noqa: F401
+        from backend.agents.technical_analyst_new import EnhancedTradingStrategy
+    except ImportError as e:
+        print(f"跳过：缺少依赖 {e.name}")
+        sys.exit(2)
+
+    strategy = EnhancedTradingStrategy("Local", "")
+    failed = 0
+    for path in sorted(CHECK_DATA_DIR.glob("*.json")):
+        failed += not _report("全量", path.stem, check_symbol(strategy, path.stem, args.limit, args.rtol))
+        failed += not _report("滑动", path.stem, check_sliding(strategy, path.stem, args.window, args.steps, args.rtol))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,514 @@
+"""
+本地假AsterDEX合约REST服务（Binance合约兼容路径）
+
+交易所SDK请求的路径按最后一段路由（/fapi/v1/klines、/fapi/v2/account 等都能命中），
+签名参数不校验。行情按交易对独立随机游走，K线由种子确定性生成。市价单立即成交并更新持仓；
+限价单未触及时挂单，价格游走到挂单价时按挂单价成交，只做maker（GTX）的限价单会立即成交时直接过期，
+可以用来验证执行算法（backend/trading/execution.py）的挂单、撤单和转市价流程。
+
+用户数据流：POST listenKey 返回固定的key，/ws/{listenKey} 上推送 ORDER_TRADE_UPDATE 和
+ACCOUNT_UPDATE（每次下单成交后），push_account_update() / expire_listen_key() 可手动触发。
+
+增量深度流：/ws 上发送 SUBSCRIBE（<symbol>@depth@100ms）后推送 depthUpdate。每次REST拉取
+深度或调用 push_depth_update() 时订单簿重新生成，差异按更新ID推送；drop=True 时只推进更新ID
+不推送，用来验证客户端断档后重新同步。
+
+    python -m benchmarks.fake_aster_server --port 9200 --symbols 50 --latency 0.05
+然后设置 ASTER_DEX_BASE_URL=http://127.0.0.1:9200、ASTER_DEX_WS_URL=ws://127.0.0.1:9200/ws
+和任意的 ASTER_DEX_API_KEY/SECRET。
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Dict, List, Optional
+
+from aiohttp import WSMsgType, web
+from loguru import logger
+
+
+LISTEN_KEY = "fake-listen-key"
+TAKER_FEE = 0.0004
+MAKER_FEE = 0.0002
+
+BOOK_LEVELS = 100
+
+INTERVAL_MS = {"1m": 60_000, "5m": 300_000, "15m": 900_000, "1h": 3_600_000, "4h": 14_400_000, "1d": 86_400_000}
+
+
+class FakeAsterServer:
+    """假交易所"""
+
+    def __init__(
+        self,
+        symbols: int = 50,
+        latency: float = 0.02,
+        jitter: float = 0.01,
+        error_rate: float = 0.0,
+        balance: float = 10000.0,
+        seed: int = 42,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.balance = balance
+        self._rng = random.Random(seed)
+        self.symbols = [f"SYM{i:03d}USDT" for i in range(symbols)]
+        self.prices: Dict[str, float] = {s: self._rng.uniform(0.5, 500) for s in self.symbols}
+        self.volumes: Dict[str, float] = {s: self._rng.uniform(5e6, 5e8) for s in self.symbols}
+        self.positions: Dict[str, Dict] = {}
+        self.orders: Dict[str, Dict] = {}  # orderId/clientOrderId -> 订单
+        self.fills: Dict[str, List[Dict]] = {}  # orderId -> 逐笔成交
+        self.open_orders: Dict[str, Dict] = {}  # orderId -> 未成交的限价挂单
+        self._order_id = 0
+        self._streams: List[web.WebSocketResponse] = []
+        self._depth_streams: Dict[web.WebSocketResponse, set] = {}  # 行情连接 -> 订阅的交易对
+        self._books: Dict[str, Dict] = {}  # symbol -> {"id", "bids", "asks"}（价格字符串 -> 数量字符串）
+        self.stats = {"requests": 0, "errors": 0, "orders": 0, "stream_events": 0, "by_endpoint": {}}
+        self._runner: Optional[web.AppRunner] = None
+
+    def set_symbol_count(self, count: int):
+        """调整交易对数量（用于按交易对数量扫描周期耗时）"""
+        for i in range(len(self.symbols), count):
+            symbol = f"SYM{i:03d}USDT"
+            self.prices[symbol] = self._rng.uniform(0.5, 500)
+            self.volumes[symbol] = self._rng.uniform(5e6, 5e8)
+        self.symbols = [f"SYM{i:03d}USDT" for i in range(count)]
+
+    # ---------- 数据生成 ----------
+
+    def _tick(self, symbol: str) -> float:
+        price = self.prices[symbol] * (1 + self._rng.gauss(0, 0.001))
+        self.prices[symbol] = price
+        if self.open_orders:
+            self._match_resting(symbol)
+        return price
+
+    def _ticker(self, symbol: str) -> Dict:
+        price = self._tick(symbol)
+        return {
+            "symbol": symbol,
+            "lastPrice": f"{price:.6f}",
+            "priceChangePercent": f"{self._rng.uniform(-8, 8):.2f}",
+            "highPrice": f"{price * 1.03:.6f}",
+            "lowPrice": f"{price * 0.97:.6f}",
+            "quoteVolume": f"{self.volumes[symbol]:.2f}",
+            "closeTime": int(time.time() * 1000),
+        }
+
+    def _klines(self, symbol: str, interval: str, limit: int) -> List[List]:
+        step = INTERVAL_MS.get(interval, 3_600_000)
+        end = int(time.time() * 1000) // step * step
+        rng = random.Random(f"{symbol}-{interval}-{end}")
+        price = self.prices[symbol] / (1 + rng.gauss(0, 0.02))
+        rows = []
+        for i in range(limit):
+            open_price = price
+            price = max(1e-6, price * (1 + rng.gauss(0, 0.01)))
+            high = max(open_price, price) * (1 + abs(rng.gauss(0, 0.003)))
+            low = min(open_price, price) * (1 - abs(rng.gauss(0, 0.003)))
+            volume = rng.uniform(1e3, 1e5)
+            open_time = end - (limit - i) * step
+            rows.append([
+                open_time, f"{open_price:.6f}", f"{high:.6f}", f"{low:.6f}", f"{price:.6f}", f"{volume:.3f}",
+                open_time + step - 1, f"{volume * price:.2f}", rng.randint(100, 5000),
+                f"{volume * 0.5:.3f}", f"{volume * price * 0.5:.2f}", "0",
+            ])
+        return rows
+
+    def _update_book(self, symbol: str, drop: bool = False):
+        """围绕当前价格重新生成订单簿，差异作为一条 depthUpdate 推送给订阅者"""
+        price = self.prices[symbol]
+        old = self._books.get(symbol, {"id": int(time.time() * 1000), "bids": {}, "asks": {}})
+        book = {
+            "id": old["id"] + 1,
+            "bids": {f"{price * (1 - 0.0005 * (i + 1)):.6f}": f"{self._rng.uniform(10, 1000):.3f}" for i in range(BOOK_LEVELS)},
+            "asks": {f"{price * (1 + 0.0005 * (i + 1)):.6f}": f"{self._rng.uniform(10, 1000):.3f}" for i in range(BOOK_LEVELS)},
+        }
+        self._books[symbol] = book
+        if drop or not any(symbol in subs for subs in self._depth_streams.values()):
+            return
+
+        def diff(side):
+            changes = [[p, q] for p, q in book[side].items() if old[side].get(p) != q]
+            return changes + [[p, "0"] for p in old[side] if p not in book[side]]
+
+        event = {
+            "e": "depthUpdate", "E": int(time.time() * 1000), "T": int(time.time() * 1000), "s": symbol,
+            "U": book["id"], "u": book["id"], "pu": old["id"], "b": diff("bids"), "a": diff("asks"),
+        }
+        asyncio.get_running_loop().create_task(self._push_depth(event))
+
+    def _depth(self, symbol: str, limit: int) -> Dict:
+        self._update_book(symbol)
+        book = self._books[symbol]
+        return {
+            "lastUpdateId": book["id"],
+            "bids": sorted(([p, q] for p, q in book["bids"].items()), key=lambda x: -float(x[0]))[:limit],
+            "asks": sorted(([p, q] for p, q in book["asks"].items()), key=lambda x: float(x[0]))[:limit],
+        }
+
+    def _new_order(self, params: Dict) -> Dict:
+        symbol = params.get("symbol", "")
+        if symbol not in self.prices:
+            return {"code": -1121, "msg": "Invalid symbol."}
+        client_order_id = params.get("newClientOrderId")
+        if client_order_id and client_order_id in self.orders:
+            return {"code": -4116, "msg": "ClientOrderId is duplicated."}
+        self._order_id += 1
+        self.stats["orders"] += 1
+        qty = float(params.get("quantity", 0) or 0)
+        side = params.get("side", "BUY").upper()
+        order_type = params.get("type", "MARKET").upper()
+        if str(params.get("reduceOnly", "")).lower() == "true":
+            # 只减仓：没有反方向持仓时拒绝，数量超过持仓时只平到0
+            held = self.positions.get(symbol, {}).get("amount", 0.0)
+            reducible = -held if side == "BUY" else held
+            if reducible <= 0:
+                return {"code": -2022, "msg": "ReduceOnly Order is rejected."}
+            qty = min(qty, reducible)
+        order = {
+            "orderId": self._order_id,
+            "clientOrderId": client_order_id or f"fake-{self._order_id}",
+            "symbol": symbol,
+            "status": "NEW",
+            "side": side,
+            "type": order_type,
+            "timeInForce": params.get("timeInForce", "GTC"),
+            "price": params.get("price", "0"),
+            "origQty": f"{qty}",
+            "executedQty": "0",
+            "avgPrice": "0",
+            "updateTime": int(time.time() * 1000),
+        }
+        self.orders[str(order["orderId"])] = order
+        self.orders[order["clientOrderId"]] = order
+
+        market = self.prices[symbol]
+        if order_type == "LIMIT":
+            limit = float(params.get("price", 0) or 0)
+            crosses = limit >= market if side == "BUY" else limit <= market
+            if not crosses:
+                # 挂单等待价格触及（_tick 中撮合）
+                self.open_orders[str(order["orderId"])] = order
+                self._schedule(self._push_order(order, "NEW"))
+                return order
+            if order["timeInForce"] == "GTX":
+                # 只做maker的挂单会立即成交，交易所直接过期
+                order["status"] = "EXPIRED"
+                self._schedule(self._push_order(order, "EXPIRED"))
+                return order
+        self._fill(order, market, TAKER_FEE)
+        return order
+
+    def _fill(self, order: Dict, price: float, fee_rate: float, rested: bool = False):
+        """订单按 price 全部成交：更新持仓、余额和成交记录，并推送用户数据流事件"""
+        symbol = order["symbol"]
+        qty = float(order["origQty"])
+        signed = qty if order["side"] == "BUY" else -qty
+        fee = qty * price * fee_rate
+        self.balance -= fee
+        pos = self.positions.setdefault(symbol, {"amount": 0.0, "entry": price})
+        new_amount = pos["amount"] + signed
+        if abs(new_amount) < 1e-12:
+            self.positions.pop(symbol, None)
+        else:
+            if pos["amount"] == 0 or (pos["amount"] > 0) == (signed > 0):
+                total = abs(pos["amount"]) + abs(signed)
+                pos["entry"] = (pos["entry"] * abs(pos["amount"]) + price * abs(signed)) / total
+            pos["amount"] = new_amount
+        order.update({
+            "status": "FILLED",
+            "executedQty": f"{qty}",
+            "avgPrice": f"{price:.6f}",
+            "updateTime": int(time.time() * 1000),
+        })
+        self.fills[str(order["orderId"])] = [{
+            "symbol": symbol, "orderId": order["orderId"], "side": order["side"], "price": f"{price:.6f}",
+            "qty": f"{qty}", "commission": f"{fee:.8f}", "commissionAsset": "USDT", "time": order["updateTime"],
+        }]
+        self._schedule(self._push_fill(order, fee, announce=not rested))
+
+    def _match_resting(self, symbol: str):
+        """价格触及挂单价时按挂单价成交（maker手续费）"""
+        price = self.prices[symbol]
+        for order_id, order in list(self.open_orders.items()):
+            if order["symbol"] != symbol:
+                continue
+            limit = float(order["price"])
+            if (order["side"] == "BUY" and price <= limit) or (order["side"] == "SELL" and price >= limit):
+                del self.open_orders[order_id]
+                self._fill(order, limit, MAKER_FEE, rested=True)
+
+    def _cancel_order(self, params: Dict) -> Dict:
+        order = self.orders.get(str(params.get("orderId") or params.get("origClientOrderId")))
+        if order is None or str(order["orderId"]) not in self.open_orders:
+            return {"code": -2011, "msg": "Unknown order sent."}
+        del self.open_orders[str(order["orderId"])]
+        order["status"] = "CANCELED"
+        order["updateTime"] = int(time.time() * 1000)
+        self._schedule(self._push_order(order, "CANCELED"))
+        return order
+
+    def _position_risk(self, symbol: Optional[str]) -> List[Dict]:
+        result = []
+        for sym, pos in self.positions.items():
+            if symbol and sym != symbol:
+                continue
+            mark = self.prices[sym]
+            result.append({
+                "symbol": sym,
+                "positionAmt": f"{pos['amount']}",
+                "entryPrice": f"{pos['entry']:.6f}",
+                "markPrice": f"{mark:.6f}",
+                "unRealizedProfit": f"{(mark - pos['entry']) * pos['amount']:.4f}",
+                "leverage": "1",
+                "positionSide": "BOTH",
+            })
+        return result
+
+    # ---------- 用户数据流 ----------
+
+    async def _push(self, event: Dict):
+        event.setdefault("E", int(time.time() * 1000))
+        for ws in list(self._streams):
+            try:
+                await ws.send_json(event)
+                self.stats["stream_events"] += 1
+            except Exception:
+                self._streams.remove(ws)
+
+    def _account_event(self, symbols: List[str]) -> Dict:
+        positions = []
+        for symbol in symbols:
+            pos = self.positions.get(symbol, {"amount": 0.0, "entry": 0.0})
+            mark = self.prices[symbol]
+            positions.append({
+                "s": symbol,
+                "pa": f"{pos['amount']}",
+                "ep": f"{pos['entry']:.6f}",
+                "up": f"{(mark - pos['entry']) * pos['amount']:.4f}" if pos["amount"] else "0",
+                "mt": "cross",
+                "ps": "BOTH",
+            })
+        return {
+            "e": "ACCOUNT_UPDATE",
+            "a": {
+                "m": "ORDER",
+                "B": [{"a": "USDT", "wb": f"{self.balance:.8f}", "cw": f"{self.balance:.8f}"}],
+                "P": positions,
+            },
+        }
+
+    def _schedule(self, coro):
+        if self._streams:
+            asyncio.get_running_loop().create_task(coro)
+        else:
+            coro.close()
+
+    async def _push_order(self, order: Dict, execution_type: str):
+        await self._push({"e": "ORDER_TRADE_UPDATE", "o": {
+            "s": order["symbol"], "c": order["clientOrderId"], "S": order["side"], "o": order["type"],
+            "q": order["origQty"], "p": order["price"], "i": order["orderId"], "ps": "BOTH",
+            "x": execution_type, "X": order["status"], "z": order["executedQty"], "ap": order["avgPrice"],
+        }})
+
+    async def _push_fill(self, order: Dict, fee: float, announce: bool = True):
+        base = {
+            "s": order["symbol"], "c": order["clientOrderId"], "S": order["side"], "o": order["type"],
+            "q": order["origQty"], "i": order["orderId"], "ps": "BOTH",
+        }
+        if announce:
+            await self._push({"e": "ORDER_TRADE_UPDATE", "o": {**base, "x": "NEW", "X": "NEW", "z": "0", "ap": "0"}})
+        await self._push({"e": "ORDER_TRADE_UPDATE", "o": {
+            **base, "x": "TRADE", "X": order["status"], "l": order["executedQty"], "z": order["executedQty"],
+            "L": order["avgPrice"], "ap": order["avgPrice"], "n": f"{fee:.8f}", "N": "USDT",
+        }})
+        await self._push(self._account_event([order["symbol"]]))
+
+    async def push_account_update(self, symbols: Optional[List[str]] = None):
+        """推送当前余额和持仓（默认全部持仓）"""
+        await self._push(self._account_event(symbols if symbols is not None else list(self.positions)))
+
+    async def expire_listen_key(self):
+        """推送 listenKeyExpired，客户端应重新创建listenKey并重连"""
+        await self._push({"e": "listenKeyExpired"})
+
+    # ---------- 增量深度流 ----------
+
+    async def _push_depth(self, event: Dict):
+        for ws, subs in list(self._depth_streams.items()):
+            if event["s"] not in subs:
+                continue
+            try:
+                await ws.send_json(event)
+                self.stats["stream_events"] += 1
+            except Exception:
+                self._depth_streams.pop(ws, None)
+
+    async def push_depth_update(self, symbol: str, drop: bool = False):
+        """订单簿变化一次并推送（drop=True 时丢弃这条推送，制造更新ID断档）"""
+        self._tick(symbol)
+        self._update_book(symbol, drop=drop)
+        await asyncio.sleep(0)
+
+    async def handle_market_stream(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        subs = self._depth_streams.setdefault(ws, set())
+        try:
+            async for msg in ws:
+                if msg.type == WSMsgType.ERROR:
+                    break
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                request_msg = json.loads(msg.data)
+                symbols = {p.split("@")[0].upper() for p in request_msg.get("params", [])}
+                if request_msg.get("method") == "SUBSCRIBE":
+                    subs |= symbols
+                elif request_msg.get("method") == "UNSUBSCRIBE":
+                    subs -= symbols
+                await ws.send_json({"result": None, "id": request_msg.get("id")})
+        finally:
+            self._depth_streams.pop(ws, None)
+        return ws
+
+    async def handle_stream(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        if request.match_info["listen_key"] != LISTEN_KEY:
+            await ws.close(code=4001, message=b"invalid listenKey")
+            return ws
+        self._streams.append(ws)
+        try:
+            async for msg in ws:
+                if msg.type == WSMsgType.ERROR:
+                    break
+        finally:
+            if ws in self._streams:
+                self._streams.remove(ws)
+        return ws
+
+    # ---------- HTTP ----------
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_route("*", "/stats", self.handle_stats)
+        app.router.add_get("/ws", self.handle_market_stream)
+        app.router.add_get("/ws/{listen_key}", self.handle_stream)
+        app.router.add_route("*", "/{path:.*}", self.handle)
+        return app
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        path = request.match_info["path"]
+        # /fapi/v1/ticker/24hr -> ticker/24hr, /fapi/v2/account -> account
+        parts = [p for p in path.split("/") if p]
+        endpoint = "/".join(parts[2:]) if len(parts) > 2 and parts[1].startswith("v") else "/".join(parts)
+        params = dict(request.query)
+        if request.method in ("POST", "PUT", "DELETE") and request.can_read_body:
+            params.update(dict(await request.post()))
+
+        self.stats["requests"] += 1
+        self.stats["by_endpoint"][endpoint] = self.stats["by_endpoint"].get(endpoint, 0) + 1
+        await asyncio.sleep(max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter)))
+        if self._rng.random() < self.error_rate:
+            self.stats["errors"] += 1
+            return web.json_response({"code": -1001, "msg": "Internal error; unable to process your request."}, status=500)
+
+        symbol = params.get("symbol")
+        if endpoint == "time":
+            return web.json_response({"serverTime": int(time.time() * 1000)})
+        if endpoint == "exchangeInfo":
+            return web.json_response({"symbols": [
+                {"symbol": s, "status": "TRADING", "baseAsset": s[:-4], "quoteAsset": "USDT"} for s in self.symbols
+            ]})
+        if endpoint == "ticker/24hr":
+            if symbol:
+                return web.json_response(self._ticker(symbol) if symbol in self.prices else {"code": -1121, "msg": "Invalid symbol."})
+            return web.json_response([self._ticker(s) for s in self.symbols])
+        if endpoint == "premiumIndex":
+            items = [
+                {"symbol": s, "markPrice": f"{self.prices[s]:.6f}", "lastFundingRate": f"{self._rng.gauss(0.0001, 0.0003):.6f}"}
+                for s in ([symbol] if symbol else self.symbols)
+            ]
+            return web.json_response(items[0] if symbol else items)
+        if endpoint == "ticker/bookTicker":
+            items = [
+                {"symbol": s, "bidPrice": f"{self.prices[s] * 0.9998:.6f}", "askPrice": f"{self.prices[s] * 1.0002:.6f}"}
+                for s in ([symbol] if symbol else self.symbols)
+            ]
+            return web.json_response(items[0] if symbol else items)
+        if endpoint == "klines":
+            if symbol not in self.prices:
+                return web.json_response({"code": -1121, "msg": "Invalid symbol."}, status=400)
+            return web.json_response(self._klines(symbol, params.get("interval", "1h"), int(params.get("limit", 100))))
+        if endpoint == "depth":
+            return web.json_response(self._depth(symbol, int(params.get("limit", 20))))
+        if endpoint in ("account", "balance"):
+            assets = [{"asset": "USDT", "walletBalance": f"{self.balance:.2f}", "availableBalance": f"{self.balance:.2f}"}]
+            return web.json_response(assets if endpoint == "balance" else {"assets": assets, "canTrade": True})
+        if endpoint == "positionRisk":
+            return web.json_response(self._position_risk(symbol))
+        if endpoint == "order":
+            if request.method == "POST":
+                return web.json_response(self._new_order(params))
+            if request.method == "DELETE":
+                result = self._cancel_order(params)
+                return web.json_response(result, status=400 if "code" in result else 200)
+            order = self.orders.get(str(params.get("orderId") or params.get("origClientOrderId")))
+            if order is None:
+                return web.json_response({"code": -2013, "msg": "Order does not exist."}, status=400)
+            if str(order["orderId"]) in self.open_orders:
+                self._tick(order["symbol"])
+            return web.json_response(order)
+        if endpoint == "batchOrders":
+            # 每笔订单单独返回结果或错误
+            orders = json.loads(params.get("batchOrders", "[]"))
+            return web.json_response([self._new_order({k: str(v) for k, v in o.items()}) for o in orders[:5]])
+        if endpoint == "userTrades":
+            return web.json_response(self.fills.get(str(params.get("orderId")), []))
+        if endpoint == "listenKey":
+            return web.json_response({"listenKey": LISTEN_KEY} if request.method == "POST" else {})
+        if endpoint == "commissionRate":
+            return web.json_response({"symbol": symbol, "makerCommissionRate": "0.0002", "takerCommissionRate": "0.0004"})
+        if endpoint in ("positionSide/dual", "leverage", "marginType"):
+            return web.json_response({"code": 200, "msg": "success"})
+        return web.json_response({"code": -1000, "msg": f"unknown endpoint {endpoint}"}, status=404)
+
+    async def start(self, host: str = "127.0.0.1", port: int = 9200) -> str:
+        """在当前事件循环中启动，返回base url"""
+        self._runner = web.AppRunner(self.build_app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        logger.info(f"🧪 假交易所已启动: http://{host}:{port} ({len(self.symbols)}个交易对)")
+        return f"http://{host}:{port}"
+
+    async def stop(self):
+        for ws in list(self._streams) + list(self._depth_streams):
+            await ws.close()
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地假AsterDEX合约REST服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9200)
+    parser.add_argument("--symbols", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.02, help="平均响应延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.01, help="延迟抖动（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回500的概率")
+    args = parser.parse_args()
+
+    server = FakeAsterServer(args.symbols, args.latency, args.jitter, args.error_rate)
+    web.run_app(server.build_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+仪表盘客户端压测
+
+模拟N个打开的仪表盘：每个客户端保持一个 /ws 连接接收推送，同时按前端的轮询间隔
+请求各个API，记录每个接口的 p50/p99 延迟和错误数。
+
+    python -m benchmarks.ws_swarm --url http://127.0.0.1:8000 --clients 50 --duration 30
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Dict, List
+
+import aiohttp
+from loguru import logger
+
+
+# 前端仪表盘轮询的接口
+DEFAULT_ENDPOINTS = ("/api/status", "/api/portfolio", "/api/positions", "/api/trades?limit=50", "/api/ai-decisions")
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class ClientSwarm:
+    """仪表盘客户端群"""
+
+    def __init__(
+        self,
+        base_url: str,
+        clients: int = 20,
+        poll_interval: float = 2.0,
+        endpoints=DEFAULT_ENDPOINTS,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.clients = clients
+        self.poll_interval = poll_interval
+        self.endpoints = list(endpoints)
+        self.latencies: Dict[str, List[float]] = {e: [] for e in self.endpoints}
+        self.errors: Dict[str, int] = {e: 0 for e in self.endpoints}
+        self.ws_messages = 0
+        self.ws_errors = 0
+
+    async def _ws_client(self, session: aiohttp.ClientSession, stop: asyncio.Event):
+        ws_url = self.base_url.replace("http", "ws", 1) + "/ws"
+        try:
+            async with session.ws_connect(ws_url, heartbeat=30) as ws:
+                while not stop.is_set():
+                    try:
+                        msg = await asyncio.wait_for(ws.receive(), timeout=0.5)
+                    except asyncio.TimeoutError:
+                        continue
+                    if msg.type == aiohttp.WSMsgType.TEXT:
+                        self.ws_messages += 1
+                    elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                        self.ws_errors += 1
+                        break
+        except Exception as e:
+            self.ws_errors += 1
+            logger.debug(f"WebSocket客户端异常: {e}")
+
+    async def _poller(self, session: aiohttp.ClientSession, stop: asyncio.Event):
+        # 错开各客户端的首次请求
+        await asyncio.sleep(random.uniform(0, self.poll_interval))
+        while not stop.is_set():
+            for endpoint in self.endpoints:
+                started = time.perf_counter()
+                try:
+                    async with session.get(self.base_url + endpoint) as resp:
+                        await resp.read()
+                        if resp.status >= 500:
+                            self.errors[endpoint] += 1
+                            continue
+                    self.latencies[endpoint].append((time.perf_counter() - started) * 1000)
+                except Exception:
+                    self.errors[endpoint] += 1
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run(self, duration: float) -> Dict:
+        stop = asyncio.Event()
+        connector = aiohttp.TCPConnector(limit=0)
+        timeout = aiohttp.ClientTimeout(total=30)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            tasks = []
+            for _ in range(self.clients):
+                tasks.append(asyncio.create_task(self._ws_client(session, stop)))
+                tasks.append(asyncio.create_task(self._poller(session, stop)))
+            await asyncio.sleep(duration)
+            stop.set()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return self.report(duration)
+
+    def report(self, duration: float) -> Dict:
+        endpoints = {}
+        all_latencies = []
+        for endpoint, values in self.latencies.items():
+            all_latencies.extend(values)
+            endpoints[endpoint] = {
+                "requests": len(values),
+                "errors": self.errors[endpoint],
+                "p50_ms": round(percentile(values, 50), 2),
+                "p99_ms": round(percentile(values, 99), 2),
+                "max_ms": round(max(values), 2) if values else 0.0,
+            }
+        return {
+            "clients": self.clients,
+            "duration_s": duration,
+            "requests_per_s": round(len(all_latencies) / duration, 1) if duration else 0.0,
+            "p50_ms": round(percentile(all_latencies, 50), 2),
+            "p99_ms": round(percentile(all_latencies, 99), 2),
+            "ws_messages": self.ws_messages,
+            "ws_errors": self.ws_errors,
+            "endpoints": endpoints,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="仪表盘客户端压测")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--poll-interval", type=float, default=2.0)
+    args = parser.parse_args()
+
+    swarm = ClientSwarm(args.url, args.clients, args.poll_interval)
+    result = asyncio.run(swarm.run(args.duration))
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""
+交易纯逻辑的行为测试
+
+行情、订单簿和成交数据来自本地假交易所（benchmarks/fake_aster_server.py），直接调用其
+撮合和数据生成方法，不启动HTTP服务。依赖交易所SDK的模块（订单管理、订单簿）在SDK未安装时跳过。
+
+    python -m pytest -q tests
+"""
+import numpy as np
+import pytest
+
+from backend.config import settings
+from backend.agents.incremental_indicators import IndicatorStore
+from backend.trading.risk_engine import PreTradeRisk
+from benchmarks.fake_aster_server import FakeAsterServer
+
+
+EQUITY = 10000.0
+
+
+@pytest.fixture
+def exchange():
+    return FakeAsterServer(symbols=5, latency=0, jitter=0, seed=7)
+
+
+@pytest.fixture
+def risk(monkeypatch):
+    for name, value in {
+        "risk_engine_enabled": True,
+        "max_position_size": 0.2,
+        "risk_max_gross_exposure": 1.0,
+        "risk_max_net_exposure": 0.8,
+        "risk_max_bucket_exposure": 0.4,
+        "risk_min_notional": 5.0,
+        "risk_daily_loss_limit": 0.05,
+        "max_concurrent_trades": 3,
+    }.items():
+        monkeypatch.setattr(settings, name, value)
+    engine = PreTradeRisk()
+    engine.buckets = {"BTCUSDT": "majors", "ETHUSDT": "majors"}
+    engine.update_equity(EQUITY)
+    engine.load_symbol_filters([{"symbol": "BTCUSDT", "filters": [
+        {"filterType": "LOT_SIZE", "minQty": "0.001", "maxQty": "100"},
+        {"filterType": "MIN_NOTIONAL", "notional": "100"},
+    ]}])
+    return engine
+
+
+def _klines(exchange: FakeAsterServer, symbol: str, limit: int):
+    """假交易所K线转成 aster_client.get_klines 的字典格式"""
+    return [
+        {"timestamp": row[0], "open": float(row[1]), "high": float(row[2]), "low": float(row[3]),
+         "close": float(row[4]), "volume": float(row[5])}
+        for row in exchange._klines(symbol, "1h", limit)
+    ]
+
+
+# ---------- 下单前风控 ----------
+
+def test_risk_rejects_below_exchange_min_notional(risk):
+    result = risk.check("BTCUSDT", "buy", 0.001, 50000)
+    assert not result.approved and result.check == "min_notional"
+
+
+def test_risk_rejects_outside_lot_size(risk):
+    assert risk.check("BTCUSDT", "buy", 0.0005, 500000).check == "min_qty"
+    assert risk.check("BTCUSDT", "buy", 101, 1).check == "max_qty"
+
+
+def test_risk_symbol_exposure_cap_and_headroom(risk):
+    risk.sync_positions([{"symbol": "BTCUSDT", "amount": 0.02, "current_price": 50000, "position_type": "long"}])
+    # 已有$1000，单交易对上限$2000
+    assert risk.headroom("BTCUSDT", "buy") == pytest.approx(1000)
+    assert risk.check("BTCUSDT", "buy", 0.01, 50000).approved
+    result = risk.check("BTCUSDT", "buy", 0.03, 50000)
+    assert not result.approved and result.check == "symbol_exposure"
+    # 反向下单先抵消现有敞口
+    assert risk.headroom("BTCUSDT", "sell") == pytest.approx(3000)
+
+
+def test_risk_bucket_cap_shared_by_correlated_symbols(risk, monkeypatch):
+    monkeypatch.setattr(settings, "risk_max_bucket_exposure", 0.3)
+    risk.sync_positions([
+        {"symbol": "BTCUSDT", "amount": 0.03, "current_price": 50000, "position_type": "long"},
+        {"symbol": "ETHUSDT", "amount": 0.4, "current_price": 2500, "position_type": "long"},
+    ])
+    # 主流币分组上限$3000，BTC和ETH合计已占$2500
+    assert risk.headroom("ETHUSDT", "buy") == pytest.approx(500)
+    result = risk.check("ETHUSDT", "buy", 0.3, 2500)
+    assert not result.approved and result.check == "bucket_exposure"
+    # 不在分组内的交易对只受单交易对上限约束
+    assert risk.check("SOLUSDT", "buy", 10, 150).approved
+
+
+def test_risk_max_open_positions(risk):
+    for symbol in ("AAAUSDT", "BBBUSDT", "CCCUSDT"):
+        risk.record_order(symbol, "buy", 10, 10)
+    result = risk.check("DDDUSDT", "buy", 10, 10)
+    assert not result.approved and result.check == "max_positions"
+    # 已有持仓的交易对加仓不受持仓数量限制
+    assert risk.check("AAAUSDT", "buy", 10, 10).approved
+
+
+def test_risk_reducing_orders_always_pass(risk):
+    risk.sync_positions([{"symbol": "BTCUSDT", "amount": 0.1, "current_price": 50000, "position_type": "long"}])
+    risk.set_kill_switch(True, "测试")
+    result = risk.check("BTCUSDT", "sell", 0.1)
+    assert result.approved and result.reducing
+    # 超过持仓的反向单会开出反向仓位，不算减仓
+    assert not risk.check("BTCUSDT", "sell", 0.2).approved
+    # 平仓单在本地持仓未同步时也放行
+    assert risk.check("ETHUSDT", "sell", 1, closing=True).approved
+
+
+def test_risk_daily_loss_engages_kill_switch(risk):
+    risk.update_equity(EQUITY * 0.94)
+    assert risk.kill_switch
+    result = risk.check("ETHUSDT", "buy", 0.1, 2500)
+    assert not result.approved and result.check == "kill_switch"
+    assert risk.headroom("ETHUSDT", "buy", 2500) == 0
+
+
+def test_risk_release_restores_exposure(risk):
+    risk.record_order("ETHUSDT", "buy", 0.5, 2500)
+    risk.release("ETHUSDT", "buy", 0.5)
+    assert "ETHUSDT" not in risk.positions
+
+
+# ---------- 客户端订单ID ----------
+
+def test_client_order_id_is_deterministic():
+    order_manager = pytest.importorskip("backend.trading.order_manager")
+    make_id = order_manager.make_client_order_id
+    first = make_id("BTCUSDT", "buy", 0.01, "cycle-1")
+    assert first == make_id("BTCUSDT", "buy", 0.01, "cycle-1")
+    assert first.startswith("nl-") and len(first) <= 36
+    assert len({
+        first,
+        make_id("BTCUSDT", "sell", 0.01, "cycle-1"),
+        make_id("BTCUSDT", "buy", 0.02, "cycle-1"),
+        make_id("BTCUSDT", "buy", 0.01, "cycle-2"),
+        make_id("ETHUSDT", "buy", 0.01, "cycle-1"),
+    }) == 5
+
+
+# ---------- 母单汇总 ----------
+
+def _fill_child(manager, exchange: FakeAsterServer, symbol: str, amount: float, intent: str):
+    """在假交易所市价成交一笔子单，按订单管理器的方式写入成交结果"""
+    child, _ = manager._new_order(symbol, "buy", amount, intent)
+    result = exchange._new_order({
+        "symbol": symbol, "side": "BUY", "type": "MARKET", "quantity": str(amount),
+        "newClientOrderId": child["client_order_id"],
+    })
+    manager._apply_exchange_result(child, result)
+    fills = exchange.fills[str(result["orderId"])]
+    child["fee"] = sum(float(f["commission"]) for f in fills)
+    child["fee_asset"] = fills[0]["commissionAsset"]
+    return child
+
+
+def test_aggregate_weights_children_by_fill(exchange):
+    order_manager = pytest.importorskip("backend.trading.order_manager")
+    manager = order_manager.OrderManager()
+    symbol = exchange.symbols[0]
+    arrival = exchange.prices[symbol]
+    parent = manager.new_parent(symbol, "buy", 3.0, "test", "twap", arrival_price=arrival)
+    first = _fill_child(manager, exchange, symbol, 1.0, "test|1")
+    exchange._tick(symbol)
+    second = _fill_child(manager, exchange, symbol, 2.0, "test|2")
+    parent["children"] = [first, second]
+
+    manager.aggregate(parent)
+
+    vwap = (first["avg_price"] + 2 * second["avg_price"]) / 3
+    assert parent["state"] == order_manager.FILLED
+    assert parent["filled_amount"] == pytest.approx(3.0)
+    assert parent["avg_price"] == pytest.approx(vwap)
+    assert parent["fee"] == pytest.approx(first["fee"] + second["fee"])
+    assert parent["fee_asset"] == "USDT"
+    assert parent["slippage_bps"] == pytest.approx((vwap - arrival) / arrival * 1e4)
+
+
+def test_aggregate_partial_and_rejected(exchange):
+    order_manager = pytest.importorskip("backend.trading.order_manager")
+    manager = order_manager.OrderManager()
+    symbol = exchange.symbols[1]
+    parent = manager.new_parent(symbol, "buy", 3.0, "test", "depth")
+    filled = _fill_child(manager, exchange, symbol, 1.0, "test|1")
+    rejected, _ = manager._new_order(symbol, "buy", 2.0, "test|2")
+    rejected.update(state=order_manager.REJECTED, error="余额不足")
+    parent["children"] = [filled, rejected]
+    manager.aggregate(parent)
+    assert parent["state"] == order_manager.PARTIALLY_FILLED
+    assert parent["avg_price"] == pytest.approx(filled["avg_price"])
+
+    parent["children"] = [rejected]
+    manager.aggregate(parent)
+    assert parent["state"] == order_manager.REJECTED
+    assert parent["error"] == "余额不足"
+
+
+# ---------- 预估滑点 ----------
+
+def _levels(rows):
+    return np.array([[float(p), float(q)] for p, q in rows])
+
+
+def test_slippage_walks_the_book(exchange):
+    order_book = pytest.importorskip("backend.exchanges.order_book")
+    symbol = exchange.symbols[2]
+    depth = exchange._depth(symbol, 20)
+    bids, asks = _levels(depth["bids"]), _levels(depth["asks"])
+    mid = (bids[0, 0] + asks[0, 0]) / 2
+    estimate = order_book.estimate_slippage_bps
+
+    # 只吃第一档时均价就是卖一价
+    best = estimate(asks, mid, asks[0, 0] * asks[0, 1] / 2)
+    assert best == pytest.approx((asks[0, 0] - mid) / mid * 1e4)
+    # 金额越大吃得越深
+    assert estimate(asks, mid, float((asks[:, 0] * asks[:, 1]).sum()) * 0.9) > best
+    assert estimate(bids, mid, bids[0, 0] * bids[0, 1] / 2) == pytest.approx((mid - bids[0, 0]) / mid * 1e4)
+    # 可见深度不够成交
+    assert estimate(asks, mid, float((asks[:, 0] * asks[:, 1]).sum()) * 2) is None
+    assert estimate(asks, mid, 0) == 0.0
+
+
+# ---------- 增量指标 ----------
+
+def test_indicator_series_incremental_matches_rebuild(exchange):
+    symbol = exchange.symbols[3]
+    klines = _klines(exchange, symbol, 121)
+    store = IndicatorStore()
+    store.series(symbol, "1h", klines[:120])
+    incremental = store.series(symbol, "1h", klines)
+    rebuilt = IndicatorStore().series(symbol, "1h", klines)
+
+    # 第二次只提交新收盘的一根
+    assert store.stats == {"incremental": 1, "rebuilds": 1, "candles": 120}
+    assert set(incremental) == set(rebuilt)
+    for name in rebuilt:
+        assert len(incremental[name]) == 121
+        np.testing.assert_allclose(incremental[name], rebuilt[name], rtol=1e-12, equal_nan=True, err_msg=name)
+
+
+def test_indicator_series_rebuilds_on_gap(exchange):
+    symbol = exchange.symbols[4]
+    klines = _klines(exchange, symbol, 150)
+    store = IndicatorStore()
+    store.series(symbol, "1h", klines[:100])
+    result = store.series(symbol, "1h", klines[120:])
+    assert store.stats["rebuilds"] == 2
+    assert len(result["rsi"]) == 30
+    # 最后一根只试算，不提交
+    assert store.series(symbol, "1h", klines[120:]) is not None
+    assert store.stats["candles"] == 99 + 29
+
+
+def test_indicator_series_rejects_oversized_window(exchange):
+    symbol = exchange.symbols[0]
+    assert IndicatorStore().series(symbol, "1h", _klines(exchange, symbol, 201)) is None
+    assert IndicatorStore().series(symbol, "1h", []) is None